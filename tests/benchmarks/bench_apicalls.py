@@ -0,0 +1,74 @@
+"""Benchmark the overhead of recording AWS API calls.
+
+Answers ``--calls`` DescribeVpcs calls from a canned ``before-send``
+response, so only botocore's own work is timed, alternating between a plain
+client and one created while a recorder is installed, and reports the added
+cost per call next to the cost of the recording step alone.
+
+Usage: python tests/benchmarks/bench_apicalls.py [--calls 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import botocore.session
+from botocore.awsrequest import AWSResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.apicalls import recording, report  # noqa: E402
+
+BODY = (b'<DescribeVpcsResponse xmlns="http://ec2.amazonaws.com/doc/2016-11-15/"><requestId>1</requestId><vpcSet>'
+        + b"".join(b"<item><vpcId>vpc-%08x</vpcId><cidrBlock>10.%d.0.0/16</cidrBlock><state>available</state>"
+                   b"<isDefault>false</isDefault></item>" % (index, index) for index in range(5))
+        + b"</vpcSet></DescribeVpcsResponse>")
+
+
+class Raw:
+    def stream(self, **kwargs):
+        yield BODY
+
+
+def client():
+    created = botocore.session.get_session().create_client(
+        "ec2", region_name="us-east-1", aws_access_key_id="testing", aws_secret_access_key="testing")
+    created.meta.events.register("before-send", lambda request, **kwargs: AWSResponse(
+        request.url, 200, {"content-length": str(len(BODY))}, Raw()))
+    return created
+
+
+def per_call(ec2, calls):
+    ec2.describe_vpcs()
+    started = time.perf_counter()
+    for _ in range(calls):
+        ec2.describe_vpcs()
+    return (time.perf_counter() - started) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    plain_client = client()
+    with recording("bench") as recorder:
+        recorded_client = client()
+        plain, recorded = float("inf"), float("inf")
+        for _ in range(3):
+            plain = min(plain, per_call(plain_client, args.calls))
+            recorded = min(recorded, per_call(recorded_client, args.calls))
+        started = time.perf_counter()
+        for _ in range(args.calls):
+            recorder.record("ec2", "DescribeVpcs", 0.0005, 0, 43, len(BODY), False)
+        step = (time.perf_counter() - started) / args.calls
+    print(f"{'plain client':<24} {plain * 1e6:8.1f} us/call")
+    print(f"{'recorded client':<24} {recorded * 1e6:8.1f} us/call")
+    print(f"{'overhead':<24} {(recorded - plain) * 1e6:8.1f} us/call ({(recorded / plain - 1) * 100:.1f} %)")
+    print(f"{'recording step alone':<24} {step * 1e6:8.1f} us/call")
+    print(report(recorder)[0])
+
+
+if __name__ == "__main__":
+    main()
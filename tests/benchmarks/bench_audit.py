@@ -0,0 +1,146 @@
+"""Benchmark the auditd analyzer on a synthetic multi-host audit.log corpus.
+
+Writes ``--size-mb`` of audit records for ``--hosts`` instances in the
+format the app user data's rules produce -- mostly ``exec`` events from
+daemons and a few logged-in users, watched-file edits, sudo and sshd
+userspace records, with every tenth pair of events interleaved -- plus a
+burst of ``sudoers`` edits, a one-off ``shadow_changes`` edit and a run of
+failed root logins.  Then times one pass and ``--jobs`` worker processes
+and checks both find the same events and anomalies.
+
+Usage: python tests/benchmarks/bench_audit.py [--size-mb 2048] [--hosts 20] [--jobs 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.audit import analyze, anomalies, load_rules  # noqa: E402
+
+T0 = 1729036800
+SYSCALL = ("node={host} type=SYSCALL msg=audit({stamp}.{ms:03d}:{serial}): arch=c000003e syscall={syscall} "
+           "success={success} exit=0 a0=55d1c a1=55d2a a2=55d3f a3=0 items={items} ppid={ppid} pid={pid} "
+           "auid={auid} uid={uid} gid=0 euid={uid} suid={uid} fsuid={uid} egid=0 sgid=0 fsgid=0 tty={tty} "
+           "ses={ses} comm=\"{comm}\" exe=\"{exe}\" key=\"{key}\"")
+PART = "node={host} type={type} msg=audit({stamp}.{ms:03d}:{serial}): {body}"
+USER = ("node={host} type={type} msg=audit({stamp}.{ms:03d}:{serial}): pid={pid} uid=0 auid={auid} ses={ses} "
+        "msg='op={op} acct=\"{acct}\" exe=\"{exe}\" hostname=? addr={addr} terminal={tty} res={res}'")
+COMMANDS = ["/usr/bin/bash", "/usr/bin/curl", "/usr/bin/node", "/usr/bin/systemctl", "/usr/bin/grep",
+            "/usr/bin/awk", "/usr/bin/sed", "/usr/bin/aws", "/usr/bin/ps", "/usr/bin/date"]
+WATCHED = [("shadow_changes", "/etc/shadow", "/usr/sbin/useradd"),
+           ("passwd_changes", "/etc/passwd", "/usr/sbin/useradd"), ("pam", "/etc/pam.d/sshd", "/usr/bin/vi"), ("network_changes", "/etc/sysconfig/network", "/usr/bin/vi"),
+           ("modules", "/sbin/modprobe", "/sbin/modprobe"), ("sshd_config", "/etc/ssh/sshd_config", "/usr/bin/vi")]
+
+
+def syscall_event(host, stamp, serial, key, exe, auid, syscall, paths, rng, success="yes"):
+    common = {"host": host, "stamp": stamp, "ms": rng.randrange(1000), "serial": serial}
+    uid = 0 if auid in ("4294967295", "1000") else int(auid)
+    lines = [SYSCALL.format(**common, syscall=syscall, success=success, items=len(paths), ppid=1, pid=rng.randrange(
+        2000, 60000), auid=auid, uid=uid, tty="pts0" if auid != "4294967295" else "(none)", ses=3,
+        comm=exe.rsplit("/", 1)[1][:15], exe=exe, key=key)]
+    if syscall == 59:
+        lines.append(PART.format(**common, type="EXECVE", body=f'argc=2 a0="{exe}" a1="--version"'))
+    lines.append(PART.format(**common, type="CWD", body='cwd="/"'))
+    lines += [PART.format(**common, type="PATH", body=f'item={item} name="{path}" inode={rng.randrange(1, 1 << 20)} '
+                          "dev=ca:01 mode=0100755 ouid=0 ogid=0 rdev=00:00 nametype=NORMAL cap_fp=0 cap_fi=0")
+              for item, path in enumerate(paths)]
+    lines.append(PART.format(**common, type="PROCTITLE", body=exe.encode().hex().upper()))
+    lines.append(PART.format(**common, type="EOE", body="").rstrip())
+    return lines
+
+
+def user_event(host, stamp, serial, kind, auid, rng, res="success", addr="10.100.0.5"):
+    op, acct, exe, tty = {"login": ("login", "root", "/usr/sbin/sshd", "ssh"),
+                          "sudo": ("PAM:session_open", "root", "/usr/bin/sudo", "/dev/pts/0")}[kind]
+    return [USER.format(host=host, type="USER_LOGIN" if kind == "login" else "USER_START", stamp=stamp,
+                        ms=rng.randrange(1000), serial=serial, pid=rng.randrange(2000, 60000), auid=auid, ses=3,
+                        op=op, acct=acct, exe=exe, addr=addr, tty=tty, res=res)]
+
+
+def generate(path, size, hosts, seed=7):
+    """Write about ``size`` bytes of audit records; return the number of events."""
+    rng = random.Random(seed)
+    names = [f"i-0{index:016x}" for index in range(hosts)]
+    serials = dict.fromkeys(names, 1000)
+    written = events = 0
+    stamp, injected = T0, False
+    with open(path, "w") as fh:
+        while written < size:
+            stamp += 1
+            block = []
+            for host in rng.sample(names, max(1, hosts // 2)):
+                for _ in range(rng.randrange(1, 4)):
+                    serials[host] += 1
+                    roll = rng.random()
+                    if roll < 0.9:
+                        auid = "4294967295" if rng.random() < 0.7 else str(rng.choice((1000, 1001, 1002)))
+                        exe = rng.choice(COMMANDS)
+                        lines = syscall_event(host, stamp, serials[host], "exec", exe, auid, 59, [exe, "/lib64/ld"],
+                                              rng)
+                    elif roll < 0.96:
+                        lines = user_event(host, stamp, serials[host], "sudo", str(rng.choice((1000, 1001))), rng)
+                    else:
+                        key, target, exe = rng.choice(WATCHED[1:])
+                        lines = syscall_event(host, stamp, serials[host], key, exe, "1000", 257, ["/etc/", target], rng)
+                    if block and rng.random() < 0.1:
+                        previous = block.pop()
+                        lines = [line for pair in zip(previous, lines) for line in pair] + \
+                            previous[len(lines):] + lines[len(previous):]
+                    block.append(lines)
+                    events += 1
+            if not injected and written >= size // 2:
+                injected = True
+                for serial in range(300):
+                    block.append(syscall_event(names[0], stamp, 10 ** 9 + serial, "sudoers", "/usr/bin/vi", "1001",
+                                               257, ["/etc/", "/etc/sudoers"], rng))
+                block.append(syscall_event(names[1], stamp, 10 ** 9, "shadow_changes", "/usr/bin/vi", "1007", 257,
+                                           ["/etc/", "/etc/shadow"], rng))
+                block += [user_event(names[2], stamp, 10 ** 9 + serial, "login", "4294967295", rng, "failed",
+                                     "203.0.113.9") for serial in range(50)]
+                events += 351
+            text = "\n".join(line for lines in block for line in lines) + "\n"
+            fh.write(text)
+            written += len(text)
+    return events
+
+
+def timed(label, size, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:8.2f} s {size / elapsed / 2 ** 20:8.1f} MiB/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    rules = load_rules()
+    keys = {rule.key for rule in rules}
+    watched = frozenset(rule.key for rule in rules if rule.kind == "watch")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "audit.log")
+        started = time.perf_counter()
+        events = generate(path, args.size_mb * 2 ** 20, args.hosts)
+        size = os.path.getsize(path)
+        print(f"generated {size / 2 ** 20:.0f} MiB, {events} events in {time.perf_counter() - started:.1f} s")
+        single = timed("one pass", size, lambda: analyze(path, watched=watched))
+        parallel = timed(f"{args.jobs} worker processes", size, lambda: analyze(path, args.jobs, watched=watched))
+    assert (parallel.events, parallel.counts, parallel.minutes) == (single.events, single.counts, single.minutes)
+    print(f"events: {single.events}  records: {single.records}  closed by window: {single.unterminated}  "
+          f"orphaned records: {single.orphans}")
+    for anomaly in anomalies(parallel, 3, keys):
+        print(f"  {anomaly.kind:<9} {anomaly.score:8.1f}  {anomaly.subject:<36} {anomaly.detail}")
+
+
+if __name__ == "__main__":
+    main()
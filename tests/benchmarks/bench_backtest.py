@@ -0,0 +1,76 @@
+"""Benchmark backtesting alarms and the Auto Scaling group on synthetic metrics.
+
+Generates ``--days`` of one-minute CPU, in-service instance and ALB
+metrics with a daily cycle, noise and a few traffic spikes, evaluates every
+module alarm over a threshold grid, then sweeps the scaling policy grid
+serially and with ``--jobs`` workers.
+
+Usage: python tests/benchmarks/bench_backtest.py [--days 90] [--jobs 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.backtest import (  # noqa: E402
+    CAPACITY_METRIC, CPU_METRIC, evaluate, load_alarms, load_scaling, metric_series, sweep,
+)
+
+GRID = {"high_threshold": [60, 65, 70, 75, 80], "low_threshold": [20, 30, 40],
+        "high_periods": [1, 2, 3], "cooldown": [60, 300, 600]}
+
+
+def synthetic_metrics(days, seed):
+    rng = np.random.default_rng(seed)
+    minutes = np.arange(days * 1440)
+    load = 45 + 30 * np.sin(2 * np.pi * (minutes % 1440) / 1440 - np.pi / 2) + rng.normal(0, 6, len(minutes))
+    for start in rng.integers(0, len(minutes) - 120, size=days // 3):
+        load[start:start + rng.integers(15, 120)] += rng.uniform(30, 80)
+    instances = np.full(len(minutes), 3.0)
+    requests = np.maximum(load * 40 + rng.normal(0, 50, len(minutes)), 0)
+    errors = rng.poisson(np.maximum(load - 90, 0.2)).astype(np.float64)
+    columns = {CPU_METRIC: np.clip(load, 0, 100), CAPACITY_METRIC: instances,
+               "AWS/ApplicationELB:RequestCount": requests, "AWS/ApplicationELB:HTTPCode_ELB_5XX_Count": errors,
+               "AWS/RDS:CPUUtilization": np.clip(load * 0.6, 0, 100),
+               "AWS/RDS:FreeStorageSpace": np.linspace(20e9, 5e9, len(minutes))}
+    gaps = rng.random(len(minutes)) < 0.001
+    for values in columns.values():
+        values[gaps] = np.nan
+    return metric_series(1729036800 + 60 * minutes, columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    series = synthetic_metrics(args.days, args.seed)
+    for name, alarm in load_alarms().items():
+        thresholds = alarm.threshold * np.linspace(0.5, 1.5, 21)
+        started = time.perf_counter()
+        result = evaluate(alarm, series, thresholds)
+        elapsed = time.perf_counter() - started
+        print(f"evaluate {name:<12} {len(thresholds)} thresholds  {elapsed * 1000:7.1f} ms  "
+              f"{int(result.alarms[len(thresholds) // 2])} ALARM transitions at {alarm.threshold:g}")
+
+    config = load_scaling()
+    sets = int(np.prod([len(values) for values in GRID.values()]))
+    for jobs in sorted({1, args.jobs}):
+        started = time.perf_counter()
+        result = sweep(series, config, GRID, jobs=jobs)
+        elapsed = time.perf_counter() - started
+        print(f"sweep jobs={jobs:<3} {sets} parameter sets x {len(series)} minutes  {elapsed:7.2f} s")
+
+    best = min(result.rows(), key=lambda row: (row["underprovisioned_minutes"], row["instance_minutes"]))
+    print("fewest under-provisioned minutes:", {key: value for key, value in best.items() if key != "time_at_capacity"})
+
+
+if __name__ == "__main__":
+    main()
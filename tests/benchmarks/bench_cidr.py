@@ -0,0 +1,66 @@
+"""Benchmark CIDR overlap detection and allocation at scale.
+
+Usage: python tests/benchmarks/bench_cidr.py [--prefixes 100000] [--seed 7]
+"""
+
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.cidr import CidrAllocator, find_overlaps, subnet_layout  # noqa: E402
+
+
+def random_prefixes(count, seed):
+    """Peered-VPC style prefixes: /16 VPCs in 10/8 with module subnet layouts and strays."""
+    rng = random.Random(seed)
+    prefixes = []
+    while len(prefixes) < count:
+        vpc = ipaddress.ip_network((0x0A000000 | rng.randrange(256) << 16, 16))
+        prefixes.append(vpc)
+        for networks in subnet_layout(vpc, rng.randint(2, 6)).values():
+            prefixes.extend(networks)
+        prefixes.append(ipaddress.ip_network((int(vpc.network_address) | rng.randrange(4096) << 4, 28)))
+    return prefixes[:count]
+
+
+def pairwise_estimate(prefixes, sample):
+    """Time pairwise ``overlaps`` on a sample and extrapolate to all prefixes."""
+    subset = prefixes[:sample]
+    started = time.perf_counter()
+    for i, left in enumerate(subset):
+        for right in subset[i + 1:]:
+            left.overlaps(right)
+    elapsed = time.perf_counter() - started
+    return elapsed * (len(prefixes) / sample) ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prefixes", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for count in (1000, 10000, args.prefixes):
+        prefixes = random_prefixes(count, args.seed)
+        started = time.perf_counter()
+        overlaps = find_overlaps(prefixes)
+        elapsed = time.perf_counter() - started
+        print(f"find_overlaps  {count:>7} prefixes  {elapsed * 1000:9.1f} ms  {len(overlaps)} overlaps")
+
+    print(f"pairwise est.  {args.prefixes:>7} prefixes  {pairwise_estimate(prefixes, 1000):9.1f} s")
+
+    allocator = CidrAllocator("10.0.0.0/8")
+    started = time.perf_counter()
+    for _ in range(20000):
+        allocator.allocate(random.Random(len(allocator)).choice((24, 26, 28)))
+    elapsed = time.perf_counter() - started
+    print(f"allocate       {len(allocator):>7} blocks    {elapsed * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark CloudTrail ingestion and queries on a synthetic copy of the trail bucket.
+
+Writes ``--size-mb`` of CloudTrail records over 35 days and three regions
+with :func:`tools.synth.write_trail`, ingests them in one process and on
+``--jobs`` worker processes and checks both stores hold the same events,
+re-ingests to check nothing is read twice, then times the incident
+queries: security group ingress by principal over 30 days, failed calls
+over a week and everything from one source address.
+
+Usage: python tests/benchmarks/bench_cloudtrail.py [--size-mb 500] [--jobs 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.cloudtrail import TrailStore, ingest  # noqa: E402
+from tools.synth import EPOCH, Scale, write_trail  # noqa: E402
+
+QUERY_BUDGET = 1.0
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<52} {elapsed:8.3f} s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=500)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    end = EPOCH + 86400
+    with tempfile.TemporaryDirectory() as directory:
+        bucket = os.path.join(directory, "bucket")
+        records, _ = timed("generate", lambda: write_trail(bucket, Scale(log_mb=args.size_mb)))
+        single = TrailStore(os.path.join(directory, "single"))
+        parallel = TrailStore(os.path.join(directory, "parallel"))
+        result, elapsed = timed("ingest, one process", lambda: ingest(bucket, single))
+        print(f"  {result.records} records in {result.files} files, {result.parts} parts, "
+              f"{result.records / elapsed:.0f} records/s")
+        timed(f"ingest, {args.jobs} worker processes", lambda: ingest(bucket, parallel, args.jobs))
+        again, _ = timed("ingest again", lambda: ingest(bucket, single))
+        assert result.records == records and (again.files, again.already) == (0, result.files)
+        assert single.stats()["rows"] == parallel.stats()["rows"] == records
+
+        queries = [
+            ("AuthorizeSecurityGroupIngress by principal, 30 days",
+             lambda store: store.query(end - 30 * 86400, end, ("principal",), name="AuthorizeSecurityGroupIngress")),
+            ("failed calls by name, 7 days",
+             lambda store: store.query(end - 7 * 86400, end, ("name",), failed=True)),
+            ("everything from 198.51.100.7",
+             lambda store: store.query(None, None, ("time", "name", "request"), source_ip="198.51.100.7")),
+        ]
+        for label, query in queries:
+            found, elapsed = timed(label, lambda: query(single))
+            print(f"  {len(found)} events from {found.parts} parts")
+            assert found.rows == query(parallel).rows
+            assert elapsed < QUERY_BUDGET, f"{label} took {elapsed:.2f} s, over the {QUERY_BUDGET} s budget"
+        single.close()
+        parallel.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark the native compliance engine on a large synthetic plan.
+
+Usage: python tests/benchmarks/bench_compliance.py [--copies 130] [--jobs 8]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from conftest import build_environment_plan  # noqa: E402
+from tools.compliance import ComplianceEngine, load_features, summarize  # noqa: E402
+from tools.plan import PlanIndex  # noqa: E402
+
+FEATURES_DIR = os.path.join(os.path.dirname(__file__), "..", "compliance")
+
+
+def scaled_plan(copies):
+    """Merge ``copies`` prod environment plans under distinct module names."""
+    merged = None
+    for copy in range(copies):
+        text = json.dumps(build_environment_plan()).replace('"module.', f'"module.c{copy}_')
+        plan = json.loads(text)
+        calls = plan["configuration"]["root_module"]["module_calls"]
+        plan["configuration"]["root_module"]["module_calls"] = {f"c{copy}_{k}": v for k, v in calls.items()}
+        if merged is None:
+            merged = plan
+            continue
+        merged["planned_values"]["root_module"]["child_modules"] += plan["planned_values"]["root_module"]["child_modules"]
+        merged["resource_changes"] += plan["resource_changes"]
+        merged["configuration"]["root_module"]["module_calls"].update(plan["configuration"]["root_module"]["module_calls"])
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=130)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    plan = scaled_plan(args.copies)
+    features = load_features(FEATURES_DIR)
+
+    started = time.perf_counter()
+    index = PlanIndex(plan)
+    indexed = time.perf_counter()
+    results = ComplianceEngine(index).run(features, jobs=args.jobs)
+    finished = time.perf_counter()
+
+    print(f"resources:  {len(index.resources)}")
+    print(f"index:      {(indexed - started) * 1000:.1f} ms")
+    print(f"scenarios:  {(finished - indexed) * 1000:.1f} ms ({len(results)} scenarios, jobs={args.jobs})")
+    print(f"statuses:   {summarize(results)}")
+    slowest = sorted(results, key=lambda result: result.duration, reverse=True)[:5]
+    for result in slowest:
+        print(f"  {result.duration * 1000:8.2f} ms  {result.scenario.id}")
+
+
+if __name__ == "__main__":
+    main()
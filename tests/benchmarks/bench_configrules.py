@@ -0,0 +1,93 @@
+"""Benchmark local Config rule evaluation over a large synthetic configuration item store.
+
+Usage: python tests/benchmarks/bench_configrules.py [--resources 100000] [--jobs 1] [--changed 0.01]
+
+Writes volumes, buckets, IAM users, VPCs and DB instances into a fresh
+store, evaluates every rule cold, again with everything cached, and once
+more after ``--changed`` of the volumes and buckets were modified.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.configrules import evaluate  # noqa: E402
+from tools.inventory import GLOBAL, TYPES, Snapshot  # noqa: E402
+
+ACCOUNT_ID = "123456789012"
+MIX = (("AWS::EC2::Volume", 0.6), ("AWS::S3::Bucket", 0.2), ("AWS::IAM::User", 0.1), ("AWS::EC2::VPC", 0.05),
+       ("AWS::RDS::DBInstance", 0.05))
+SSL_ONLY = json.dumps({"Version": "2012-10-17", "Statement": [
+    {"Effect": "Deny", "Principal": "*", "Action": "s3:*", "Resource": "*",
+     "Condition": {"Bool": {"aws:SecureTransport": "false"}}}]})
+
+
+def item(name, index, generation=0):
+    """A configuration item shaped like the describe_* output, one in seven non-compliant."""
+    bad = (index + generation) % 7 == 0
+    tags = [{"Key": "Environment", "Value": "prod"}, {"Key": "Name", "Value": f"{name}-{index}"}]
+    if name == "AWS::EC2::Volume":
+        return {"VolumeId": f"vol-{index:017x}", "Encrypted": not bad, "Size": 20, "VolumeType": "gp3",
+                "Attachments": [{"InstanceId": f"i-{index:017x}", "State": "attached", "Device": "/dev/xvda"}],
+                "AvailabilityZone": "us-east-1a", "State": "in-use", "Tags": tags}
+    if name == "AWS::S3::Bucket":
+        return {"Name": f"bucket-{index}", "CreationDate": "2024-01-01T00:00:00+00:00", "supplementaryConfiguration": {
+            "AccessControlList": {"Grants": [{"Grantee": {"Type": "CanonicalUser", "ID": "owner"},
+                                              "Permission": "FULL_CONTROL"}]},
+            "BucketPolicy": None if bad else SSL_ONLY,
+            "PublicAccessBlockConfiguration": {"BlockPublicAcls": True, "IgnorePublicAcls": True,
+                                               "BlockPublicPolicy": True, "RestrictPublicBuckets": True},
+            "AccountPublicAccessBlockConfiguration": None}}
+    if name == "AWS::IAM::User":
+        return {"UserName": f"user-{index}", "Arn": f"arn:aws:iam::{ACCOUNT_ID}:user/user-{index}",
+                "supplementaryConfiguration": {"LoginProfile": {"UserName": f"user-{index}"},
+                                               "MFADevices": [] if bad else [f"arn:aws:iam::{ACCOUNT_ID}:mfa/{index}"]}}
+    if name == "AWS::EC2::VPC":
+        return {"VpcId": f"vpc-{index:017x}", "CidrBlock": "10.0.0.0/16", "State": "available", "Tags": tags,
+                "supplementaryConfiguration": {"FlowLogs": [] if bad else [
+                    {"FlowLogId": f"fl-{index}", "FlowLogStatus": "ACTIVE", "TrafficType": "ALL"}]}}
+    return {"DBInstanceIdentifier": f"db-{index}", "StorageEncrypted": not bad, "Engine": "postgres",
+            "DBInstanceClass": "db.r5.large", "MultiAZ": True, "TagList": tags}
+
+
+def populate(store, resources, generation=0, fraction=1.0):
+    """Write the mix; with ``fraction`` < 1 only that share of volumes and buckets moves to ``generation``."""
+    for name, share in MIX:
+        resource_type = TYPES[name]
+        count = int(resources * share)
+        moved = int(count * fraction) if name in ("AWS::EC2::Volume", "AWS::S3::Bucket") else 0
+        items = [item(name, index, generation if index < moved else 0) for index in range(count)]
+        store.write(resource_type, "us-east-1" if resource_type.regional else GLOBAL, ACCOUNT_ID, items)
+
+
+def timed(store, jobs, label):
+    started = time.perf_counter()
+    matrix = evaluate(store, jobs=jobs)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {elapsed * 1000:9.1f} ms  {len(matrix.evaluations)} evaluations, {matrix.evaluated} evaluated, "
+          f"{matrix.reused} cached, {len(matrix.failing())} non-compliant")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=100000)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--changed", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch, Snapshot(os.path.join(scratch, "config.db")) as store:
+        populate(store, args.resources)
+        print(f"resources: {args.resources}, jobs={args.jobs}")
+        timed(store, args.jobs, "cold")
+        timed(store, args.jobs, "cached")
+        populate(store, args.resources, generation=1, fraction=args.changed)
+        timed(store, args.jobs, f"{args.changed:.0%} moved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark pricing a what-if grid over dev, staging and prod.
+
+Builds the three environment plans, reads their quantities once, then prices
+every combination of NAT layout, Multi-AZ, DB instance class, storage, app
+instance type, group sizes and Performance Insights retention in one
+vectorized pass, and compares that with pricing the same rows one at a time.
+
+Usage: python tests/benchmarks/bench_cost.py [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from conftest import build_environment_plan  # noqa: E402
+from tools.cost import evaluate, load_prices, quantities  # noqa: E402
+
+GRID = {"ha_nat_gateway": [True, False], "multi_az": [True, False],
+        "db_instance_class": ["db.t3.medium", "db.t3.large", "db.r5.large", "db.r5.xlarge", "db.r5.2xlarge"],
+        "allocated_storage": [50, 100, 200], "instance_type": ["t3.medium", "t3.large", "m5.large", "c5.large"],
+        "min_size": [1, 2, 3], "max_size": [4, 10], "desired_capacity": [2, 3, 6],
+        "performance_insights_retention_period": [7, 731]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    environments = {environment: quantities(build_environment_plan(environment))
+                    for environment in ("dev", "staging", "prod")}
+    prices = load_prices()
+    best = float("inf")
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        table = evaluate(environments, GRID, prices)
+        best = min(best, time.perf_counter() - started)
+    print(f"{'vectorized grid':<28} {len(table):>7} rows {best * 1000:9.1f} ms")
+
+    sample = table.rows(200)
+    started = time.perf_counter()
+    for row in sample:
+        evaluate({row["environment"]: environments[row["environment"]]},
+                 {name: [row[name]] for name in GRID}, prices)
+    per_row = (time.perf_counter() - started) / len(sample)
+    print(f"{'one row at a time':<28} {len(table):>7} rows {per_row * len(table) * 1000:9.1f} ms (extrapolated)")
+    environment, monthly = table.columns["environment"], table.columns["monthly"]
+    print(f"cheapest {environment[0]} ${monthly[0]:,.2f}/month, dearest {environment[-1]} ${monthly[-1]:,.2f}/month")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark building the apply graph, its critical path and -parallelism simulations.
+
+Usage: python tests/benchmarks/bench_depgraph.py [--copies 250] [--parallelism 1 10 50]
+
+Nests ``copies`` prod environment plans under ``module.c<n>`` in one plan,
+so references still resolve through each copy's module inputs and outputs,
+then times indexing it, building the graph, the critical path and one
+simulated apply per ``-parallelism`` value.  The HCL graph of the prod
+environment is timed as well.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from conftest import build_environment_plan  # noqa: E402
+from tools.depgraph import ApplyGraph, environment_index  # noqa: E402
+from tools.plan import PlanIndex  # noqa: E402
+
+
+def nested_plan(copies):
+    """One plan holding ``copies`` prod environments as ``module.c<n>``."""
+    children, calls, changes = [], {}, []
+    for number in range(copies):
+        plan, prefix = build_environment_plan(), f"module.c{number}"
+        renamed = json.loads(json.dumps({"planned": plan["planned_values"]["root_module"],
+                                         "changes": plan["resource_changes"]}).replace('"module.', f'"{prefix}.module.'))
+        children.append(dict(renamed["planned"], address=prefix))
+        changes.extend(renamed["changes"])
+        calls[f"c{number}"] = {"source": "./prod", "expressions": {}, "module": plan["configuration"]["root_module"]}
+    return {"planned_values": {"root_module": {"resources": [], "child_modules": children}},
+            "resource_changes": changes, "configuration": {"root_module": {"resources": [], "module_calls": calls}}}
+
+
+def timed(label, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    print(f"{label:<28} {(time.perf_counter() - started) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=250)
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    timed("prod HCL graph", lambda: ApplyGraph.from_index(environment_index("prod")[0]))
+    document = nested_plan(args.copies)
+    index = timed("index", PlanIndex, document)
+    graph = timed("graph", ApplyGraph.from_index, index)
+    print(f"{len(graph)} operations, {graph.edges} edges")
+    seconds, path = timed("critical path", graph.critical_path)
+    print(f"critical path {seconds:.0f} s over {len(path)} operations, {graph.work:.0f} s of work")
+    for level in args.parallelism:
+        schedule = timed(f"simulate -parallelism={level}", graph.simulate, level)
+        print(f"  wall clock {schedule.wall:.0f} s")
+
+
+if __name__ == "__main__":
+    main()
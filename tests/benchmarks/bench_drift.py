@@ -0,0 +1,99 @@
+"""Benchmark drift checks of dev, staging and prod against a local moto server.
+
+Applies the three environment plans to an in-process moto server, adds
+``--noise`` unrelated security groups, subnets and roles straight into its
+backends, then times the first check (a full inventory snapshot), a repeat
+check with no CloudTrail changes, and a check after a console edit of one
+security group, where only security groups are listed and only the edited
+group is diffed again.
+
+Usage: python tests/benchmarks/bench_drift.py [--noise 5000]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests", "integration"))
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from moto.core import DEFAULT_ACCOUNT_ID  # noqa: E402
+from moto.ec2.models import ec2_backends  # noqa: E402
+from moto.iam.models import iam_backends  # noqa: E402
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+from conftest import build_environment_plan  # noqa: E402
+from integration.conftest import FAKE_CREDENTIALS, REGION, ClientPool, _free_port  # noqa: E402
+from test_drift_moto import ENVIRONMENTS, apply_plan  # noqa: E402
+from tools.drift import IN_SYNC, check  # noqa: E402
+from tools.inventory import Clients, Snapshot  # noqa: E402
+
+
+def add_noise(count):
+    """Add ``count`` security groups, subnets and roles no plan declares."""
+    ec2 = ec2_backends[DEFAULT_ACCOUNT_ID][REGION]
+    vpcs = [ec2.create_vpc(f"172.{16 + index}.0.0/16").id for index in range(count // 4 // 4096 + 1)]
+    for index in range(count // 2):
+        ec2.create_security_group(f"noise-{index}", "noise", vpc_id=vpcs[index % len(vpcs)])
+    for index in range(count // 4):
+        ec2.create_subnet(vpcs[index // 4096], f"172.{16 + index // 4096}.{index % 4096 // 16}.{index % 16 * 16}/28",
+                          availability_zone=f"{REGION}a")
+    iam = iam_backends[DEFAULT_ACCOUNT_ID]["global"]
+    for index in range(count - count // 2 - count // 4):
+        iam.create_role(f"noise-{index}", "{}", "/", None, "noise", [], "3600")
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    print(f"{label:<52} {time.perf_counter() - started:8.2f} s")
+    return result
+
+
+def summary(results, clients):
+    drifted = sum(result.status != IN_SYNC for result in results)
+    rediffed = sum(not result.cached for result in results)
+    calls = sum(clients.calls.values())
+    print(f"  {len(results)} resources, {drifted} drifted, {rediffed} re-diffed, {calls} API calls")
+    clients.calls.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--noise", type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.update(FAKE_CREDENTIALS)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=_free_port(), verbose=False)
+    server.start()
+    try:
+        pool = ClientPool(f"http://127.0.0.1:{server._port}")
+        plans = {environment: build_environment_plan(environment, vpc_cidr=cidr, include_monitoring=False)
+                 for environment, cidr in ENVIRONMENTS.items()}
+        groups = timed("apply dev, staging and prod", lambda: {environment: apply_plan(pool, plan)
+                                                                for environment, plan in plans.items()})
+        timed(f"add {args.noise} unrelated resources", lambda: add_noise(args.noise))
+        clients = Clients(endpoint_url=pool.endpoint_url, max_pool_connections=16)
+        sg_only = lambda *_: {("AWS::EC2::SecurityGroup", REGION)}  # noqa: E731
+        with tempfile.TemporaryDirectory() as directory, Snapshot(os.path.join(directory, "inv.db")) as snapshot:
+            summary(timed("first check (full snapshot)", lambda: check(plans, snapshot, clients)), clients)
+            summary(timed("repeat check, no CloudTrail changes", lambda: check(plans, snapshot, clients,
+                                                                               changes=lambda *_: set())), clients)
+            pool.client("ec2").authorize_security_group_ingress(
+                GroupId=groups["prod"]["prod-db-sg"], IpPermissions=[
+                    {"IpProtocol": "tcp", "FromPort": 5432, "ToPort": 5432, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}])
+            summary(timed("check after editing prod-db-sg", lambda: check(plans, snapshot, clients,
+                                                                          changes=sg_only)), clients)
+            summary(timed("offline check of the snapshot", lambda: check(plans, snapshot)), clients)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
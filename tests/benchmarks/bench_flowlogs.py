@@ -0,0 +1,108 @@
+"""Benchmark flow log parsing and aggregation throughput in MB/s.
+
+Usage: python tests/benchmarks/bench_flowlogs.py [--megabytes 200] [--seed 7]
+"""
+
+import argparse
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.flowlogs import FlowAggregator, analyze, iter_chunks, parse_chunk  # noqa: E402
+
+HEADER = b"version account-id interface-id srcaddr dstaddr srcport dstport protocol packets bytes start end action log-status\n"
+
+
+def write_flow_log(path, megabytes, seed):
+    """Write synthetic records for a 10.100.0.0/16 VPC with some internet peers."""
+    rng = random.Random(seed)
+    hosts = [f"10.100.{rng.randrange(9)}.{rng.randrange(1, 255)}" for _ in range(500)]
+    peers = [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+             for _ in range(2000)]
+    enis = [f"eni-{rng.getrandbits(68):017x}" for _ in range(50)]
+    lines = []
+    for _ in range(20000):
+        src, dst = rng.choice(hosts), rng.choice(hosts + peers)
+        action = "REJECT" if rng.random() < 0.1 else "ACCEPT"
+        start = 1700000000 + rng.randrange(86400)
+        lines.append(f"2 123456789012 {rng.choice(enis)} {src} {dst} {rng.randrange(1024, 65535)} "
+                     f"{rng.choice((22, 80, 443, 5432, 8080))} 6 {rng.randrange(1, 500)} "
+                     f"{rng.randrange(40, 1500000)} {start} {start + 60} {action} OK")
+    block = ("\n".join(lines) + "\n").encode()
+    target = megabytes * 1024 * 1024
+    with open(path, "wb") as fh:
+        fh.write(HEADER)
+        written = 0
+        while written < target:
+            fh.write(block)
+            written += len(block)
+
+
+def address(text):
+    a, b, c, d = text.split(".")
+    return int(a) << 24 | int(b) << 16 | int(c) << 8 | int(d)
+
+
+def naive(path):
+    """Line-by-line baseline decoding the same columns into Python ints."""
+    talkers = {}
+    rejected = 0
+    with open(path, "rb") as fh:
+        next(fh)
+        for line in fh:
+            fields = line.split()
+            if fields[13] != b"OK":
+                continue
+            src, dst = address(fields[3].decode()), address(fields[4].decode())
+            _ports = int(fields[5]), int(fields[6]), int(fields[7]), int(fields[8]), int(fields[10]), int(fields[11])
+            key = (src, dst)
+            talkers[key] = talkers.get(key, 0) + int(fields[9])
+            rejected += fields[12] == b"REJECT"
+    return talkers
+
+
+def timed(label, size, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} {size / 1048576 / elapsed:8.1f} MB/s  ({elapsed:.2f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        plain = os.path.join(workdir, "flows.log")
+        packed = os.path.join(workdir, "flows.log.gz")
+        write_flow_log(plain, args.megabytes, args.seed)
+        with open(plain, "rb") as source, gzip.open(packed, "wb", compresslevel=1) as target:
+            while True:
+                block = source.read(1 << 24)
+                if not block:
+                    break
+                target.write(block)
+        size = os.path.getsize(plain)
+        print(f"{size / 1048576:.0f} MB uncompressed, {os.path.getsize(packed) / 1048576:.0f} MB gzip")
+
+        timed("per-line decode", size, lambda: naive(plain))
+        timed("chunked parse (mmap)", size, lambda: [parse_chunk(c) for c in iter_chunks(plain)])
+        timed("parse + aggregate", size, lambda: analyze(plain, "10.100.0.0/16", 3))
+        timed("gzip parse + aggregate", size, lambda: analyze(packed, "10.100.0.0/16", 3))
+
+        aggregator = FlowAggregator("10.100.0.0/16", 3)
+        for chunk in iter_chunks(plain):
+            aggregator.add(parse_chunk(chunk))
+        print(f"talker table: {len(aggregator.talkers.counts)} keys "
+              f"(capacity {aggregator.talkers.capacity})")
+
+
+if __name__ == "__main__":
+    main()
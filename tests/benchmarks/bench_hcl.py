@@ -0,0 +1,52 @@
+"""Benchmark the Terraform module model: parsing, the hash-keyed cache and lookups.
+
+Usage: python tests/benchmarks/bench_hcl.py [--lookups 100000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.hcl import ParseCache, TerraformModel  # noqa: E402
+
+PATH = "aws_kms_key.db_encryption_key.enable_key_rotation"
+
+
+def load(cache_dir, names=None):
+    """Build a fresh model (a new process, in effect) and load ``names``."""
+    cache = ParseCache(cache_dir)
+    model = TerraformModel(cache=cache)
+    started = time.perf_counter()
+    for name in names or model.names():
+        model.module(name)
+    return (time.perf_counter() - started) * 1000, cache, model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label, names in (("cold, all modules", None), ("warm, all modules", None),
+                             ("warm, security only", ["security"])):
+            elapsed, cache, _ = load(cache_dir, names)
+            print(f"{label:<22} {elapsed:8.2f} ms  {cache.misses} parsed, {cache.hits} from cache")
+        elapsed, cache, _ = load(None, ["monitoring"])
+        print(f"{'parse monitoring only':<22} {elapsed:8.2f} ms")
+
+        _, _, model = load(cache_dir, ["database"])
+        database = model["database"]
+        started = time.perf_counter()
+        for _ in range(args.lookups):
+            database[PATH]
+        per_lookup = (time.perf_counter() - started) / args.lookups
+        print(f"{'lookup':<22} {per_lookup * 1e6:8.2f} us  {PATH}")
+
+
+if __name__ == "__main__":
+    main()
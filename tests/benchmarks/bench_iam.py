@@ -0,0 +1,120 @@
+"""Benchmark compiled IAM policy queries over a synthetic policy corpus.
+
+Usage: python tests/benchmarks/bench_iam.py [--policies 10000] [--queries 200] [--seed 7]
+"""
+
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.iam import PolicyAnalyzer, PolicyCache  # noqa: E402
+
+SERVICES = {
+    "s3": ["GetObject", "PutObject", "DeleteObject", "ListBucket", "GetBucketPolicy", "PutBucketPolicy",
+           "GetObjectAcl", "PutObjectAcl", "GetBucketLocation", "ListAllMyBuckets"],
+    "ec2": ["DescribeInstances", "RunInstances", "TerminateInstances", "DescribeSecurityGroups",
+            "AuthorizeSecurityGroupIngress", "CreateTags", "DescribeVolumes", "AttachVolume"],
+    "kms": ["Decrypt", "Encrypt", "GenerateDataKey", "DescribeKey", "CreateGrant", "ScheduleKeyDeletion"],
+    "logs": ["CreateLogGroup", "CreateLogStream", "PutLogEvents", "DescribeLogGroups", "GetLogEvents"],
+    "iam": ["PassRole", "GetRole", "CreateRole", "AttachRolePolicy", "CreateUser", "ListRoles"],
+    "rds": ["DescribeDBInstances", "CreateDBSnapshot", "DeleteDBInstance", "ModifyDBInstance"],
+    "cloudwatch": ["PutMetricData", "GetMetricData", "PutMetricAlarm", "DescribeAlarms"],
+    "ssm": ["GetParameter", "GetParameters", "PutParameter", "SendCommand", "StartSession"],
+}
+
+
+def random_policy(rng, buckets):
+    statements = []
+    for _ in range(rng.randint(1, 4)):
+        service = rng.choice(list(SERVICES))
+        roll = rng.random()
+        if roll < 0.6:
+            actions = [f"{service}:{name}" for name in rng.sample(SERVICES[service], rng.randint(1, 4))]
+        elif roll < 0.85:
+            actions = [f"{service}:{rng.choice(('Get', 'Describe', 'List', 'Put'))}*"]
+        elif roll < 0.97:
+            actions = [f"{service}:*"]
+        else:
+            actions = ["*"]
+        if service == "s3" and rng.random() < 0.8:
+            bucket = rng.choice(buckets)
+            resources = [f"arn:aws:s3:::{bucket}", f"arn:aws:s3:::{bucket}/*"]
+        else:
+            resources = "*"
+        statement = {"Effect": "Deny" if rng.random() < 0.05 else "Allow", "Action": actions, "Resource": resources}
+        if rng.random() < 0.1:
+            statement["Condition"] = {"Bool": {"aws:SecureTransport": "true"}}
+        statements.append(statement)
+    return {"Version": "2012-10-17", "Statement": statements}
+
+
+def naive_grants(corpus, action, resource):
+    """Scan every statement of every policy with fnmatch, ignoring conditions and deny."""
+    found = []
+    for name, document in corpus:
+        for statement in document["Statement"]:
+            actions = statement["Action"] if isinstance(statement["Action"], list) else [statement["Action"]]
+            resources = statement["Resource"] if isinstance(statement["Resource"], list) else [statement["Resource"]]
+            if statement["Effect"] == "Allow" \
+                    and any(fnmatch.fnmatchcase(action.lower(), a.lower()) for a in actions) \
+                    and any(fnmatch.fnmatchcase(resource, r) for r in resources):
+                found.append(name)
+                break
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--policies", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    buckets = [f"bucket-{i}" for i in range(500)]
+    corpus = [(f"policy-{i}", random_policy(rng, buckets)) for i in range(args.policies)]
+    # Real accounts attach the same documents many times.
+    corpus += [(f"copy-{i}", corpus[rng.randrange(len(corpus))][1]) for i in range(args.policies // 5)]
+    queries = []
+    for _ in range(args.queries):
+        service = rng.choice(list(SERVICES))
+        resource = f"arn:aws:s3:::{rng.choice(buckets)}/key" if service == "s3" else "*"
+        queries.append((f"{service}:{rng.choice(SERVICES[service])}", resource))
+
+    analyzer = PolicyAnalyzer()
+    started = time.perf_counter()
+    analyzer.extend(corpus)
+    analyzer.candidates("s3:getobject")
+    print(f"load + compile + index {len(corpus):>6} policies {(time.perf_counter() - started) * 1000:9.1f} ms  "
+          f"({analyzer.cache.misses} distinct documents)")
+
+    started = time.perf_counter()
+    for action, resource in queries:
+        analyzer.grants(action, resource)
+    indexed = (time.perf_counter() - started) / len(queries)
+    started = time.perf_counter()
+    for action, resource in queries[:20]:
+        naive_grants(corpus, action, resource)
+    naive = (time.perf_counter() - started) / 20
+    print(f"indexed grants query    {indexed * 1000:9.2f} ms/query")
+    print(f"naive fnmatch scan      {naive * 1000:9.2f} ms/query  ({naive / indexed:.0f}x)")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cache_path = os.path.join(workdir, "findings.json")
+        for label in ("cold over-grant audit", "warm over-grant audit"):
+            cache = PolicyCache(cache_path)
+            started = time.perf_counter()
+            findings = PolicyAnalyzer(cache).extend(corpus).over_grants()
+            elapsed = time.perf_counter() - started
+            cache.save()
+            print(f"{label:<23} {elapsed * 1000:9.1f} ms  {len(findings)} findings, {cache.misses} compiled")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Compare integration-test setup: per-test moto decorators vs the pooled moto server.
+
+Runs the test methods of tests/integration/test_deployment.py ``--rounds``
+times each way and, when pytest-xdist is installed, times the integration
+suite serially and with ``-n auto``.
+
+Usage: python tests/benchmarks/bench_integration.py [--rounds 5]
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests", "integration"))
+
+import boto3  # noqa: E402
+from moto import mock_ec2, mock_iam, mock_rds, mock_s3, mock_sts  # noqa: E402
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+from conftest import FAKE_CREDENTIALS, SERVICES, ClientPool, _free_port  # noqa: E402
+from test_deployment import TestDatabaseDeployment, TestInfrastructureDeployment  # noqa: E402
+
+CLASSES = (TestInfrastructureDeployment, TestDatabaseDeployment)
+
+
+def test_methods():
+    for cls in CLASSES:
+        for name in sorted(vars(cls)):
+            if name.startswith("test_"):
+                yield cls, name
+
+
+def run_decorated(cls, name):
+    """The previous approach: start every mock and build fresh clients for each test."""
+    with mock_ec2(), mock_s3(), mock_iam(), mock_rds(), mock_sts():
+        instance = cls()
+        instance.region = "us-east-1"
+        for service in ("ec2", "s3", "iam", "rds"):
+            setattr(instance, f"{service}_client", boto3.client(service, region_name=instance.region))
+        getattr(instance, name)()
+
+
+def run_pooled(pool, cls, name):
+    pool.reset()
+    instance = cls()
+    instance.region = pool.region
+    for service in ("ec2", "s3", "iam", "rds"):
+        setattr(instance, f"{service}_client", pool.client(service))
+    getattr(instance, name)()
+
+
+def timed(label, count, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed:7.2f} s  {elapsed / count * 1000:8.1f} ms/test")
+    return elapsed
+
+
+def pytest_wall_time(*args):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "tests/integration", *args],
+                   cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    os.environ.update(FAKE_CREDENTIALS)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    tests = list(test_methods()) * args.rounds
+
+    decorated = timed("decorators + fresh clients", len(tests),
+                      lambda: [run_decorated(cls, name) for cls, name in tests])
+
+    started = time.perf_counter()
+    port = _free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    pool = ClientPool(f"http://127.0.0.1:{port}")
+    for service in SERVICES:
+        pool.client(service)
+    print(f"{'server start + client pool':<34} {time.perf_counter() - started:7.2f} s  (once per worker)")
+    pooled = timed("pooled server + reset", len(tests), lambda: [run_pooled(pool, cls, name) for cls, name in tests])
+    server.stop()
+    print(f"{'speedup':<34} {decorated / pooled:7.1f}x")
+
+    try:
+        import xdist  # noqa: F401
+    except ImportError:
+        print("pytest-xdist not installed; skipping the parallel suite timing")
+        return
+    serial = pytest_wall_time()
+    parallel = pytest_wall_time("-n", "auto")
+    print(f"{'pytest tests/integration':<34} {serial:7.2f} s")
+    print(f"{'pytest tests/integration -n auto':<34} {parallel:7.2f} s  ({os.cpu_count()} cores)")
+
+
+if __name__ == "__main__":
+    main()
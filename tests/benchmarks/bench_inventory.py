@@ -0,0 +1,126 @@
+"""Benchmark inventory snapshots against a local moto server.
+
+Starts a moto server in a child process, seeded with ``--resources``
+resources (network interfaces, security groups, volumes, IAM roles,
+subnets and buckets) straight into its backends, then times a full
+snapshot serially and with ``--workers`` threads, a refresh where only
+security groups moved, an unchanged full refresh, and indexed queries.
+Only one resource in 100 is tagged: moto looks tags up with a scan of
+every tag in the account, which would otherwise dominate.
+
+Usage: python tests/benchmarks/bench_inventory.py [--resources 50000] [--workers 16]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+os.environ.update({"AWS_ACCESS_KEY_ID": "testing", "AWS_SECRET_ACCESS_KEY": "testing", "AWS_DEFAULT_REGION": "us-east-1"})
+
+from moto.core import DEFAULT_ACCOUNT_ID  # noqa: E402
+from moto.ec2.models import ec2_backends  # noqa: E402
+from moto.iam.models import iam_backends  # noqa: E402
+from moto.s3.models import s3_backends  # noqa: E402
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+from tools.inventory import Clients, Snapshot, refresh  # noqa: E402
+
+REGION = "us-east-1"
+MIX = {"network_interfaces": 0.40, "security_groups": 0.30, "volumes": 0.10, "roles": 0.16, "subnets": 0.02,
+       "buckets": 0.02}
+
+
+def seed(total):
+    """Create ``total`` resources in moto's backends; return the first VPC ID."""
+    counts = {kind: int(total * share) for kind, share in MIX.items()}
+    ec2 = ec2_backends[DEFAULT_ACCOUNT_ID][REGION]
+    vpcs = [ec2.create_vpc(f"10.{index}.0.0/16").id for index in range(counts["subnets"] // 4096 + 1)]
+    subnets = [ec2.create_subnet(vpcs[index // 4096], f"10.{index // 4096}.{index % 4096 // 16}.{index % 16 * 16}/28",
+                                 availability_zone=f"{REGION}a")
+               for index in range(max(counts["subnets"], 1))]
+    for index in range(counts["security_groups"]):
+        tags = {"Environment": ("prod", "staging", "dev")[index // 100 % 3]} if index % 100 == 0 else None
+        ec2.create_security_group(f"sg-{index}", "bench", vpc_id=vpcs[index % len(vpcs)], tags=tags)
+    for index in range(counts["network_interfaces"]):
+        tags = {"Service": f"svc-{index // 100 % 50}"} if index % 100 == 0 else None
+        ec2.create_network_interface(subnets[index % len(subnets)], [], tags=tags)
+    for index in range(counts["volumes"]):
+        ec2.create_volume(8, f"{REGION}a", volume_type="gp3", iops=3000, throughput=125)
+    iam = iam_backends[DEFAULT_ACCOUNT_ID]["global"]
+    for index in range(counts["roles"]):
+        iam.create_role(f"role-{index}", "{}", "/", None, "bench", [], "3600")
+    s3 = s3_backends[DEFAULT_ACCOUNT_ID]["global"]
+    for index in range(counts["buckets"]):
+        s3.create_bucket(f"bench-bucket-{index}", REGION)
+    return vpcs[0]
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    print(f"{label:<44} {time.perf_counter() - started:8.2f} s")
+    return result
+
+
+def serve(port, resources):
+    """Child process: seed moto, serve it and report the first VPC ID on stdout."""
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    print(seed(resources), flush=True)
+    sys.stdin.read()
+    server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.resources)
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, __file__, "--serve", str(port), "--resources", str(args.resources)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        vpc_id = server.stdout.readline().strip()
+        print(f"{'seed ' + str(args.resources) + ' resources':<44} {time.perf_counter() - started:8.2f} s")
+        endpoint = f"http://127.0.0.1:{port}"
+        with tempfile.TemporaryDirectory() as directory:
+            for workers in sorted({1, args.workers}):
+                clients = Clients(endpoint_url=endpoint, max_pool_connections=workers * 2)
+                with Snapshot(os.path.join(directory, f"inventory-{workers}.db")) as snapshot:
+                    results, _ = timed(f"full snapshot, {workers} worker(s)",
+                                       lambda: refresh(snapshot, clients, workers=workers))
+                print(f"  {sum(added for added, _, _ in results.values())} resources, "
+                      f"{sum(clients.calls.values())} API calls")
+            path = os.path.join(directory, f"inventory-{args.workers}.db")
+            print(f"  snapshot file {os.path.getsize(path) / 1e6:.1f} MB")
+            clients = Clients(endpoint_url=endpoint, max_pool_connections=args.workers * 2)
+            with Snapshot(path) as snapshot:
+                sg_only = lambda *_: {("AWS::EC2::SecurityGroup", REGION)}  # noqa: E731
+                timed("refresh, security groups moved", lambda: refresh(snapshot, clients, workers=args.workers,
+                                                                       changes=sg_only))
+                timed("full refresh, nothing changed", lambda: refresh(snapshot, clients, workers=args.workers,
+                                                                      full=True))
+                found = timed("query by VPC", lambda: snapshot.find(vpc_id=vpc_id))
+                tagged = timed("query by tag Environment=prod",
+                               lambda: snapshot.find(tags={"Environment": "prod"}))
+                timed("100 queries by ID", lambda: [snapshot.find(id=f"role-{index}") for index in range(100)])
+                print(f"  {len(found)} in the VPC, {len(tagged)} tagged prod")
+    finally:
+        server.communicate("")
+
+
+if __name__ == "__main__":
+    main()
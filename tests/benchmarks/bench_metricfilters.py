@@ -0,0 +1,84 @@
+"""Benchmark replaying log files through the monitoring module's metric filters.
+
+Writes a synthetic day of ``/var/log/secure`` (sshd noise with failed
+logins and sudo) and CloudTrail events to a temporary directory, then
+replays it through every filter serially and with ``--jobs`` workers.
+
+Usage: python tests/benchmarks/bench_metricfilters.py [--mb 64] [--jobs 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.metricfilters import evaluate_alarm, load_monitoring, replay  # noqa: E402
+
+SECURE = (
+    "sshd[{pid}]: Accepted publickey for ec2-user from 10.100.{a}.{b} port {port} ssh2",
+    "sshd[{pid}]: Connection closed by 10.100.{a}.{b} port {port} [preauth]",
+    "sshd[{pid}]: pam_unix(sshd:session): session opened for user ec2-user by (uid=0)",
+    "sshd[{pid}]: Failed password for invalid user admin from 203.0.113.{b} port {port} ssh2",
+    "sudo: ec2-user : TTY=pts/0 ; PWD=/home/ec2-user ; USER=root ; COMMAND=/bin/systemctl status app",
+)
+WEIGHTS = (40, 40, 18, 1.5, 0.5)
+EVENTS = ("DescribeInstances", "GetObject", "AssumeRole", "AuthorizeSecurityGroupIngress")
+
+
+def write_corpus(directory, megabytes, seed):
+    rng = random.Random(seed)
+    start = 1729036800  # 2024-10-16T00:00:00Z
+    for name, size in (("secure.log", megabytes * 0.8), ("cloudtrail.log", megabytes * 0.2)):
+        path = os.path.join(directory, name)
+        target = int(size * 1024 * 1024)
+        stamp = start
+        with open(path, "w") as fh:
+            while fh.tell() < target:
+                lines = []
+                for _ in range(1000):
+                    stamp += rng.random() * 2
+                    clock = time.gmtime(int(stamp) % 86400 + start)
+                    if name == "secure.log":
+                        template = rng.choices(SECURE, WEIGHTS)[0]
+                        message = template.format(pid=rng.randrange(1000, 9999), a=rng.randrange(256),
+                                                  b=rng.randrange(256), port=rng.randrange(1024, 65535))
+                        lines.append(f"{time.strftime('%b %d %H:%M:%S', clock)} ip-10-100-3-17 {message}")
+                    else:
+                        event = rng.choices(EVENTS, (60, 30, 9.99, 0.01))[0]
+                        lines.append(f'{{"eventVersion": "1.08", "eventTime": "{time.strftime("%Y-%m-%dT%H:%M:%SZ", clock)}", '
+                                     f'"eventSource": "ec2.amazonaws.com", "eventName": "{event}", '
+                                     f'"awsRegion": "us-east-1", "sourceIPAddress": "10.100.3.17"}}')
+                fh.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=int, default=64)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    filters, alarms = load_monitoring()
+    with tempfile.TemporaryDirectory() as directory:
+        write_corpus(directory, args.mb, args.seed)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        for jobs in sorted({1, args.jobs}):
+            started = time.perf_counter()
+            result = replay(directory, filters, jobs=jobs, year=2024)
+            elapsed = time.perf_counter() - started
+            print(f"jobs={jobs:<3} {elapsed:7.2f} s  {size / elapsed / 1e6:7.1f} MB/s  {result.lines} lines")
+
+    print(", ".join(f"{name}={count}" for name, count in result.matches.items()))
+    for alarm in alarms:
+        metric_filter = next(item for item in filters if item.metric_name == alarm.metric_name)
+        datapoints = result.datapoints(metric_filter.name, alarm.period, alarm.statistic)
+        transitions = evaluate_alarm(alarm, datapoints, *result.span())
+        print(f"{alarm.name}: {sum(1 for item in transitions if item.state == 'ALARM')} ALARM transitions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark the streaming plan loader against json.load on large synthetic plans.
+
+Usage: python tests/benchmarks/bench_planstream.py [--copies 100 800] [--keep DIR]
+
+Each size writes a plan of ``copies`` prod environments under distinct
+module names, with ``prior_state`` and ``resource_changes``, then loads it
+in a fresh interpreter with ``json.load`` and with :class:`PlanStream` and
+reports wall time and peak RSS of each.  Peak RSS of the stream should not
+grow with the plan.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from conftest import build_environment_plan  # noqa: E402
+from tools.planstream import PlanStream  # noqa: E402
+
+
+def copy(number):
+    """One prod environment plan renamed to ``module.c<number>_*``, with every tenth database replaced."""
+    plan = json.loads(json.dumps(build_environment_plan()).replace('"module.', f'"module.c{number}_'))
+    for change in plan["resource_changes"]:
+        if number % 10 == 0 and change["type"] == "aws_db_instance":
+            change["change"]["actions"] = ["delete", "create"]
+            change["action_reason"] = "replace_because_cannot_update"
+        elif number % 3 == 0 and change["type"] == "aws_autoscaling_group":
+            change["change"]["actions"] = ["update"]
+    return plan
+
+
+SECTIONS = (
+    ("prior_state", '{"values": {"root_module": {"child_modules": [', "]}}}"),
+    ("planned_values", '{"root_module": {"child_modules": [', "]}}"),
+    ("resource_changes", "[", "]"),
+)
+
+
+def write_plan(path, copies):
+    """Write the plan section by section so the generator itself stays small."""
+    with open(path, "w") as fh:
+        fh.write('{"format_version": "1.2", "terraform_version": "1.5.0"')
+        for section, opening, closing in SECTIONS:
+            fh.write(f', "{section}": {opening}')
+            for number in range(copies):
+                plan = copy(number)
+                if section == "resource_changes":
+                    items = plan["resource_changes"]
+                else:
+                    items = plan["planned_values"]["root_module"]["child_modules"]
+                fh.write(("," if number else "") + ",".join(json.dumps(item) for item in items))
+            fh.write(closing)
+        fh.write("}\n")
+
+
+def measure(mode, path):
+    """Run in a child interpreter: load the plan one way and print seconds, peak RSS and resources."""
+    import resource
+
+    started = time.perf_counter()
+    if mode == "json":
+        with open(path) as fh:
+            document = json.load(fh)
+        counted = sum(1 for change in document["resource_changes"]
+                      if "delete" in change["change"]["actions"] and change["type"] == "aws_db_instance")
+        resources = len(document["resource_changes"])
+    else:
+        summary = PlanStream(path).summary()
+        counted = len(summary.stateful)
+        resources = summary.resources
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps([elapsed, peak, resources, counted]))
+
+
+def run(mode, path):
+    output = subprocess.run([sys.executable, __file__, "--measure", mode, path], check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, nargs="+", default=[100, 800])
+    parser.add_argument("--keep", help="Directory to write the plans to instead of a temporary one.")
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.keep or scratch
+        for copies in args.copies:
+            path = os.path.join(directory, f"plan-{copies}.json")
+            write_plan(path, copies)
+            size = os.path.getsize(path) / 2 ** 20
+            loaded, streamed = run("json", path), run("stream", path)
+            assert loaded[2:] == streamed[2:], (loaded, streamed)
+            print(f"{copies} copies, {size:.0f} MiB, {streamed[2]} resource changes, "
+                  f"{streamed[3]} stateful replacements")
+            for mode, (elapsed, peak, _, _) in (("json.load", loaded), ("PlanStream", streamed)):
+                print(f"  {mode:<11} {elapsed:7.2f} s  peak RSS {peak:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark the reachability engine: a full matrix and single-rule incremental updates.
+
+Builds a synthetic VPC with ``--subnets`` subnets, ``--workloads``
+workloads and about ``--rules`` security group rules (CIDR and SG-to-SG)
+plus a numbered NACL per tier, then times the full workload matrix, the
+subnet matrix, and re-evaluation after replacing one security group.
+
+Usage: python tests/benchmarks/bench_reachability.py [--rules 3000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools.reachability import (  # noqa: E402
+    AclEntry, Network, NetworkAcl, Route, RouteTable, Rule, SecurityGroup, Subnet, Workload,
+)
+
+PROTOCOLS = ("tcp", "tcp", "tcp", "udp", "icmp")
+
+
+def random_rule(rng, group_ids, subnet_cidrs):
+    protocol = rng.choice(PROTOCOLS)
+    first = rng.randrange(1, 65000) if protocol != "icmp" else rng.choice((-1, 0, 8))
+    last = first + rng.choice((0, 0, 10, 1000)) if protocol != "icmp" else None
+    if rng.random() < 0.3:
+        return Rule(protocol, first, last, groups=(rng.choice(group_ids),))
+    return Rule(protocol, first, last, (rng.choice(subnet_cidrs + ["0.0.0.0/0", "10.0.0.0/16"]),))
+
+
+def build(args):
+    rng = random.Random(args.seed)
+    subnets = [Subnet(f"subnet-{number}", f"10.0.{number}.0/24") for number in range(args.subnets)]
+    cidrs = [subnet.cidr for subnet in subnets]
+    group_ids = [f"sg-{number}" for number in range(args.workloads)]
+    per_group = max(1, args.rules // (2 * len(group_ids)))
+    groups = [SecurityGroup(group_id, [random_rule(rng, group_ids, cidrs) for _ in range(per_group)],
+                            [random_rule(rng, group_ids, cidrs) for _ in range(per_group)] +
+                            [Rule("-1", cidrs=("0.0.0.0/0",))]) for group_id in group_ids]
+    tiers = [subnets[start::3] for start in range(3)]
+    acls = []
+    for tier_number, tier in enumerate(tiers):
+        entries = [AclEntry(number * 10, rng.choice(("allow", "deny")), rng.choice(PROTOCOLS), rng.choice(cidrs),
+                            port, port) for number, port in enumerate(rng.sample(range(1, 1024), 50), 1)]
+        entries.append(AclEntry(32000, "allow", "-1", "0.0.0.0/0"))
+        acls.append(NetworkAcl(f"acl-{tier_number}", tuple(subnet.id for subnet in tier), entries, list(entries)))
+    tables = [RouteTable("rtb-public", tuple(subnet.id for subnet in tiers[0]), [Route("0.0.0.0/0", "igw")]),
+              RouteTable("rtb-private", tuple(subnet.id for subnet in tiers[1]), [Route("0.0.0.0/0", "nat")])]
+    workloads = [Workload(f"workload-{number}", tuple(subnet.id for subnet in rng.sample(subnets, 3)), (group_id,))
+                 for number, group_id in enumerate(group_ids)]
+    return Network(subnets, groups, acls, tables, workloads, ["10.0.0.0/16"]), rng, group_ids, cidrs
+
+
+def timed(label, func, detail=""):
+    started = time.perf_counter()
+    result = func()
+    print(f"{label:<32} {(time.perf_counter() - started) * 1000:9.2f} ms  {detail}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subnets", type=int, default=48)
+    parser.add_argument("--workloads", type=int, default=40)
+    parser.add_argument("--rules", type=int, default=3000)
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    network, rng, group_ids, cidrs = timed("compile", lambda: build(args))
+    rules = sum(len(group.ingress) + len(group.egress) for group in network.security_groups.values())
+    print(f"{len(network.subnets)} subnets, {len(network.workloads)} workloads, {rules} SG rules, "
+          f"{len(network._bounds)} address atoms")
+
+    matrix = timed("full workload matrix", network.matrix)
+    print(f"{network.evaluations} cells evaluated, {sum(1 for _ in matrix.reachable())} reachable workload pairs")
+    timed("full subnet matrix (cached)", lambda: network.matrix("subnet"))
+
+    started = time.perf_counter()
+    before = network.evaluations
+    for _ in range(args.updates):
+        group_id = rng.choice(group_ids)
+        group = network.security_groups[group_id]
+        ingress = list(group.ingress)
+        ingress[rng.randrange(len(ingress))] = random_rule(rng, group_ids, cidrs)
+        network.set_security_group(SecurityGroup(group_id, ingress, group.egress))
+        network.matrix()
+    elapsed = (time.perf_counter() - started) * 1000 / args.updates
+    print(f"{'one-rule change + matrix':<32} {elapsed:9.2f} ms  "
+          f"{(network.evaluations - before) / args.updates:.0f} cells re-evaluated per change")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""Time every validation and analysis path over synthetic corpora at 1x, 10x and 100x.
+
+Usage: python tests/benchmarks/suite.py run [--scale 1 10 100] [--only CASE ...] [--out .benchmarks]
+       python tests/benchmarks/suite.py compare BASELINE.json CURRENT.json [--tolerance 0.25]
+
+``run`` writes a :mod:`tools.synth` corpus per scale -- 3 environments,
+100 IAM policies, 1 MB per log corpus and 4 audited hosts times the
+factor -- and keeps it under ``<out>/corpus`` until the scale, seed or
+generator changes.  Every case runs in a fresh interpreter, so its peak
+RSS is its own, and reports seconds, items processed, items per second and
+peak memory; the run is saved as ``<out>/<commit>.json``, with ``-dirty``
+when the tree has uncommitted changes.  The moto cases seed a moto server
+in a separate process first and time only the collection.
+
+``compare`` flags every case whose throughput dropped, or whose peak
+memory grew, by more than ``--tolerance`` against the baseline run and
+exits 1 if there is any.  Changes under ``--time-floor`` seconds or
+``--memory-floor`` MB are noise and never flag.
+
+Drift, backtesting, the boot path, HCL parsing and the API call gate do
+not depend on the size of the infrastructure and keep their own
+benchmarks.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tools import synth  # noqa: E402
+from tools.synth import Scale, write_corpus  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+FEATURES_DIR = os.path.join(ROOT, "tests", "compliance")
+FAKE_CREDENTIALS = {"AWS_ACCESS_KEY_ID": "testing", "AWS_SECRET_ACCESS_KEY": "testing",
+                    "AWS_DEFAULT_REGION": "us-east-1"}
+CASES = {}
+
+
+def case(unit):
+    """Register ``function(corpus)`` as a case returning the number of ``unit`` it processed.
+
+    Cases import what they use, so a case's peak memory does not count the
+    modules of the others.
+    """
+    def register(function):
+        CASES[function.__name__] = (function, unit)
+        return function
+    return register
+
+
+class Corpus:
+    """A written corpus: its directory and manifest."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as fh:
+            self.manifest = json.load(fh)
+
+    def path(self, key, name=None):
+        entry = self.manifest["files"][key]
+        return os.path.join(self.directory, entry if name is None else entry[name])
+
+    def load(self, key, name=None):
+        with open(self.path(key, name)) as fh:
+            return json.load(fh)
+
+
+# -- Cases ----------------------------------------------------------------------
+
+
+@case("resources")
+def compliance(corpus):
+    from tools.compliance import ComplianceEngine, load_features
+    from tools.plan import PlanIndex
+
+    index = PlanIndex(corpus.load("plan"))
+    ComplianceEngine(index).run(load_features(FEATURES_DIR))
+    return len(index.resources)
+
+
+@case("changes")
+def planstream(corpus):
+    from tools.planstream import PlanStream
+
+    with PlanStream(corpus.path("plan")) as stream:
+        summary = stream.summary()
+    return sum(sum(row[1:]) for row in summary.table())
+
+
+@case("operations")
+def depgraph(corpus):
+    from tools.depgraph import ApplyGraph
+    from tools.plan import PlanIndex
+
+    graph = ApplyGraph.from_index(PlanIndex(corpus.load("plan")))
+    graph.critical_path()
+    graph.simulate(10)
+    return len(graph)
+
+
+@case("environments")
+def cost(corpus):
+    from tools.cost import evaluate, quantities
+
+    environments = {name: quantities(corpus.path("plans", name)) for name in corpus.manifest["files"]["plans"]}
+    evaluate(environments, grid={"multi_az": [True, False], "ha_nat_gateway": [True, False]})
+    return len(environments)
+
+
+@case("networks")
+def cidr(corpus):
+    from tools.cidr import find_overlaps
+
+    networks = [network for vpc in corpus.load("seed")["vpcs"]
+                for network in [vpc["cidr"]] + [subnet["cidr"] for subnet in vpc["subnets"]]]
+    find_overlaps(networks)
+    return len(networks)
+
+
+@case("policies")
+def iam(corpus):
+    from tools.iam import PolicyAnalyzer, load_policies
+
+    analyzer = PolicyAnalyzer().extend(load_policies(corpus.path("iam")))
+    analyzer.over_grants()
+    for action in ("s3:GetObject", "iam:PassRole", "kms:Decrypt", "ec2:AuthorizeSecurityGroupIngress"):
+        analyzer.grants(action, "*")
+    return corpus.manifest["counts"]["policies"]
+
+
+@case("resources")
+def reachability(corpus):
+    from tools.reachability import from_plan
+
+    # One matrix per environment plan, as the command line is used; the
+    # VPCs are not peered, so a matrix over all of them is mostly empty.
+    resources = 0
+    for name in corpus.manifest["files"]["plans"]:
+        plan = corpus.load("plans", name)
+        from_plan(plan).matrix()
+        resources += len(plan["resource_changes"])
+    return resources
+
+
+@case("records")
+def flowlogs(corpus):
+    from tools.flowlogs import analyze
+
+    return analyze(corpus.path("flow_log"), synth.PROFILES["prod"]["vpc_cidr"]).records
+
+
+@case("events")
+def audit(corpus):
+    from tools.audit import analyze, load_rules
+
+    watched = frozenset(rule.key for rule in load_rules() if rule.kind == "watch")
+    return analyze(corpus.path("audit"), watched=watched).events
+
+
+@case("lines")
+def metricfilters(corpus):
+    from tools.metricfilters import load_monitoring, replay
+
+    filters, _ = load_monitoring()
+    return replay(corpus.path("logs"), filters, year=2024).lines
+
+
+@case("records")
+def cloudtrail(corpus):
+    from tools.cloudtrail import TrailStore, ingest
+
+    with tempfile.TemporaryDirectory() as directory, TrailStore(directory) as store:
+        return ingest(corpus.path("trail"), store).records
+
+
+@case("queries")
+def trailquery(corpus):
+    from tools.cloudtrail import TrailStore, ingest
+
+    end = synth.EPOCH + 86400
+    with tempfile.TemporaryDirectory() as directory, TrailStore(directory) as store:
+        ingest(corpus.path("trail"), store)
+        started = time.perf_counter()
+        store.query(end - 30 * 86400, end, ("principal",), name="AuthorizeSecurityGroupIngress")
+        store.query(end - 7 * 86400, end, ("name", "principal"), failed=True)
+        store.query(None, None, ("time", "request"), source_ip="198.51.100.7")
+        return 3, time.perf_counter() - started
+
+
+@case("items")
+def inventory(corpus):
+    from tools.inventory import Clients, Snapshot, refresh
+
+    with MotoServer(corpus) as endpoint, tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        with Snapshot(os.path.join(directory, "inventory.db")) as snapshot:
+            results, _ = refresh(snapshot, Clients(endpoint_url=endpoint), full=True)
+        return sum(added for added, _, _ in results.values()), time.perf_counter() - started
+
+
+@case("evaluations")
+def configrules(corpus):
+    from tools.configrules import collect, evaluate
+    from tools.inventory import Clients, Snapshot
+
+    with MotoServer(corpus) as endpoint, tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        with Snapshot(os.path.join(directory, "config.db")) as store:
+            collect(store, Clients(endpoint_url=endpoint))
+            matrix = evaluate(store)
+        return len(matrix.evaluations), time.perf_counter() - started
+
+
+# -- moto -----------------------------------------------------------------------
+
+
+class MotoServer:
+    """Context manager: a moto server process seeded with the corpus, yielding its endpoint."""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+
+    def __enter__(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.server = subprocess.Popen([sys.executable, __file__, "serve", str(port), self.corpus.path("seed")],
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                       text=True)
+        if not self.server.stdout.readline():
+            raise RuntimeError("moto server failed to start")
+        return f"http://127.0.0.1:{port}"
+
+    def __exit__(self, *exc_info):
+        self.server.communicate()
+
+
+def serve(port, seed_path):
+    """Child process: seed a moto server, report on stdout and serve until stdin closes."""
+    from moto.server import ThreadedMotoServer
+
+    from tools.inventory import Clients
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    with open(seed_path) as fh:
+        counts = synth.seed(Clients(endpoint_url=f"http://127.0.0.1:{port}"), json.load(fh))
+    print(json.dumps(counts), flush=True)
+    sys.stdin.read()
+    server.stop()
+
+
+def measure(name, directory):
+    """Child process: run one case and print its record as JSON."""
+    function, unit = CASES[name]
+    corpus = Corpus(directory)
+    started = time.perf_counter()
+    items = function(corpus)
+    seconds = time.perf_counter() - started
+    if isinstance(items, tuple):
+        items, seconds = items
+    # Only this process: the moto server is a child of it.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": round(seconds, 4), "items": items, "unit": unit,
+                      "throughput": round(items / seconds, 1) if seconds else None, "peak_mb": round(peak / 1024, 1)}))
+
+
+# -- Runs -----------------------------------------------------------------------
+
+
+def commit():
+    """Short commit of the tree, ``-dirty`` with uncommitted changes, or ``unknown`` outside git."""
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                             check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{sha}-dirty" if dirty else sha
+
+
+def corpus_for(out, factor, scale):
+    """Directory of the corpus for ``scale``, written unless the same scale and generator already did."""
+    with open(synth.__file__, "rb") as fh:
+        digest = hashlib.sha1(json.dumps(asdict(scale), sort_keys=True).encode() + fh.read()).hexdigest()[:12]
+    directory = os.path.join(out, "corpus", f"{factor}x-{digest}")
+    if not os.path.exists(os.path.join(directory, "manifest.json")):
+        started = time.perf_counter()
+        os.makedirs(directory, exist_ok=True)
+        write_corpus(directory, scale)
+        print(f"corpus {factor}x written in {time.perf_counter() - started:.1f} s to {directory}")
+    return directory
+
+
+def run(args):
+    names = args.only or list(CASES)
+    unknown = sorted(set(names) - set(CASES))
+    if unknown:
+        raise SystemExit(f"unknown case(s): {', '.join(unknown)}; choose from {', '.join(CASES)}")
+    results = {"commit": commit(), "python": platform.python_version(), "machine": platform.machine(),
+               "cpus": os.cpu_count(), "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "cases": {}}
+    for factor in args.scale:
+        directory = corpus_for(args.out, factor, Scale(seed=args.seed).times(factor))
+        for name in names:
+            process = subprocess.run([sys.executable, __file__, "case", name, directory], capture_output=True,
+                                     text=True)
+            key = f"{name}@{factor}x"
+            if process.returncode:
+                error = f"killed by signal {-process.returncode}" if process.returncode < 0 else \
+                    (process.stderr.strip().splitlines() or [f"exit {process.returncode}"])[-1]
+                print(f"{key:<24} failed: {error}", file=sys.stderr)
+                results["cases"][key] = {"error": error}
+                continue
+            record = results["cases"][key] = json.loads(process.stdout.strip().splitlines()[-1])
+            print(f"{key:<24} {record['seconds']:9.3f} s {record['throughput'] or 0:12.1f} {record['unit']}/s "
+                  f"{record['peak_mb']:8.1f} MB")
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{results['commit']}.json")
+    if os.path.exists(path):
+        # Runs of other scales or cases on the same commit are kept.
+        with open(path) as fh:
+            results["cases"] = dict(json.load(fh)["cases"], **results["cases"])
+    with open(path, "w") as fh:
+        json.dump(results, fh, indent=2)
+    print(f"saved {path}")
+
+
+def compare(baseline, current, tolerance=0.25, time_floor=0.05, memory_floor=16.0):
+    """``[(case, metric, before, after)]`` for every case of ``current`` that regressed against ``baseline``.
+
+    Throughput regresses when it falls below ``1 - tolerance`` of the
+    baseline and the case got slower by more than ``time_floor`` seconds;
+    peak memory when it exceeds ``1 + tolerance`` of the baseline by more
+    than ``memory_floor`` MB.  Cases missing from either run, or failed in
+    either, are skipped.
+    """
+    found = []
+    for key, after in sorted(current["cases"].items()):
+        before = baseline["cases"].get(key)
+        if not before or "error" in before or "error" in after:
+            continue
+        if after["throughput"] is not None and before["throughput"] is not None \
+                and after["throughput"] < before["throughput"] * (1 - tolerance) \
+                and after["seconds"] - before["seconds"] > time_floor:
+            found.append((key, "throughput", before["throughput"], after["throughput"]))
+        if after["peak_mb"] > before["peak_mb"] * (1 + tolerance) \
+                and after["peak_mb"] - before["peak_mb"] > memory_floor:
+            found.append((key, "peak_mb", before["peak_mb"], after["peak_mb"]))
+    return found
+
+
+def compare_command(args):
+    runs = []
+    for path in (args.baseline, args.current):
+        with open(path) as fh:
+            runs.append(json.load(fh))
+    regressions = compare(*runs, args.tolerance, args.time_floor, args.memory_floor)
+    for key, metric, before, after in regressions:
+        print(f"{key:<24} {metric:<10} {before:12.1f} -> {after:12.1f}")
+    if not regressions:
+        print(f"no regressions from {runs[0]['commit']} to {runs[1]['commit']}")
+    raise SystemExit(1 if regressions else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run the cases and save the results.")
+    run_parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100])
+    run_parser.add_argument("--only", nargs="+", metavar="CASE", help=f"Cases to run: {', '.join(CASES)}.")
+    run_parser.add_argument("--out", default=".benchmarks")
+    run_parser.add_argument("--seed", type=int, default=7)
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two saved runs.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.25)
+    compare_parser.add_argument("--time-floor", type=float, default=0.05)
+    compare_parser.add_argument("--memory-floor", type=float, default=16.0)
+    case_parser = commands.add_parser("case")
+    case_parser.add_argument("name", choices=list(CASES))
+    case_parser.add_argument("corpus")
+    serve_parser = commands.add_parser("serve")
+    serve_parser.add_argument("port", type=int)
+    serve_parser.add_argument("seed_path")
+    args = parser.parse_args()
+
+    for key, value in FAKE_CREDENTIALS.items():
+        os.environ.setdefault(key, value)
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        compare_command(args)
+    elif args.command == "case":
+        measure(args.name, args.corpus)
+    else:
+        serve(args.port, args.seed_path)
+
+
+if __name__ == "__main__":
+    main()
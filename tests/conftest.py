@@ -0,0 +1,41 @@
+import pytest
+
+from tools.hcl import ENVIRONMENTS_DIR, ParseCache, TerraformModel
+from tools.synth import PlanBuilder, build_environment_plan
+
+
+@pytest.fixture
+def plan_builder():
+    """Return a fresh :class:`PlanBuilder`."""
+    return PlanBuilder()
+
+
+@pytest.fixture
+def make_plan():
+    """Return the environment plan factory."""
+    return build_environment_plan
+
+
+@pytest.fixture
+def prod_plan():
+    """Plan document modelled on the prod environment."""
+    return build_environment_plan()
+
+
+@pytest.fixture(scope="session")
+def hcl_cache(request):
+    """Parse cache shared by the Terraform model fixtures, kept in .pytest_cache between runs."""
+    cache = getattr(request.config, "cache", None)
+    return ParseCache(str(cache.mkdir("hcl")) if cache is not None else None)
+
+
+@pytest.fixture(scope="session")
+def terraform_modules(hcl_cache):
+    """Lazily parsed model of terraform/modules."""
+    return TerraformModel(cache=hcl_cache)
+
+
+@pytest.fixture(scope="session")
+def terraform_environments(hcl_cache):
+    """Lazily parsed model of terraform/environments."""
+    return TerraformModel(ENVIRONMENTS_DIR, hcl_cache)
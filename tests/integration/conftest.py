@@ -0,0 +1,129 @@
+"""Shared moto server and pooled boto3 clients for the integration tests.
+
+Each pytest process (each xdist worker) starts one in-process moto server
+for the whole session and builds one boto3 client per service against it,
+so service models are loaded and HTTP connections opened only once.
+
+Tests are isolated without tearing anything down: the ``aws`` fixture
+calls the server's ``/moto-api/reset`` endpoint, which empties every
+loaded backend in place, so each test starts from a clean default account
+while the pooled clients and their connections are reused.  Tests that
+need several accounts call :meth:`ClientPool.use_account`, which assumes a
+role in a new account ID and re-targets the pool's shared credentials.
+"""
+
+import itertools
+import os
+import socket
+import urllib.request
+
+import boto3
+import botocore.session
+import pytest
+from botocore.config import Config
+from moto.server import ThreadedMotoServer
+
+REGION = "us-east-1"
+SERVICES = ("ec2", "s3", "iam", "rds", "sts")
+FAKE_CREDENTIALS = {
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_SECURITY_TOKEN": "testing",
+    "AWS_SESSION_TOKEN": "testing",
+    "AWS_DEFAULT_REGION": REGION,
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _account_ids():
+    """Unique 12-digit account IDs per xdist worker (``gw0``, ``gw1``, ...)."""
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    base = 100000000000 + int(worker.lstrip("gw") or 0) * 1000000
+    return (f"{base + offset:012d}" for offset in itertools.count(1))
+
+
+class ClientPool:
+    """boto3 clients for a moto endpoint sharing one mutable credentials object."""
+
+    def __init__(self, endpoint_url, region=REGION):
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.account_id = None
+        self._botocore = botocore.session.Session()
+        self._botocore.set_credentials("testing", "testing")
+        self.credentials = self._botocore.get_credentials()
+        self._session = boto3.session.Session(botocore_session=self._botocore, region_name=region)
+        self._config = Config(retries={"max_attempts": 1}, max_pool_connections=10,
+                              s3={"addressing_style": "path"})
+        self._clients = {}
+        self._accounts = _account_ids()
+
+    def client(self, service):
+        """Return the pooled client for ``service``, creating it on first use."""
+        client = self._clients.get(service)
+        if client is None:
+            client = self._clients[service] = self._session.client(
+                service, endpoint_url=self.endpoint_url, config=self._config)
+        return client
+
+    def reset(self):
+        """Empty all moto state and switch back to the default account."""
+        request = urllib.request.Request(f"{self.endpoint_url}/moto-api/reset", method="POST")
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        if self.account_id is not None:
+            self.credentials.access_key = self.credentials.secret_key = "testing"
+            self.credentials.token = None
+            self.account_id = None
+
+    def use_account(self, account_id=None):
+        """Switch every pooled client to temporary credentials in ``account_id``."""
+        account_id = account_id or next(self._accounts)
+        response = self.client("sts").assume_role(
+            RoleArn=f"arn:aws:iam::{account_id}:role/integration-test", RoleSessionName="pytest")
+        keys = response["Credentials"]
+        # Clients read the credentials object on every request, so updating it
+        # in place re-targets all of them without rebuilding any client.
+        self.credentials.access_key = keys["AccessKeyId"]
+        self.credentials.secret_key = keys["SecretAccessKey"]
+        self.credentials.token = keys["SessionToken"]
+        self.account_id = account_id
+        return account_id
+
+
+@pytest.fixture(scope="session")
+def moto_server():
+    """Endpoint URL of a moto server running for the whole session."""
+    saved = {key: os.environ.get(key) for key in FAKE_CREDENTIALS}
+    os.environ.update(FAKE_CREDENTIALS)
+    port = _free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+    for key, value in saved.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = value
+
+
+@pytest.fixture(scope="session")
+def aws_pool(moto_server):
+    """Session-wide :class:`ClientPool` with every service client pre-built."""
+    pool = ClientPool(moto_server)
+    for service in SERVICES:
+        pool.client(service)
+    return pool
+
+
+@pytest.fixture
+def aws(aws_pool):
+    """The client pool, with moto state reset for this test."""
+    aws_pool.reset()
+    return aws_pool
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from tools.configrules import COMPLIANT, NON_COMPLIANT, NOT_APPLICABLE, collect, evaluate
+from tools.inventory import GLOBAL, Clients, Snapshot
+
+
+@pytest.fixture
+def config_store(aws, tmp_path):
+    """A tool-side client cache against the moto server and an empty configuration item store."""
+    clients = Clients(endpoint_url=aws.endpoint_url, max_pool_connections=8)
+    with Snapshot(str(tmp_path / "config.db")) as store:
+        yield clients, store
+
+
+class TestConfigRulesMoto:
+    """Integration tests for evaluating managed rules against the moto account."""
+
+    def seed(self, aws):
+        ec2, s3, iam = aws.client("ec2"), aws.client("s3"), aws.client("iam")
+        image = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+        instance = ec2.run_instances(ImageId=image, MinCount=1, MaxCount=1, InstanceType="t3.micro",
+                                     Placement={"AvailabilityZone": "us-east-1a"})["Instances"][0]["InstanceId"]
+        volumes = {}
+        for name, encrypted in (("plain", False), ("encrypted", True)):
+            volume_id = ec2.create_volume(AvailabilityZone="us-east-1a", Size=8, Encrypted=encrypted)["VolumeId"]
+            ec2.attach_volume(VolumeId=volume_id, InstanceId=instance, Device=f"/dev/sd{name[0]}")
+            volumes[name] = volume_id
+        vpc_id = ec2.create_vpc(CidrBlock="10.0.0.0/16")["Vpc"]["VpcId"]
+        s3.create_bucket(Bucket="flow-logs")
+        ec2.create_flow_logs(ResourceIds=[vpc_id], ResourceType="VPC", TrafficType="ALL",
+                             LogDestinationType="s3", LogDestination="arn:aws:s3:::flow-logs")
+        s3.create_bucket(Bucket="public-assets")
+        s3.put_bucket_acl(Bucket="public-assets", ACL="public-read")
+        s3.create_bucket(Bucket="audit-logs")
+        s3.put_bucket_policy(Bucket="audit-logs", Policy=json.dumps({"Version": "2012-10-17", "Statement": [
+            {"Effect": "Deny", "Principal": "*", "Action": "s3:*",
+             "Resource": ["arn:aws:s3:::audit-logs", "arn:aws:s3:::audit-logs/*"],
+             "Condition": {"Bool": {"aws:SecureTransport": "false"}}}]}))
+        iam.create_user(UserName="console")
+        iam.create_login_profile(UserName="console", Password="Correct-Horse-1")
+        iam.create_user(UserName="deployer")
+        iam.update_account_password_policy(MinimumPasswordLength=14, RequireSymbols=True, RequireNumbers=True,
+                                           RequireUppercaseCharacters=True, RequireLowercaseCharacters=True,
+                                           MaxPasswordAge=90, PasswordReusePrevention=24)
+        return volumes, vpc_id
+
+    def test_rules_against_described_account(self, aws, config_store):
+        """Test each rule's verdicts on resources described from moto, then a cached re-run after one fix."""
+        clients, store = config_store
+        volumes, vpc_id = self.seed(aws)
+        collect(store, clients, workers=4)
+
+        matrix = evaluate(store)
+        verdicts = {(evaluation.rule, evaluation.resource_id): evaluation.compliance
+                    for evaluation in matrix.evaluations}
+
+        assert verdicts["encrypted-volumes", volumes["plain"]] == NON_COMPLIANT
+        assert verdicts["encrypted-volumes", volumes["encrypted"]] == COMPLIANT
+        assert verdicts["vpc-flow-logs-enabled", vpc_id] == COMPLIANT
+        default_vpc = next(vpc for rule, vpc in verdicts if rule == "vpc-flow-logs-enabled" and vpc != vpc_id)
+        assert verdicts["vpc-flow-logs-enabled", default_vpc] == NON_COMPLIANT
+        assert verdicts["s3-bucket-public-read-prohibited", "public-assets"] == NON_COMPLIANT
+        assert verdicts["s3-bucket-public-read-prohibited", "audit-logs"] == COMPLIANT
+        assert verdicts["s3-bucket-ssl-requests-only", "audit-logs"] == COMPLIANT
+        assert verdicts["s3-bucket-ssl-requests-only", "public-assets"] == NON_COMPLIANT
+        assert verdicts["mfa-enabled-for-iam-console-access", "console"] == NON_COMPLIANT
+        assert verdicts["mfa-enabled-for-iam-console-access", "deployer"] == NOT_APPLICABLE
+        account = clients.account_id()
+        assert verdicts["iam-password-policy", account] == COMPLIANT
+        assert verdicts["iam-root-access-key-check", account] == COMPLIANT
+        assert verdicts["guardduty-enabled-centralized", account] == NON_COMPLIANT
+        assert {evaluation.region for evaluation in matrix.evaluations if evaluation.resource_id == "audit-logs"} == {
+            GLOBAL}
+
+        clients.client("guardduty", "us-east-1").create_detector(Enable=True)
+        assert collect(store, clients, workers=4)[("AWS::::Account", "us-east-1")] == (0, 1, 0)
+        rerun = evaluate(store)
+        assert rerun.evaluated == 3 and rerun.reused == len(matrix.evaluations) - 3
+        assert next(evaluation.compliance for evaluation in rerun.evaluations
+                    if evaluation.rule == "guardduty-enabled-centralized") == COMPLIANT
@@ -1,21 +1,17 @@
 import pytest
-import boto3
 import time
-from moto import mock_ec2, mock_s3, mock_iam, mock_rds
 
 
-@mock_ec2
-@mock_s3
-@mock_iam
 class TestInfrastructureDeployment:
     """Integration tests for infrastructure deployment."""
     
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.region = "us-east-1"
-        self.ec2_client = boto3.client("ec2", region_name=self.region)
-        self.s3_client = boto3.client("s3", region_name=self.region)
-        self.iam_client = boto3.client("iam", region_name=self.region)
+    @pytest.fixture(autouse=True)
+    def setup_clients(self, aws):
+        """Set up pooled clients in a fresh account."""
+        self.region = aws.region
+        self.ec2_client = aws.client("ec2")
+        self.s3_client = aws.client("s3")
+        self.iam_client = aws.client("iam")
     
     def test_vpc_deployment(self):
         """Test VPC and networking resources are created correctly."""
@@ -209,14 +205,14 @@ class TestInfrastructureDeployment:
 import json
 
 
-@mock_rds
 class TestDatabaseDeployment:
     """Test database deployment configurations."""
     
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.region = "us-east-1"
-        self.rds_client = boto3.client("rds", region_name=self.region)
+    @pytest.fixture(autouse=True)
+    def setup_clients(self, aws):
+        """Set up pooled clients in a fresh account."""
+        self.region = aws.region
+        self.rds_client = aws.client("rds")
     
     def test_rds_multi_az_deployment(self):
         """Test RDS is deployed with Multi-AZ for high availability."""
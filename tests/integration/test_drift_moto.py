@@ -0,0 +1,139 @@
+import pytest
+
+from tools.drift import DRIFTED, IN_SYNC, MISSING, check
+from tools.inventory import Clients, Snapshot
+from tools.plan import PlanIndex
+
+ENVIRONMENTS = {"dev": "10.0.0.0/16", "staging": "10.1.0.0/16", "prod": "10.100.0.0/16"}
+DB_SG = "module.database.aws_security_group.db_security_group"
+APP_SG = "module.compute.aws_security_group.app_security_group"
+
+
+def _tag_specification(resource_type, values):
+    return [{"ResourceType": resource_type, "Tags": [{"Key": key, "Value": str(value)}
+                                                     for key, value in values["tags_all"].items()]}]
+
+
+def apply_plan(aws, document):
+    """Create the VPC, subnets, security groups, roles and database a plan declares, as an apply would."""
+    plan = PlanIndex(document)
+    ec2, iam, rds = aws.client("ec2"), aws.client("iam"), aws.client("rds")
+    vpc = plan.of_type("aws_vpc")[0].values
+    vpc_id = ec2.create_vpc(CidrBlock=vpc["cidr_block"],
+                            TagSpecifications=_tag_specification("vpc", vpc))["Vpc"]["VpcId"]
+    subnets = {}
+    for subnet in plan.of_type("aws_subnet"):
+        subnet_id = ec2.create_subnet(
+            VpcId=vpc_id, CidrBlock=subnet.values["cidr_block"], AvailabilityZone=subnet.values["availability_zone"],
+            TagSpecifications=_tag_specification("subnet", subnet.values))["Subnet"]["SubnetId"]
+        if subnet.values["map_public_ip_on_launch"]:
+            ec2.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={"Value": True})
+        subnets[subnet.address] = subnet_id
+    groups = {resource.values["name"]: ec2.create_security_group(
+        GroupName=resource.values["name"], Description="Managed by Terraform", VpcId=vpc_id,
+        TagSpecifications=_tag_specification("security-group", resource.values))["GroupId"]
+        for resource in plan.of_type("aws_security_group")}
+    for resource in plan.of_type("aws_security_group"):
+        group_id = groups[resource.values["name"]]
+        ec2.revoke_security_group_egress(GroupId=group_id, IpPermissions=[
+            {"IpProtocol": "-1", "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}])
+        for direction, authorize in (("ingress", ec2.authorize_security_group_ingress),
+                                     ("egress", ec2.authorize_security_group_egress)):
+            referenced = [groups[target.values["name"]] for target in plan.resolve_attribute(resource, direction)
+                          if target.type == "aws_security_group" and target.address != resource.address]
+            others = [group_id for name, group_id in groups.items() if name != resource.values["name"]]
+            for rule in resource.values[direction]:
+                permission = {"IpProtocol": rule["protocol"],
+                              "IpRanges": [{"CidrIp": cidr, "Description": rule["description"]}
+                                           for cidr in rule["cidr_blocks"]]}
+                if rule["protocol"] != "-1":
+                    permission.update(FromPort=rule["from_port"], ToPort=rule["to_port"])
+                if not rule["cidr_blocks"]:
+                    permission["UserIdGroupPairs"] = [{"GroupId": source, "Description": rule["description"]}
+                                                      for source in referenced or others[:1]]
+                authorize(GroupId=group_id, IpPermissions=[permission])
+    for role in plan.of_type("aws_iam_role"):
+        iam.create_role(RoleName=role.values["name"], AssumeRolePolicyDocument=role.values["assume_role_policy"],
+                        Tags=_tag_specification("role", role.values)[0]["Tags"])
+    for group in plan.of_type("aws_db_subnet_group"):
+        rds.create_db_subnet_group(DBSubnetGroupName=group.values["name"],
+                                   DBSubnetGroupDescription="Managed by Terraform",
+                                   SubnetIds=[subnets[address] for address in subnets if ".private[" in address])
+    for database in plan.of_type("aws_db_instance"):
+        values = database.values
+        rds.create_db_instance(
+            DBInstanceIdentifier=values["identifier"], Engine=values["engine"],
+            DBInstanceClass=values["instance_class"],
+            AllocatedStorage=values["allocated_storage"], StorageType=values["storage_type"],
+            StorageEncrypted=values["storage_encrypted"], MultiAZ=values["multi_az"],
+            BackupRetentionPeriod=values["backup_retention_period"], DeletionProtection=values["deletion_protection"],
+            PubliclyAccessible=values["publicly_accessible"], MasterUsername="admin",
+            MasterUserPassword="changeme123!",
+            VpcSecurityGroupIds=[groups[f"{values['tags']['Environment']}-db-sg"]],
+            DBSubnetGroupName=plan.of_type("aws_db_subnet_group")[0].values["name"],
+            Tags=_tag_specification("db", values)[0]["Tags"])
+    return groups
+
+
+@pytest.fixture
+def environments(aws, tmp_path, make_plan):
+    """dev, staging and prod applied to the moto account, a tool-side client cache and an empty snapshot."""
+    plans = {environment: make_plan(environment, vpc_cidr=cidr, include_monitoring=False)
+             for environment, cidr in ENVIRONMENTS.items()}
+    groups = {environment: apply_plan(aws, plan) for environment, plan in plans.items()}
+    clients = Clients(endpoint_url=aws.endpoint_url, max_pool_connections=8)
+    with Snapshot(str(tmp_path / "inventory.db")) as snapshot:
+        yield plans, groups, clients, snapshot
+
+
+class TestDriftCheck:
+    """Integration tests for drift checks of applied environments."""
+
+    def test_applied_environments_are_in_sync(self, environments):
+        """Test every mapped resource of the three environments matches its live counterpart."""
+        plans, _, clients, snapshot = environments
+
+        results = check(plans, snapshot, clients)
+
+        assert {(result.status, result.cached) for result in results} == {(IN_SYNC, False)}
+        assert len(results) == 3 * 19
+        assert {result.address for result in results if result.environment == "prod"} >= {
+            DB_SG, APP_SG, "module.database.aws_db_instance.main", "module.networking.aws_subnet.private[2]"}
+
+    def test_console_edits_are_found_and_only_they_rediffed(self, aws, environments):
+        """Test hand-edited security groups are diffed again and everything else reuses its verdict."""
+        plans, groups, clients, snapshot = environments
+        check(plans, snapshot, clients)
+        ec2 = aws.client("ec2")
+        ec2.authorize_security_group_ingress(GroupId=groups["prod"]["prod-app-sg"], IpPermissions=[
+            {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}])
+        ec2.create_tags(Resources=[groups["staging"]["staging-db-sg"]], Tags=[{"Key": "Owner", "Value": "console"}])
+        clients.calls.clear()
+
+        results = check(plans, snapshot, clients, changes=lambda *_: {("AWS::EC2::SecurityGroup", "us-east-1")})
+
+        drifted = {(result.environment, result.address): result.changes for result in results
+                   if result.status == DRIFTED}
+        assert drifted == {
+            ("prod", APP_SG): [("ingress", [], [["tcp", 22, 22, "0.0.0.0/0", ""]])],
+            ("staging", DB_SG): [("tags.Owner", None, "console")],
+        }
+        assert sum(not result.cached for result in results) == 2
+        assert {operation for _, operation in clients.calls} == {"DescribeSecurityGroups", "GetCallerIdentity"}
+
+    def test_deleted_and_modified_resources(self, aws, environments):
+        """Test a deleted role is missing and a resized database reports each changed attribute."""
+        plans, groups, clients, snapshot = environments
+        aws.client("iam").delete_role(RoleName="dev-ec2-role")
+        rds = aws.client("rds")
+        rds.modify_db_instance(DBInstanceIdentifier="staging-stagingdb", DBInstanceClass="db.t3.micro",
+                               VpcSecurityGroupIds=[groups["staging"]["staging-public-sg"]], ApplyImmediately=True)
+
+        results = {(result.environment, result.address): result for result in check(plans, snapshot, clients)}
+
+        assert results[("dev", "module.compute.aws_iam_role.ec2_role")].status == MISSING
+        database = results[("staging", "module.database.aws_db_instance.main")]
+        assert (database.status, database.live_id) == (DRIFTED, "staging-stagingdb")
+        assert database.changes == [("instance_class", "db.r5.xlarge", "db.t3.micro"),
+                                    ("security_groups", ["sg:staging-db-sg"], ["sg:staging-public-sg"])]
+        assert sum(result.status != IN_SYNC for result in results.values()) == 2
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+from botocore.stub import Stubber
+
+from tools.inventory import GLOBAL, Clients, Snapshot, cloudtrail_changes, refresh
+
+
+@pytest.fixture
+def inventory(aws, tmp_path):
+    """A tool-side client cache against the moto server and an empty snapshot."""
+    clients = Clients(endpoint_url=aws.endpoint_url, max_pool_connections=8)
+    with Snapshot(str(tmp_path / "inventory.db")) as snapshot:
+        yield clients, snapshot
+
+
+class TestInventorySnapshot:
+    """Integration tests for snapshotting the moto account."""
+
+    def seed(self, aws):
+        ec2 = aws.client("ec2")
+        vpc_id = ec2.create_vpc(CidrBlock="10.0.0.0/16")["Vpc"]["VpcId"]
+        subnet_id = ec2.create_subnet(VpcId=vpc_id, CidrBlock="10.0.1.0/24")["Subnet"]["SubnetId"]
+        groups = [ec2.create_security_group(GroupName=f"app-{index}", Description="app", VpcId=vpc_id,
+                                            TagSpecifications=[{"ResourceType": "security-group", "Tags": [
+                                                {"Key": "Environment", "Value": "prod" if index % 2 else "dev"}]}]
+                                            )["GroupId"] for index in range(30)]
+        for index in range(25):
+            ec2.create_network_interface(SubnetId=subnet_id, Groups=[groups[index]])
+        for index in range(3):
+            aws.client("iam").create_role(RoleName=f"role-{index}", AssumeRolePolicyDocument="{}")
+        aws.client("s3").create_bucket(Bucket="inventory-check")
+        return vpc_id, groups
+
+    def test_full_snapshot_is_paginated_and_indexed(self, aws, inventory):
+        """Test every type is listed through paginators and found again by VPC, tag, ID and type."""
+        clients, snapshot = inventory
+        vpc_id, groups = self.seed(aws)
+
+        results, errors = refresh(snapshot, clients, workers=4)
+
+        assert errors == {} and results[("AWS::EC2::SecurityGroup", "us-east-1")][0] == 32
+        assert results[("AWS::IAM::Role", GLOBAL)] == (3, 0, 0)
+        assert len(snapshot.find(vpc_id=vpc_id, type="AWS::EC2::NetworkInterface")) == 25
+        assert len(snapshot.find(tags={"Environment": "prod"})) == 15
+        assert snapshot.find(id=groups[0])[0].name == "app-0"
+        assert [bucket.id for bucket in snapshot.find(type="AWS::S3::Bucket")] == ["inventory-check"]
+        assert clients.calls[("ec2", "DescribeSecurityGroups")] == 1
+
+    def test_refresh_lists_only_changed_types(self, aws, inventory):
+        """Test an incremental refresh calls only the moved types and applies their adds and removals."""
+        clients, snapshot = inventory
+        vpc_id, groups = self.seed(aws)
+        refresh(snapshot, clients, workers=4)
+        ec2 = aws.client("ec2")
+        ec2.delete_security_group(GroupId=groups[-1])
+        ec2.create_tags(Resources=[groups[0]], Tags=[{"Key": "Owner", "Value": "payments"}])
+        aws.client("iam").create_role(RoleName="unseen", AssumeRolePolicyDocument="{}")
+        clients.calls.clear()
+
+        results, _ = refresh(snapshot, clients, workers=4,
+                             changes=lambda *_: {("AWS::EC2::SecurityGroup", "us-east-1")})
+
+        assert results == {("AWS::EC2::SecurityGroup", "us-east-1"): (0, 1, 1)}
+        assert {operation for _, operation in clients.calls} == {"DescribeSecurityGroups", "GetCallerIdentity"}
+        assert [group.id for group in snapshot.find(tags={"Owner": "payments"})] == [groups[0]]
+        assert snapshot.find(id="unseen") == []
+        assert ("AWS::IAM::Role", GLOBAL) in refresh(snapshot, clients, changes=lambda *_: set(), max_age=0)[0]
+
+    def test_unreadable_cloudtrail_means_full_refresh(self, aws, inventory):
+        """Test markers are unknown when CloudTrail cannot be looked up, so nothing is skipped."""
+        clients, snapshot = inventory
+        refresh(snapshot, clients, types=["AWS::EC2::VPC"])
+
+        assert cloudtrail_changes(clients, ["us-east-1"], time.time(), max_attempts=1) is None
+        assert list(refresh(snapshot, clients, types=["AWS::EC2::VPC"],
+                            changes=lambda *args: cloudtrail_changes(*args, max_attempts=1))[0]) == [
+            ("AWS::EC2::VPC", "us-east-1")]
+
+    def test_failed_types_are_reported_and_kept(self, aws, inventory):
+        """Test a type whose listing is denied comes back as an error while the others are still written."""
+        clients, snapshot = inventory
+        self.seed(aws)
+        types = ["AWS::EC2::SecurityGroup", "AWS::IAM::Role"]
+        refresh(snapshot, clients, types=types)
+        stubber = Stubber(clients.client("iam", clients.default_region()))
+        stubber.add_client_error("list_roles", "AccessDenied", "not authorized to perform iam:ListRoles")
+
+        with stubber:
+            results, errors = refresh(snapshot, clients, types=types, full=True)
+
+        assert list(results) == [("AWS::EC2::SecurityGroup", "us-east-1")]
+        assert list(errors) == [("AWS::IAM::Role", GLOBAL)] and "AccessDenied" in errors[("AWS::IAM::Role", GLOBAL)]
+        assert len(snapshot.find(type="AWS::IAM::Role")) == 3
@@ -0,0 +1,25 @@
+class TestMotoClientPool:
+    """Integration tests for the shared moto server and client pool."""
+
+    def test_reset_empties_state(self, aws):
+        """Test a reset removes everything created earlier."""
+        aws.client("s3").create_bucket(Bucket="isolation-check")
+        aws.client("ec2").create_vpc(CidrBlock="10.50.0.0/16")
+
+        aws.reset()
+
+        assert aws.client("s3").list_buckets()["Buckets"] == []
+        vpcs = aws.client("ec2").describe_vpcs(Filters=[{"Name": "cidr", "Values": ["10.50.0.0/16"]}])
+        assert vpcs["Vpcs"] == []
+
+    def test_accounts_are_isolated(self, aws):
+        """Test pooled clients follow use_account and see only that account's state."""
+        first = aws.use_account()
+        aws.client("s3").create_bucket(Bucket="isolation-check")
+
+        second = aws.use_account()
+
+        assert second != first
+        assert aws.client("ec2") is aws.client("ec2")
+        assert aws.client("sts").get_caller_identity()["Account"] == second
+        assert aws.client("s3").list_buckets()["Buckets"] == []
@@ -0,0 +1,37 @@
+from tools.reachability import INTERNET, from_ec2
+
+
+class TestReachabilityFromEc2:
+    """Integration tests for building the reachability model from the EC2 API."""
+
+    def test_described_vpc(self, aws):
+        """Test a two-tier VPC described through the API yields the expected reachability."""
+        ec2 = aws.client("ec2")
+        vpc_id = ec2.create_vpc(CidrBlock="10.0.0.0/16")["Vpc"]["VpcId"]
+        public = ec2.create_subnet(VpcId=vpc_id, CidrBlock="10.0.1.0/24")["Subnet"]["SubnetId"]
+        private = ec2.create_subnet(VpcId=vpc_id, CidrBlock="10.0.11.0/24")["Subnet"]["SubnetId"]
+
+        igw = ec2.create_internet_gateway()["InternetGateway"]["InternetGatewayId"]
+        ec2.attach_internet_gateway(InternetGatewayId=igw, VpcId=vpc_id)
+        table = ec2.create_route_table(VpcId=vpc_id)["RouteTable"]["RouteTableId"]
+        ec2.create_route(RouteTableId=table, DestinationCidrBlock="0.0.0.0/0", GatewayId=igw)
+        ec2.associate_route_table(RouteTableId=table, SubnetId=public)
+
+        lb = ec2.create_security_group(GroupName="lb", Description="lb", VpcId=vpc_id)["GroupId"]
+        app = ec2.create_security_group(GroupName="app", Description="app", VpcId=vpc_id)["GroupId"]
+        ec2.authorize_security_group_ingress(GroupId=lb, IpPermissions=[
+            {"IpProtocol": "tcp", "FromPort": 443, "ToPort": 443, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}])
+        ec2.authorize_security_group_ingress(GroupId=app, IpPermissions=[
+            {"IpProtocol": "tcp", "FromPort": 8080, "ToPort": 8080, "UserIdGroupPairs": [{"GroupId": lb}]}])
+        ec2.create_network_interface(SubnetId=public, Groups=[lb])
+        for _ in range(2):
+            ec2.create_network_interface(SubnetId=private, Groups=[app])
+
+        network = from_ec2(ec2, vpc_id)
+        matrix = network.matrix()
+
+        assert sorted(network.workloads) == ["app", "lb"]
+        assert str(matrix[INTERNET, "lb"]) == "tcp:443"
+        assert str(matrix["lb", "app"]) == "tcp:8080"
+        assert not matrix[INTERNET, "app"]
+        assert matrix.allows("lb", INTERNET, "tcp", 443) and not matrix["app", INTERNET]
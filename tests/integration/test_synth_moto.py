@@ -0,0 +1,31 @@
+from tools.configrules import NON_COMPLIANT, collect, evaluate
+from tools.inventory import Clients, Snapshot
+from tools.synth import Scale, seed, seed_data
+
+
+class TestSynthMoto:
+    """Integration tests for creating the synthetic seed data on moto."""
+
+    def test_seed_creates_every_environment(self, aws, tmp_path):
+        """Test the seeded VPCs, groups, instances, users and buckets match the data and rules find the gaps."""
+        data = seed_data(Scale(environments=4, azs=2, asgs=2, rules=3))
+        clients = Clients(endpoint_url=aws.endpoint_url, max_pool_connections=8)
+
+        counts = seed(clients, data)
+
+        ec2 = aws.client("ec2")
+        vpcs = {vpc["CidrBlock"]: vpc["VpcId"] for vpc in ec2.describe_vpcs()["Vpcs"] if not vpc["IsDefault"]}
+        assert sorted(vpcs) == ["10.0.0.0/16", "10.1.0.0/16", "10.100.0.0/16", "10.103.0.0/16"]
+        assert counts["subnets"] == 4 * 3 * 2 and counts["instances"] == 3 * 2
+        private = ec2.describe_security_groups(Filters=[{"Name": "group-name", "Values": ["prod1-private-sg"]}])[
+            "SecurityGroups"][0]
+        assert private["VpcId"] == vpcs["10.103.0.0/16"] and len(private["IpPermissions"]) == 4
+        assert {user["UserName"] for user in aws.client("iam").list_users()["Users"]} >= {
+            "dev-deploy", "prod1-operator-1"}
+        assert len(aws.client("s3").list_buckets()["Buckets"]) == counts["buckets"] == 12
+        with Snapshot(str(tmp_path / "config.db")) as store:
+            collect(store, clients, rules=["encrypted-volumes", "vpc-flow-logs-enabled"])
+            failing = {(evaluation.rule, evaluation.resource_id) for evaluation in
+                       evaluate(store, ["vpc-flow-logs-enabled"]).evaluations if evaluation.compliance == NON_COMPLIANT}
+        flow_logged = {vpcs[vpc["cidr"]] for vpc in data["vpcs"] if vpc["flow_logs"]}
+        assert {resource_id for _, resource_id in failing} & set(vpcs.values()) == set(vpcs.values()) - flow_logged
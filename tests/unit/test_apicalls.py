@@ -0,0 +1,169 @@
+import os
+import subprocess
+import sys
+
+import botocore.session
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+
+from tools.apicalls import EDGES, OperationStats, Recorder, active, attach, compare, histogram, recording
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IDENTITY = (b'<GetCallerIdentityResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/"><GetCallerIdentityResult>'
+            b"<Arn>arn:aws:iam::123456789012:user/test</Arn><UserId>AIDA</UserId><Account>123456789012</Account>"
+            b"</GetCallerIdentityResult><ResponseMetadata><RequestId>1</RequestId></ResponseMetadata>"
+            b"</GetCallerIdentityResponse>")
+DENIED = (b"<ErrorResponse><Error><Type>Sender</Type><Code>AccessDenied</Code><Message>no</Message></Error>"
+          b"<RequestId>2</RequestId></ErrorResponse>")
+TEST_MODULE = '''
+import os
+
+import botocore.session
+from botocore.awsrequest import AWSResponse
+
+
+class Raw:
+    def stream(self, **kwargs):
+        yield b"<GetCallerIdentityResponse><GetCallerIdentityResult><Account>1</Account></GetCallerIdentityResult>" \\
+              b"</GetCallerIdentityResponse>"
+
+
+def test_identity():
+    client = botocore.session.get_session().create_client(
+        "sts", region_name="us-east-1", aws_access_key_id="a", aws_secret_access_key="b")
+    client.meta.events.register("before-send", lambda request, **kwargs: AWSResponse(request.url, 200, {}, Raw()))
+    for _ in range(int(os.environ["CALLS"])):
+        client.get_caller_identity()
+'''
+
+
+class Raw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def canned(*responses):
+    """A before-send handler answering with ``(status, body)`` pairs in turn, then repeating the last."""
+    queue = list(responses)
+
+    def respond(request, **kwargs):
+        status, body = queue.pop(0) if len(queue) > 1 else queue[0]
+        if isinstance(body, Exception):
+            raise body
+        return AWSResponse(request.url, status, {"content-length": str(len(body))}, Raw(body))
+
+    return respond
+
+
+def sts_client(*responses):
+    client = botocore.session.get_session().create_client(
+        "sts", region_name="us-east-1", aws_access_key_id="testing", aws_secret_access_key="testing")
+    client.meta.events.register("before-send", canned(*responses))
+    return client
+
+
+def stats(calls, seconds):
+    result = OperationStats()
+    for _ in range(calls):
+        result.add(seconds, 0, 0, 0, False)
+    return result
+
+
+class TestRecording:
+    """Unit tests for the botocore hooks."""
+
+    def test_calls_are_recorded_per_scope(self):
+        """Test count, errors, payload sizes and scopes of calls from clients created while installed."""
+        with recording("tools.inventory snapshot") as recorder:
+            client = sts_client((200, IDENTITY), (403, DENIED), (200, IDENTITY), (200, ValueError("reset")))
+            attach(client)
+            client.get_caller_identity()
+            with pytest.raises(ClientError):
+                client.get_caller_identity()
+            with recorder.scoped("tests/unit/test_x.py::test_y"):
+                client.get_caller_identity()
+                with pytest.raises(ValueError):
+                    client.get_caller_identity()
+        assert active() is None
+        with pytest.raises(ValueError):
+            client.get_caller_identity()  # still attached, but nothing is recording
+
+        run = recorder.stats["tools.inventory snapshot", "sts", "GetCallerIdentity"]
+        test = recorder.stats["tests/unit/test_x.py::test_y", "sts", "GetCallerIdentity"]
+        assert (run.calls, run.errors, run.received) == (2, 1, len(IDENTITY) + len(DENIED))
+        assert run.sent == 2 * len("Action=GetCallerIdentity&Version=2011-06-15")
+        assert (test.calls, test.errors, test.received) == (2, 1, len(IDENTITY))
+        assert sum(run.histogram) == 2 and 0 < run.slowest < 1
+        assert recorder.scopes() == ["tests/unit/test_x.py::test_y", "tools.inventory snapshot"]
+
+    def test_export_merge_and_folded_stacks(self, tmp_path):
+        """Test a JSON round trip, merging two recordings and the folded-stack lines."""
+        recorder = Recorder()
+        with recorder.scoped("a;b"):
+            recorder.record("ec2", "DescribeVpcs", 0.012, retries=1, sent=40, received=900)
+        recorder.record("s3", "ListBuckets", 0.003, error=True)
+        path = tmp_path / "calls.json"
+        recorder.dump(str(path))
+        merged = Recorder.load(str(path)).merge(recorder)
+
+        assert merged.stats["a;b", "ec2", "DescribeVpcs"] == OperationStats(
+            2, 0, 2, 0.024, 0.012, 80, 1800, merged.stats["a;b", "ec2", "DescribeVpcs"].histogram)
+        assert merged.totals(by=("service", "operation"))["s3", "ListBuckets"].errors == 2
+        assert merged.folded() == ["-;s3;ListBuckets 6", "a:b;ec2;DescribeVpcs 24"]
+
+
+class TestHistogramsAndGate:
+    """Unit tests for percentiles and the regression gate."""
+
+    def test_percentiles_and_text_histogram(self):
+        """Test p50/p95 land on the bucket holding the quantile and never exceed the slowest call."""
+        latency = stats(95, 0.010).merge(stats(5, 0.300))
+
+        assert latency.percentile(0.5) == pytest.approx(next(edge for edge in EDGES if edge >= 0.010))
+        assert latency.percentile(0.95) == latency.percentile(0.5)
+        assert latency.percentile(0.99) == pytest.approx(0.300)
+        assert stats(1, 500.0).percentile(0.95) == 500.0
+        lines = histogram(latency, width=19)
+        assert len(lines) == 2 and lines[0].endswith(" 95 " + "#" * 19) and lines[1].endswith(" 5 " + "#")
+
+    def test_call_count_and_p95_regressions(self):
+        """Test extra calls, a slower p95 beyond the floor and new scopes against a baseline."""
+        baseline, current = Recorder(), Recorder()
+        baseline.stats = {("t::calls", "ec2", "CreateSubnet"): stats(1, 0.01),
+                          ("t::slow", "ec2", "DescribeVpcs"): stats(10, 0.02),
+                          ("t::jitter", "ec2", "DescribeVpcs"): stats(10, 0.001)}
+        current.stats = {("t::calls", "ec2", "CreateSubnet"): stats(3, 0.01),
+                         ("t::slow", "ec2", "DescribeVpcs"): stats(10, 0.08),
+                         ("t::jitter", "ec2", "DescribeVpcs"): stats(10, 0.004),
+                         ("t::new", "s3", "ListBuckets"): stats(50, 1.0)}
+
+        found = compare(current, baseline)
+        assert [(regression.scope, regression.metric, regression.baseline, regression.current)
+                for regression in found if regression.metric == "calls"] == [("t::calls", "calls", 1, 3)]
+        assert [regression.scope for regression in found if regression.metric == "p95"] == ["t::slow"]
+        assert [regression.scope for regression in compare(current, baseline, call_slack=2)] == ["t::slow"]
+
+    def test_pytest_plugin_gates_a_run(self, tmp_path):
+        """Test the plugin records a test's calls and fails a later run that makes more of them."""
+        (tmp_path / "test_calls.py").write_text(TEST_MODULE)
+        environment = dict(os.environ, PYTHONPATH=ROOT)
+
+        def run(calls, *options):
+            return subprocess.run(
+                [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "-p", "tools.pytest_apicalls",
+                 str(tmp_path / "test_calls.py"), *options], cwd=tmp_path, capture_output=True, text=True,
+                env=dict(environment, CALLS=str(calls)))
+
+        first = run(3, "--api-calls-json", "baseline.json")
+        assert first.returncode == 0, first.stdout
+        recorded = Recorder.load(str(tmp_path / "baseline.json"))
+        assert {key: value.calls for key, value in recorded.stats.items()} == {
+            ("test_calls.py::test_identity", "sts", "GetCallerIdentity"): 3}
+        assert run(3, "--api-calls-baseline", "baseline.json").returncode == 0
+        regressed = run(5, "--api-calls-baseline", "baseline.json")
+        assert regressed.returncode == 1
+        assert "REGRESSION test_calls.py::test_identity: 5 calls (baseline 3)" in regressed.stdout
@@ -0,0 +1,156 @@
+import gzip
+import math
+
+import pytest
+
+from tools.audit import (
+    UNSET_AUID, Assembler, AuditError, AuditSummary, Event, _ranges, analyze, anomalies, load_rules, parse_fields,
+    parse_rule,
+)
+
+T0 = 1729072800
+
+
+def records(stamp, serial, key, auid="1000", exe="/usr/bin/id", syscall=59, success="yes", paths=(), node=None):
+    """The SYSCALL, PATH, PROCTITLE and EOE lines of one syscall event."""
+    prefix = f"node={node} " if node else ""
+    head = f"{prefix}type={{}} msg=audit({stamp}.250:{serial}): "
+    lines = [head.format("SYSCALL") + f'arch=c000003e syscall={syscall} success={success} exit=0 ppid=1 pid=4242 '
+             f'auid={auid} uid=0 gid=0 euid=0 ses=3 tty=pts0 comm="{exe.rsplit("/", 1)[1]}" exe="{exe}" key="{key}"']
+    lines += [head.format("PATH") + f'item={item} name="{path}" inode=1 nametype=NORMAL'
+              for item, path in enumerate(paths)]
+    lines += [head.format("PROCTITLE") + "proctitle=6964", head.format("EOE").rstrip()]
+    return lines
+
+
+def interleaved(count, hosts=("i-0aaa", "i-0bbb")):
+    """``count`` events on each host, every second pair of events interleaved record by record."""
+    lines = []
+    for index in range(count):
+        for host in hosts:
+            first = records(T0 + index, 2 * index, "exec", auid=str(1000 + index % 3), node=host)
+            second = records(T0 + index, 2 * index + 1, "shadow_changes", exe="/usr/bin/vi", syscall=257,
+                             paths=("/etc/", "/etc/shadow"), node=host)
+            if index % 2:
+                lines += first + second
+            else:
+                lines += [first[0], second[0], second[1], first[1], second[2], first[2]] + second[3:]
+    return lines
+
+
+def write(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+class TestRules:
+    """Unit tests for reading the audit rules out of the user data."""
+
+    def test_rules_from_user_data(self, terraform_modules, terraform_environments):
+        """Test every watch and syscall rule of user_data.sh is read with its key and section."""
+        rules = load_rules(terraform_modules, terraform_environments)
+
+        assert {rule.key for rule in rules} == {
+            "mount", "pam", "nsswitch", "sshd_config", "passwd_changes", "shadow_changes", "group_changes", "sudoers",
+            "network_changes", "modules", "exec"}
+        shadow = next(rule for rule in rules if rule.key == "shadow_changes")
+        assert (shadow.kind, shadow.target, shadow.permissions, shadow.section) == (
+            "watch", "/etc/shadow", "wa", "Monitor system user and group management")
+        mount = next(rule for rule in rules if rule.key == "mount")
+        assert (mount.kind, mount.target, mount.filters) == ("syscall", "mount,umount2", ("arch=b64",))
+        with pytest.raises(AuditError, match="without a key"):
+            parse_rule("-w /etc/hosts -p wa")
+
+
+class TestAssembly:
+    """Unit tests for parsing records and joining them into events."""
+
+    def test_fields_and_encodings(self):
+        """Test quoted, hex-encoded, (null), nested userspace and enriched fields."""
+        keys = "exec\x01priv".encode().hex().upper()
+        assert parse_fields(f'syscall=59 comm=2F746D702F782079 key={keys} exe="/usr/bin/id"\x1dUID="root"') == {
+            "syscall": "59", "comm": "/tmp/x y", "key": "exec\x01priv", "exe": "/usr/bin/id"}
+        assert parse_fields("pid=6 uid=0 auid=4294967295 msg='op=login acct=\"root\" exe=\"/usr/sbin/sshd\" "
+                            "res=failed'")["res"] == "failed"
+        assert parse_fields("key=(null)")["key"] is None
+
+    def test_interleaved_and_userspace_events(self, tmp_path):
+        """Test interleaved records join by stamp and serial and single-record userspace events stand alone."""
+        lines = interleaved(2) + [
+            f"type=USER_LOGIN msg=audit({T0 + 5}.000:90): pid=6 uid=0 auid=4294967295 ses=4294967295 "
+            "msg='op=login acct=\"root\" exe=\"/usr/sbin/sshd\" addr=203.0.113.9 terminal=ssh res=failed'",
+            "----", ""]
+        summary = analyze(write(tmp_path / "audit.log", lines), watched=frozenset({"shadow_changes"}))
+
+        assert (summary.events, summary.records, summary.unparsed, summary.orphans, summary.unterminated) == (
+            9, 2 * 2 * (3 + 5) + 1, 1, 0, 0)
+        assert summary.counts["shadow_changes", "i-0bbb", "1000"] == 2
+        assert summary.failures == {("(USER_LOGIN)", tmp_path.name, UNSET_AUID): 1}
+        assert summary.top_paths("shadow_changes") == [("/etc/", 4), ("/etc/shadow", 4)]
+        assert summary.top_paths("exec") == []
+        assert summary.by_key()[0] == ("exec", 4, 0, 2, 2)
+
+    def test_window_and_open_limit(self):
+        """Test events without EOE close after the window or over the open limit; headless ones are fragments."""
+        assembler = Assembler("i-0aaa", window=2, max_open=2)
+        syscall = {"key": "exec", "auid": "1000"}
+
+        assert assembler.feed(None, "SYSCALL", T0, 1, syscall) == []
+        assert assembler.feed(None, "PATH", T0 + 1, 2, {"name": "/etc/shadow"}) == []
+        closed = assembler.feed(None, "SYSCALL", T0 + 3, 3, syscall)
+        assert [(event.serial, event.ended) for event in closed] == [(1, False)] and assembler.fragments == []
+        assert assembler.feed(None, "SYSCALL", T0 + 3, 4, syscall) == []
+        assert [event.serial for event in assembler.fragments] == [2]
+        assert [event.serial for event in assembler.feed(None, "SYSCALL", T0 + 3, 5, syscall)] == [3]
+        assert [event.serial for event in assembler.close()] == [2, 4, 5]
+
+
+class TestAnalyze:
+    """Unit tests for splitting files across workers."""
+
+    def test_workers_and_gzip_agree_with_one_pass(self, tmp_path):
+        """Test ranges start after EOE, and fragments cut by a range boundary are joined again."""
+        lines = interleaved(60)
+        path = write(tmp_path / "audit.log", lines)
+        with open(path, "rb") as fh:
+            data = fh.read()
+        ranges = _ranges(path, 4)
+
+        assert len(ranges) == 4 and ranges[-1][1] == len(data)
+        assert all(data[:start].rstrip(b"\n").rsplit(b"\n", 1)[-1].startswith(b"node=i-0")
+                   and b"type=EOE" in data[:start].rsplit(b"\n", 2)[-2] for start, _ in ranges[1:])
+        single = analyze(path)
+        split = analyze(path, jobs=3, chunk_size=700)
+        with gzip.open(tmp_path / "audit.log.1.gz", "wt") as fh:
+            fh.write("\n".join(lines) + "\n")
+        zipped = analyze(str(tmp_path / "audit.log.1.gz"))
+
+        for summary in (split, zipped):
+            assert (summary.events, summary.records, summary.orphans) == (single.events, single.records, 0) == (
+                240, 960, 0)
+            assert summary.counts == single.counts and summary.minutes == single.minutes
+            assert summary.paths == single.paths
+
+
+class TestAnomalies:
+    """Unit tests for the anomaly report."""
+
+    def test_bursts_rare_pairs_and_failures(self):
+        """Test a minute burst, a one-off shadow edit and failed logins rank first in their kind."""
+        summary = AuditSummary()
+        serial = 0
+        for minute in range(60):
+            for _ in range(40 if minute == 30 else 2):
+                serial += 1
+                summary.add(Event("i-0aaa", T0 + minute * 60, serial, "SYSCALL", ("exec",), "1000", ended=True))
+        summary.add(Event("i-0aaa", T0 + 600, 0, "SYSCALL", ("shadow_changes",), "1001", ended=True))
+        for attempt in range(5):
+            summary.add(Event("i-0bbb", T0 + attempt, attempt, "USER_LOGIN", (), "1002", failed=True, ended=True))
+
+        found = anomalies(summary, top=1, keys={"exec", "shadow_changes"})
+
+        assert [(anomaly.kind, anomaly.subject) for anomaly in found] == [
+            ("burst", "i-0aaa exec"), ("rare", "auid 1001 shadow_changes"), ("failures", "i-0bbb auid 1002")]
+        assert found[0].score == pytest.approx(38) and "2024-10-16T10:30:00Z" in found[0].detail
+        assert found[1].score == pytest.approx(math.log2(2 * 59 + 40 + 1 + 5))
+        assert found[2].detail == "5 of 5 events failed"
@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+
+from tools.backtest import (
+    ALARM, CAPACITY_METRIC, CPU_METRIC, INSUFFICIENT_DATA, OK, BacktestError, MetricAlarm, ScalingConfig, evaluate,
+    load_alarms, load_scaling, load_series, metric_series, period_statistic, sweep,
+)
+
+START = 1729036800  # 2024-10-16T00:00:00Z
+
+
+def series(**columns):
+    length = len(next(iter(columns.values())))
+    return metric_series(START + 60 * np.arange(length), {key.replace("__", ":").replace("_", "/", 1): values
+                                                          for key, values in columns.items()})
+
+
+def periods(*values, minutes=5):
+    """One value per ``minutes``-minute period, repeated for every minute."""
+    return np.repeat(np.asarray(values, dtype=np.float64), minutes)
+
+
+class TestAlarmEvaluation:
+    """Unit tests for vectorized alarm evaluation."""
+
+    def test_period_statistics(self):
+        """Test samples are bucketed on period boundaries and missing minutes are ignored."""
+        values = np.array([1.0, 2.0, np.nan, 4.0, 5.0, np.nan, np.nan])
+        starts, sums = period_statistic(values, START + 180, 300, "Sum")
+
+        assert starts.tolist() == [START, START + 300]
+        assert sums.tolist() == [3.0, 9.0]
+        assert period_statistic(values, START + 180, 300, "Maximum")[1].tolist() == [2.0, 5.0]
+        assert np.isnan(period_statistic(np.full(5, np.nan), START, 300, "Average")[1][0])
+
+    def test_threshold_grid_and_evaluation_window(self):
+        """Test each threshold row enters ALARM only after evaluation_periods breaching periods."""
+        alarm = MetricAlarm("high", "GreaterThanOrEqualToThreshold", 70, 2, metric="AWS/EC2:CPUUtilization")
+        data = series(AWS_EC2__CPUUtilization=periods(50, 75, 80, 60, 90, 95, 40))
+
+        result = evaluate(alarm, data, [70, 85])
+
+        assert result.states.tolist() == [[OK, OK, ALARM, OK, OK, ALARM, OK], [OK, OK, OK, OK, OK, ALARM, OK]]
+        assert result.alarms.tolist() == [2, 1]
+        assert result.alarm_minutes.tolist() == [10, 5]
+
+    def test_missing_data_treatment(self):
+        """Test missing periods follow treat_missing_data."""
+        alarm = MetricAlarm("high", "GreaterThanThreshold", 70, 1, metric="AWS/EC2:CPUUtilization")
+        data = series(AWS_EC2__CPUUtilization=periods(80, np.nan, 50))
+
+        assert evaluate(alarm, data).states.tolist() == [[ALARM, INSUFFICIENT_DATA, OK]]
+        alarm.treat_missing_data = "ignore"
+        assert evaluate(alarm, data).states.tolist() == [[ALARM, ALARM, OK]]
+        alarm.treat_missing_data = "notBreaching"
+        assert evaluate(alarm, data).states.tolist() == [[ALARM, OK, OK]]
+
+    def test_module_alarms(self, terraform_modules):
+        """Test the compute and monitoring alarms load, including alb_5xx metric math."""
+        alarms = load_alarms(terraform_modules)
+        data = series(AWS_ApplicationELB__RequestCount=periods(100, 100, 100, 100),
+                      AWS_ApplicationELB__HTTPCode_ELB_5XX_Count=periods(1, 10, 10, 2))
+
+        assert sorted(alarms) == ["alb_5xx", "high_cpu", "low_cpu", "rds_cpu", "rds_storage"]
+        assert alarms["high_cpu"].actions == ("scale_up",) and alarms["high_cpu"].period == 300
+        assert evaluate(alarms["alb_5xx"], data).states.tolist() == [[OK, OK, ALARM, OK]]
+
+
+class TestScalingSweep:
+    """Unit tests for the Auto Scaling simulation."""
+
+    def test_scaling_config_from_environment(self, terraform_modules, terraform_environments):
+        """Test the prod group sizes, CPU alarms and simple scaling policies are read from Terraform."""
+        config = load_scaling(terraform_modules, terraform_environments, "prod")
+
+        assert (config.min_size, config.max_size, config.desired_capacity) == (2, 10, 3)
+        assert (config.high_threshold, config.low_threshold, config.high_periods) == (70, 30, 2)
+        assert (config.scale_up, config.scale_down, config.cooldown, config.warmup) == (1, 1, 300, 300)
+
+    def test_step_load_scales_out_within_limits(self):
+        """Test a demand step adds instances one cooldown at a time and stops at max_size."""
+        cpu = periods(*[40] * 4 + [100] * 24, minutes=5)
+        data = series(AWS_EC2__CPUUtilization=cpu, AWS_AutoScaling__GroupInServiceInstances=np.full(len(cpu), 3.0))
+        config = ScalingConfig(min_size=2, desired_capacity=3, warmup=0)
+
+        capped, capped_slow, fast, slow = sweep(data, config, {"max_size": [4, 5], "cooldown": [300, 900]}).rows()
+
+        assert fast["time_at_capacity"] == {3: 30, 4: 6, 5: 104}
+        assert slow["time_at_capacity"] == {3: 30, 4: 16, 5: 94}
+        assert capped["time_at_capacity"] == {3: 30, 4: 110} and capped["scaling_activities"] == 1
+        assert fast["scaling_activities"] == 2 and fast["high_alarms"] == 1 and fast["low_alarms"] == 0
+        assert fast["underprovisioned_minutes"] == capped_slow["underprovisioned_minutes"] == 10
+        assert fast["instance_minutes"] == 3 * 30 + 4 * 6 + 5 * 104
+
+    def test_grid_is_a_cartesian_product_and_parallel_runs_agree(self):
+        """Test every combination is simulated and worker processes match a serial run."""
+        rng = np.random.default_rng(3)
+        cpu = np.clip(50 + 35 * np.sin(np.arange(2880) / 120) + rng.normal(0, 5, 2880), 0, 100)
+        data = series(AWS_EC2__CPUUtilization=cpu)
+        grid = {"high_threshold": [60, 80], "low_threshold": [20, 30], "cooldown": [60, 300]}
+
+        serial = sweep(data, ScalingConfig(desired_capacity=3), grid)
+        parallel = sweep(data, ScalingConfig(desired_capacity=3), grid, jobs=2)
+
+        assert len(serial) == 8 and serial.params["cooldown"].tolist() == [60, 300] * 4
+        assert list(serial.rows()) == list(parallel.rows())
+        assert (serial.capacity_minutes.sum(axis=1) == 2880).all()
+        with pytest.raises(BacktestError, match="cannot sweep"):
+            sweep(data, grid={"period": [60]})
+
+
+class TestLoadSeries:
+    """Unit tests for metric exports."""
+
+    def test_csv_with_iso_timestamps_and_gaps(self, tmp_path):
+        """Test rows are placed on a minute timeline with gaps and blank cells as missing."""
+        path = tmp_path / "metrics.csv"
+        path.write_text(f"timestamp,{CPU_METRIC},{CAPACITY_METRIC}\n"
+                        "2024-10-16T00:00:00Z,40,3\n2024-10-16T00:01:30Z,50,\n2024-10-16T00:04:00Z,60,4\n")
+
+        data = load_series(str(path))
+
+        assert data.start == START and len(data) == 5
+        assert np.allclose(data[CPU_METRIC], [40, 50, np.nan, np.nan, 60], equal_nan=True)
+        assert np.isnan(data[CAPACITY_METRIC][1])
+        with pytest.raises(BacktestError, match="no 'AWS/RDS:CPUUtilization' column"):
+            data["AWS/RDS:CPUUtilization"]
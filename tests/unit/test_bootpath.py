@@ -0,0 +1,128 @@
+import json
+import socket
+import sys
+
+import pytest
+
+from tools.bootpath import (
+    BAKE, BOOT, BootPathError, bake_manifest, boot_script, launch_template, measure, parse_steps, render, split,
+)
+
+
+@pytest.fixture(scope="module")
+def user_data(terraform_modules, terraform_environments):
+    path, variables = launch_template(terraform_modules, terraform_environments, "prod")
+    with open(path) as fh:
+        template = fh.read()
+    return template, variables, split(template, variables)
+
+
+def step_at(steps, command):
+    return next(step for step in steps if step.head.startswith(command))
+
+
+class TestTemplate:
+    """Unit tests for rendering and cutting the user data template."""
+
+    def test_render_follows_templatefile(self):
+        """Test ${name} interpolates, $${ and %%{ escape and unknown variables raise."""
+        assert render("port ${app_port} on ${ environment }", {"app_port": 8080.0, "environment": "prod"}) == \
+            "port 8080 on prod"
+        assert render('"$${aws:InstanceId}" %%{x}', {}) == '"${aws:InstanceId}" %{x}'
+        with pytest.raises(BootPathError, match="'region' is not set"):
+            render("${region}", {})
+        with pytest.raises(BootPathError, match="unsupported"):
+            render("${upper(environment)}", {"environment": "prod"})
+
+    def test_steps_keep_heredocs_and_continuations_whole(self):
+        """Test a heredoc body and backslash continuations belong to the command that opens them."""
+        script = ("#!/bin/bash\n# Write config\ncat > /etc/app.conf << 'EOF'\nport=1\n# not a comment\nEOF\n\n"
+                  "# Tag\naws ec2 create-tags \\\n  --resources i-1\necho done\n")
+
+        assert parse_steps(script) == [
+            (3, "Write config", "cat > /etc/app.conf << 'EOF'\nport=1\n# not a comment\nEOF"),
+            (9, "Tag", "aws ec2 create-tags \\\n  --resources i-1"),
+            (11, "Tag", "echo done"),
+        ]
+        with pytest.raises(BootPathError, match="never closed"):
+            parse_steps("cat > /tmp/x << EOF\nbody\n")
+
+    def test_variables_from_the_environment(self, user_data):
+        """Test the compute module's templatefile arguments resolve through the prod module call."""
+        _, variables, _ = user_data
+
+        assert variables == {"environment": "prod", "app_port": 8080, "region": "us-east-1"}
+
+
+class TestSplit:
+    """The compute module's user data split into bake and boot steps."""
+
+    def test_packages_and_downloads_are_baked(self, user_data):
+        """Test installs, updates, the AWS CLI and static files move to the image and the repeat update drops."""
+        _, _, steps = user_data
+        manifest = bake_manifest(steps)
+
+        assert manifest["packages"] == ["amazon-cloudwatch-agent", "awslogs", "jq", "iptables-services", "nodejs",
+                                        "npm"]
+        assert manifest["services"] == ["amazon-cloudwatch-agent", "iptables"]
+        assert manifest["downloads"] == ["https://awscli.amazonaws.com/awscli-exe-linux-x86_64.zip"]
+        assert manifest["files"] == ["/etc/audit/rules.d/audit.rules", "/var/www/html/health"]
+        assert [(item["line"], item["repeats_line"]) for item in manifest["dropped"]] == [(108, 5)]
+        assert step_at(steps, "./aws/install").phase == BAKE
+
+    def test_instance_and_environment_config_stays_at_boot(self, user_data):
+        """Test steps rendering variables, reading metadata or starting services run at boot."""
+        _, _, steps = user_data
+
+        assert step_at(steps, "cat > /opt/application/app.js").variables == ("environment", "app_port")
+        assert step_at(steps, "cat > /opt/aws/amazon-cloudwatch-agent").phase == BOOT
+        assert step_at(steps, "INSTANCE_ID=").kind == "metadata"
+        assert step_at(steps, "systemctl start financial-app").phase == BOOT
+        assert step_at(steps, "systemctl enable financial-app").reason == \
+            "needs /etc/systemd/system/financial-app.service, written at boot"
+        assert sum(step.estimate for step in steps if step.phase == BOOT) < 10 < \
+            sum(step.estimate for step in steps) / 10
+
+    def test_boot_script_is_a_template(self, user_data):
+        """Test the boot script keeps template syntax and renders to the boot steps of the original."""
+        _, variables, steps = user_data
+        script = boot_script(steps)
+
+        assert "yum" not in script and "awscliv2" not in script
+        assert '"$${aws:InstanceId}"' in script and "${environment}-financial-app" in script
+        rendered = render(script, variables)
+        assert rendered == boot_script(steps, rendered=True)
+        assert [source for _, _, source in parse_steps(rendered)] == [step.text for step in steps
+                                                                     if step.phase == BOOT]
+        assert json.loads(json.dumps(bake_manifest(steps, "user_data.sh", variables)))["variables"]["app_port"] == 8080
+
+
+class TestMeasure:
+    """Unit tests for the boot harness, using the shell runtime."""
+
+    def test_steps_and_time_to_healthy(self, tmp_path):
+        """Test each step is timed and the run stops once the health check answers."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        script = (f"#!/bin/bash\n# Health file\nmkdir -p {tmp_path}/www\necho OK > {tmp_path}/www/health\n"
+                  f"# Slow step\nsleep 0.3\n# Start the app\ncd {tmp_path}/www\n"
+                  f"exec {sys.executable} -m http.server {port} --bind 127.0.0.1\n")
+
+        result = measure(script, "shell", port, timeout=30)
+
+        assert result.healthy_after is not None and result.healthy_after >= 0.3
+        assert [line for line, *_ in result.steps] == [3, 4, 6, 8, 9]
+        slow = result.steps[2]
+        assert slow[1] == "Slow step" and slow[4] >= 0.3
+
+    def test_failed_script_reports_no_health(self):
+        """Test a script that exits without starting the app is reported unhealthy."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        result = measure("#!/bin/bash\necho starting\nexit 3\n", "shell", port, timeout=10, settle=0.2)
+
+        assert result.healthy_after is None and result.exit_code == 3
+        assert result.output == "starting\n" and len(result.steps) == 2
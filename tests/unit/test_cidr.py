@@ -0,0 +1,104 @@
+import ipaddress
+
+import pytest
+
+from tools.cidr import CidrAllocator, CidrError, cidrsubnet, find_overlaps, subnet_layout
+
+
+class TestCidrLayout:
+    """Unit tests for the networking module's CIDR arithmetic."""
+
+    def test_cidrsubnet_matches_terraform(self):
+        """Test cidrsubnet follows Terraform's semantics."""
+        assert str(cidrsubnet("10.0.0.0/16", 8, 0)) == "10.0.0.0/24"
+        assert str(cidrsubnet("10.0.0.0/16", 8, 23)) == "10.0.23.0/24"
+        assert str(cidrsubnet("172.16.0.0/12", 4, 15)) == "172.31.0.0/16"
+        assert str(cidrsubnet("fd00::/56", 8, 1)) == "fd00:0:0:1::/64"
+
+    def test_cidrsubnet_rejects_out_of_range_netnum(self):
+        """Test netnum must fit in newbits."""
+        with pytest.raises(CidrError):
+            cidrsubnet("10.0.0.0/16", 8, 256)
+        with pytest.raises(CidrError):
+            cidrsubnet("10.0.0.0/28", 8, 0)
+
+    def test_subnet_layout_tiers(self):
+        """Test tiers are laid out as consecutive blocks of len(azs) subnets."""
+        layout = subnet_layout("10.1.0.0/16", ["us-east-1a", "us-east-1b", "us-east-1c"])
+
+        assert [str(n) for n in layout["public"]] == ["10.1.0.0/24", "10.1.1.0/24", "10.1.2.0/24"]
+        assert [str(n) for n in layout["private"]] == ["10.1.3.0/24", "10.1.4.0/24", "10.1.5.0/24"]
+        assert [str(n) for n in layout["restricted"]] == ["10.1.6.0/24", "10.1.7.0/24", "10.1.8.0/24"]
+
+
+class TestOverlapDetection:
+    """Unit tests for sorted-range overlap detection."""
+
+    def test_disjoint_networks(self):
+        """Test disjoint networks report no overlaps."""
+        networks = [n for tier in subnet_layout("10.0.0.0/16", 6).values() for n in tier]
+
+        assert find_overlaps(networks) == []
+
+    def test_containment_and_duplicates_across_sizes(self):
+        """Test overlaps between CIDRs of different sizes are detected."""
+        overlaps = find_overlaps(["10.0.0.0/16", "10.0.4.0/22", "10.0.5.0/24", "10.1.0.0/24",
+                                  "10.0.5.0/24", "fd00::/48", "10.0.0.0/8"])
+
+        found = {(str(o.outer), str(o.inner), o.kind) for o in overlaps}
+        assert found == {
+            ("10.0.0.0/8", "10.0.0.0/16", "contains"),
+            ("10.0.0.0/8", "10.1.0.0/24", "contains"),
+            ("10.0.0.0/16", "10.0.4.0/22", "contains"),
+            ("10.0.4.0/22", "10.0.5.0/24", "contains"),
+            ("10.0.5.0/24", "10.0.5.0/24", "duplicate"),
+        }
+
+    def test_labelled_networks_keep_their_owners(self):
+        """Test equal networks from different owners are reported with both labels."""
+        overlaps = find_overlaps([("dev", "10.0.0.0/16"), ("prod", "10.0.0.0/16"), ("dev", "10.0.1.0/24")],
+                                 labelled=True)
+
+        assert [(o.kind, o.outer_label, o.inner_label) for o in overlaps] == [
+            ("duplicate", "dev", "prod"), ("contains", "prod", "dev")]
+
+    def test_matches_pairwise_comparison(self):
+        """Test the sweep flags the same networks as a pairwise ipaddress check."""
+        networks = [ipaddress.ip_network(f"10.{i % 7}.{(i * 37) % 256}.0/{22 + i % 5}", strict=False)
+                    for i in range(300)]
+
+        pairwise = {j for i, a in enumerate(networks) for j, b in enumerate(networks) if i < j and a.overlaps(b)}
+        swept = {str(o.inner) for o in find_overlaps(networks)} | {str(o.outer) for o in find_overlaps(networks)}
+
+        assert {str(networks[j]) for j in pairwise} <= swept
+
+
+class TestCidrAllocator:
+    """Unit tests for the CIDR allocator."""
+
+    def test_next_free_skips_allocated_and_aligns(self):
+        """Test the next free block is aligned and avoids existing allocations."""
+        allocator = CidrAllocator("10.0.0.0/16", ["10.0.0.0/24", "10.0.1.0/25", "10.0.4.0/22"])
+
+        assert str(allocator.next_free(25)) == "10.0.1.128/25"
+        assert str(allocator.next_free(23)) == "10.0.2.0/23"
+        assert str(allocator.next_free(22)) == "10.0.8.0/22"
+
+    def test_add_rejects_overlaps(self):
+        """Test overlapping or out-of-range allocations are refused."""
+        allocator = CidrAllocator("10.0.0.0/16", ["10.0.4.0/22"])
+
+        with pytest.raises(CidrError, match="overlaps 10.0.4.0/22"):
+            allocator.add("10.0.5.0/24")
+        with pytest.raises(CidrError, match="outside"):
+            allocator.add("10.1.0.0/24")
+
+    def test_allocate_until_exhausted(self):
+        """Test allocation fills the supernet and then raises."""
+        allocator = CidrAllocator("10.0.0.0/22")
+
+        blocks = [str(allocator.allocate(24)) for _ in range(4)]
+
+        assert blocks == ["10.0.0.0/24", "10.0.1.0/24", "10.0.2.0/24", "10.0.3.0/24"]
+        with pytest.raises(CidrError, match="no free"):
+            allocator.allocate(28)
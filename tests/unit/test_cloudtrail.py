@@ -0,0 +1,158 @@
+import gzip
+import json
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from tools.cloudtrail import TrailError, TrailStore, ingest, parse_files, read_part, trail_files, write_part
+from tools.synth import EPOCH, Scale, write_trail
+
+END = EPOCH + 86400
+DELIVERY = "AWSLogs/123456789012/CloudTrail/us-east-1/2024/10/16"
+
+
+def deliver(root, name, records, folder=DELIVERY):
+    os.makedirs(os.path.join(root, folder), exist_ok=True)
+    with open(os.path.join(root, folder, name), "wb") as fh:
+        fh.write(gzip.compress(json.dumps({"Records": records}).encode()))
+    return f"{folder}/{name}"
+
+
+def raw_records(root):
+    for path in trail_files(root):
+        with gzip.open(os.path.join(root, path)) as fh:
+            yield from json.load(fh)["Records"]
+
+
+@pytest.fixture(scope="module")
+def bucket(tmp_path_factory):
+    """A synthetic trail bucket of about 2,000 records over 35 days and three regions."""
+    root = str(tmp_path_factory.mktemp("bucket"))
+    write_trail(root, Scale(log_mb=2))
+    return root
+
+
+class TestParsing:
+    """Unit tests for reading and flattening delivery files."""
+
+    def test_flattens_and_encodes_records(self, tmp_path):
+        """Test fields flatten into codes and blobs, and bad files and records are reported, digests skipped."""
+        root = str(tmp_path)
+        good = deliver(root, "a.json.gz", [
+            {"eventTime": "2024-10-16T01:02:03Z", "eventSource": "ec2.amazonaws.com", "awsRegion": "us-east-1",
+             "eventName": "AuthorizeSecurityGroupIngress", "readOnly": False, "eventID": "e1",
+             "userIdentity": {"type": "IAMUser", "arn": "arn:aws:iam::123456789012:user/ops"},
+             "requestParameters": {"groupId": "sg-1"}, "errorCode": "AccessDenied"},
+            {"eventTime": "2024-10-16T23:59:59Z", "eventSource": "s3.amazonaws.com", "awsRegion": "us-east-1",
+             "eventName": "GetObject", "userIdentity": {"type": "AWSService", "invokedBy": "config.amazonaws.com"}},
+            {"eventSource": "ec2.amazonaws.com", "eventName": "DescribeInstances"},
+        ])
+        broken = deliver(root, "b.json.gz", [])
+        with open(os.path.join(root, broken), "wb") as fh:
+            fh.write(b"\x1f\x8bnot gzip")
+        deliver(root, "digest.json.gz", [], "AWSLogs/123456789012/CloudTrail-Digest/us-east-1/2024/10/16")
+
+        batch = parse_files(root, trail_files(root))
+
+        assert trail_files(root) == [good, broken]
+        assert batch.files == [(good, 3)] and [path for path, _ in batch.errors] == [broken]
+        assert (len(batch), batch.skipped) == (2, 1)
+        assert batch.time.tolist() == [EPOCH + 3723, EPOCH + 86399] and batch.read_only.tolist() == [0, -1]
+
+        def decoded(column):
+            return [batch.dictionaries[column][code] for code in batch.codes[column].tolist()]
+
+        assert decoded("principal") == ["arn:aws:iam::123456789012:user/ops", "config.amazonaws.com"]
+        assert decoded("error_code") == ["AccessDenied", None] and decoded("day") == ["2024-10-16"] * 2
+        lengths, data = batch.blobs["request"]
+        assert (lengths.tolist(), data) == ([18, 0], b'{"groupId":"sg-1"}')
+
+    def test_parts_round_trip(self, tmp_path):
+        """Test a part reads back only the columns asked for, whether small or past the first read."""
+        arrays = {"time": np.arange(5, dtype=np.int64), "codes": np.array([3, -1, 2, 2, 0], dtype=np.int32),
+                  "data": np.frombuffer(b"x" * 200000, dtype=np.uint8)}
+        path = str(tmp_path / "part")
+        write_part(path, arrays)
+
+        found = read_part(path, ["codes", "data"])
+
+        assert set(found) == {"codes", "data"}
+        assert found["codes"].tolist() == [3, -1, 2, 2, 0] and found["data"].tobytes() == b"x" * 200000
+
+
+class TestStore:
+    """Unit tests for ingesting into and querying the columnar store."""
+
+    def test_ingest_is_incremental(self, bucket, tmp_path):
+        """Test a second ingest reads only new deliveries and a reopened store keeps its dictionaries."""
+        root = str(tmp_path / "bucket")
+        for path in trail_files(bucket)[:10]:
+            os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+            with open(os.path.join(bucket, path), "rb") as source, open(os.path.join(root, path), "wb") as copy:
+                copy.write(source.read())
+        store_path = str(tmp_path / "store")
+        with TrailStore(store_path) as store:
+            first = ingest(root, store)
+        added = deliver(root, "new.json.gz", [
+            {"eventTime": "2024-10-16T05:00:00Z", "eventSource": "ec2.amazonaws.com", "awsRegion": "us-east-1",
+             "eventName": "AuthorizeSecurityGroupIngress", "sourceIPAddress": "192.0.2.1",
+             "userIdentity": {"type": "IAMUser", "arn": "arn:aws:iam::123456789012:user/new"}}])
+
+        with TrailStore(store_path) as store:
+            second = ingest(root, store)
+            found = store.query(columns=("principal",), source_ip="192.0.2.1")
+            total = store.stats()
+            ingested = store.ingested()
+
+        assert (first.files, first.already) == (10, 0)
+        assert (second.files, second.records, second.already) == (1, 1, 10)
+        assert found.values("principal") == ["arn:aws:iam::123456789012:user/new"]
+        assert total["files"] == 11 and total["rows"] == first.records + 1
+        assert added in ingested
+
+    def test_query_prunes_and_matches_a_scan(self, bucket, tmp_path):
+        """Test security group ingress by principal over 30 days matches a scan and reads only its partitions."""
+        start = END - 30 * 86400
+        expected = Counter()
+        for record in raw_records(bucket):
+            day = record["eventTime"][:10]
+            if record["eventName"] == "AuthorizeSecurityGroupIngress" and "2024-09-17" <= day <= "2024-10-16":
+                expected[record["userIdentity"]["arn"]] += 1
+
+        with TrailStore(str(tmp_path)) as store:
+            ingest(bucket, store)
+            found = store.query(start, END, ("principal", "time"), name="AuthorizeSecurityGroupIngress")
+            unseen = store.query(columns=("time",), principal="arn:aws:iam::123456789012:user/nobody")
+            parts = store.stats()["parts"]
+            with pytest.raises(TrailError, match="unknown columns: colour"):
+                store.query(colour="red")
+
+        assert dict((values[0], count) for values, count in found.count_by("principal")) == expected
+        assert found.count_by("principal")[0] == (("arn:aws:iam::123456789012:user/prod-operator-1",),
+                                                  expected["arn:aws:iam::123456789012:user/prod-operator-1"])
+        assert min(found.values("time")) >= start and 0 < found.parts <= 30 * 3 < parts
+        assert (len(unseen), unseen.parts) == (0, 0)
+
+    def test_workers_flushes_and_compaction_agree(self, bucket, tmp_path):
+        """Test worker processes, small flushes and compaction store the same events as one pass."""
+        columns = ("time", "name", "principal", "error_code", "request")
+
+        def events(store):
+            return sorted((record["time"], record["name"], record["principal"], record["error_code"] or "",
+                           record["request"]) for record in store.query(columns=columns).records())
+
+        with TrailStore(str(tmp_path / "one")) as one, TrailStore(str(tmp_path / "many")) as many:
+            ingest(bucket, one)
+            result = ingest(bucket, many, jobs=2, batch_files=5, flush_rows=300)
+            before = many.stats()["parts"]
+            merged, removed = many.compact()
+
+            assert result.parts == before > one.stats()["parts"]
+            assert many.stats()["parts"] == one.stats()["parts"] == before - removed + merged
+            assert events(many) == events(one)
+            assert len(events(one)) == sum(1 for _ in raw_records(bucket))
+            failed = one.query(END - 7 * 86400, END, ("name",), failed=True)
+            assert len(failed) == sum(1 for record in raw_records(bucket) if "errorCode" in record
+                                      and record["eventTime"] >= "2024-10-10")
@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from tools.compliance import ComplianceEngine, load_features, parse_feature
+from tools.plan import PlanIndex
+
+FEATURES_DIR = os.path.join(os.path.dirname(__file__), "..", "compliance")
+
+
+def _scenario(results, name):
+    return next(result for result in results if result.scenario.name == name)
+
+
+class TestPlanIndex:
+    """Unit tests for the indexed plan view."""
+
+    def test_resources_indexed_by_type_and_module(self, prod_plan):
+        """Test resources are indexed by type, module and base address."""
+        plan = PlanIndex(prod_plan)
+
+        assert len(plan.by_type["aws_subnet"]) == 9
+        assert len(plan.by_base["module.networking.aws_nat_gateway.main"]) == 3
+        assert "module.database" in plan.modules()
+        assert plan.by_address["module.database.aws_db_instance.main"].values["storage_encrypted"] is True
+
+    def test_attribute_path_index(self, prod_plan):
+        """Test nested attributes are indexed with list positions collapsed."""
+        plan = PlanIndex(prod_plan)
+
+        encrypted = plan.attribute("aws_launch_template", "block_device_mappings.*.ebs.*.encrypted")
+        azs = {value for _, value in plan.attribute("aws_subnet", "availability_zone")}
+
+        assert [value for _, value in encrypted] == ["true"]
+        assert azs == {"us-east-1a", "us-east-1b", "us-east-1c"}
+
+    def test_references_resolve_across_modules(self, prod_plan):
+        """Test var and module output references resolve to producing resources."""
+        plan = PlanIndex(prod_plan)
+        asg = plan.by_address["module.compute.aws_autoscaling_group.app_asg"]
+        nat = plan.by_address["module.networking.aws_nat_gateway.main[1]"]
+
+        subnets = plan.resolve_attribute(asg, "vpc_zone_identifier")
+        nat_subnets = plan.resolve_attribute(nat, "subnet_id")
+
+        assert [s.address for s in subnets] == [f"module.networking.aws_subnet.private[{i}]" for i in range(3)]
+        assert [s.address for s in nat_subnets] == ["module.networking.aws_subnet.public[1]"]
+
+
+class TestComplianceEngine:
+    """Unit tests for the native compliance engine."""
+
+    def test_parse_feature_inherits_step_kind(self):
+        """Test And steps inherit the kind of the preceding step."""
+        feature = parse_feature(
+            "Feature: Example\n"
+            "  Scenario: One\n"
+            "    Given I have KMS keys configured\n"
+            "    Then all KMS keys must have rotation enabled\n"
+            "    And KMS key policies must restrict access\n"
+        )
+
+        assert [step.kind for step in feature.scenarios[0].steps] == ["Given", "Then", "Then"]
+
+    def test_every_feature_step_is_defined(self, prod_plan):
+        """Test every step in the repository's feature files has a definition."""
+        features = load_features(FEATURES_DIR)
+        results = ComplianceEngine(prod_plan).run(features)
+
+        undefined = [f"{r.scenario.id}: {o.step.text}" for r in results for o in r.steps if o.status == "undefined"]
+        assert len(results) == 20
+        assert undefined == []
+
+    def test_rds_encryption(self, make_plan):
+        """Test unencrypted RDS instances fail the encryption at rest scenario."""
+        plan = make_plan()
+        features = load_features(os.path.join(FEATURES_DIR, "financial_compliance.feature"))
+        passing = _scenario(ComplianceEngine(plan).run(features), "Encryption at Rest")
+
+        for resource in plan["planned_values"]["root_module"]["child_modules"]:
+            for item in resource["resources"]:
+                if item["type"] == "aws_db_instance":
+                    item["values"]["storage_encrypted"] = False
+        failing = _scenario(ComplianceEngine(plan).run(features), "Encryption at Rest")
+
+        assert passing.status == "passed"
+        assert failing.status == "failed"
+        assert failing.steps[1].messages == ["module.database.aws_db_instance.main: storage_encrypted is not true"]
+
+    def test_nat_gateways_multiple_azs(self, make_plan):
+        """Test a single NAT gateway fails the high availability scenario."""
+        features = load_features(os.path.join(FEATURES_DIR, "financial_compliance.feature"))
+
+        ha = _scenario(ComplianceEngine(make_plan(ha_nat_gateway=True)).run(features), "High Availability")
+        single = _scenario(ComplianceEngine(make_plan(ha_nat_gateway=False)).run(features), "High Availability")
+
+        assert ha.status == "passed"
+        assert single.status == "failed"
+        assert "cover 1 availability zone" in single.steps[-1].messages[0]
+
+    def test_production_scenario_skipped_outside_prod(self, make_plan):
+        """Test production-only scenarios are skipped for other environments."""
+        features = load_features(os.path.join(FEATURES_DIR, "financial_compliance.feature"))
+
+        result = _scenario(ComplianceEngine(make_plan(environment="dev")).run(features), "High Availability")
+
+        assert result.status == "skipped"
+
+    @pytest.mark.parametrize("jobs", [2, 8])
+    def test_parallel_matches_serial(self, prod_plan, jobs):
+        """Test concurrent evaluation returns the same results in the same order."""
+        features = load_features(FEATURES_DIR)
+        serial = ComplianceEngine(prod_plan).run(features, jobs=1)
+        parallel = ComplianceEngine(prod_plan).run(features, jobs=jobs)
+
+        assert [(r.scenario.id, r.status) for r in parallel] == [(r.scenario.id, r.status) for r in serial]
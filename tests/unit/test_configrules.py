@@ -0,0 +1,159 @@
+import json
+
+import pytest
+
+from tools.configrules import (
+    ACCOUNT, COMPLIANT, INSUFFICIENT_DATA, NON_COMPLIANT, NOT_APPLICABLE, RULES, ConfigRuleError, evaluate,
+)
+from tools.inventory import GLOBAL, TYPES, Snapshot
+
+VOLUME = TYPES["AWS::EC2::Volume"]
+BUCKET = TYPES["AWS::S3::Bucket"]
+ACCOUNT_ID = "123456789012"
+SSL_ONLY = {"Effect": "Deny", "Principal": "*", "Action": "s3:*", "Resource": ["arn:aws:s3:::b", "arn:aws:s3:::b/*"],
+            "Condition": {"Bool": {"aws:SecureTransport": "false"}}}
+
+
+def volume(volume_id, encrypted=True, attached=True, key="arn:aws:kms:us-east-1:123456789012:key/abc"):
+    return {"VolumeId": volume_id, "Encrypted": encrypted, "KmsKeyId": key if encrypted else None,
+            "Attachments": [{"InstanceId": "i-1", "State": "attached"}] if attached else [],
+            "State": "in-use" if attached else "available"}
+
+
+def bucket(name, grants=(), statements=(), block=None, account_block=None):
+    return {"Name": name, "supplementaryConfiguration": {
+        "AccessControlList": {"Grants": [{"Grantee": {"Type": "Group", "URI": uri}, "Permission": permission}
+                                         for uri, permission in grants]},
+        "BucketPolicy": json.dumps({"Version": "2012-10-17", "Statement": list(statements)}) if statements else None,
+        "PublicAccessBlockConfiguration": block, "AccountPublicAccessBlockConfiguration": account_block}}
+
+
+def check(name, item, **params):
+    """Run one rule's check on an item the way evaluate() does."""
+    config_rule = RULES[name]
+    item = dict(item)
+    supplementary = item.pop("supplementaryConfiguration", {})
+    outcome = config_rule.check(item, supplementary, config_rule.parameters(params))
+    return outcome if isinstance(outcome, tuple) else (outcome, None)
+
+
+@pytest.fixture
+def store(tmp_path):
+    with Snapshot(str(tmp_path / "config.db")) as store:
+        yield store
+
+
+class TestRules:
+    """Unit tests for the managed rule semantics."""
+
+    def test_volumes_and_databases(self):
+        """Test attached volumes and DB instances must be encrypted, with the given key if any."""
+        assert check("encrypted-volumes", volume("vol-1"))[0] == COMPLIANT
+        assert check("encrypted-volumes", volume("vol-2", encrypted=False)) == (
+            NON_COMPLIANT, "Volume is not encrypted.")
+        assert check("encrypted-volumes", volume("vol-3", encrypted=False, attached=False))[0] == NOT_APPLICABLE
+        assert check("encrypted-volumes", volume("vol-1"), kmsId="key/other")[0] == NON_COMPLIANT
+        assert check("rds-encryption-enabled", {"StorageEncrypted": False})[0] == NON_COMPLIANT
+        assert check("rds-encryption-enabled", {"StorageEncrypted": True, "KmsKeyId": "key/abc"}, kmsKeyId="abc")[0] \
+            == COMPLIANT
+
+    def test_bucket_acls_policies_and_public_access_blocks(self):
+        """Test public grants and statements fail unless a bucket or account block neutralises them."""
+        all_users = "http://acs.amazonaws.com/groups/global/AllUsers"
+        public_get = {"Effect": "Allow", "Principal": {"AWS": "*"}, "Action": ["s3:Get*"], "Resource": "*"}
+        from_vpc = dict(public_get, Condition={"StringEquals": {"aws:SourceVpce": "vpce-1"}})
+
+        assert check("s3-bucket-public-read-prohibited", bucket("acl", [(all_users, "READ")])) == (
+            NON_COMPLIANT, "ACL grants READ to AllUsers")
+        assert check("s3-bucket-public-write-prohibited", bucket("acl", [(all_users, "READ")]))[0] == COMPLIANT
+        assert check("s3-bucket-public-read-prohibited", bucket("policy", statements=[public_get]))[0] == NON_COMPLIANT
+        assert check("s3-bucket-public-read-prohibited", bucket("vpce", statements=[from_vpc]))[0] == COMPLIANT
+        assert check("s3-bucket-public-read-prohibited", bucket("blocked", [(all_users, "FULL_CONTROL")], [public_get],
+                     account_block={"IgnorePublicAcls": True, "RestrictPublicBuckets": True}))[0] == COMPLIANT
+        assert check("s3-bucket-public-write-prohibited", bucket("acl", [(all_users, "WRITE")],
+                     block={"IgnorePublicAcls": False}))[0] == NON_COMPLIANT
+        assert check("s3-bucket-ssl-requests-only", bucket("ssl", statements=[SSL_ONLY]))[0] == COMPLIANT
+        assert check("s3-bucket-ssl-requests-only", bucket("plain"))[0] == NON_COMPLIANT
+        assert check("s3-bucket-ssl-requests-only", bucket("get", statements=[dict(SSL_ONLY, Action="s3:GetObject")]))[
+            0] == NON_COMPLIANT
+
+    def test_account_rules(self):
+        """Test password policy parameters, root keys, GuardDuty and console MFA."""
+        strong = {"MinimumPasswordLength": 14, "RequireSymbols": True, "RequireNumbers": True,
+                  "RequireUppercaseCharacters": True, "RequireLowercaseCharacters": True, "MaxPasswordAge": 90,
+                  "PasswordReusePrevention": 24}
+        account = {"AccountId": ACCOUNT_ID, "supplementaryConfiguration": {
+            "PasswordPolicy": dict(strong, MinimumPasswordLength=8, MaxPasswordAge=None),
+            "AccountSummary": {"AccountAccessKeysPresent": 1},
+            "GuardDutyDetectors": [{"DetectorId": "d", "Status": "ENABLED", "Administrator": None}]}}
+
+        assert check("iam-password-policy", account) == (
+            NON_COMPLIANT, "MinimumPasswordLength 8 < 14; MaxPasswordAge unset > 90")
+        assert check("iam-password-policy", account, MinimumPasswordLength="8", MaxPasswordAge="0")[0] == NON_COMPLIANT
+        assert check("iam-password-policy", {"AccountId": ACCOUNT_ID, "supplementaryConfiguration": {
+            "PasswordPolicy": strong}})[0] == COMPLIANT
+        assert check("iam-password-policy", {"AccountId": ACCOUNT_ID})[0] == INSUFFICIENT_DATA
+        assert check("iam-root-access-key-check", account)[0] == NON_COMPLIANT
+        assert check("guardduty-enabled-centralized", account)[0] == COMPLIANT
+        assert check("guardduty-enabled-centralized", account, CentralMonitoringAccount="999999999999")[0] \
+            == NON_COMPLIANT
+        assert check("mfa-enabled-for-iam-console-access", {"UserName": "ci", "supplementaryConfiguration": {
+            "LoginProfile": None, "MFADevices": []}})[0] == NOT_APPLICABLE
+        assert check("mfa-enabled-for-iam-console-access", {"UserName": "alice", "supplementaryConfiguration": {
+            "LoginProfile": {"UserName": "alice"}, "MFADevices": []}})[0] == NON_COMPLIANT
+        with pytest.raises(ConfigRuleError, match="MinimumPasswordLength must be an integer"):
+            RULES["iam-password-policy"].parameters({"MinimumPasswordLength": "long"})
+
+
+class TestEvaluate:
+    """Unit tests for incremental evaluation and the compliance matrix."""
+
+    def test_only_changed_items_are_reevaluated(self, store):
+        """Test a re-run reuses cached evaluations and redoes changed, new and re-parameterised ones."""
+        store.write(VOLUME, "us-east-1", ACCOUNT_ID, [volume(f"vol-{index}") for index in range(10)])
+        store.write(BUCKET, GLOBAL, ACCOUNT_ID, [bucket("logs", statements=[SSL_ONLY])])
+        rules = ["encrypted-volumes", "s3-bucket-ssl-requests-only"]
+
+        first = evaluate(store, rules, now=100.0)
+        assert (first.evaluated, first.reused) == (11, 0)
+        store.write(VOLUME, "us-east-1", ACCOUNT_ID, [volume(f"vol-{index}", encrypted=index != 3)
+                                                      for index in range(1, 11)])
+        second = evaluate(store, rules, now=200.0)
+
+        assert (second.evaluated, second.reused) == (2, 9)
+        assert [(evaluation.resource_id, evaluation.cached) for evaluation in second.failing()] == [("vol-3", False)]
+        assert "vol-0" not in {evaluation.resource_id for evaluation in second.evaluations}
+        kept = next(evaluation for evaluation in second.evaluations if evaluation.resource_id == "vol-1")
+        assert kept.recorded_at == 100.0
+        third = evaluate(store, rules, params={"encrypted-volumes": {"kmsId": "key/abc"}}, now=300.0)
+        assert (third.evaluated, third.reused) == (10, 1)
+        assert store.db.execute("SELECT count(*) FROM evaluations").fetchone()[0] == 11
+        with pytest.raises(ConfigRuleError, match="unknown rule 'no-such-rule'"):
+            evaluate(store, ["no-such-rule"])
+
+    def test_matrix_shapes_and_parallel_batches(self, store):
+        """Test the aggregator shapes, the contributor cap and that jobs and chunking do not change results."""
+        store.write(VOLUME, "us-east-1", ACCOUNT_ID, [volume(f"vol-{index:03}", encrypted=index % 2 == 0)
+                                                      for index in range(240)])
+        store.write(ACCOUNT, "us-east-1", ACCOUNT_ID, [{"AccountId": ACCOUNT_ID, "supplementaryConfiguration": {
+            "AccountSummary": {"AccountAccessKeysPresent": 0}}}])
+
+        matrix = evaluate(store, jobs=2, chunk_size=50, now=1729072800.0)
+        rows = {row["ConfigRuleName"]: row for row in matrix.by_rule()["AggregateComplianceByConfigRules"]}
+
+        assert rows["encrypted-volumes"]["Compliance"] == {
+            "ComplianceType": NON_COMPLIANT, "ComplianceContributorCount": {"CappedCount": 100, "CapExceeded": True}}
+        assert rows["iam-root-access-key-check"]["Compliance"] == {"ComplianceType": COMPLIANT}
+        assert rows["iam-password-policy"]["Compliance"] == {"ComplianceType": INSUFFICIENT_DATA}
+        assert (rows["encrypted-volumes"]["AccountId"], rows["encrypted-volumes"]["AwsRegion"]) == (
+            ACCOUNT_ID, "us-east-1")
+        result = matrix.details("encrypted-volumes", [NON_COMPLIANT])["AggregateEvaluationResults"][0]
+        assert result["EvaluationResultIdentifier"]["EvaluationResultQualifier"] == {
+            "ConfigRuleName": "encrypted-volumes", "ResourceType": "AWS::EC2::Volume", "ResourceId": "vol-001"}
+        assert result["ResultRecordedTime"].isoformat() == "2024-10-16T10:00:00+00:00"
+        assert result["Annotation"] == "Volume is not encrypted."
+        resources = matrix.by_resource()["AggregateComplianceByResources"]
+        assert len(resources) == 241
+        assert [(evaluation.rule, evaluation.resource_id, evaluation.compliance) for evaluation in matrix.evaluations] \
+            == [(evaluation.rule, evaluation.resource_id, evaluation.compliance)
+                for evaluation in evaluate(store, now=1.0).evaluations]
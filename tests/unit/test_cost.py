@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+import pytest
+
+from tools.cost import COMPONENTS, CostError, evaluate, load_prices, quantities
+
+
+@pytest.fixture
+def environments(make_plan):
+    return {environment: quantities(make_plan(environment, ha_nat_gateway=environment == "prod",
+                                              multi_az=environment == "prod"))
+            for environment in ("dev", "staging", "prod")}
+
+
+class TestQuantities:
+    """Unit tests for reading billable quantities from a plan."""
+
+    def test_prod_plan(self, environments):
+        """Test the prod plan's NAT gateways, app group, database and monitoring services are counted."""
+        prod = environments["prod"]
+
+        assert (prod["azs"], prod["ha_nat_gateway"], prod["nat_gateways"]) == (3, True, 3)
+        assert (prod["instance_type"], prod["min_size"], prod["max_size"], prod["desired_capacity"]) == (
+            "t3.large", 2, 10, 3)
+        assert (prod["volume_gb"], prod["volume_type"]) == (20, "gp3")
+        assert (prod["db_instance_class"], prod["multi_az"], prod["allocated_storage"]) == ("db.r5.xlarge", True, 100)
+        assert (prod["kms_keys"], prod["log_groups"], prod["log_retention_months"]) == (4, 3, 7.0)
+        assert (prod["guardduty"], prod["config_recorders"], prod["data_event_trails"]) == (1, 1, 1)
+        assert environments["dev"]["nat_gateways"] == 1
+
+
+class TestEvaluate:
+    """Unit tests for pricing variable grids."""
+
+    def test_baseline_components(self, environments):
+        """Test each environment's own configuration prices to the table's list prices."""
+        rows = {row["environment"]: row for row in evaluate(environments).rows()}
+        prod = rows["prod"]
+
+        assert prod["nat_gateway"] == pytest.approx(3 * (730 * 0.045 + 100 * 0.045))
+        assert prod["rds"] == pytest.approx(2 * (730 * 0.5 + 100 * 0.115))
+        assert prod["ec2"] == pytest.approx(3 * 730 * 0.0832)
+        assert prod["performance_insights"] == 0
+        assert prod["monthly"] == pytest.approx(sum(prod[name] for name in COMPONENTS))
+        assert prod["peak"] - prod["monthly"] == pytest.approx(7 * (730 * 0.0832 + 20 * 0.08))
+        assert rows["dev"]["monthly"] < rows["prod"]["monthly"]
+
+    def test_grid_is_sorted_and_skips_impossible_sizes(self, environments):
+        """Test every environment x combination is priced, cheapest first, without min_size above max_size."""
+        grid = {"ha_nat_gateway": ["true", "false"], "multi_az": [True, False],
+                "db_instance_class": ["db.t3.medium", "db.r5.large", "db.r5.xlarge"],
+                "min_size": [1, 2, 4], "max_size": [2, 6], "performance_insights_retention_period": [7, 731]}
+
+        table = evaluate(environments, grid)
+
+        assert len(table) == 3 * 2 * 2 * 3 * 2 * 5
+        monthly = table.columns["monthly"]
+        assert np.all(np.diff(monthly) >= 0)
+        assert np.all(table.columns["min_size"] <= table.columns["max_size"])
+        cheapest = table.rows(1)[0]
+        assert (cheapest["ha_nat_gateway"], cheapest["multi_az"], cheapest["db_instance_class"],
+                cheapest["performance_insights_retention_period"]) == (False, False, "db.t3.medium", 7)
+        insights = table.columns["performance_insights"][table.columns["db_instance_class"] == "db.r5.xlarge"]
+        assert set(insights.tolist()) == {0.0, 4 * 1.5}
+
+    def test_nat_and_multi_az_deltas(self, environments):
+        """Test turning HA NAT off saves two gateways and addresses and Multi-AZ doubles the database."""
+        rows = {(row["ha_nat_gateway"], row["multi_az"]): row for row in evaluate(
+            {"prod": environments["prod"]}, {"ha_nat_gateway": [True, False], "multi_az": [True, False]}).rows()}
+
+        saving = rows[(True, True)]["monthly"] - rows[(False, True)]["monthly"]
+        assert saving == pytest.approx(2 * (730 * 0.045 + 100 * 0.045 + 730 * 0.005))
+        assert rows[(True, True)]["rds"] == pytest.approx(2 * rows[(True, False)]["rds"])
+
+    def test_bad_grids_and_price_tables(self, environments, tmp_path):
+        """Test unknown variables, unpriced classes and unreadable tables raise CostError."""
+        with pytest.raises(CostError, match="unknown variable 'colour'"):
+            evaluate(environments, {"colour": ["blue"]})
+        with pytest.raises(CostError, match="no price for DB instance class 'db.x9.huge'"):
+            evaluate(environments, {"db_instance_class": ["db.x9.huge"]})
+        with pytest.raises(CostError, match="multi_az: expected true or false"):
+            evaluate(environments, {"multi_az": ["sometimes"]})
+        with pytest.raises(CostError, match="cannot read price table"):
+            load_prices(str(tmp_path / "missing.json"))
+
+        prices = load_prices()
+        prices["version"] = "test"
+        prices["nat_gateway"]["hourly"] = 0.0
+        path = tmp_path / "prices.json"
+        path.write_text(json.dumps(prices))
+        table = evaluate(environments, prices=load_prices(str(path)), usage={"nat_gb_per_gateway": 0})
+        assert table.version == "test" and not table.columns["nat_gateway"].any()
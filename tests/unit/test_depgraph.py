@@ -0,0 +1,135 @@
+import pytest
+
+from tools.depgraph import (
+    CREATE_SECONDS, ApplyGraph, DepGraphError, Operation, environment_document, environment_index, placeholders,
+)
+from tools.hcl import TerraformModel
+from tools.plan import PlanIndex
+
+
+def graph_of(*operations):
+    return ApplyGraph({operation.address: operation for operation in operations})
+
+
+def write_module(root, name, text):
+    (root / name).mkdir(parents=True)
+    (root / name / "main.tf").write_text(text)
+
+
+class TestConfiguration:
+    """Unit tests for building the graph from the environment HCL."""
+
+    def test_prod_instances_and_cross_module_edges(self):
+        """Test counts are expanded and references resolve through module inputs and outputs."""
+        index, comments, warnings = environment_index("prod")
+        graph = ApplyGraph.from_index(index)
+
+        assert warnings == []
+        nat = graph.operations["module.networking.aws_nat_gateway.main[2]"]
+        assert set(nat.after) == {"module.networking.aws_internet_gateway.main"} | {
+            f"module.networking.aws_eip.nat[{i}]" for i in range(3)} | {
+            f"module.networking.aws_subnet.public[{i}]" for i in range(3)}
+        assert "module.networking.aws_subnet.private[1]" in graph.operations[
+            "module.database.aws_db_subnet_group.db_subnet_group"].after
+        assert graph.operations["module.database.aws_db_instance.main"].seconds == CREATE_SECONDS[
+            "aws_db_instance+multi_az"]
+        assert not any(address.startswith("module.monitoring.aws_sns_topic_subscription") for address in graph.order)
+        assert not any(dependency.startswith(("module.compute.", "module.database."))
+                       for address in graph.order if address.startswith("module.monitoring.")
+                       for dependency in graph.operations[address].after)
+        dev = ApplyGraph.from_index(environment_index("dev")[0])
+        assert [address for address in dev.order if ".aws_nat_gateway." in address] == [
+            "module.networking.aws_nat_gateway.main[0]"]
+
+    def test_placeholder_inputs(self):
+        """Test literals standing in for module outputs are flagged with the reference to use."""
+        index, comments, _ = environment_index("prod")
+
+        found = {(item.module, item.name): item for item in placeholders(index, comments)}
+
+        assert found["module.monitoring", "asg_name"].suggestion == "module.compute.asg_name"
+        assert found["module.monitoring", "db_instance_id"].suggestion == "module.database.db_instance_id"
+        assert found["module.monitoring", "lb_arn_suffix"].reasons[0] == (
+            "hard-coded, derivable from module.compute.lb_arn")
+        assert found["module.compute", "certificate_arn"].reasons[0] == "placeholder value"
+        assert ("module.compute", "min_size") not in found
+
+    def test_unresolved_counts_and_cycles(self, tmp_path):
+        """Test counts that need apply-time values become one instance with a warning and cycles fail."""
+        write_module(tmp_path / "modules", "app", '''
+variable "names" { default = ["a", "b"] }
+variable "ids" {}
+resource "aws_iam_role" "named" {
+  for_each = toset(var.names)
+}
+resource "aws_security_group" "a" {
+  count  = var.ids == null ? 0 : 2
+  vpc_id = aws_security_group.b.id
+}
+resource "aws_security_group" "b" {
+  vpc_id = aws_security_group.a[0].id
+}
+''')
+        write_module(tmp_path / "environments", "test", '''
+module "app" {
+  source = "../../modules/app"
+  ids    = module.other.ids
+}
+''')
+        modules = TerraformModel(str(tmp_path / "modules"))
+        environments = TerraformModel(str(tmp_path / "environments"))
+
+        document, warnings = environment_document("test", modules, environments)
+
+        assert warnings == [
+            "module.app.aws_iam_role.named: for_each not resolvable offline, counted as one instance",
+            "module.app.aws_security_group.a: count not resolvable offline, counted as one instance"]
+        with pytest.raises(DepGraphError, match="dependency cycle among module.app.aws_security_group.a, "):
+            ApplyGraph.from_index(PlanIndex(document))
+        with pytest.raises(DepGraphError, match="no-such-env"):
+            environment_document("no-such-env", modules, environments)
+
+
+class TestSchedule:
+    """Unit tests for the critical path and the apply simulation."""
+
+    def test_critical_path_and_parallelism(self):
+        """Test the longest chain, the wall clock per -parallelism and that free operations take no slot."""
+        graph = graph_of(
+            Operation("vpc", "aws_vpc", "create", 3.0),
+            Operation("subnet", "aws_subnet", "create", 2.0, ["vpc"]),
+            Operation("nat", "aws_nat_gateway", "create", 120.0, ["subnet"]),
+            Operation("key", "aws_kms_key", "create", 30.0),
+            Operation("db", "aws_db_instance", "create", 600.0, ["key", "subnet"]),
+            Operation("sg", "aws_security_group", "no-op", 0.0, ["vpc"]),
+            Operation("lb", "aws_lb", "create", 180.0, ["sg", "subnet"]))
+
+        assert graph.critical_path() == (630.0, ["key", "db"])
+        assert graph.simulate(None).wall == 630.0 and graph.simulate(None).peak == 3
+        assert graph.simulate(1).wall == graph.work == 935.0
+        two = graph.simulate(2)
+        assert (two.start["lb"], two.start["db"], two.start["nat"], two.wall) == (5.0, 30.0, 185.0, 630.0)
+        assert graph.simulate(None).start["nat"] == 5.0
+        assert two.start["sg"] == two.start["subnet"] == 3.0
+        assert graph.waits_on("db", graph.simulate(None)) == ["key"]
+        with pytest.raises(DepGraphError, match="db waits for unknown subnet"):
+            graph_of(Operation("db", "aws_db_instance", "create", 600.0, ["subnet"]))
+
+    def test_plan_actions_weight_operations(self, make_plan):
+        """Test a plan's no-op resources cost nothing and a replacement costs a delete and a create."""
+        document = make_plan()
+        for change in document["resource_changes"]:
+            change["change"]["actions"] = ["no-op"]
+            if change["type"] == "aws_db_instance":
+                change["change"]["actions"] = ["delete", "create"]
+
+        index = PlanIndex(document)
+        graph = ApplyGraph.from_index(index)
+
+        assert graph.critical_path() == (2 * CREATE_SECONDS["aws_db_instance+multi_az"],
+                                         ["module.database.aws_db_instance.main"])
+        assert graph.work == graph.simulate(1).wall == 2 * CREATE_SECONDS["aws_db_instance+multi_az"]
+        assert {(item.module, item.name, item.suggestion) for item in placeholders(index)} == {
+            ("module.monitoring", "asg_name", "module.compute.asg_name"),
+            ("module.monitoring", "db_instance_id", "module.database.db_instance_id"),
+            ("module.monitoring", "lb_arn_suffix", "module.compute.lb_arn")}
@@ -0,0 +1,148 @@
+import json
+from urllib.parse import quote
+
+import pytest
+
+from tools.drift import (
+    DRIFTED, IN_SYNC, MISSING, WILDCARD, LiveView, canonical_live, canonical_policy, check, digest, project,
+)
+from tools.inventory import TYPES, Snapshot
+
+SG = TYPES["AWS::EC2::SecurityGroup"]
+DB_SG = "module.database.aws_security_group.db_security_group"
+PRIVATE_SG = "module.security.aws_security_group.private"
+PROD_TAGS = {"Environment": "prod", "Project": "financial-infrastructure", "ManagedBy": "terraform",
+             "Compliance": "PCI-DSS,SOC2"}
+
+
+def group(group_id, name, ingress, egress, **extra_tags):
+    tags = dict(PROD_TAGS, Name=name, **extra_tags)
+    return {"GroupId": group_id, "GroupName": name, "Description": "Managed by Terraform", "VpcId": "vpc-1",
+            "IpPermissions": ingress, "IpPermissionsEgress": egress,
+            "Tags": [{"Key": key, "Value": value} for key, value in tags.items()]}
+
+
+def everything(description):
+    return [{"IpProtocol": "-1", "IpRanges": [{"CidrIp": "0.0.0.0/0", "Description": description}]}]
+
+
+def private_group(**extra_tags):
+    return group("sg-private", "prod-private-sg", [{"IpProtocol": "-1", "IpRanges": [
+        {"CidrIp": "10.100.0.0/16", "Description": "Allow all traffic from within the VPC"}]}],
+        everything("Allow all outbound traffic"), **extra_tags)
+
+
+def db_group(group_id="sg-db", name="prod-db-sg"):
+    return group(group_id, name, [{"IpProtocol": "tcp", "FromPort": 5432, "ToPort": 5432, "UserIdGroupPairs": [
+        {"GroupId": "sg-private", "Description": "Allow database connection from application tier"}]}],
+        everything("Allow outbound connections (for updates)"))
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    with Snapshot(str(tmp_path / "inventory.db")) as snapshot:
+        snapshot.write(SG, "us-east-1", "1", [private_group(), db_group()])
+        yield snapshot
+
+
+@pytest.fixture
+def plan(make_plan):
+    return make_plan(include_compute=False, include_monitoring=False)
+
+
+def verdicts(results):
+    return {result.address: result for result in results if result.address in (DB_SG, PRIVATE_SG)}
+
+
+class TestCanonicalForms:
+    """Unit tests for normalizing both sides before hashing."""
+
+    def test_rule_order_and_protocol_spelling_do_not_matter(self, snapshot):
+        """Test one permission with two ranges hashes like two permissions in the other order."""
+        live = LiveView(snapshot)
+        grouped = {"GroupId": "sg-1", "IpPermissions": [
+            {"IpProtocol": "tcp", "FromPort": 443, "ToPort": 443,
+             "IpRanges": [{"CidrIp": "10.0.0.0/8"}, {"CidrIp": "0.0.0.0/0"}]},
+            {"IpProtocol": "-1", "UserIdGroupPairs": [{"GroupId": "sg-1"}]}]}
+        split = {"GroupId": "sg-1", "IpPermissions": [
+            {"IpProtocol": "all", "UserIdGroupPairs": [{"GroupId": "sg-1"}]},
+            {"IpProtocol": "6", "FromPort": 443, "ToPort": 443, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+            {"IpProtocol": "tcp", "FromPort": 443, "ToPort": 443, "IpRanges": [{"CidrIp": "10.0.0.0/8"}]}]}
+
+        canonical = canonical_live("aws_security_group", grouped, live)
+        assert canonical["ingress"] == [["all", None, None, "self", ""], ["tcp", 443, 443, "0.0.0.0/0", ""],
+                                        ["tcp", 443, 443, "10.0.0.0/8", ""]]
+        assert digest(canonical) == digest(canonical_live("aws_security_group", split, live))
+        referencing = {"GroupId": "sg-2", "IpPermissionsEgress": [
+            {"IpProtocol": "tcp", "FromPort": 5432, "ToPort": 5432, "UserIdGroupPairs": [{"GroupId": "sg-db"}]}]}
+        assert canonical_live("aws_security_group", referencing, live)["egress"] == [
+            ["tcp", 5432, 5432, "sg:prod-db-sg", ""]]
+
+    def test_policy_documents(self):
+        """Test single values, statement order and URL-encoded text canonicalize to the same document."""
+        text = json.dumps({"Version": "2012-10-17", "Statement": [
+            {"Effect": "Allow", "Action": "sts:AssumeRole", "Principal": {"Service": "ec2.amazonaws.com"}},
+            {"Effect": "Deny", "Action": ["sts:TagSession", "sts:AssumeRole"], "Principal": "*"}]})
+        reordered = {"Version": "2012-10-17", "Statement": [
+            {"Principal": "*", "Effect": "Deny", "Action": ["sts:AssumeRole", "sts:TagSession"]},
+            {"Principal": {"Service": ["ec2.amazonaws.com"]}, "Action": ["sts:AssumeRole"], "Effect": "Allow"}]}
+
+        assert canonical_policy(text) == canonical_policy(reordered) == canonical_policy(quote(text))
+
+    def test_wildcards_stand_for_any_group_on_the_same_rule(self):
+        """Test an unresolved reference matches any group, but not a CIDR or another port."""
+        planned = {"ingress": [["tcp", 8080, 8080, WILDCARD, "from the load balancer"]], "name": "app"}
+        observed = {"ingress": [["tcp", 8080, 8080, "sg:prod-lb-sg", "from the load balancer"],
+                                ["tcp", 8080, 8080, "sg:prod-bastion-sg", "from the load balancer"],
+                                ["tcp", 8080, 8080, "0.0.0.0/0", "from the load balancer"],
+                                ["tcp", 22, 22, "sg:prod-lb-sg", "from the load balancer"]]}
+
+        assert project(planned, observed) == {"ingress": [
+            ["tcp", 22, 22, "sg:prod-lb-sg", "from the load balancer"],
+            ["tcp", 8080, 8080, "0.0.0.0/0", "from the load balancer"],
+            ["tcp", 8080, 8080, WILDCARD, "from the load balancer"]]}
+
+
+class TestCheck:
+    """Unit tests for matching, diffing and reusing verdicts against a snapshot."""
+
+    def test_matching_by_name_and_by_prior_state_id(self, snapshot, plan):
+        """Test groups are found by name, or by the prior state's ID even when renamed, and absent types are missing."""
+        results = check({"prod": plan}, snapshot)
+
+        assert {address: result.status for address, result in verdicts(results).items()} == {
+            DB_SG: IN_SYNC, PRIVATE_SG: IN_SYNC}
+        assert {result.status for result in results if result.address.endswith("aws_vpc.main")} == {MISSING}
+
+        snapshot.write(SG, "us-east-1", "1", [private_group(), db_group("sg-0renamed", "prod-database-sg")])
+        plan["prior_state"] = {"values": {"root_module": {"child_modules": [{"resources": [
+            {"address": DB_SG, "mode": "managed", "values": {"id": "sg-0renamed"}}]}]}}}
+        renamed = verdicts(check({"prod": plan}, snapshot))[DB_SG]
+
+        assert (renamed.status, renamed.live_id) == (DRIFTED, "sg-0renamed")
+        assert renamed.changes == [("name", "prod-db-sg", "prod-database-sg"),
+                                   ("tags.Name", "prod-db-sg", "prod-database-sg")]
+
+    def test_only_moved_hashes_are_rediffed(self, snapshot, plan):
+        """Test a repeat check reuses every verdict, and a live or planned change re-diffs just that resource."""
+        first = check({"prod": plan}, snapshot)
+        again = check({"prod": plan}, snapshot)
+
+        assert not any(result.cached for result in first) and all(result.cached for result in again)
+        assert [(result.address, result.status) for result in again] == [
+            (result.address, result.status) for result in first]
+
+        snapshot.write(SG, "us-east-1", "1", [private_group(Owner="console"), db_group()])
+        edited = check({"prod": plan}, snapshot)
+
+        assert [result.address for result in edited if not result.cached] == [PRIVATE_SG]
+        assert verdicts(edited)[PRIVATE_SG].changes == [("tags.Owner", None, "console")]
+        assert verdicts(check({"prod": plan}, snapshot))[PRIVATE_SG].status == DRIFTED
+
+        replanned = json.loads(json.dumps(plan).replace("Allow database connection", "Allow connections"))
+        results = check({"prod": replanned}, snapshot)
+
+        assert [result.address for result in results if not result.cached] == [DB_SG]
+        assert verdicts(results)[DB_SG].changes == [("ingress", [
+            ["tcp", 5432, 5432, "sg:prod-private-sg", "Allow connections from application tier"]], [
+            ["tcp", 5432, 5432, "sg:prod-private-sg", "Allow database connection from application tier"]])]
@@ -0,0 +1,128 @@
+import gzip
+
+import numpy as np
+
+from tools.flowlogs import (FlowAggregator, HeavyHitters, SubnetClassifier, analyze, iter_chunks,
+                            parse_chunk)
+
+HEADER = "version account-id interface-id srcaddr dstaddr srcport dstport protocol packets bytes start end action log-status\n"
+RECORDS = [
+    "2 123456789012 eni-0a1b2c3d 10.100.0.10 10.100.3.20 443 49152 6 10 8400 1700000000 1700000060 ACCEPT OK",
+    "2 123456789012 eni-0a1b2c3d 10.100.3.20 10.100.6.5 49153 5432 6 4 1200 1700000000 1700000060 ACCEPT OK",
+    "2 123456789012 eni-0a1b2c3d 203.0.113.9 10.100.0.10 51000 22 6 1 60 1700000000 1700000060 REJECT OK",
+    "2 123456789012 eni-0a1b2c3d 203.0.113.9 10.100.0.11 51001 22 6 1 60 1700000000 1700000060 REJECT OK",
+    "2 123456789012 eni-0a1b2c3d - - - - - - - 1700000000 1700000060 - NODATA",
+]
+
+
+def _write(path, lines, header=True, compress=False):
+    text = (HEADER if header else "") + "\n".join(lines) + "\n"
+    if compress:
+        with gzip.open(path, "wt") as fh:
+            fh.write(text)
+    else:
+        path.write_text(text)
+    return str(path)
+
+
+class TestFlowLogParser:
+    """Unit tests for chunked flow log decoding."""
+
+    def test_parse_chunk_decodes_columns(self):
+        """Test addresses, ports and counters are decoded and NODATA records skipped."""
+        batch = parse_chunk((HEADER + "\n".join(RECORDS) + "\n").encode())
+
+        assert len(batch) == 4
+        assert batch.skipped == 1
+        assert batch.srcaddr[0] == int.from_bytes(bytes([10, 100, 0, 10]), "big")
+        assert batch.dstport.tolist() == [49152, 5432, 22, 22]
+        assert batch.bytes.sum() == 9720
+        assert batch.accepted.tolist() == [True, True, False, False]
+
+    def test_malformed_lines_are_skipped(self):
+        """Test truncated lines do not shift the columns of later records."""
+        data = (RECORDS[0] + "\n" + "2 123456789012 eni-0a1b2c3d 10.0.0.1\n" + RECORDS[1] + "\n").encode()
+
+        batch = parse_chunk(data)
+
+        assert len(batch) == 2
+        assert batch.skipped == 1
+        assert batch.dstport.tolist() == [49152, 5432]
+
+    def test_chunks_split_on_line_boundaries(self, tmp_path):
+        """Test plain and gzip files yield the same records for any chunk size."""
+        lines = RECORDS[:4] * 50
+        plain = _write(tmp_path / "flows.log", lines)
+        packed = _write(tmp_path / "flows.log.gz", lines, compress=True)
+
+        for path in (plain, packed):
+            chunks = list(iter_chunks(path, chunk_size=300))
+            assert len(chunks) > 1
+            assert all(chunk.endswith(b"\n") for chunk in chunks)
+            assert sum(len(parse_chunk(chunk)) for chunk in chunks) == 200
+
+
+class TestFlowAggregations:
+    """Unit tests for top-talker, rejection and per-subnet aggregation."""
+
+    def test_analyze_directory(self, tmp_path):
+        """Test a bucket-like directory is aggregated across files."""
+        day = tmp_path / "AWSLogs" / "123456789012" / "vpcflowlogs" / "us-east-1" / "2024" / "01" / "02"
+        day.mkdir(parents=True)
+        _write(day / "a.log.gz", RECORDS, compress=True)
+        _write(day / "b.log", RECORDS[:2])
+
+        summary = analyze(str(tmp_path), vpc_cidr="10.100.0.0/16", availability_zones=3, top=2)
+        subnets = {subnet.name: subnet for subnet in summary.subnets}
+
+        assert summary.records == 6
+        assert summary.rejected == 2
+        assert summary.top_talkers[0] == ("10.100.0.10", "10.100.3.20", 16800)
+        assert summary.top_rejected == [("203.0.113.9", 22, "tcp/other", 2)]
+        assert subnets["public-1"].tier == "public"
+        assert subnets["public-1"].bytes_out == 16800
+        assert subnets["public-1"].rejected == 2
+        assert subnets["restricted-1"].bytes_in == 2400
+
+    def test_classifier_marks_external_addresses(self):
+        """Test addresses outside every subnet classify as -1."""
+        classifier = SubnetClassifier("10.0.0.0/16", 2)
+        addresses = np.array([0x0A000001, 0x0A000301, 0x0A000601, 0x08080808], dtype=np.uint32)
+
+        positions = classifier.classify(addresses)
+
+        assert [classifier.tiers[p] if p >= 0 else None for p in positions] == [
+            "public", "private", None, None]
+
+    def test_heavy_hitters_bounded(self):
+        """Test the heavy-hitter table never grows past its capacity."""
+        hitters = HeavyHitters(capacity=100)
+        for start in range(0, 5000, 500):
+            keys = np.arange(start, start + 500, dtype=np.uint64)
+            hitters.update(keys)
+        hitters.update(np.full(50, 7, dtype=np.uint64))
+
+        assert len(hitters.counts) <= 100
+        assert hitters.top(1)[0][0] == 7
+
+    def test_heavy_hitters_error_bounds_dropped_keys(self):
+        """Test the error is the heaviest dropped weight and covers a dropped key that outgrows a kept one."""
+        hitters = HeavyHitters(capacity=4)
+        hitters.update(np.arange(1, 6, dtype=np.uint64), np.array([10.0, 9.0, 8.0, 7.0, 6.0]))
+
+        assert hitters.counts == {1: 10.0, 2: 9.0} and hitters.error == 8.0
+
+        hitters.update(np.array([3], dtype=np.uint64), np.array([5.0]))
+
+        # Key 3 really totals 13, more than key 2 kept at 9, and is reported within the error.
+        assert hitters.counts[3] == 5.0 and hitters.counts[3] + hitters.error >= 13.0 > hitters.counts[2]
+
+    def test_aggregator_without_layout(self):
+        """Test aggregation works without a VPC CIDR to classify against."""
+        aggregator = FlowAggregator()
+        aggregator.add(parse_chunk("\n".join(RECORDS).encode()))
+
+        summary = aggregator.result()
+
+        assert summary.records == 4
+        assert summary.subnets == []
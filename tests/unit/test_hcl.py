@@ -0,0 +1,149 @@
+import pytest
+
+from tools.hcl import Expression, HclError, ParseCache, TerraformModel, parse, references
+
+MAIN_TF = '''
+# KMS key for database encryption
+resource "aws_kms_key" "db" {
+  description             = "KMS key for ${var.environment}"
+  deletion_window_in_days = 30
+  enable_key_rotation     = true
+
+  policy = jsonencode({
+    Version   = "2012-10-17"
+    Statement = [{ Effect = "Allow", Action = "kms:*", Resource = "*" }]
+  })
+}
+
+resource "aws_security_group" "app" {
+  vpc_id = var.vpc_id
+
+  ingress {
+    from_port   = 443
+    to_port     = 443
+    cidr_blocks = [var.vpc_cidr]
+  }
+
+  ingress {
+    from_port = -1
+    to_port   = -1
+  }
+}
+
+data "aws_caller_identity" "current" {}
+'''
+
+VARIABLES_TF = '''
+variable "environment" {
+  description = "Environment name"
+  type        = string
+  default     = "dev"
+}
+'''
+
+
+def write_module(root, name, main=MAIN_TF, variables=VARIABLES_TF):
+    module = root / name
+    module.mkdir(parents=True, exist_ok=True)
+    (module / "main.tf").write_text(main)
+    (module / "variables.tf").write_text(variables)
+    return module
+
+
+class TestParse:
+    """Unit tests for the HCL parser."""
+
+    def test_literals_and_nested_blocks(self):
+        """Test literal attributes become Python values and repeated blocks become lists."""
+        blocks = parse(MAIN_TF).blocks
+
+        assert [(block.type, block.labels) for block in blocks] == [
+            ("resource", ["aws_kms_key", "db"]),
+            ("resource", ["aws_security_group", "app"]),
+            ("data", ["aws_caller_identity", "current"]),
+        ]
+        kms, group = blocks[0].body, blocks[1].body
+        assert kms["deletion_window_in_days"] == 30 and kms["enable_key_rotation"] is True
+        assert [rule["from_port"] for rule in group["ingress"]] == [443, -1]
+        assert blocks[2].body == {}
+
+    def test_expressions_keep_source_and_references(self):
+        """Test references, calls and templates are kept unevaluated with their references."""
+        body = parse('''
+count     = var.ha ? length(var.azs) : 1
+subnet_id = aws_subnet.public[count.index].id
+name      = "${var.environment}-nat-$${literal}"
+ids       = [for s in aws_subnet.private : s.id if s.tags.Tier != local.skip]
+script    = <<-EOT
+  echo ${var.region}
+  EOT
+''').attributes
+
+        assert body["count"] == Expression("var.ha ? length(var.azs) : 1", ("var.ha", "var.azs"))
+        assert body["subnet_id"].references == ("aws_subnet.public", "count.index")
+        assert body["name"].references == ("var.environment",)
+        assert body["ids"].references == ("aws_subnet.private", "local.skip")
+        assert references(body["script"]) == ["var.region"]
+        assert parse('name = "plain $${literal}"').attributes["name"] == "plain ${literal}"
+
+    def test_function_arguments_stay_inspectable(self):
+        """Test jsonencode documents are parsed into dicts inside the call expression."""
+        policy = parse(MAIN_TF).blocks[0].body["policy"]
+
+        assert policy.function == "jsonencode"
+        assert policy.args[0]["Statement"][0] == {"Effect": "Allow", "Action": "kms:*", "Resource": "*"}
+
+    def test_syntax_errors_report_the_line(self):
+        """Test malformed input raises HclError with the file and line."""
+        with pytest.raises(HclError, match=r"main.tf:3: expected"):
+            parse('resource "a" "b" {\n  name = "x"\n  = 1\n}\n', "main.tf")
+
+
+class TestTerraformModel:
+    """Unit tests for the lazily loaded, hash-cached module model."""
+
+    def test_lookup_by_address_path(self, tmp_path):
+        """Test dotted paths resolve through resources, nested blocks and variables."""
+        write_module(tmp_path, "database")
+        module = TerraformModel(str(tmp_path))["database"]
+
+        assert module["aws_kms_key.db.enable_key_rotation"] is True
+        assert module["aws_security_group.app.ingress.0.cidr_blocks"][0].source == "var.vpc_cidr"
+        assert module["var.environment.default"] == "dev"
+        assert "data.aws_caller_identity.current" in module
+        assert module.get("aws_kms_key.db.is_enabled") is None
+        assert module.locations["aws_security_group.app"] == ("main.tf", 14)
+        with pytest.raises(KeyError):
+            module["aws_kms_key.missing.arn"]
+
+    def test_modules_parse_lazily(self, tmp_path):
+        """Test only the modules that are asked for are parsed."""
+        write_module(tmp_path, "database")
+        write_module(tmp_path, "monitoring", main="not valid hcl {")
+        model = TerraformModel(str(tmp_path))
+
+        assert model.names() == ["database", "monitoring"]
+        assert model.get("database.aws_kms_key.db.deletion_window_in_days") == 30
+        assert model.cache.misses == 2
+        with pytest.raises(HclError):
+            model["monitoring"]
+
+    def test_disk_cache_reparses_only_changed_files(self, tmp_path):
+        """Test a warm cache re-parses only files whose content hash changed."""
+        module = write_module(tmp_path / "modules", "database")
+        cache_dir = str(tmp_path / "cache")
+        TerraformModel(str(tmp_path / "modules"), ParseCache(cache_dir))["database"]
+
+        (module / "variables.tf").write_text(VARIABLES_TF.replace('"dev"', '"prod"'))
+        warm = ParseCache(cache_dir)
+        database = TerraformModel(str(tmp_path / "modules"), warm)["database"]
+
+        assert (warm.hits, warm.misses) == (1, 1)
+        assert database["var.environment.default"] == "prod"
+        assert database["aws_kms_key.db.deletion_window_in_days"] == 30
+
+    def test_repository_modules(self, terraform_modules):
+        """Test every module in terraform/modules parses and indexes its resources."""
+        assert terraform_modules.names() == ["compute", "database", "monitoring", "networking", "security"]
+        assert terraform_modules["database"]["aws_db_instance.main.storage_encrypted"] is True
+        assert terraform_modules["networking"]["output.vpc_id.value"].references == ("aws_vpc.main.id",)
@@ -0,0 +1,157 @@
+import json
+
+from tools.iam import (CompiledPolicy, PolicyAnalyzer, PolicyCache, document_hash, evaluate_condition,
+                       load_policies, over_grants)
+
+BUCKET = "arn:aws:s3:::app-logs"
+
+
+def policy(*statements):
+    return {"Version": "2012-10-17", "Statement": list(statements)}
+
+
+READ_LOGS = policy({"Sid": "ReadLogs", "Effect": "Allow", "Action": "s3:Get*", "Resource": f"{BUCKET}/*"})
+ADMIN = policy({"Effect": "Allow", "Action": "*", "Resource": "*"})
+NOT_IAM = policy({"Sid": "AllButIam", "Effect": "Allow", "NotAction": ["iam:*"], "Resource": "*"})
+
+
+class TestCompiledPolicy:
+    """Unit tests for compiled policy matching."""
+
+    def test_prefix_wildcard_grants_action(self):
+        """Test s3:Get* grants s3:GetObject, case-insensitively, on matching ARNs only."""
+        compiled = CompiledPolicy(READ_LOGS)
+
+        assert compiled.evaluate("s3:GetObject", f"{BUCKET}/2024/01/app.log") == "allow"
+        assert compiled.evaluate("S3:getobjectacl", f"{BUCKET}/a") == "allow"
+        assert compiled.evaluate("s3:PutObject", f"{BUCKET}/a") is None
+        assert compiled.evaluate("s3:GetObject", "arn:aws:s3:::other/a") is None
+
+    def test_not_action_and_list_resources(self):
+        """Test NotAction excludes actions and list-valued Resource matches any entry."""
+        compiled = CompiledPolicy(policy(
+            {"Effect": "Allow", "NotAction": "iam:*", "Resource": [f"{BUCKET}", f"{BUCKET}/*"]}))
+
+        assert compiled.evaluate("s3:ListBucket", BUCKET) == "allow"
+        assert compiled.evaluate("iam:CreateUser", BUCKET) is None
+        assert compiled.evaluate("s3:ListBucket", "arn:aws:s3:::other") is None
+
+    def test_explicit_deny_wins(self):
+        """Test a matching Deny statement overrides an Allow in the same policy."""
+        compiled = CompiledPolicy(policy(
+            {"Effect": "Allow", "Action": "s3:*", "Resource": "*"},
+            {"Effect": "Deny", "Action": "s3:DeleteBucket", "Resource": "*"},
+        ))
+
+        assert compiled.evaluate("s3:GetObject", BUCKET) == "allow"
+        assert compiled.evaluate("s3:DeleteBucket", BUCKET) == "deny"
+
+    def test_conditions(self):
+        """Test conditions are conditional without context and evaluated with it."""
+        compiled = CompiledPolicy(policy({
+            "Effect": "Allow", "Action": "s3:GetObject", "Resource": "*",
+            "Condition": {"IpAddress": {"aws:SourceIp": "10.100.0.0/16"}, "Bool": {"aws:SecureTransport": True}},
+        }))
+
+        assert compiled.evaluate("s3:GetObject", BUCKET) == "conditional"
+        assert compiled.evaluate("s3:GetObject", BUCKET, {"aws:SourceIp": "10.100.3.4",
+                                                          "aws:securetransport": "true"}) == "allow"
+        assert compiled.evaluate("s3:GetObject", BUCKET, {"aws:SourceIp": "192.0.2.1",
+                                                          "aws:SecureTransport": "true"}) is None
+
+    def test_condition_operator_semantics(self):
+        """Test IfExists, negated operators and ForAllValues on missing or multi-valued keys."""
+        assert evaluate_condition({"StringEqualsIfExists": {"aws:RequestTag/env": "prod"}}, {}) is True
+        assert evaluate_condition({"StringNotEquals": {"aws:RequestTag/env": "prod"}}, {}) is True
+        assert evaluate_condition({"StringLike": {"s3:prefix": "home/*"}}, {"s3:prefix": "home/a"}) is True
+        assert evaluate_condition({"ForAllValues:StringEquals": {"aws:TagKeys": ["env", "team"]}},
+                                  {"aws:TagKeys": ["env", "owner"]}) is False
+        assert evaluate_condition({"ForAllValues:StringEquals": {"aws:TagKeys": ["env", "team"]}}, {}) is True
+        assert evaluate_condition({"ForAnyValue:StringEquals": {"aws:TagKeys": ["env", "team"]}}, {}) is False
+        not_ab = {"StringNotEquals": {"aws:TagKeys": ["a", "b"]}}
+        assert evaluate_condition(not_ab, {"aws:TagKeys": ["c", "d"]}) is True
+        assert evaluate_condition(not_ab, {"aws:TagKeys": ["a", "c"]}) is False
+
+    def test_negated_set_operators(self):
+        """Test ForAllValues and ForAnyValue negate each value, and treat a missing key as the empty set."""
+        for qualifier, both, one, none, missing in (("ForAllValues", False, False, True, True),
+                                                    ("ForAnyValue", False, True, True, False)):
+            block = {f"{qualifier}:StringNotEquals": {"aws:TagKeys": ["a", "b"]}}
+            assert evaluate_condition(block, {"aws:TagKeys": ["a", "b"]}) is both
+            assert evaluate_condition(block, {"aws:TagKeys": ["a", "c"]}) is one
+            assert evaluate_condition(block, {"aws:TagKeys": ["c", "d"]}) is none
+            assert evaluate_condition(block, {}) is missing
+            assert evaluate_condition({f"{qualifier}:StringNotLikeIfExists": {"aws:TagKeys": "a*"}}, {}) is missing
+        assert evaluate_condition({"ForAnyValue:NotIpAddress": {"aws:SourceIp": "10.0.0.0/8"}},
+                                  {"aws:SourceIp": ["10.1.2.3", "192.0.2.1"]}) is True
+        assert evaluate_condition({"ForAllValues:NotIpAddress": {"aws:SourceIp": "10.0.0.0/8"}},
+                                  {"aws:SourceIp": ["10.1.2.3", "192.0.2.1"]}) is False
+        assert evaluate_condition({"DateGreaterThan": {"aws:CurrentTime": "2024-01-01"}}, {}) is None
+
+
+class TestPolicyAnalyzer:
+    """Unit tests for indexed grant queries and over-grant detection."""
+
+    def test_which_policies_grant(self):
+        """Test grants are found through exact, prefix, glob and NotAction statements."""
+        analyzer = PolicyAnalyzer().extend([
+            ("read-logs", READ_LOGS),
+            ("admin", ADMIN),
+            ("not-iam", NOT_IAM),
+            ("objects", policy({"Effect": "Allow", "Action": "s3:*Object", "Resource": "*"})),
+            ("ec2", policy({"Effect": "Allow", "Action": "ec2:DescribeInstances", "Resource": "*"})),
+        ])
+
+        granting = [grant.policy for grant in analyzer.grants("s3:GetObject", f"{BUCKET}/x")]
+        iam = [grant.policy for grant in analyzer.grants("iam:PassRole", "arn:aws:iam::123456789012:role/app")]
+
+        assert granting == ["admin", "not-iam", "objects", "read-logs"]
+        assert iam == ["admin"]
+
+    def test_over_grants(self):
+        """Test wildcard over-grants are classified per statement."""
+        analyzer = PolicyAnalyzer().extend([("read-logs", READ_LOGS), ("admin", ADMIN), ("not-iam", NOT_IAM)])
+
+        findings = {(finding.policy, finding.kind) for finding in analyzer.over_grants()}
+
+        assert findings == {
+            ("read-logs", "action-pattern"),
+            ("admin", "full-admin"),
+            ("not-iam", "not-action"),
+            ("not-iam", "resource-wildcard"),
+        }
+        assert over_grants(policy({"Effect": "Deny", "Action": "*", "Resource": "*"})) == []
+
+    def test_memoized_by_document_hash(self, tmp_path):
+        """Test identical documents compile once and cached findings skip unchanged policies."""
+        cache_path = str(tmp_path / "findings.json")
+        cache = PolicyCache(cache_path)
+        analyzer = PolicyAnalyzer(cache).extend([(f"copy-{i}", json.dumps(ADMIN)) for i in range(5)])
+        analyzer.grants("s3:GetObject", BUCKET)
+        analyzer.over_grants()
+        cache.save()
+
+        assert cache.misses == 1
+        assert len({document_hash(document) for _, document in analyzer.documents.values()}) == 1
+
+        warm = PolicyCache(cache_path)
+        findings = PolicyAnalyzer(warm).extend([("admin", ADMIN)]).over_grants()
+
+        assert warm.misses == 0
+        assert [finding.kind for finding in findings] == ["full-admin"]
+
+    def test_load_policies_from_plan_and_export(self, tmp_path, plan_builder):
+        """Test identity policies are read from plans and authorization details exports."""
+        plan_builder.resource("module.compute", "aws_iam_role_policy", "app", {"policy": json.dumps(READ_LOGS)})
+        (tmp_path / "plan.json").write_text(json.dumps(plan_builder.build()))
+        (tmp_path / "details.json").write_text(json.dumps({
+            "Policies": [{"PolicyName": "Admin", "Arn": "arn:aws:iam::aws:policy/AdministratorAccess",
+                          "PolicyVersionList": [{"IsDefaultVersion": True, "Document": ADMIN}]}],
+            "RoleDetailList": [{"RoleName": "config", "RolePolicyList": [
+                {"PolicyName": "inline", "PolicyDocument": NOT_IAM}]}],
+        }))
+
+        names = [name for name, _ in load_policies(str(tmp_path))]
+
+        assert names == ["arn:aws:iam::aws:policy/AdministratorAccess", "role/config/inline",
+                         "module.compute.aws_iam_role_policy.app"]
@@ -0,0 +1,115 @@
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from tools.inventory import GLOBAL, TYPES, InventoryError, Snapshot, changed_types, refresh
+
+SG = TYPES["AWS::EC2::SecurityGroup"]
+ROLE = TYPES["AWS::IAM::Role"]
+
+
+def group(group_id, vpc_id="vpc-1", **tags):
+    return {"GroupId": group_id, "GroupName": f"name-{group_id}", "VpcId": vpc_id, "IpPermissions": [],
+            "Tags": [{"Key": key, "Value": value} for key, value in tags.items()]}
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    with Snapshot(str(tmp_path / "inventory.db")) as snapshot:
+        yield snapshot
+
+
+class TestChangeMarkers:
+    """Unit tests for mapping CloudTrail events to resource types."""
+
+    def test_event_names_select_types(self):
+        """Test write events mark the types whose nouns they contain, in the event's region or globally."""
+        ingress = {"EventSource": "ec2.amazonaws.com", "EventName": "AuthorizeSecurityGroupIngress"}
+        run = {"EventSource": "ec2.amazonaws.com", "EventName": "RunInstances"}
+        policy = {"EventSource": "iam.amazonaws.com", "EventName": "PutRolePolicy"}
+
+        assert changed_types(ingress, "eu-west-1") == {("AWS::EC2::SecurityGroup", "eu-west-1")}
+        assert {name for name, _ in changed_types(run, "us-east-1")} == {
+            "AWS::EC2::Instance", "AWS::EC2::NetworkInterface", "AWS::EC2::Volume"}
+        assert changed_types(policy, "us-east-1") == {("AWS::IAM::Role", GLOBAL), ("AWS::IAM::Policy", GLOBAL)}
+        assert changed_types({"EventSource": "kms.amazonaws.com", "EventName": "CreateKey"}, "us-east-1") == set()
+
+    def test_tag_events_follow_resource_ids(self):
+        """Test CreateTags marks only the types of the tagged IDs, or the whole service when they are unknown."""
+        tags = {"EventSource": "ec2.amazonaws.com", "EventName": "CreateTags",
+                "Resources": [{"ResourceType": "AWS::EC2::SecurityGroup", "ResourceName": "sg-0abc"},
+                              {"ResourceName": "subnet-0123"}]}
+
+        assert changed_types(tags, "us-east-1") == {("AWS::EC2::SecurityGroup", "us-east-1"),
+                                                    ("AWS::EC2::Subnet", "us-east-1")}
+        assert len(changed_types({**tags, "Resources": []}, "us-east-1")) == 11
+
+
+class TestSnapshot:
+    """Unit tests for the SQLite store."""
+
+    def test_writes_are_diffed_by_digest(self, snapshot):
+        """Test only added, changed and removed resources are reported and rewritten."""
+        assert snapshot.write(SG, "us-east-1", "123456789012", [group("sg-1"), group("sg-2")], 100.0) == (2, 0, 0)
+        assert snapshot.write(SG, "us-east-1", "123456789012", [group("sg-1"), group("sg-2")], 200.0) == (0, 0, 0)
+        assert snapshot.write(SG, "us-east-1", "123456789012", [group("sg-1", Tier="app"), group("sg-3")],
+                              300.0) == (1, 1, 1)
+        assert snapshot.counts() == {("AWS::EC2::SecurityGroup", "us-east-1"): (2, 300.0)}
+        assert snapshot.refreshed() == {("AWS::EC2::SecurityGroup", "us-east-1"): 300.0}
+
+    def test_indexed_queries(self, snapshot):
+        """Test lookups by ID, type, VPC, region and tag, with tags and API items round-tripped."""
+        created = datetime(2024, 10, 16, tzinfo=timezone.utc)
+        snapshot.write(SG, "us-east-1", "1", [group("sg-1", Environment="prod", Name="web"),
+                                              group("sg-2", "vpc-2", Environment="dev")])
+        snapshot.write(SG, "eu-west-1", "1", [group("sg-9", Environment="prod")])
+        snapshot.write(ROLE, GLOBAL, "1", [{"RoleName": "app", "Arn": "arn:aws:iam::1:role/app", "CreateDate": created}])
+
+        assert [r.id for r in snapshot.find(tags={"Environment": "prod"})] == ["sg-9", "sg-1"]
+        assert [r.id for r in snapshot.find(tags={"Environment": "prod"}, region="us-east-1")] == ["sg-1"]
+        assert [r.id for r in snapshot.find(vpc_id="vpc-2")] == ["sg-2"]
+        assert [r.id for r in snapshot.find(tags={"Name": None})] == ["sg-1"]
+        web = snapshot.find(id="sg-1")[0]
+        assert (web.name, web.vpc_id, web.tags) == ("web", "vpc-1", {"Environment": "prod", "Name": "web"})
+        role = snapshot.find(type="AWS::IAM::Role")[0]
+        assert role.name == "app" and role.data["CreateDate"] == "2024-10-16T00:00:00+00:00"
+
+    def test_unknown_types_are_rejected(self, snapshot):
+        """Test asking for a type that is not catalogued raises InventoryError."""
+        with pytest.raises(InventoryError, match="AWS::EC2::Nope"):
+            refresh(snapshot, None, ["us-east-1"], ["AWS::EC2::Nope"])
+
+    def test_unchanged_types_move_the_lookup_window(self, snapshot):
+        """Test types CloudTrail shows unchanged are marked checked, so the next lookup starts there."""
+        snapshot.write(SG, "us-east-1", "1", [group("sg-1")], time.time() - 600)
+        listed = snapshot.refreshed()
+        seen = []
+
+        def changes(clients, regions, since):
+            seen.append(since)
+            return set()
+
+        for _ in range(2):
+            assert refresh(snapshot, None, ["us-east-1"], ["AWS::EC2::SecurityGroup"], changes=changes) == ({}, {})
+
+        assert seen[0] == listed[("AWS::EC2::SecurityGroup", "us-east-1")] < seen[1]
+        assert seen[1] < snapshot.checked()[("AWS::EC2::SecurityGroup", "us-east-1")]
+        assert snapshot.refreshed() == listed
+
+    def test_version_1_snapshots_are_migrated(self, tmp_path):
+        """Test a snapshot written before the checked marker opens with its listing time as the marker."""
+        path = str(tmp_path / "old.db")
+        db = sqlite3.connect(path)
+        db.executescript("CREATE TABLE refreshes (type TEXT NOT NULL, region TEXT NOT NULL, account TEXT, "
+                         "refreshed_at REAL NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (type, region)) "
+                         "WITHOUT ROWID;"
+                         "INSERT INTO refreshes VALUES ('AWS::EC2::VPC', 'us-east-1', '1', 100.0, 2);"
+                         "PRAGMA user_version = 1;")
+        db.close()
+
+        with Snapshot(path) as snapshot:
+            assert snapshot.checked() == {("AWS::EC2::VPC", "us-east-1"): 100.0}
+            snapshot.mark_checked([("AWS::EC2::VPC", "us-east-1")], 200.0)
+            assert snapshot.checked() == {("AWS::EC2::VPC", "us-east-1"): 200.0}
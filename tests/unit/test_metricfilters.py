@@ -0,0 +1,166 @@
+import calendar
+import gzip
+
+import pytest
+
+from tools.metricfilters import (
+    Alarm, MetricFilter, PatternError, compile_pattern, evaluate_alarm, load_monitoring, parse_timestamp, replay,
+)
+
+SECURE_LOG = [
+    "Oct 16 10:00:01 ip-10-100-3-17 sshd[2211]: Failed password for root from 203.0.113.9 port 51234 ssh2",
+    "Oct 16 10:00:02 ip-10-100-3-17 sshd[2211]: Failed password for invalid user admin from 203.0.113.9 port 51240 ssh2",
+    "Oct 16 10:00:09 ip-10-100-3-17 sshd[2214]: Accepted publickey for ec2-user from 10.100.0.5 port 50022 ssh2",
+    "Oct 16 10:01:00 ip-10-100-3-17 sudo: ec2-user : TTY=pts/0 ; PWD=/home/ec2-user ; USER=root ; COMMAND=/bin/yum update",
+    "Oct 16 10:01:05 ip-10-100-3-17 sudo: ec2-user : TTY=pts/0 ; PWD=/home/ec2-user ; USER=postgres ; COMMAND=/bin/psql",
+]
+CLOUDTRAIL_EVENTS = [
+    '{"eventTime": "2024-10-16T10:02:00Z", "eventName": "AuthorizeSecurityGroupIngress", "requestParameters": {}}',
+    '{"eventTime": "2024-10-16T10:02:30Z", "eventName": "DescribeSecurityGroups"}',
+]
+APACHE = '127.0.0.1 - frank [10/Oct/2000:13:25:15 -0700] "GET /apache_pb.html HTTP/1.0" 404 1534'
+
+
+def at(minute, second=0):
+    """Epoch seconds for 2024-10-16 10:00 plus ``minute`` minutes."""
+    return calendar.timegm((2024, 10, 16, 10, 0, 0)) + minute * 60 + second
+
+
+class TestPatterns:
+    """Unit tests for compiling filter patterns."""
+
+    def test_term_patterns(self):
+        """Test terms are ANDed, ? terms ORed, - terms excluded and quoted phrases literal."""
+        line = "2024-10-16T10:00:00Z ERROR payment gateway timeout"
+
+        assert compile_pattern("ERROR timeout").match(line) is not None
+        assert compile_pattern("ERROR -timeout").match(line) is None
+        assert compile_pattern("?WARN ?timeout").match(line) is not None
+        assert compile_pattern('"gateway timeout"').match(line) is not None
+        assert compile_pattern('"timeout gateway"').match(line) is None
+        assert compile_pattern("gate*y").match(line) is not None
+        assert compile_pattern("").match(line) is not None
+
+    def test_space_delimited_patterns(self):
+        """Test fields split on blanks, keep quoted and bracketed fields whole and support ``...``."""
+        pattern = compile_pattern('[ip, user, username, timestamp, request = "*html*", status_code = 4*, bytes > 1000]')
+
+        assert pattern.match(APACHE) == {
+            "ip": "127.0.0.1", "user": "-", "username": "frank", "timestamp": "10/Oct/2000:13:25:15 -0700",
+            "request": "GET /apache_pb.html HTTP/1.0", "status_code": "404", "bytes": "1534"}
+        assert compile_pattern("[..., status_code = 5* || status_code = 404, bytes]").match(APACHE) is not None
+        assert compile_pattern("[ip, ..., bytes < 1000]").match(APACHE) is None
+        assert compile_pattern("[ip, user]").match(APACHE) is None
+
+    def test_json_patterns(self):
+        """Test selectors, comparisons, boolean operators and existence checks on JSON events."""
+        event = ('{"eventName": "RunInstances", "errorCode": null, "latency": 250, "readOnly": false,'
+                 ' "resources": [{"type": "AWS::EC2::Instance"}, {"type": "AWS::EC2::Subnet"}]}')
+
+        assert compile_pattern("{ $.eventName = Run* && $.latency >= 250 }").match(event) is not None
+        assert compile_pattern("{ ($.eventName = Stop*) || ($.latency > 1000) }").match(event) is None
+        assert compile_pattern("{ $.errorCode IS NULL && $.readOnly IS FALSE }").match(event) is not None
+        assert compile_pattern("{ $.userIdentity.type NOT EXISTS }").match(event) is not None
+        assert compile_pattern('{ $.resources[*].type = "AWS::EC2::Subnet" }').match(event) is not None
+        assert compile_pattern('{ $.resources[0].type = "AWS::EC2::Subnet" }').match(event) is None
+        assert compile_pattern("{ $.eventName = RunInstances }").match("not json") is None
+
+    def test_invalid_patterns(self):
+        """Test malformed patterns raise PatternError."""
+        for pattern in ("{ $.eventName = X", "{ $.latency > fast }", "{ eventName = X }", '"unterminated'):
+            with pytest.raises(PatternError):
+                compile_pattern(pattern)
+
+
+@pytest.fixture(scope="module")
+def monitoring(terraform_modules):
+    filters, alarms = load_monitoring(terraform_modules)
+    return {metric_filter.name: metric_filter for metric_filter in filters}, alarms
+
+
+class TestMonitoringFilters:
+    """The monitoring module's filters against real log lines."""
+
+    def matching(self, metric_filter, lines):
+        return [number for number, line in enumerate(lines) if metric_filter.matcher.match(line) is not None]
+
+    def test_secure_log_filters(self, monitoring):
+        """Test failed_logins and sudo_commands match the /var/log/secure lines they are meant for."""
+        filters, _ = monitoring
+
+        assert self.matching(filters["failed_logins"], SECURE_LOG) == [0, 1]
+        assert self.matching(filters["sudo_commands"], SECURE_LOG) == [3]
+
+    def test_security_group_changes_filter(self, monitoring):
+        """Test the CloudTrail filter matches mutating security group calls only."""
+        filters, _ = monitoring
+
+        assert self.matching(filters["security_group_changes"], CLOUDTRAIL_EVENTS) == [0]
+        assert self.matching(filters["security_group_changes"], SECURE_LOG) == []
+
+    def test_alarms_are_linked_by_metric(self, monitoring):
+        """Test each alarm is loaded with the period, statistic and threshold from the module."""
+        filters, alarms = monitoring
+        by_name = {alarm.name: alarm for alarm in alarms}
+
+        assert by_name["failed_logins"] == Alarm("failed_logins", "FailedLoginAttempts", "GreaterThanThreshold",
+                                                 5.0, 300, 1, "Sum")
+        assert {alarm.metric_name for alarm in alarms} <= {f.metric_name for f in filters.values()}
+
+
+class TestReplay:
+    """Unit tests for replaying log files and evaluating alarms."""
+
+    FAILED = MetricFilter("failed_logins", "Failed password for * from * port * ssh2", "FailedLoginAttempts")
+
+    def write_secure_log(self, path, compress=False):
+        """Two quiet minutes, a burst of 8 failures at 10:07, then quiet until 10:20."""
+        lines = []
+        for minute, count in ((0, 1), (2, 2), (7, 8), (20, 1)):
+            for second in range(count):
+                lines.append(f"Oct 16 10:{minute:02d}:{second:02d} host sshd[1]: Failed password for root "
+                             f"from 203.0.113.{second} port {40000 + second} ssh2")
+                lines.append(f"Oct 16 10:{minute:02d}:{second:02d} host sshd[1]: Connection closed by 203.0.113.9")
+        text = "\n".join(lines) + "\n"
+        if compress:
+            with gzip.open(path, "wt") as fh:
+                fh.write(text)
+        else:
+            path.write_text(text)
+        return str(path)
+
+    def test_timestamps(self):
+        """Test syslog, ISO 8601 and CloudTrail eventTime timestamps are understood."""
+        assert parse_timestamp(SECURE_LOG[0], 2024) == at(0, 1)
+        assert parse_timestamp("2024-10-16T12:00:00+02:00 message", 2024) == at(0)
+        assert parse_timestamp(CLOUDTRAIL_EVENTS[0], 1999) == at(2)
+        assert parse_timestamp("no timestamp here", 2024) is None
+
+    def test_replay_buckets_and_alarm_transitions(self, tmp_path):
+        """Test matches are bucketed per period and the alarm fires only for the 10:05 period."""
+        result = replay(self.write_secure_log(tmp_path / "secure.log"), [self.FAILED], year=2024, chunk_size=256)
+        alarm = Alarm("failed_logins", "FailedLoginAttempts", "GreaterThanThreshold", 5, 300)
+        datapoints = result.datapoints("failed_logins", alarm.period, alarm.statistic)
+
+        assert result.lines == 24 and result.matches == {"failed_logins": 12}
+        assert datapoints == {at(0): 3, at(5): 8, at(20): 1}
+        transitions = evaluate_alarm(alarm, datapoints, *result.span())
+        assert [(t.timestamp, t.state) for t in transitions] == [
+            (at(0), "OK"), (at(5), "ALARM"), (at(10), "INSUFFICIENT_DATA"), (at(20), "OK")]
+
+        alarm.treat_missing_data = "notBreaching"
+        alarm.evaluation_periods = alarm.datapoints_to_alarm = 2
+        assert evaluate_alarm(alarm, datapoints, *result.span())[1:] == []
+
+    def test_parallel_replay_matches_serial(self, tmp_path):
+        """Test worker processes and gzip input give the same buckets as a serial scan."""
+        plain = self.write_secure_log(tmp_path / "secure.log")
+        self.write_secure_log(tmp_path / "secure.1.log.gz", compress=True)
+        filters = [self.FAILED, MetricFilter("closed", "[..., word = closed, by, ip]", "Closed")]
+
+        serial = replay(str(tmp_path), filters, jobs=1, year=2024, chunk_size=300)
+        parallel = replay([str(tmp_path)], filters, jobs=2, year=2024, chunk_size=300)
+
+        assert parallel.buckets == serial.buckets and parallel.matches == serial.matches
+        assert serial.matches == {"failed_logins": 24, "closed": 24}
+        assert replay(plain, filters, year=2024).datapoints("closed")[at(7)] == 8
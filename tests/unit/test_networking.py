@@ -1,7 +1,10 @@
+import ipaddress
 import pytest
 import json
 from unittest.mock import Mock, patch
 
+from tools.cidr import find_overlaps, subnet_layout
+
 
 class TestNetworkingModule:
     """Unit tests for the networking Terraform module."""
@@ -17,42 +20,71 @@ class TestNetworkingModule:
         for cidr in invalid_cidrs:
             assert not self._validate_cidr(cidr), f"CIDR {cidr} should be invalid"
     
-    def test_subnet_count(self):
+    def test_subnet_count(self, terraform_modules):
         """Test that correct number of subnets are created."""
-        availability_zones = ["us-east-1a", "us-east-1b", "us-east-1c"]
+        networking = terraform_modules["networking"]
+        subnets = networking.of_type("aws_subnet")
         
-        # Should create 3 public, 3 private, and 3 restricted subnets
-        expected_subnet_count = len(availability_zones) * 3
-        assert expected_subnet_count == 9
+        # Should create one public, one private and one restricted subnet per AZ
+        assert sorted(subnets) == ["aws_subnet.private", "aws_subnet.public", "aws_subnet.restricted"]
+        for address, subnet in subnets.items():
+            assert subnet["count"].source == "length(var.availability_zones)", f"{address} should be one per AZ"
     
-    def test_subnet_cidr_calculation(self):
+    def test_subnet_cidr_calculation(self, terraform_modules):
         """Test subnet CIDR calculation logic."""
         vpc_cidr = "10.0.0.0/16"
         availability_zones = ["us-east-1a", "us-east-1b", "us-east-1c"]
         
-        # Expected subnet layout
+        # Layout produced by cidrsubnet(var.vpc_cidr, 8, count.index + k * length(var.availability_zones))
         expected_subnets = {
-            "public": ["10.0.1.0/24", "10.0.2.0/24", "10.0.3.0/24"],
-            "private": ["10.0.11.0/24", "10.0.12.0/24", "10.0.13.0/24"],
-            "restricted": ["10.0.21.0/24", "10.0.22.0/24", "10.0.23.0/24"]
+            "public": ["10.0.0.0/24", "10.0.1.0/24", "10.0.2.0/24"],
+            "private": ["10.0.3.0/24", "10.0.4.0/24", "10.0.5.0/24"],
+            "restricted": ["10.0.6.0/24", "10.0.7.0/24", "10.0.8.0/24"]
+        }
+        
+        netnums = {
+            "public": "count.index",
+            "private": "count.index + length(var.availability_zones)",
+            "restricted": "count.index + 2 * length(var.availability_zones)"
         }
+        for tier, netnum in netnums.items():
+            cidr_block = terraform_modules["networking"][f"aws_subnet.{tier}.cidr_block"]
+            assert cidr_block.source == f"cidrsubnet(var.vpc_cidr, 8, {netnum})", f"{tier} layout drifted"
         
-        # Verify subnet CIDR blocks don't overlap
-        all_subnets = []
-        for subnet_type, cidrs in expected_subnets.items():
-            all_subnets.extend(cidrs)
+        layout = subnet_layout(vpc_cidr, availability_zones)
+        assert {tier: [str(n) for n in nets] for tier, nets in layout.items()} == expected_subnets
         
-        assert len(all_subnets) == len(set(all_subnets)), "Subnet CIDRs must be unique"
+        # Verify subnet CIDR blocks don't overlap, including across sizes
+        all_subnets = [network for networks in layout.values() for network in networks]
+        assert find_overlaps(all_subnets) == [], "Subnet CIDRs must not overlap"
     
-    def test_nat_gateway_high_availability(self):
+    def test_environment_vpcs_do_not_overlap(self, terraform_environments):
+        """Test the environments' VPCs and subnets can be peered without overlap."""
+        pairs = []
+        for environment in terraform_environments.names():
+            variables = terraform_environments[environment]
+            vpc_cidr = variables["var.vpc_cidr.default"]
+            pairs.append((environment, vpc_cidr))
+            for networks in subnet_layout(vpc_cidr, variables["var.availability_zones.default"]).values():
+                pairs.extend((environment, network) for network in networks)
+        
+        overlaps = find_overlaps(pairs, labelled=True)
+        
+        assert sorted({environment for environment, _ in pairs}) == ["dev", "prod", "staging"]
+        conflicts = [f"{overlap.inner_label} {overlap.inner} overlaps {overlap.outer_label} {overlap.outer}"
+                     for overlap in overlaps
+                     if overlap.kind == "duplicate" or overlap.outer_label != overlap.inner_label]
+        assert conflicts == [], "environment CIDRs must not overlap"
+    
+    def test_nat_gateway_high_availability(self, terraform_modules, terraform_environments):
         """Test NAT gateway configuration for high availability."""
-        availability_zones = ["us-east-1a", "us-east-1b", "us-east-1c"]
-        enable_nat_gateway = True
+        networking = terraform_modules["networking"]
         
-        if enable_nat_gateway:
-            # Should create one NAT gateway per AZ for HA
-            expected_nat_gateways = len(availability_zones)
-            assert expected_nat_gateways >= 2, "Should have at least 2 NAT gateways for HA"
+        # Should create one NAT gateway per AZ for HA, with its own EIP and private route table
+        assert networking["var.ha_nat_gateway.default"] is False
+        for address in ("aws_nat_gateway.main", "aws_eip.nat", "aws_route_table.private"):
+            assert networking[f"{address}.count"].source == "var.ha_nat_gateway ? length(var.availability_zones) : 1"
+        assert terraform_environments["prod"]["module.networking.ha_nat_gateway"] is True, "Production must use HA NAT gateways"
     
     def test_flow_logs_configuration(self):
         """Test VPC flow logs are properly configured."""
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from tools.planstream import PlanStream, PlanStreamError, ResourceChange
+
+
+@pytest.fixture
+def plan(make_plan):
+    """The prod plan with a prior state, a replaced database, an updated group and a non-ASCII tag."""
+    document = make_plan()
+    document["prior_state"] = {"format_version": "1.0",
+                               "values": {"root_module": document["planned_values"]["root_module"]}}
+    for change in document["resource_changes"]:
+        if change["type"] == "aws_db_instance":
+            change["change"]["actions"] = ["delete", "create"]
+            change["action_reason"] = "replace_because_cannot_update"
+        elif change["type"] == "aws_autoscaling_group":
+            change["change"]["actions"] = ["update"]
+            change["change"]["before"] = dict(change["change"]["after"], max_size=4)
+        elif change["type"] == "aws_vpc":
+            change["change"]["after"]["tags"]["Owner"] = "équipe réseau ✓"
+    return document
+
+
+def write(path, document, **kwargs):
+    path.write_text(json.dumps(document, ensure_ascii=False, **kwargs), encoding="utf-8")
+    return str(path)
+
+
+class TestStreaming:
+    """Unit tests for walking a plan file in chunks."""
+
+    @pytest.mark.parametrize("chunk_size", [5, 4096])
+    def test_changes_match_json_load(self, plan, tmp_path, chunk_size):
+        """Test every change, blob and header value equals json.load's, whatever the chunk size."""
+        path = write(tmp_path / "plan.json", plan, indent=2)
+        stream = PlanStream(path, chunk_size=chunk_size)
+
+        changes = list(stream.changes())
+
+        assert [change.address for change in changes] == [change["address"] for change in plan["resource_changes"]]
+        for view, change in zip(changes, plan["resource_changes"]):
+            assert (view.type, view.actions, view.before, view.after, view.after_unknown) == (
+                change["type"], change["change"]["actions"], change["change"]["before"], change["change"]["after"],
+                change["change"].get("after_unknown", {}))
+        assert stream.header == {"format_version": plan["format_version"],
+                                 "terraform_version": plan["terraform_version"]}
+        vpc = next(change for change in changes if change.type == "aws_vpc")
+        assert vpc.after["tags"]["Owner"] == "équipe réseau ✓"
+        stream.close()
+
+    def test_records_stop_at_array_elements(self, plan, tmp_path):
+        """Test only single resources are decoded whole and child modules are walked."""
+        stream = PlanStream(write(tmp_path / "plan.json", plan))
+
+        paths = {path for path, *_ in stream.records()}
+
+        assert ("prior_state", "values", "root_module", "child_modules", "*", "resources", "*") in paths
+        assert ("resource_changes", "*") in paths
+        assert ("configuration", "root_module", "module_calls", "database", "module", "resources", "*") in paths
+        assert not any(path[-2:] == ("child_modules", "*") for path in paths)
+
+    def test_blobs_are_decoded_on_access(self, plan, tmp_path):
+        """Test views hold no blobs until accessed and again after release."""
+        with PlanStream(write(tmp_path / "plan.json", plan)) as stream:
+            group = next(change for change in stream.changes() if change.type == "aws_autoscaling_group")
+
+            assert group._change is None and not hasattr(group, "__dict__")
+            assert group.changed_attributes() == ["max_size", "vpc_zone_identifier"]
+            assert group._change is not None
+            group.release()
+            assert group._change is None and group.before["max_size"] == 4
+        assert ResourceChange("aws_vpc.main", "", "managed", "aws_vpc", "main").after is None
+
+
+class TestSummary:
+    """Unit tests for the change summary."""
+
+    def test_counts_and_stateful_replacements(self, plan, tmp_path):
+        """Test action counts per module and type and the flagged database replacement."""
+        plan["resource_changes"].append({"address": "data.aws_caller_identity.current", "mode": "data",
+                                         "type": "aws_caller_identity", "name": "current",
+                                         "change": {"actions": ["read"]}})
+        summary = PlanStream(write(tmp_path / "plan.json", plan)).summary()
+
+        assert summary.resources == len(plan["resource_changes"])
+        assert summary.actions == {"create": len(plan["resource_changes"]) - 3, "update": 1, "replace": 1}
+        assert summary.by_module["module.database", "replace"] == 1
+        assert summary.by_type["aws_autoscaling_group", "update"] == 1
+        assert summary.stateful == [("module.database.aws_db_instance.main", "replace",
+                                     "replace_because_cannot_update")]
+        rows = dict((row[0], row[1:]) for row in summary.table("type"))
+        assert rows["aws_db_instance"] == (0, 0, 1, 0)
+
+    def test_malformed_files(self, tmp_path):
+        """Test truncated documents, trailing data and numbers split across chunks."""
+        (tmp_path / "cut.json").write_text('{"resource_changes": [{"address": "aws_vpc.main", "type": "aws_vpc"')
+        (tmp_path / "trailing.json").write_text('{"resource_changes": []} []')
+        (tmp_path / "split.json").write_text('{"format_version": 12345678, "resource_changes": []}')
+
+        with pytest.raises(PlanStreamError, match="invalid JSON at byte 67"):
+            list(PlanStream(str(tmp_path / "cut.json"), chunk_size=8).changes())
+        with pytest.raises(PlanStreamError, match="unexpected data at byte 25"):
+            list(PlanStream(str(tmp_path / "trailing.json")).changes())
+        stream = PlanStream(str(tmp_path / "split.json"), chunk_size=4)
+        assert list(stream.changes()) == [] and stream.header == {"format_version": 12345678}
@@ -0,0 +1,158 @@
+import pytest
+
+from tools.reachability import (
+    INTERNET, AclEntry, Network, NetworkAcl, Route, RouteTable, Rule, SecurityGroup, Subnet, Traffic, Workload,
+    from_plan, traffic_mask,
+)
+
+LB = "module.compute.aws_lb.app_lb"
+APP = "module.compute.aws_autoscaling_group.app_asg"
+DB = "module.database.aws_db_instance.main"
+DB_SG = "module.database.aws_security_group.db_security_group"
+APP_SG = "module.compute.aws_security_group.app_security_group"
+
+
+def tiered_network(acl_ingress=None):
+    """A public web tier and a private app tier behind a NACL."""
+    subnets = [Subnet("public", "10.0.1.0/24"), Subnet("private", "10.0.11.0/24")]
+    groups = [
+        SecurityGroup("sg-web", [Rule("tcp", 443, 443, ("0.0.0.0/0",))], [Rule("-1", cidrs=("0.0.0.0/0",))]),
+        SecurityGroup("sg-app", [Rule("tcp", 8080, 8080, groups=("sg-web",)), Rule("tcp", 22, 22, ("10.0.0.0/16",))],
+                      [Rule("-1", cidrs=("0.0.0.0/0",))]),
+    ]
+    acls = [NetworkAcl("acl-private", ("private",),
+                       acl_ingress or [AclEntry(100, "allow", "-1", "0.0.0.0/0")],
+                       [AclEntry(100, "allow", "-1", "0.0.0.0/0")])]
+    tables = [RouteTable("rtb-public", ("public",), [Route("10.0.0.0/16", "local"), Route("0.0.0.0/0", "igw")]),
+              RouteTable("rtb-private", ("private",), [Route("10.0.0.0/16", "local")])]
+    workloads = [Workload("web", ("public",), ("sg-web",)), Workload("app", ("private",), ("sg-app",))]
+    return Network(subnets, groups, acls, tables, workloads, ["10.0.0.0/16"])
+
+
+class TestTraffic:
+    """Unit tests for the protocol/port bitsets."""
+
+    def test_masks_and_ranges(self):
+        """Test rules compile to bit ranges per protocol and render compactly."""
+        traffic = Traffic(traffic_mask("tcp", 443, 443) | traffic_mask("6", 1024, 2047) | traffic_mask("icmp", 8))
+
+        assert traffic.allows("tcp", 443) and traffic.allows("tcp", 1500) and traffic.allows("icmp", 8)
+        assert not traffic.allows("tcp", 80) and not traffic.allows("udp", 443)
+        assert traffic.ranges() == {"tcp": [(443, 443), (1024, 2047)], "icmp": [(8, 8)]}
+        assert str(traffic) == "tcp:443, tcp:1024-2047, icmp:8"
+        assert str(Traffic(traffic_mask("-1"))) == "all"
+        assert traffic_mask("50") == 0
+
+
+class TestNetwork:
+    """Unit tests for reachability evaluation and incremental updates."""
+
+    def test_security_group_references_and_routes(self):
+        """Test SG-to-SG rules match by attachment and only routed subnets reach the internet."""
+        network = tiered_network()
+
+        assert str(network.traffic(INTERNET, "web")) == "tcp:443"
+        assert str(network.traffic("web", "app")) == "tcp:22, tcp:8080"
+        assert not network.traffic("app", INTERNET)
+        assert not network.traffic(INTERNET, "app")
+
+    def test_nacl_rules_apply_in_rule_number_order(self):
+        """Test the lowest-numbered matching NACL rule decides, and replies need the ephemeral range."""
+        network = tiered_network([AclEntry(200, "allow", "-1", "0.0.0.0/0"),
+                                  AclEntry(100, "deny", "tcp", "10.0.1.0/24", 22, 22)])
+        assert str(network.traffic("web", "app")) == "tcp:8080"
+
+        network.set_network_acl(NetworkAcl("acl-private", ("private",), [AclEntry(100, "allow", "-1", "0.0.0.0/0")],
+                                           [AclEntry(100, "allow", "tcp", "0.0.0.0/0", 0, 1023)]))
+        assert not network.traffic("web", "app")
+
+    def test_incremental_update_recomputes_affected_cells(self):
+        """Test changing one security group re-evaluates only cells involving workloads that carry it."""
+        network = tiered_network()
+        network.set_workload(Workload("bastion", ("public",), ("sg-bastion",)))
+        network.matrix()
+        evaluations = network.evaluations
+
+        network.set_security_group(SecurityGroup("sg-app", [Rule("tcp", 8443, 8443, groups=("sg-web",))],
+                                                 [Rule("-1", cidrs=("0.0.0.0/0",))]))
+        matrix = network.matrix()
+
+        # 15 cells in all; the 7 with "app" at either end are re-evaluated.
+        assert (evaluations, network.evaluations - evaluations) == (15, 7)
+        assert matrix.allows("web", "app", "tcp", 8443) and not matrix.allows("web", "app", "tcp", 8080)
+        assert not matrix.allows("bastion", "app", "tcp", 22)
+
+    def test_new_cidr_boundaries_rebuild_atoms(self):
+        """Test a rule with a CIDR inside a subnet splits it, so only part of the subnet matches."""
+        network = tiered_network()
+        network.set_workload(Workload("ops", ("public",), ("sg-ops",)))
+        network.set_security_group(SecurityGroup("sg-ops", [], [Rule("-1", cidrs=("0.0.0.0/0",))]))
+        network.set_security_group(SecurityGroup("sg-app", [Rule("tcp", 22, 22, ("10.0.1.128/25",))], []))
+
+        assert network.traffic("ops", "app").allows("tcp", 22)
+        assert network.matrix("subnet")["public", "private"].allows("tcp", 22)
+
+    def test_other_vpcs_need_peering_routes(self):
+        """Test a second VPC is reachable only once both route tables send the other VPC over peering."""
+        subnets = [Subnet("a", "10.0.1.0/24", vpc_id="vpc-a"), Subnet("a2", "10.0.2.0/24", vpc_id="vpc-a"),
+                   Subnet("b", "10.1.1.0/24", vpc_id="vpc-b")]
+        groups = [SecurityGroup("sg-open", [Rule("-1", cidrs=("10.0.0.0/8",))], [Rule("-1", cidrs=("0.0.0.0/0",))])]
+        tables = [RouteTable("rtb-a", ("a", "a2"), [Route("10.0.0.0/16", "local")]),
+                  RouteTable("rtb-b", ("b",), [Route("10.1.0.0/16", "local")])]
+        workloads = [Workload(name, (name,), ("sg-open",)) for name in ("a", "a2", "b")]
+        network = Network(subnets, groups, [], tables, workloads, ["10.0.0.0/16", "10.1.0.0/16"])
+
+        assert network.traffic("a", "a2") and not network.traffic("a", "b") and not network.traffic("b", "a")
+
+        network.set_route_table(RouteTable("rtb-a", ("a", "a2"), [Route("10.0.0.0/16", "local"),
+                                                                  Route("10.1.0.0/16", "peering")]))
+        assert not network.traffic("a", "b")
+
+        network.set_route_table(RouteTable("rtb-b", ("b",), [Route("10.1.0.0/16", "local"),
+                                                             Route("10.0.0.0/16", "tgw")]))
+        assert network.traffic("a", "b") and network.traffic("b", "a2")
+
+
+class TestFromPlan:
+    """Unit tests for building the network from plan JSON."""
+
+    @pytest.fixture
+    def network(self, prod_plan):
+        return from_plan(prod_plan)
+
+    def test_internet_reaches_only_the_load_balancer_on_443(self, network):
+        """Test the only inbound path from the internet is HTTPS to the load balancer."""
+        matrix = network.matrix()
+
+        assert str(matrix[INTERNET, LB]) == "tcp:443"
+        assert not matrix[INTERNET, APP] and not matrix[INTERNET, DB]
+        assert matrix.allows(APP, INTERNET, "tcp", 443)
+
+    def test_database_is_unreachable_from_public_tiers(self, network):
+        """Test nothing in the public subnets or on the internet reaches PostgreSQL."""
+        matrix = network.matrix("subnet")
+
+        for source in [subnet for subnet in network.subnets if ".public[" in subnet] + [INTERNET]:
+            for destination in network.workloads[DB].subnets:
+                assert not matrix.allows(source, destination, "tcp", 5432)
+
+    def test_application_wiring(self, network):
+        """Test app -> db and lb -> app follow the security group references actually wired up."""
+        assert network.workloads[DB].security_groups == (DB_SG,)
+        # The database admits the security module's private group, which the app instances don't carry.
+        assert not network.traffic(APP, DB).allows("tcp", 5432)
+        assert not network.traffic(LB, APP).allows("tcp", 8080)
+
+        db_group = network.security_groups[DB_SG]
+        network.set_security_group(SecurityGroup(DB_SG, [Rule("tcp", 5432, 5432, groups=(APP_SG,))], db_group.egress))
+        assert network.traffic(APP, DB).allows("tcp", 5432)
+        assert not network.traffic(LB, DB)
+
+    def test_restricted_subnets_have_no_internet_route(self, network):
+        """Test the restricted tier's route table has no default route."""
+        restricted = [subnet for subnet in network.subnets if ".restricted[" in subnet]
+        network.set_workload(Workload("probe", tuple(restricted), (APP_SG,)))
+
+        assert len(restricted) == 3
+        assert not network.traffic("probe", INTERNET)
+        assert network.traffic("probe", LB).allows("tcp", 443)
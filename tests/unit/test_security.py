@@ -2,6 +2,9 @@ import pytest
 import json
 from unittest.mock import Mock, patch
 
+from tools.configrules import RULES
+from tools.iam import over_grants
+
 
 class TestSecurityModule:
     """Unit tests for the security Terraform module."""
@@ -22,34 +25,18 @@ class TestSecurityModule:
             ]
         }
         
-        # Check no wildcard actions
-        for statement in iam_policy["Statement"]:
-            for action in statement.get("Action", []):
-                assert "*" not in action, f"Action {action} should not use wildcards"
-        
-        # Check no wildcard resources
-        for statement in iam_policy["Statement"]:
-            resource = statement.get("Resource", "")
-            if isinstance(resource, list):
-                for r in resource:
-                    assert r != "*", "Resource should not be wildcard"
-            else:
-                assert resource != "*", "Resource should not be wildcard"
+        assert over_grants(iam_policy) == [], "Policy should not grant wildcard actions or resources"
     
-    def test_kms_key_rotation(self):
+    def test_kms_key_rotation(self, terraform_modules):
         """Test KMS keys have rotation enabled."""
-        kms_config = {
-            "enable_key_rotation": True,
-            "deletion_window_in_days": 30,
-            "is_enabled": True,
-            "policy": {
-                "Version": "2012-10-17",
-                "Statement": []
-            }
-        }
+        kms_keys = list(terraform_modules.of_type("aws_kms_key"))
+        assert len(kms_keys) == 4
         
-        assert kms_config["enable_key_rotation"] is True, "KMS key rotation must be enabled"
-        assert kms_config["deletion_window_in_days"] >= 7, "Deletion window must be at least 7 days"
+        for module, address, kms_config in kms_keys:
+            assert kms_config["enable_key_rotation"] is True, f"{module}.{address}: KMS key rotation must be enabled"
+            assert kms_config["deletion_window_in_days"] >= 7, f"{module}.{address}: Deletion window must be at least 7 days"
+        
+        assert terraform_modules["database"]["aws_kms_key.db_encryption_key.enable_key_rotation"] is True
     
     def test_security_hub_standards(self):
         """Test Security Hub standards are enabled."""
@@ -64,48 +51,29 @@ class TestSecurityModule:
         for standard in required_standards:
             assert any(standard in s for s in enabled_standards), f"{standard} must be enabled"
     
-    def test_guardduty_configuration(self):
+    def test_guardduty_configuration(self, terraform_modules):
         """Test GuardDuty is properly configured."""
-        guardduty_config = {
-            "enable": True,
-            "finding_publishing_frequency": "SIX_HOURS",
-            "datasources": {
-                "s3_logs": {"enable": True},
-                "kubernetes": {"audit_logs": {"enable": True}},
-                "malware_protection": {"scan_ec2_instance_with_findings": {"enable": True}}
-            }
-        }
+        guardduty_config = terraform_modules["monitoring"]["aws_guardduty_detector.main"]
         
         assert guardduty_config["enable"] is True, "GuardDuty must be enabled"
         assert guardduty_config["finding_publishing_frequency"] in ["FIFTEEN_MINUTES", "ONE_HOUR", "SIX_HOURS"], \
             "Valid publishing frequency required"
-        assert guardduty_config["datasources"]["s3_logs"]["enable"] is True, "S3 log monitoring must be enabled"
     
-    def test_cloudtrail_configuration(self):
+    @pytest.mark.xfail(reason="the monitoring module does not configure GuardDuty data sources yet", strict=True)
+    def test_guardduty_s3_protection(self, terraform_modules):
+        """Test GuardDuty monitors S3 data events."""
+        assert terraform_modules["monitoring"]["aws_guardduty_detector.main.datasources.s3_logs.enable"] is True, \
+            "S3 log monitoring must be enabled"
+    
+    def test_cloudtrail_configuration(self, terraform_modules):
         """Test CloudTrail logging configuration."""
-        cloudtrail_config = {
-            "is_multi_region_trail": True,
-            "is_organization_trail": True,
-            "enable_log_file_validation": True,
-            "enable_logging": True,
-            "event_selector": [
-                {
-                    "read_write_type": "All",
-                    "include_management_events": True,
-                    "data_resource": [
-                        {
-                            "type": "AWS::S3::Object",
-                            "values": ["arn:aws:s3:::*/"]
-                        }
-                    ]
-                }
-            ],
-            "kms_key_id": "arn:aws:kms:us-east-1:123456789012:key/12345678-1234-1234-1234-123456789012"
-        }
+        cloudtrail_config = terraform_modules["monitoring"]["aws_cloudtrail.main"]
         
         assert cloudtrail_config["is_multi_region_trail"] is True, "Must be multi-region trail"
         assert cloudtrail_config["enable_log_file_validation"] is True, "Log file validation must be enabled"
-        assert cloudtrail_config["kms_key_id"] is not None, "CloudTrail logs must be encrypted"
+        assert cloudtrail_config["kms_key_id"].references == ("aws_kms_key.cloudtrail_kms_key.arn",), \
+            "CloudTrail logs must be encrypted"
+        assert cloudtrail_config["event_selector"][0]["include_management_events"] is True
     
     def test_config_rules(self):
         """Test AWS Config rules for compliance."""
@@ -122,35 +90,16 @@ class TestSecurityModule:
             "guardduty-enabled-centralized"
         ]
         
-        enabled_rules = [
-            "encrypted-volumes",
-            "rds-encryption-enabled",
-            "s3-bucket-public-read-prohibited",
-            "s3-bucket-public-write-prohibited",
-            "s3-bucket-ssl-requests-only",
-            "iam-root-access-key-check",
-            "mfa-enabled-for-iam-console-access",
-            "iam-password-policy",
-            "vpc-flow-logs-enabled",
-            "guardduty-enabled-centralized"
-        ]
-        
+        enabled_rules = set(RULES)
+
         for rule in required_config_rules:
-            assert rule in enabled_rules, f"Config rule {rule} must be enabled"
+            assert rule in enabled_rules, f"Config rule {rule} must be evaluated by tools.configrules"
     
-    def test_password_policy(self):
+    @pytest.mark.xfail(reason="no module sets the account-wide password policy yet; it needs its own change",
+                       raises=KeyError, strict=True)
+    def test_password_policy(self, terraform_modules):
         """Test IAM password policy meets security requirements."""
-        password_policy = {
-            "minimum_password_length": 14,
-            "require_lowercase_characters": True,
-            "require_uppercase_characters": True,
-            "require_numbers": True,
-            "require_symbols": True,
-            "allow_users_to_change_password": True,
-            "max_password_age": 90,
-            "password_reuse_prevention": 24,
-            "hard_expiry": False
-        }
+        password_policy = terraform_modules["security"]["aws_iam_account_password_policy.strict"]
         
         assert password_policy["minimum_password_length"] >= 14, "Minimum password length must be at least 14"
         assert password_policy["require_lowercase_characters"] is True, "Must require lowercase"
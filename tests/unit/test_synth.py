@@ -0,0 +1,102 @@
+import filecmp
+import os
+
+import pytest
+
+from tools.audit import analyze as analyze_audit
+from tools.cidr import find_overlaps
+from tools.depgraph import ApplyGraph
+from tools.flowlogs import analyze as analyze_flows
+from tools.iam import load_policies
+from tools.metricfilters import load_monitoring, replay
+from tools.plan import PlanIndex
+from tools.synth import Scale, SynthError, build_environment_plan, environments, nest, plans, write_corpus
+
+SMALL = Scale(policies=20, log_mb=0.05, hosts=3)
+
+
+def files_under(directory):
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, _, names in os.walk(directory) for name in names)
+
+
+class TestPlans:
+    """Unit tests for the scaled plan documents."""
+
+    def test_asgs_and_rules_extend_the_environment(self):
+        """Test extra ASGs bring their own launch template and target group and rules land on the private group."""
+        index = PlanIndex(build_environment_plan(asgs=3, rules=2))
+
+        asg = index.by_address["module.compute.aws_autoscaling_group.app_asg_2"]
+        assert asg.values["name"] == "prod-app-2-asg"
+        assert index.references(asg, "launch_template") == ["aws_launch_template.app_launch_template_2.id"]
+        assert len(index.of_type("aws_lb_target_group")) == 3
+        ingress = index.by_address["module.security.aws_security_group.private"].values["ingress"]
+        assert [(rule["from_port"], rule["cidr_blocks"]) for rule in ingress[1:]] == [
+            (1024, ["172.16.0.0/24"]), (1025, ["172.16.1.0/24"])]
+        assert len(PlanIndex(build_environment_plan()).of_type("aws_autoscaling_group")) == 1
+
+    def test_environments_cycle_and_nest(self):
+        """Test environments cycle through the real settings and nest with resolvable references."""
+        scale = Scale(environments=5)
+
+        names = [name for name, _ in environments(scale)]
+        named = list(plans(scale))
+        index = PlanIndex(nest(named))
+
+        assert names == ["prod", "staging", "dev", "prod1", "staging1"]
+        assert [settings["vpc_cidr"] for _, settings in environments(scale)] == [
+            "10.100.0.0/16", "10.1.0.0/16", "10.0.0.0/16", "10.103.0.0/16", "10.104.0.0/16"]
+        assert len(index.resources) == sum(len(plan["resource_changes"]) for _, plan in named)
+        assert index.by_address["module.prod1.module.networking.aws_vpc.main"].values["cidr_block"] == "10.103.0.0/16"
+        graph = ApplyGraph.from_index(index)
+        assert "module.staging1.module.networking.aws_subnet.private[1]" in graph.operations[
+            "module.staging1.module.database.aws_db_subnet_group.db_subnet_group"].after
+
+    def test_scale_multiplies_counts_and_wraps_cidrs(self):
+        """Test times() scales the counts but not the shape and VPC blocks only overlap past 156 environments."""
+        assert find_overlaps([settings["vpc_cidr"] for _, settings in environments(Scale(environments=156))]) == []
+        assert find_overlaps([settings["vpc_cidr"] for _, settings in environments(Scale(environments=157))])
+        assert Scale(environments=2, policies=5, log_mb=0.5, hosts=1, azs=2).times(10) == Scale(
+            environments=20, policies=50, log_mb=5.0, hosts=10, azs=2)
+        with pytest.raises(SynthError, match="azs must be between 1 and 6"):
+            Scale(azs=7)
+
+
+class TestCorpus:
+    """Unit tests for the written corpora."""
+
+    def test_same_seed_same_bytes(self, tmp_path):
+        """Test a scale and seed always write identical files and another seed changes the logs."""
+        first = write_corpus(str(tmp_path / "a"), SMALL)
+        write_corpus(str(tmp_path / "b"), SMALL)
+        write_corpus(str(tmp_path / "c"), Scale(policies=20, log_mb=0.05, hosts=3, seed=8))
+
+        names = files_under(tmp_path / "a")
+        assert "audit/i-00000000000000002/audit.log" in names and "plans/staging.json" in names
+        assert names == files_under(tmp_path / "b")
+        _, mismatch, errors = filecmp.cmpfiles(tmp_path / "a", tmp_path / "b", names, shallow=False)
+        assert (mismatch, errors) == ([], [])
+        assert not filecmp.cmp(tmp_path / "a" / "flow.log", tmp_path / "c" / "flow.log", shallow=False)
+        assert first["counts"]["environments"] == 3 and first["counts"]["policies"] == 23
+
+    def test_corpora_parse_with_the_tools(self, tmp_path):
+        """Test the flow, audit, syslog and IAM corpora read back in full with the expected findings."""
+        manifest = write_corpus(str(tmp_path), SMALL)
+        counts, files = manifest["counts"], manifest["files"]
+
+        flows = analyze_flows(str(tmp_path / files["flow_log"]), "10.100.0.0/16")
+        assert (flows.records, flows.skipped, flows.error) == (counts["flow_records"], 0, 0)
+        assert 0 < flows.rejected < flows.records
+        audit = analyze_audit(str(tmp_path / files["audit"]))
+        assert (audit.events, audit.orphans) == (counts["audit_events"], 0)
+        assert sorted(row[0] for row in audit.by_host()) == [
+            "i-00000000000000000", "i-00000000000000001", "i-00000000000000002"]
+        assert dict(row[:2] for row in audit.by_key())["modules"] >= 300
+        filters, _ = load_monitoring()
+        result = replay(str(tmp_path / files["logs"]), filters, year=2024)
+        assert result.lines == counts["log_lines"]
+        assert result.matches["failed_logins"] and result.matches["sudo_commands"]
+        policies = list(load_policies(str(tmp_path / files["iam"])))
+        assert len(policies) == counts["policies"]
+        assert policies[-1][0] == "role/dev-ec2-role/app"
@@ -0,0 +1 @@
+"""Python tooling for validating and analysing the Terraform configuration."""
@@ -0,0 +1,428 @@
+"""AWS API call instrumentation for the test suite and the tools.
+
+:func:`install` wraps ``botocore.session.Session.create_client`` so every
+client created afterwards -- boto3's included -- gets three handlers on its
+event system: ``before-call`` (registered first, so stubs and moto's
+in-process responders cannot skip it) notes the start time and request
+size, ``after-call`` records latency, retry attempts, response size and
+the error code of a failed response, and ``after-call-error`` records
+calls that raised before a response arrived.  :func:`attach` does the same
+for a client that already exists.
+
+Calls are aggregated per ``(scope, service, operation)`` into counters and
+a latency histogram with quarter-octave buckets, so memory does not grow
+with the number of calls and recording costs a few microseconds per call.
+A scope is a pytest node ID, a tool run (``tools.inventory snapshot``) or
+whatever :meth:`Recorder.scoped` names.  A :class:`Recorder` exports to and
+merges from JSON, renders text histograms and folded stacks
+(``scope;service;operation milliseconds``) for ``flamegraph.pl`` or
+speedscope, and :func:`compare` lists the scopes whose call count or p95
+latency regressed past a stored baseline.
+
+:mod:`tools.pytest_apicalls` records the test suite per test, and
+``python -m tools.apicalls run MODULE ARGS...`` runs a tool's CLI
+in-process under a recorder.
+"""
+
+import bisect
+import contextlib
+import json
+import math
+import runpy
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+import botocore.session
+import click
+
+DEFAULT_SCOPE = "-"
+# Quarter-octave latency buckets from 0.1 ms to about 100 s; the last bucket is open-ended.
+EDGES = tuple(0.0001 * 2 ** (index / 4) for index in range(81))
+_CALL = "apicalls"
+_lock = threading.Lock()
+_active = None
+_original_create_client = None
+
+
+@dataclass
+class OperationStats:
+    """Counters and latency histogram for one operation in one scope."""
+
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    slowest: float = 0.0
+    sent: int = 0
+    received: int = 0
+    histogram: list = field(default_factory=lambda: [0] * (len(EDGES) + 1))
+
+    def add(self, seconds, retries, sent, received, error):
+        self.calls += 1
+        self.errors += error
+        self.retries += retries
+        self.seconds += seconds
+        self.slowest = max(self.slowest, seconds)
+        self.sent += sent
+        self.received += received
+        self.histogram[bisect.bisect_left(EDGES, seconds)] += 1
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.retries += other.retries
+        self.seconds += other.seconds
+        self.slowest = max(self.slowest, other.slowest)
+        self.sent += other.sent
+        self.received += other.received
+        self.histogram = [mine + theirs for mine, theirs in zip(self.histogram, other.histogram)]
+        return self
+
+    def percentile(self, fraction):
+        """Upper edge of the bucket holding the ``fraction`` quantile, capped at the slowest call."""
+        if not self.calls:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.calls))
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(EDGES[index] if index < len(EDGES) else self.slowest, self.slowest)
+        return self.slowest
+
+
+@dataclass
+class Regression:
+    """A scope whose ``metric`` (``calls`` or ``p95``) moved from ``baseline`` to ``current``."""
+
+    scope: str
+    metric: str
+    baseline: float
+    current: float
+
+
+class Recorder:
+    """Aggregates recorded calls per ``(scope, service, operation)``."""
+
+    def __init__(self):
+        self.stats = {}
+        self.scope = DEFAULT_SCOPE
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def scoped(self, name):
+        """Attribute calls made inside the block, from any thread, to scope ``name``."""
+        previous, self.scope = self.scope, name
+        try:
+            yield self
+        finally:
+            self.scope = previous
+
+    def record(self, service, operation, seconds, retries=0, sent=0, received=0, error=False):
+        key = (self.scope, service, operation)
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = OperationStats()
+            stats.add(seconds, retries, sent, received, error)
+
+    def scopes(self):
+        return sorted({scope for scope, _, _ in self.stats})
+
+    def totals(self, scope=None, by=("scope",)):
+        """``{group: OperationStats}`` summed over ``scope`` (or every scope), grouped by the ``by`` parts."""
+        positions = [("scope", "service", "operation").index(part) for part in by]
+        grouped = {}
+        for key, stats in self.stats.items():
+            if scope is None or key[0] == scope:
+                group = tuple(key[position] for position in positions)
+                grouped.setdefault(group if len(group) > 1 else group[0], OperationStats()).merge(stats)
+        return grouped
+
+    def merge(self, other):
+        for key, stats in other.stats.items():
+            self.stats.setdefault(key, OperationStats()).merge(stats)
+        return self
+
+    def to_dict(self):
+        return {"version": 1, "edges": len(EDGES), "stats": [
+            {"scope": scope, "service": service, "operation": operation, "calls": stats.calls,
+             "errors": stats.errors, "retries": stats.retries, "seconds": stats.seconds, "slowest": stats.slowest,
+             "sent": stats.sent, "received": stats.received, "histogram": stats.histogram}
+            for (scope, service, operation), stats in sorted(self.stats.items())]}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("edges") != len(EDGES):
+            raise ValueError("recording uses a different latency histogram")
+        recorder = cls()
+        for entry in data["stats"]:
+            recorder.stats[entry["scope"], entry["service"], entry["operation"]] = OperationStats(
+                entry["calls"], entry["errors"], entry["retries"], entry["seconds"], entry["slowest"],
+                entry["sent"], entry["received"], list(entry["histogram"]))
+        return recorder
+
+    def dump(self, path):
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fh:
+            return cls.from_dict(json.load(fh))
+
+    def folded(self):
+        """Folded stacks ``scope;service;operation milliseconds``, one per line, for flame graphs."""
+        return [f"{scope.replace(';', ':')};{service};{operation} {max(1, round(stats.seconds * 1000))}"
+                for (scope, service, operation), stats in sorted(self.stats.items())]
+
+
+def histogram(stats, width=40):
+    """Text histogram of the non-empty latency buckets of ``stats``, fastest first."""
+    counts = stats.histogram
+    peak = max(counts)
+    lines = []
+    for index, count in enumerate(counts):
+        if count:
+            low = EDGES[index - 1] * 1000 if index else 0.0
+            high = f"{EDGES[index] * 1000:9.2f}" if index < len(EDGES) else "      inf"
+            lines.append(f"{low:9.2f} - {high} ms {count:>8} {'#' * math.ceil(width * count / peak)}")
+    return lines
+
+
+def compare(current, baseline, call_slack=0, latency_factor=1.5, latency_floor=0.005):
+    """Scopes of ``current`` that regressed against ``baseline``.
+
+    A scope regresses when it makes more than ``call_slack`` calls more
+    than its baseline, or when its p95 latency exceeds ``latency_factor``
+    times the baseline p95 by more than ``latency_floor`` seconds.  Scopes
+    missing from the baseline are new and never regress.
+    """
+    before, after = baseline.totals(), current.totals()
+    found = []
+    for scope, stats in sorted(after.items()):
+        base = before.get(scope)
+        if base is None:
+            continue
+        if stats.calls > base.calls + call_slack:
+            found.append(Regression(scope, "calls", base.calls, stats.calls))
+        old, new = base.percentile(0.95), stats.percentile(0.95)
+        if new > old * latency_factor and new - old > latency_floor:
+            found.append(Regression(scope, "p95", old, new))
+    return found
+
+
+# -- botocore hooks ------------------------------------------------------------
+
+
+def _size(body):
+    if body is None:
+        return 0
+    if isinstance(body, dict):
+        return len(urlencode(body, doseq=True))
+    return len(body) if isinstance(body, (bytes, str)) else 0
+
+
+def _before_call(model, params, context, **kwargs):
+    if _active is not None:
+        # after-call-error carries no model, so the operation travels with the start time.
+        context[_CALL] = (model.service_model.service_name, model.name, _size(params.get("body")),
+                          time.perf_counter())
+
+
+def _after_call(http_response, parsed, context, **kwargs):
+    call = context.pop(_CALL, None)
+    if _active is None or call is None:
+        return
+    service, operation, sent, started = call
+    metadata = parsed.get("ResponseMetadata") or {}
+    _active.record(service, operation, time.perf_counter() - started, metadata.get("RetryAttempts", 0), sent,
+                   int(http_response.headers.get("content-length") or 0), http_response.status_code >= 300)
+
+
+def _after_call_error(context, **kwargs):
+    call = context.pop(_CALL, None)
+    if _active is None or call is None:
+        return
+    service, operation, sent, started = call
+    _active.record(service, operation, time.perf_counter() - started, 0, sent, 0, True)
+
+
+def attach(client):
+    """Instrument an existing client; attaching twice is harmless."""
+    events = client.meta.events
+    events.register_first("before-call", _before_call, unique_id="tools.apicalls.before-call")
+    events.register("after-call", _after_call, unique_id="tools.apicalls.after-call")
+    events.register("after-call-error", _after_call_error, unique_id="tools.apicalls.after-call-error")
+    return client
+
+
+def install(recorder=None):
+    """Record every client's calls into ``recorder`` (a new one by default) and return it."""
+    global _active, _original_create_client
+    with _lock:
+        if _original_create_client is None:
+            original = _original_create_client = botocore.session.Session.create_client
+
+            def create_client(session, *args, **kwargs):
+                return attach(original(session, *args, **kwargs))
+
+            botocore.session.Session.create_client = create_client
+        _active = recorder or Recorder()
+    return _active
+
+
+def uninstall():
+    """Stop recording; clients already attached keep their (now idle) handlers."""
+    global _active, _original_create_client
+    with _lock:
+        if _original_create_client is not None:
+            botocore.session.Session.create_client = _original_create_client
+            _original_create_client = None
+        _active = None
+
+
+def active():
+    """The recorder calls currently go to, or None."""
+    return _active
+
+
+@contextlib.contextmanager
+def recording(scope=DEFAULT_SCOPE, recorder=None):
+    """Install a recorder for the block and yield it, restoring the previous one afterwards."""
+    previous = _active
+    recorder = install(recorder)
+    try:
+        with recorder.scoped(scope):
+            yield recorder
+    finally:
+        if previous is None:
+            uninstall()
+        else:
+            install(previous)
+
+
+def describe(regression):
+    """One line naming the scope, the metric and both values."""
+    if regression.metric == "calls":
+        return f"REGRESSION {regression.scope}: {regression.current} calls (baseline {regression.baseline})"
+    return (f"REGRESSION {regression.scope}: p95 {regression.current * 1000:.1f} ms "
+            f"(baseline {regression.baseline * 1000:.1f} ms)")
+
+
+def report(recorder, top=10, scope=None):
+    """Text summary: totals, the busiest scopes and operations, and the slowest operation's histogram."""
+    operations = recorder.totals(scope, by=("service", "operation"))
+    total = OperationStats()
+    for stats in operations.values():
+        total.merge(stats)
+    lines = [f"{total.calls} calls, {total.errors} errors, {total.retries} retries, {total.seconds:.3f} s, "
+             f"p50 {total.percentile(0.5) * 1000:.2f} ms, p95 {total.percentile(0.95) * 1000:.2f} ms, "
+             f"{total.sent} B sent, {total.received} B received"]
+    if scope is None:
+        lines.append("busiest scopes (calls, seconds, p95 ms):")
+        scopes = sorted(recorder.totals().items(), key=lambda item: (-item[1].calls, item[0]))
+        lines += [f"  {stats.calls:>7} {stats.seconds:9.3f} {stats.percentile(0.95) * 1000:9.2f}  {name}"
+                  for name, stats in scopes[:top]]
+    lines.append("operations (calls, errors, retries, seconds, p50 ms, p95 ms):")
+    ranked = sorted(operations.items(), key=lambda item: (-item[1].seconds, item[0]))
+    lines += [f"  {stats.calls:>7} {stats.errors:>6} {stats.retries:>6} {stats.seconds:9.3f} "
+              f"{stats.percentile(0.5) * 1000:8.2f} {stats.percentile(0.95) * 1000:8.2f}  {service}.{operation}"
+              for (service, operation), stats in ranked[:top]]
+    if ranked:
+        (service, operation), stats = ranked[0]
+        lines.append(f"latency of {service}.{operation}:")
+        lines += [f"  {line}" for line in histogram(stats)]
+    return lines
+
+
+# -- CLI -----------------------------------------------------------------------
+
+
+def _load(path):
+    try:
+        return Recorder.load(path)
+    except (OSError, ValueError, KeyError) as exc:
+        raise click.ClickException(f"cannot read recording {path}: {exc}")
+
+
+def _gate(recorder, baseline, slack, factor):
+    regressions = compare(recorder, _load(baseline), slack, factor)
+    for regression in regressions:
+        click.echo(describe(regression), err=True)
+    return regressions
+
+
+@click.group()
+def main():
+    """AWS API call recordings: run, report, fold and compare."""
+
+
+@main.command("run", context_settings={"ignore_unknown_options": True, "allow_interspersed_args": False})
+@click.option("--json", "json_path", type=click.Path(dir_okay=False), help="Write the recording as JSON.")
+@click.option("--folded", "folded_path", type=click.Path(dir_okay=False), help="Write folded stacks.")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), help="Fail on regressions against it.")
+@click.option("--slack", default=0, show_default=True, help="Extra calls allowed over the baseline.")
+@click.option("--latency-factor", default=1.5, show_default=True, help="Allowed p95 growth factor.")
+@click.argument("module")
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+def run_command(json_path, folded_path, baseline, slack, latency_factor, module, args):
+    """Run MODULE's CLI (e.g. tools.inventory snapshot inv.db) and record its API calls."""
+    scope = " ".join([module, *args[:1]])
+    argv, sys.argv = sys.argv, [module, *args]
+    status = 0
+    try:
+        with recording(scope) as recorder:
+            runpy.run_module(module, run_name="__main__", alter_sys=True)
+    except SystemExit as exc:
+        status = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+    finally:
+        sys.argv = argv
+    for line in report(recorder):
+        click.echo(line, err=True)
+    if json_path:
+        recorder.dump(json_path)
+    if folded_path:
+        with open(folded_path, "w") as fh:
+            fh.write("\n".join(recorder.folded()) + "\n")
+    if baseline and _gate(recorder, baseline, slack, latency_factor) and not status:
+        status = 1
+    raise SystemExit(status)
+
+
+@main.command("report")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--scope", help="Only this scope (a test node ID or tool run).")
+@click.option("--top", default=10, show_default=True, help="Rows per table.")
+def report_command(path, scope, top):
+    """Summarize a JSON recording."""
+    for line in report(_load(path), top, scope):
+        click.echo(line)
+
+
+@main.command("folded")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def folded_command(path):
+    """Print a recording as folded stacks for flamegraph.pl or speedscope."""
+    for line in _load(path).folded():
+        click.echo(line)
+
+
+@main.command("compare")
+@click.argument("current", type=click.Path(exists=True, dir_okay=False))
+@click.argument("baseline", type=click.Path(exists=True, dir_okay=False))
+@click.option("--slack", default=0, show_default=True, help="Extra calls allowed over the baseline.")
+@click.option("--latency-factor", default=1.5, show_default=True, help="Allowed p95 growth factor.")
+def compare_command(current, baseline, slack, latency_factor):
+    """Exit non-zero when CURRENT regressed against BASELINE."""
+    regressions = _gate(_load(current), baseline, slack, latency_factor)
+    if not regressions:
+        click.echo("no regressions")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,609 @@
+"""Streaming analyzer for the auditd logs the app instances ship to CloudWatch.
+
+``user_data.sh`` installs watch rules (``-w /etc/shadow -p wa -k
+shadow_changes``) and syscall rules (``-a always,exit ... -S execve -k
+exec``); :func:`load_rules` reads them back out of the compute module's
+template.  The CloudWatch agent ships ``/var/log/audit/audit.log`` to
+``/${environment}/var/log/audit`` with one log stream per instance.
+
+auditd writes one event as several records -- ``SYSCALL``, ``CWD``,
+``PATH``, ``PROCTITLE`` ... closed by ``EOE`` -- that share the
+``msg=audit(<time>:<serial>)`` stamp and may interleave with other events.
+:class:`Assembler` joins records by ``(node, time, serial)`` and keeps at
+most ``max_open`` events open: an event is complete at its ``EOE``, when it
+is a single-record userspace event (``USER_*``, ``CRED_*`` ...), or when it
+falls more than ``window`` seconds behind the newest record, like
+auparse's end-of-event timeout.
+
+:func:`analyze` memory-maps plain files and cuts them into one range per
+worker just after an ``EOE`` record.  Events still open at a range's end,
+and records whose ``SYSCALL`` lies in an earlier range, come back from the
+worker as fragments and are joined in the parent, so the result does not
+depend on ``jobs``.  Gzip files are streamed whole by one worker.
+
+Events are counted per ``(key, host, auid)`` with failures, executables,
+watched paths and per-minute counts, which :class:`AuditSummary` projects
+into per-key, per-host and per-auid tables.  :func:`anomalies` ranks
+minute bursts per host and key (robust z-score against the series'
+median and MAD), rare ``(auid, key)`` pairs (self-information across all
+events) and hosts with failed events per auid.
+"""
+
+import math
+import mmap
+import os
+import re
+import shlex
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import click
+import numpy as np
+
+from tools.bootpath import _head, launch_template, parse_steps
+from tools.flowlogs import CHUNK_SIZE, GZIP_MAGIC, iter_chunks
+
+RULES_PATH = "/etc/audit/rules.d/"
+# auparse's default end-of-event timeout.
+WINDOW = 2
+MAX_OPEN = 4096
+UNSET_AUID = "unset"
+# Records that only ever accompany another record of the same event.
+PARTS = frozenset({
+    "EXECVE", "CWD", "PATH", "PROCTITLE", "SOCKADDR", "FD_PAIR", "MMAP", "BPRM_FCAPS", "CAPSET", "OBJ_PID",
+    "KERN_MODULE", "NETFILTER_CFG", "IPC", "MQ_OPEN", "MQ_SENDRECV", "MQ_NOTIFY", "MQ_GETSETATTR", "EOE",
+})
+# Records written by userspace (PAM, sudo, sshd, systemd) as complete events on their own.
+USERSPACE = ("USER_", "CRED_", "DAEMON_", "SERVICE_", "SYSTEM_", "ANOM_LOGIN")
+# Fields of a primary record the summary uses.
+SUMMARY_FIELDS = frozenset({"key", "auid", "uid", "exe", "comm", "syscall", "success", "res"})
+# Fields auditd hex-encodes when the value contains blanks, quotes or control characters.
+ENCODED = frozenset({"key", "exe", "comm", "name", "cmd", "acct", "cwd", "proctitle"})
+_HEADER = re.compile(r"(?:node=(\S+) )?type=(\w+) msg=audit\((\d+)\.\d+:(\d+)\): ?")
+_FIELD = re.compile(r"""([\w-]+)=("[^"]*"|'[^']*'|\S+)""")
+_PATH_NAME = re.compile(r'\bname=("[^"]*"|\S+)')
+_HEX = re.compile(r"(?:[0-9A-F]{2})+")
+_ROTATED = re.compile(r"\.(?:log|gz|txt)$|\.log\.\d+$")
+_EOE = b"type=EOE "
+
+
+class AuditError(ValueError):
+    """Audit rules the analyzer cannot read."""
+
+
+@dataclass
+class AuditRule:
+    """One line of ``audit.rules``: a file watch or a syscall rule, by key."""
+
+    key: str
+    kind: str
+    target: str
+    permissions: str = None
+    filters: tuple = ()
+    section: str = ""
+
+
+def parse_rule(line, section=""):
+    """Parse one ``auditctl`` rule line (``-w`` or ``-a``)."""
+    words = shlex.split(line)
+    options, syscalls, filters = {}, [], []
+    for flag, value in zip(words[::2], words[1::2]):
+        if flag == "-S":
+            syscalls.extend(value.split(","))
+        elif flag == "-F":
+            filters.append(value)
+        else:
+            options[flag] = value
+    if len(words) % 2 or "-k" not in options:
+        raise AuditError(f"cannot read rule without a key: {line}")
+    if "-w" in options:
+        return AuditRule(options["-k"], "watch", options["-w"], options.get("-p", "rwxa"), tuple(filters), section)
+    if "-a" in options:
+        return AuditRule(options["-k"], "syscall", ",".join(syscalls) or "all", None, tuple(filters), section)
+    raise AuditError(f"not a watch or syscall rule: {line}")
+
+
+def parse_rules(text):
+    """Rules in an ``audit.rules`` body; comments name the section of the rules below them."""
+    rules, section = [], ""
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#"):
+            section = line.lstrip("#").strip()
+        elif line.startswith(("-w ", "-a ")):
+            rules.append(parse_rule(line, section))
+    return rules
+
+
+def load_rules(model=None, environments=None):
+    """Rules the launch template's user data writes under ``/etc/audit/rules.d/``."""
+    path, _ = launch_template(model, environments)
+    with open(path) as fh:
+        steps = parse_steps(fh.read())
+    for _, _, source in steps:
+        if RULES_PATH in _head(source):
+            return parse_rules(source.split("\n", 1)[1].rsplit("\n", 1)[0])
+    raise AuditError(f"{path} writes no audit rules under {RULES_PATH}")
+
+
+# -- Records and events --------------------------------------------------------
+
+
+def _value(name, raw):
+    if raw[:1] in "\"'":
+        return raw[1:-1]
+    if name in ENCODED:
+        if raw in ("(null)", "(none)", "?"):
+            return None
+        if _HEX.fullmatch(raw):
+            return bytes.fromhex(raw).decode("utf-8", "replace")
+    return raw
+
+
+def parse_fields(text, names=None):
+    """``{name: value}`` of a record body, with hex-encoded strings decoded.
+
+    Userspace records nest their fields in ``msg='...'``; those are read as
+    if they were top level.  Enriched logs append resolved names after a
+    ``\\x1d`` separator, which is dropped.  ``names`` limits the fields decoded.
+    """
+    text = text.split("\x1d", 1)[0]
+    if "msg='" in text:
+        text = text.replace("msg='", "", 1).rstrip("'")
+    return {name: _value(name, raw) for name, raw in _FIELD.findall(text) if names is None or name in names}
+
+
+@dataclass
+class Event:
+    """One audit event joined from its records."""
+
+    node: str
+    time: int
+    serial: int
+    type: str = None
+    keys: tuple = ()
+    auid: str = None
+    uid: str = None
+    exe: str = None
+    syscall: str = None
+    failed: bool = False
+    paths: list = field(default_factory=list)
+    records: int = 0
+    ended: bool = False
+
+    @property
+    def id(self):
+        return self.node, self.time, self.serial
+
+    @property
+    def whole(self):
+        """Whether the event's primary record (``SYSCALL``, ``USER_*`` ...) has been seen."""
+        return self.type is not None
+
+    def add(self, record_type, fields):
+        """Fold one record's fields into the event."""
+        self.records += 1
+        if record_type == "EOE":
+            self.ended = True
+        elif record_type == "PATH":
+            if fields.get("name"):
+                self.paths.append(fields["name"])
+        elif record_type not in PARTS and self.type is None:
+            self.type = record_type
+            key = fields.get("key")
+            self.keys = tuple(key.split("\x01")) if key else ()
+            auid = fields.get("auid")
+            self.auid = UNSET_AUID if auid in ("4294967295", "-1", "unset") else auid
+            self.uid = fields.get("uid")
+            self.exe = fields.get("exe") or fields.get("comm")
+            self.syscall = fields.get("syscall")
+            self.failed = fields.get("success") == "no" or fields.get("res") in ("failed", "0", "no")
+
+    def absorb(self, other):
+        """Join a fragment of the same event found in another range."""
+        if other.whole and not self.whole:
+            self.type, self.keys, self.auid, self.uid = other.type, other.keys, other.auid, other.uid
+            self.exe, self.syscall, self.failed = other.exe, other.syscall, other.failed
+        self.paths.extend(other.paths)
+        self.records += other.records
+        self.ended = self.ended or other.ended
+        return self
+
+
+@dataclass
+class AuditSummary:
+    """Event counts per ``(key, host, auid)`` and the detail behind them.
+
+    ``orphans`` are records whose event never showed its primary record;
+    ``unterminated`` events were closed by the window rather than ``EOE``.
+    Events without a rule key count under their record type, e.g.
+    ``(USER_LOGIN)``.
+    """
+
+    lines: int = 0
+    records: int = 0
+    unparsed: int = 0
+    events: int = 0
+    orphans: int = 0
+    unterminated: int = 0
+    counts: Counter = field(default_factory=Counter)
+    failures: Counter = field(default_factory=Counter)
+    executables: Counter = field(default_factory=Counter)
+    paths: Counter = field(default_factory=Counter)
+    minutes: Counter = field(default_factory=Counter)
+
+    def add(self, event, watched=None):
+        """Count one whole event; paths are kept for keys in ``watched`` (all keys when None)."""
+        self.events += 1
+        if not event.ended:
+            self.unterminated += 1
+        minute = event.time - event.time % 60
+        auid = event.auid or UNSET_AUID
+        for key in event.keys or (f"({event.type})",):
+            self.counts[key, event.node, auid] += 1
+            if event.failed:
+                self.failures[key, event.node, auid] += 1
+            if event.exe:
+                self.executables[key, event.exe] += 1
+            if event.paths and (watched is None or key in watched):
+                self.paths.update((key, path) for path in event.paths)
+            self.minutes[event.node, key, minute] += 1
+
+    def merge(self, other):
+        self.lines += other.lines
+        self.records += other.records
+        self.unparsed += other.unparsed
+        self.events += other.events
+        self.orphans += other.orphans
+        self.unterminated += other.unterminated
+        for name in ("counts", "failures", "executables", "paths", "minutes"):
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+    def _table(self, position):
+        events, failed, spread = Counter(), Counter(), {}
+        for cell, count in self.counts.items():
+            events[cell[position]] += count
+            failed[cell[position]] += self.failures.get(cell, 0)
+            spread.setdefault(cell[position], [set(), set()])
+            others = [part for index, part in enumerate(cell) if index != position]
+            spread[cell[position]][0].add(others[0])
+            spread[cell[position]][1].add(others[1])
+        return [(name, count, failed[name], len(spread[name][0]), len(spread[name][1]))
+                for name, count in events.most_common()]
+
+    def by_key(self):
+        """``(key, events, failed, hosts, auids)`` rows, busiest first."""
+        return self._table(0)
+
+    def by_host(self):
+        """``(host, events, failed, keys, auids)`` rows, busiest first."""
+        return self._table(1)
+
+    def by_auid(self):
+        """``(auid, events, failed, keys, hosts)`` rows, busiest first."""
+        return self._table(2)
+
+    def top_executables(self, key, top=5):
+        return Counter({exe: count for (name, exe), count in self.executables.items() if name == key}).most_common(top)
+
+    def top_paths(self, key, top=5):
+        return Counter({path: count for (name, path), count in self.paths.items() if name == key}).most_common(top)
+
+
+class Assembler:
+    """Joins records into events with a bounded reorder window.
+
+    ``feed`` returns the events it completed.  Events that cannot be
+    finished here -- still open at the end of the input, or missing their
+    primary record -- are collected in ``fragments`` for the caller to join
+    with the neighbouring range.
+    """
+
+    def __init__(self, host, window=WINDOW, max_open=MAX_OPEN):
+        self.host = host
+        self.window = window
+        self.max_open = max_open
+        self.open = OrderedDict()
+        self.fragments = []
+
+    def _finish(self, event, done):
+        (done if event.whole else self.fragments).append(event)
+
+    def feed(self, node, record_type, stamp, serial, fields):
+        done = []
+        node = node or self.host
+        if record_type.startswith(USERSPACE) and (node, stamp, serial) not in self.open:
+            event = Event(node, stamp, serial)
+            event.add(record_type, fields)
+            event.ended = True
+            done.append(event)
+        else:
+            event = self.open.get((node, stamp, serial))
+            if event is None:
+                event = self.open[node, stamp, serial] = Event(node, stamp, serial)
+            event.add(record_type, fields)
+            if event.ended:
+                self._finish(self.open.pop(event.id), done)
+        horizon = stamp - self.window
+        while self.open:
+            oldest = next(iter(self.open.values()))
+            if oldest.time >= horizon and len(self.open) <= self.max_open:
+                break
+            self._finish(self.open.popitem(last=False)[1], done)
+        return done
+
+    def close(self):
+        """Move every open event to ``fragments``: its remaining records may be in the next range."""
+        self.fragments.extend(self.open.values())
+        self.open.clear()
+        return self.fragments
+
+
+# -- Scanning ------------------------------------------------------------------
+
+
+def audit_files(path):
+    """Audit logs under ``path``: ``audit.log``, rotated ``audit.log.N`` and exported parts, in a stable order."""
+    if not os.path.isdir(path):
+        return [path]
+    found = []
+    for root, _, names in os.walk(path):
+        found.extend(os.path.join(root, name) for name in names if _ROTATED.search(name))
+    return sorted(found)
+
+
+def host_of(path):
+    """Host for records without ``node=``, named after the file or its directory.
+
+    CloudWatch Logs exports a log stream -- named after the instance -- as
+    a directory of numbered parts, and collected logs usually sit in a
+    directory per host, so ``i-0abc/000000.gz`` and ``i-0abc/audit.log``
+    both belong to ``i-0abc``; ``i-0abc.log`` does too.
+    """
+    stem = os.path.basename(path).split(".", 1)[0]
+    if stem.isdigit() or stem == "audit":
+        return os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return stem
+
+
+def _ranges(path, pieces):
+    """Split a plain file into up to ``pieces`` byte ranges that each start just after an ``EOE`` record."""
+    with open(path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if pieces <= 1 or not size or fh.read(2) == GZIP_MAGIC:
+            return [(0, None)]
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            bounds = [0]
+            for index in range(1, pieces):
+                eoe = mapped.find(_EOE, max(size * index // pieces, bounds[-1]))
+                newline = mapped.find(b"\n", eoe) if eoe != -1 else -1
+                if newline == -1 or newline + 1 >= size:
+                    break
+                bounds.append(newline + 1)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _chunks(path, start, end, chunk_size):
+    if end is None:
+        yield from iter_chunks(path, chunk_size)
+        return
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        while start < end:
+            stop = min(start + chunk_size, end)
+            if stop < end:
+                newline = mapped.rfind(b"\n", start, stop)
+                if newline == -1:
+                    newline = mapped.find(b"\n", stop, end)
+                stop = end if newline == -1 else newline + 1
+            yield mapped[start:stop]
+            start = stop
+
+
+def scan(path, start=0, end=None, host=None, watched=None, window=WINDOW, max_open=MAX_OPEN, chunk_size=CHUNK_SIZE):
+    """Summarize the events in ``path[start:end]``; return ``(summary, fragments)``.
+
+    ``end=None`` reads the whole file, plain or gzip.  Only ``PATH`` names,
+    ``EOE`` and the :data:`SUMMARY_FIELDS` of primary records are parsed;
+    the other parts of an event are counted but not read.
+    """
+    summary = AuditSummary()
+    assembler = Assembler(host or host_of(path), window, max_open)
+    header, feed, add = _HEADER.search, assembler.feed, summary.add
+    for chunk in _chunks(path, start, end, chunk_size):
+        lines = chunk.decode("utf-8", "replace").splitlines()
+        summary.lines += len(lines)
+        for line in lines:
+            match = header(line)
+            if match is None:
+                summary.unparsed += bool(line.strip())
+                continue
+            summary.records += 1
+            node, record_type, stamp, serial = match.groups()
+            if record_type == "PATH":
+                name = _PATH_NAME.search(line, match.end())
+                fields = {"name": _value("name", name.group(1))} if name else {}
+            elif record_type == "EOE":
+                fields = {}
+            elif record_type in PARTS:
+                continue
+            else:
+                fields = parse_fields(line[match.end():], SUMMARY_FIELDS)
+            for event in feed(node, record_type, int(stamp), int(serial), fields):
+                add(event, watched)
+    return summary, assembler.close()
+
+
+def analyze(paths, jobs=1, host=None, watched=None, window=WINDOW, max_open=MAX_OPEN, chunk_size=CHUNK_SIZE):
+    """Stream every audit log under ``paths`` into one :class:`AuditSummary`.
+
+    With ``jobs > 1`` each plain file is split into ``jobs`` ranges scanned
+    by that many worker processes; fragments of events cut by a range
+    boundary are joined here.  ``host`` overrides :func:`host_of` for
+    records without ``node=``.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    tasks = [(log_path, start, end, host, watched, window, max_open, chunk_size)
+             for path in paths for log_path in audit_files(path) for start, end in _ranges(log_path, jobs)]
+    summary, fragments = AuditSummary(), []
+    if jobs <= 1:
+        results = (scan(*task) for task in tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(scan, *zip(*tasks)) if tasks else ()
+    try:
+        for partial, pieces in results:
+            summary.merge(partial)
+            fragments.extend(pieces)
+    finally:
+        if jobs > 1:
+            pool.shutdown()
+    joined = {}
+    for fragment in fragments:
+        existing = joined.get(fragment.id)
+        joined[fragment.id] = fragment if existing is None else existing.absorb(fragment)
+    for event in joined.values():
+        if event.whole:
+            summary.add(event, watched)
+        else:
+            summary.orphans += event.records
+    return summary
+
+
+# -- Anomalies -----------------------------------------------------------------
+
+
+@dataclass
+class Anomaly:
+    """One entry of the anomaly report; ``score`` ranks entries of the same ``kind``."""
+
+    kind: str
+    subject: str
+    score: float
+    detail: str
+
+
+def _timestamp(stamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stamp))
+
+
+def bursts(summary, threshold=6.0):
+    """Minutes where a host logged far more events for a key than it usually does.
+
+    Each ``(host, key)`` series is zero-filled over the host's active span;
+    the score of its busiest minute is ``(peak - median) / (1.4826 * MAD + 1)``.
+    The ``+ 1`` keeps a mostly quiet series from scoring a single event as
+    infinitely unusual.
+    """
+    series, spans = {}, {}
+    for (host, key, minute), count in summary.minutes.items():
+        series.setdefault((host, key), {})[minute] = count
+        first, last = spans.get(host, (minute, minute))
+        spans[host] = (min(first, minute), max(last, minute))
+    found = []
+    for (host, key), counts in series.items():
+        first, last = spans[host]
+        values = np.zeros((last - first) // 60 + 1)
+        values[(np.fromiter(counts, dtype=np.int64, count=len(counts)) - first) // 60] = list(counts.values())
+        median = float(np.median(values))
+        spread = 1.4826 * float(np.median(np.abs(values - median))) + 1
+        peak = int(values.argmax())
+        score = (values[peak] - median) / spread
+        if score >= threshold:
+            found.append(Anomaly("burst", f"{host} {key}", score, f"{int(values[peak])} events in the minute at "
+                                 f"{_timestamp(first + peak * 60)}, median {median:g}/min"))
+    return sorted(found, key=lambda anomaly: -anomaly.score)
+
+
+def rare_pairs(summary, keys=None):
+    """``(auid, key)`` pairs ranked by self-information, ``log2(all events / pair events)``.
+
+    Only logged-in users count (``auid`` set); ``keys`` limits the pairs to
+    those keys, e.g. the rule keys.
+    """
+    total = sum(summary.counts.values())
+    pairs, hosts = Counter(), {}
+    for (key, host, auid), count in summary.counts.items():
+        if auid == UNSET_AUID or (keys is not None and key not in keys):
+            continue
+        pairs[auid, key] += count
+        hosts.setdefault((auid, key), set()).add(host)
+    found = [Anomaly("rare", f"auid {auid} {key}", math.log2(total / count),
+                     f"{count} event(s) on {len(hosts[auid, key])} host(s)") for (auid, key), count in pairs.items()]
+    return sorted(found, key=lambda anomaly: -anomaly.score)
+
+
+def failing(summary):
+    """``(host, auid)`` pairs with failed events, scored by failures times failure ratio."""
+    events, failed = Counter(), Counter()
+    for (_, host, auid), count in summary.counts.items():
+        events[host, auid] += count
+    for (_, host, auid), count in summary.failures.items():
+        failed[host, auid] += count
+    found = [Anomaly("failures", f"{host} auid {auid}", count * count / events[host, auid],
+                     f"{count} of {events[host, auid]} events failed") for (host, auid), count in failed.items()]
+    return sorted(found, key=lambda anomaly: -anomaly.score)
+
+
+def anomalies(summary, top=10, keys=None, threshold=6.0):
+    """The ``top`` bursts, rare pairs and failing users, in that order."""
+    return bursts(summary, threshold)[:top] + rare_pairs(summary, keys)[:top] + failing(summary)[:top]
+
+
+# -- CLI -----------------------------------------------------------------------
+
+
+@click.group()
+def main():
+    """auditd logs from the app instances, analyzed locally."""
+
+
+@main.command("rules")
+def rules_command():
+    """List the audit rules the app user data installs."""
+    for rule in load_rules():
+        click.echo(f"{rule.key:<16} {rule.kind:<8} {rule.target:<24} {rule.permissions or '-':<5} {rule.section}")
+
+
+@main.command("analyze")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--jobs", "-j", default=1, show_default=True, help="Worker processes.")
+@click.option("--host", help="Host for records without node= (default: from the file or directory name).")
+@click.option("--top", default=10, show_default=True, help="Rows per table and anomalies per kind.")
+@click.option("--window", default=WINDOW, show_default=True, help="Seconds to wait for an event's EOE record.")
+@click.option("--max-open", default=MAX_OPEN, show_default=True, help="Events kept open at most.")
+@click.option("--threshold", default=6.0, show_default=True, help="Burst score to report.")
+@click.option("--chunk-kb", default=1024, show_default=True, help="Chunk size in KiB.")
+def analyze_command(paths, jobs, host, top, window, max_open, threshold, chunk_kb):
+    """Aggregate audit.log files per rule key, host and auid and report anomalies."""
+    rules = load_rules()
+    keys = {rule.key for rule in rules}
+    watched = frozenset(rule.key for rule in rules if rule.kind == "watch")
+    started = time.perf_counter()
+    summary = analyze(paths, jobs, host, watched, window, max_open, chunk_kb * 1024)
+    click.echo(f"lines: {summary.lines}  records: {summary.records}  events: {summary.events}  "
+               f"closed by window: {summary.unterminated}  orphaned records: {summary.orphans}  "
+               f"unparsed: {summary.unparsed}  ({time.perf_counter() - started:.1f}s)")
+    rows = summary.by_key()
+    seen = {row[0] for row in rows}
+    click.echo("\nPer key (events, failed, hosts, auids):")
+    for key, events, failed, hosts, auids in rows + [(key, 0, 0, 0, 0) for key in sorted(keys - seen)]:
+        click.echo(f"  {key:<20} {events:>10} {failed:>8} {hosts:>6} {auids:>6}")
+        details = summary.top_paths(key, 3) if key in watched else summary.top_executables(key, 3)
+        for name, count in details:
+            click.echo(f"      {count:>10}  {name}")
+    for title, table in (("host", summary.by_host()), ("auid", summary.by_auid())):
+        click.echo(f"\nPer {title} (events, failed, keys, {'auids' if title == 'host' else 'hosts'}):")
+        for name, events, failed, first, second in table[:top]:
+            click.echo(f"  {name:<20} {events:>10} {failed:>8} {first:>6} {second:>6}")
+    click.echo("\nAnomalies:")
+    for anomaly in anomalies(summary, top, keys, threshold):
+        click.echo(f"  {anomaly.kind:<9} {anomaly.score:8.1f}  {anomaly.subject:<36} {anomaly.detail}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,601 @@
+"""Backtest CloudWatch alarms and the app Auto Scaling group on exported metrics.
+
+Metric history is read from CSV or Parquet exports with a ``timestamp``
+column (epoch seconds or ISO 8601) and one column per metric named
+``Namespace:MetricName``, e.g. ``AWS/EC2:CPUUtilization``, and placed on a
+one-minute timeline (gaps are missing data).
+
+:func:`evaluate` runs one alarm -- plain metric or metric math such as
+``alb_5xx``'s ``m2/m1*100`` -- over the whole history for a whole grid of
+thresholds at once: period statistics come from reshaping the timeline
+into ``(periods, minutes)``, and the ``evaluation_periods`` window is a
+cumulative-sum difference, so months of data evaluate in milliseconds.
+
+:func:`sweep` replays ``high_cpu`` / ``low_cpu`` and their simple scaling
+policies against the group.  Scaling changes the CPU the alarms see, so
+demand is reconstructed as ``CPUUtilization x GroupInServiceInstances``
+and the group is stepped minute by minute -- alarm actions re-run every
+minute while in ALARM, capacity stays within min/max, new instances
+serve after the health check grace period and a scaling activity starts
+the cooldown.  Each step is vectorized over every parameter set of the
+grid, and the grid is split across worker processes.  Results report
+alarm flaps, scaling activities, minutes at each capacity, instance
+minutes and under-provisioned minutes (demand per instance above
+``saturation`` percent).
+"""
+
+import ast
+import csv
+import itertools
+import operator
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import click
+import numpy as np
+
+from tools.hcl import ENVIRONMENTS_DIR, Expression, TerraformModel
+from tools.metricfilters import COMPARISONS
+
+OK, ALARM, INSUFFICIENT_DATA = 0, 1, 2
+STATES = ("OK", "ALARM", "INSUFFICIENT_DATA")
+CPU_METRIC = "AWS/EC2:CPUUtilization"
+CAPACITY_METRIC = "AWS/AutoScaling:GroupInServiceInstances"
+_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+
+class BacktestError(ValueError):
+    """Raised for metric exports or alarms the backtester cannot use."""
+
+
+@dataclass
+class MetricSeries:
+    """Metric columns on a shared one-minute timeline starting at ``start`` (epoch seconds)."""
+
+    start: int
+    columns: dict
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, key):
+        try:
+            return self.columns[key]
+        except KeyError:
+            raise BacktestError(f"no {key!r} column; have {', '.join(sorted(self.columns))}") from None
+
+    def __contains__(self, key):
+        return key in self.columns
+
+
+def _epoch_seconds(values):
+    values = np.asarray(values)
+    if values.dtype.kind in "iuf":
+        return values.astype(np.int64)
+    try:
+        return values.astype(np.float64).astype(np.int64)
+    except ValueError:
+        stripped = np.char.rstrip(values.astype(str), "Z")
+        return stripped.astype("datetime64[s]").astype(np.int64)
+
+
+def metric_series(timestamps, columns):
+    """Place samples on a one-minute timeline; the last sample in a minute wins."""
+    seconds = _epoch_seconds(timestamps)
+    if not len(seconds):
+        raise BacktestError("no samples")
+    minutes = seconds // 60
+    start = int(minutes.min())
+    index = minutes - start
+    length = int(index.max()) + 1
+    placed = {}
+    for key, values in columns.items():
+        column = np.full(length, np.nan)
+        column[index] = np.asarray(values, dtype=np.float64)
+        placed[key] = column
+    return MetricSeries(start * 60, placed)
+
+
+def load_series(path):
+    """Read a CSV or Parquet metric export into a :class:`MetricSeries`."""
+    if path.endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise BacktestError("reading Parquet needs pyarrow (pip install pyarrow)") from exc
+        table = pq.read_table(path)
+        data = {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+    else:
+        with open(path, newline="") as fh:
+            reader = csv.reader(fh)
+            header = next(reader, None)
+            rows = list(reader)
+        if not header:
+            raise BacktestError(f"{path}: empty export")
+        cells = np.array(rows, dtype=object).reshape(len(rows), len(header))
+        data = {name: cells[:, position] for position, name in enumerate(header)}
+        for name in header[1:]:
+            column = data[name]
+            column[column == ""] = "nan"
+            data[name] = column.astype(np.float64)
+    if "timestamp" not in data:
+        raise BacktestError(f"{path}: no timestamp column")
+    timestamps = data.pop("timestamp")
+    if hasattr(timestamps, "dtype") and timestamps.dtype.kind == "M":
+        timestamps = timestamps.astype("datetime64[s]").astype(np.int64)
+    return metric_series(timestamps, data)
+
+
+def period_statistic(values, start, period, statistic):
+    """Return ``(period_starts, values)`` of ``statistic`` per ``period`` seconds; NaN where no data."""
+    minutes = period // 60
+    lead = (start // 60) % minutes
+    trail = -(lead + len(values)) % minutes
+    grid = np.concatenate([np.full(lead, np.nan), values, np.full(trail, np.nan)]).reshape(-1, minutes)
+    valid = ~np.isnan(grid)
+    count = valid.sum(axis=1)
+    total = np.where(valid, grid, 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if statistic == "Sum":
+            result = total
+        elif statistic == "SampleCount":
+            result = count.astype(np.float64)
+        elif statistic == "Average":
+            result = total / count
+        elif statistic == "Minimum":
+            result = np.where(valid, grid, np.inf).min(axis=1)
+        elif statistic == "Maximum":
+            result = np.where(valid, grid, -np.inf).max(axis=1)
+        else:
+            raise BacktestError(f"unsupported statistic {statistic!r}")
+    result = np.where(count > 0, result, np.nan)
+    starts = (start - lead * 60) + period * np.arange(len(result))
+    return starts, result
+
+
+def _metric_math(expression, values):
+    """Evaluate ``+ - * /`` metric math over ``{id: array}``; non-finite results are missing."""
+
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            return _OPERATORS[type(node.op)](visit(node.left), visit(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -visit(node.operand)
+        if isinstance(node, ast.Name) and node.id in values:
+            return values[node.id]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return float(node.value)
+        raise BacktestError(f"unsupported metric math in {expression!r}")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = visit(ast.parse(expression, mode="eval"))
+    return np.where(np.isfinite(result), result, np.nan)
+
+
+@dataclass
+class MetricAlarm:
+    """A metric alarm; ``queries`` maps metric-math ids to ``(metric, stat)`` when ``expression`` is set."""
+
+    name: str
+    comparison_operator: str
+    threshold: float
+    evaluation_periods: int
+    period: int = 300
+    metric: str = None
+    statistic: str = "Average"
+    datapoints_to_alarm: int = None
+    treat_missing_data: str = "missing"
+    expression: str = None
+    queries: dict = field(default_factory=dict)
+    actions: tuple = ()
+
+    def datapoints(self, series):
+        """``(period_starts, values)`` the alarm evaluates."""
+        if self.expression is None:
+            return period_statistic(series[self.metric], series.start, self.period, self.statistic)
+        values = {}
+        for query_id, (metric, stat) in self.queries.items():
+            starts, values[query_id] = period_statistic(series[metric], series.start, self.period, stat)
+        return starts, _metric_math(self.expression, values)
+
+
+@dataclass
+class AlarmBacktest:
+    """States of one alarm per threshold (rows) and period (columns)."""
+
+    alarm: MetricAlarm
+    thresholds: np.ndarray
+    period_starts: np.ndarray
+    states: np.ndarray
+
+    @property
+    def alarms(self):
+        """Entries into ALARM per threshold."""
+        entered = (self.states[:, 1:] == ALARM) & (self.states[:, :-1] != ALARM)
+        return entered.sum(axis=1) + (self.states[:, 0] == ALARM)
+
+    @property
+    def transitions(self):
+        return (self.states[:, 1:] != self.states[:, :-1]).sum(axis=1)
+
+    @property
+    def alarm_minutes(self):
+        return (self.states == ALARM).sum(axis=1) * (self.alarm.period // 60)
+
+
+def _rolling_sum(values, window):
+    totals = np.cumsum(values, axis=-1, dtype=np.int64)
+    totals[..., window:] = totals[..., window:] - totals[..., :-window]
+    return totals
+
+
+def evaluate(alarm, series, thresholds=None):
+    """Evaluate ``alarm`` over ``series`` for each of ``thresholds`` (default: its own)."""
+    thresholds = np.atleast_1d(np.asarray(alarm.threshold if thresholds is None else thresholds, dtype=np.float64))
+    starts, values = alarm.datapoints(series)
+    present = ~np.isnan(values)
+    with np.errstate(invalid="ignore"):
+        breach = COMPARISONS[alarm.comparison_operator](values[None, :], thresholds[:, None]) & present
+    present = np.broadcast_to(present, breach.shape)
+    if alarm.treat_missing_data == "breaching":
+        breach, present = breach | ~present, np.ones_like(breach)
+    elif alarm.treat_missing_data == "notBreaching":
+        present = np.ones_like(breach)
+    window = alarm.evaluation_periods
+    required = alarm.datapoints_to_alarm or window
+    breaching, observed = _rolling_sum(breach, window), _rolling_sum(present, window)
+    states = np.where(breaching >= required, ALARM, np.where(observed > 0, OK, INSUFFICIENT_DATA)).astype(np.int8)
+    if alarm.treat_missing_data == "ignore":
+        # An all-missing window keeps the previous state.
+        positions = np.where(observed > 0, np.arange(states.shape[1]), -1)
+        positions = np.maximum.accumulate(positions, axis=1)
+        states = np.where(positions >= 0, np.take_along_axis(states, np.maximum(positions, 0), axis=1),
+                          INSUFFICIENT_DATA).astype(np.int8)
+    return AlarmBacktest(alarm, thresholds, starts, states)
+
+
+@dataclass
+class ScalingConfig:
+    """Parameters of the app Auto Scaling group and its CPU alarms; each can be swept."""
+
+    min_size: int = 2
+    max_size: int = 10
+    desired_capacity: int = 2
+    high_threshold: float = 70.0
+    low_threshold: float = 30.0
+    high_periods: int = 2
+    low_periods: int = 2
+    scale_up: int = 1
+    scale_down: int = 1
+    cooldown: int = 300
+    period: int = 300
+    warmup: int = 300
+    high_operator: str = "GreaterThanOrEqualToThreshold"
+    low_operator: str = "LessThanOrEqualToThreshold"
+
+
+SWEEPABLE = ("min_size", "max_size", "desired_capacity", "high_threshold", "low_threshold", "high_periods",
+             "low_periods", "scale_up", "scale_down", "cooldown")
+
+
+@dataclass
+class SweepResult:
+    """Outcomes per parameter set; ``params`` maps each swept name to a column."""
+
+    params: dict
+    high_alarms: np.ndarray
+    low_alarms: np.ndarray
+    scaling_activities: np.ndarray
+    underprovisioned_minutes: np.ndarray
+    instance_minutes: np.ndarray
+    capacity_minutes: np.ndarray
+    minutes: int = 0
+
+    def __len__(self):
+        return len(self.high_alarms)
+
+    def rows(self):
+        """Yield one dict per parameter set, with ``time_at_capacity`` as ``{capacity: minutes}``."""
+        for position in range(len(self)):
+            row = {name: column[position].item() for name, column in self.params.items()}
+            row.update(high_alarms=int(self.high_alarms[position]), low_alarms=int(self.low_alarms[position]),
+                       scaling_activities=int(self.scaling_activities[position]),
+                       underprovisioned_minutes=int(self.underprovisioned_minutes[position]),
+                       instance_minutes=int(self.instance_minutes[position]),
+                       time_at_capacity={capacity: int(minutes) for capacity, minutes
+                                         in enumerate(self.capacity_minutes[position]) if minutes})
+            yield row
+
+
+def _simulate(demand, params, config, saturation):
+    """Step the group through ``demand`` for every parameter set in ``params`` at once."""
+    count = len(params["min_size"])
+    minimum, maximum = params["min_size"], params["max_size"]
+    capacity = np.clip(params["desired_capacity"], minimum, maximum).astype(np.int64)
+    desired = capacity.copy()
+    per_period = config.period // 60
+    warmup = max(config.warmup // 60, 0)
+    arriving = np.zeros((warmup + 1, count), dtype=np.int64)
+    cooldown = (params["cooldown"] // 60).astype(np.int64)
+    ready_at = np.zeros(count, dtype=np.int64)
+    window = int(max(params["high_periods"].max(), params["low_periods"].max()))
+    history = np.full((count, window), np.nan)
+    high_compare, low_compare = COMPARISONS[config.high_operator], COMPARISONS[config.low_operator]
+    high_threshold, low_threshold = params["high_threshold"][:, None], params["low_threshold"][:, None]
+    high_window, low_window = params["high_periods"][:, None], params["low_periods"][:, None]
+    high = np.zeros(count, dtype=bool)
+    low = np.zeros(count, dtype=bool)
+    high_alarms = np.zeros(count, dtype=np.int64)
+    low_alarms = np.zeros(count, dtype=np.int64)
+    activities = np.zeros(count, dtype=np.int64)
+    underprovisioned = np.zeros(count, dtype=np.int64)
+    capacity_minutes = np.zeros((count, int(maximum.max()) + 1), dtype=np.int64)
+    rows = np.arange(count)
+    since = np.zeros(count, dtype=np.int64)
+    cpu_total = np.zeros(count)
+    cpu_samples = periods = in_flight = 0
+    alarming = False
+
+    def resize(changed, new_capacity, minute):
+        # Time at capacity is booked per stretch, not per minute.
+        capacity_minutes[rows[changed], capacity[changed]] += minute - since[changed]
+        since[changed] = minute
+        capacity[changed] = new_capacity[changed]
+
+    for minute, load in enumerate(demand):
+        if in_flight:
+            slot = arriving[minute % (warmup + 1)]
+            if slot.any():
+                in_flight -= int(slot.sum())
+                resize(slot > 0, capacity + slot, minute)
+                slot[:] = 0
+        if load == load:
+            utilization = load / np.maximum(capacity, 1)
+            underprovisioned += utilization > saturation
+            cpu_total += np.minimum(utilization, 100.0)
+            cpu_samples += 1
+        if minute % per_period == per_period - 1:
+            history[:, periods % window] = cpu_total / cpu_samples if cpu_samples else np.nan
+            periods += 1
+            cpu_total[:] = 0.0
+            cpu_samples = 0
+            age = (periods - 1 - np.arange(window)) % window
+            recent = (age[None, :] < np.minimum(periods, window)) & ~np.isnan(history)
+            with np.errstate(invalid="ignore"):
+                now_high = ((high_compare(history, high_threshold) & recent & (age < high_window)).sum(axis=1)
+                            >= params["high_periods"])
+                now_low = ((low_compare(history, low_threshold) & recent & (age < low_window)).sum(axis=1)
+                           >= params["low_periods"])
+            high_alarms += now_high & ~high
+            low_alarms += now_low & ~low
+            high, low = now_high, now_low
+            alarming = bool(high.any() or low.any())
+        if not alarming:
+            continue
+        # Auto Scaling alarm actions re-run every minute the alarm stays in ALARM.
+        idle = minute >= ready_at
+        grow = high & idle & (desired < maximum)
+        shrink = low & ~high & idle & (desired > minimum)
+        if grow.any() or shrink.any():
+            target = np.where(grow, np.minimum(desired + params["scale_up"], maximum),
+                              np.where(shrink, np.maximum(desired - params["scale_down"], minimum), desired))
+            launched = np.where(grow, target - desired, 0)
+            if warmup:
+                arriving[(minute + warmup) % (warmup + 1)] += launched
+                in_flight += int(launched.sum())
+                resize(shrink, np.maximum(capacity - (desired - target), 0), minute + 1)
+            else:
+                resize(grow | shrink, np.maximum(capacity + launched - np.where(shrink, desired - target, 0), 0),
+                       minute + 1)
+            desired = target
+            changed = grow | shrink
+            activities += changed
+            ready_at = np.where(changed, minute + 1 + cooldown, ready_at)
+    resize(np.ones(count, dtype=bool), capacity, len(demand))
+    instance_minutes = capacity_minutes @ np.arange(capacity_minutes.shape[1])
+    return {"high_alarms": high_alarms, "low_alarms": low_alarms, "scaling_activities": activities,
+            "underprovisioned_minutes": underprovisioned, "instance_minutes": instance_minutes,
+            "capacity_minutes": capacity_minutes}
+
+
+def demand_from(series, config):
+    """Per-minute demand in instance-percent: CPU times the instances that served it."""
+    cpu = series[CPU_METRIC]
+    if CAPACITY_METRIC in series:
+        instances = series[CAPACITY_METRIC].copy()
+        # Capacity is reported less often than CPU; carry the last value forward.
+        known = np.where(~np.isnan(instances), np.arange(len(instances)), 0)
+        instances = instances[np.maximum.accumulate(known)]
+        instances[np.isnan(instances)] = config.desired_capacity
+    else:
+        instances = np.full(len(cpu), float(config.desired_capacity))
+    return cpu * instances
+
+
+def parameter_grid(config, grid):
+    """Cartesian product of ``grid`` over ``config``'s values, as ``{name: column}``."""
+    unknown = set(grid) - set(SWEEPABLE)
+    if unknown:
+        raise BacktestError(f"cannot sweep {', '.join(sorted(unknown))}; choose from {', '.join(SWEEPABLE)}")
+    names = list(grid)
+    combinations = list(itertools.product(*(grid[name] for name in names))) or [()]
+    columns = {}
+    for name in SWEEPABLE:
+        if name in grid:
+            values = [combination[names.index(name)] for combination in combinations]
+        else:
+            values = [getattr(config, name)] * len(combinations)
+        dtype = np.float64 if name.endswith("threshold") else np.int64
+        columns[name] = np.asarray(values, dtype=dtype)
+    return columns
+
+
+def sweep(series, config=None, grid=None, jobs=1, saturation=90.0):
+    """Simulate the group for every combination in ``grid`` (``{name: [values]}``)."""
+    config = config or ScalingConfig()
+    params = parameter_grid(config, grid or {})
+    demand = demand_from(series, config)
+    count = len(params["min_size"])
+    if jobs <= 1 or count == 1:
+        parts = [_simulate(demand, params, config, saturation)]
+    else:
+        slices = [piece for piece in np.array_split(np.arange(count), jobs) if len(piece)]
+        chunks = [{name: column[piece] for name, column in params.items()} for piece in slices]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parts = list(pool.map(_simulate, [demand] * len(chunks), chunks, [config] * len(chunks),
+                                  [saturation] * len(chunks)))
+    width = max(part["capacity_minutes"].shape[1] for part in parts)
+    for part in parts:
+        part["capacity_minutes"] = np.pad(part["capacity_minutes"], ((0, 0), (0, width - part["capacity_minutes"].shape[1])))
+    merged = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    swept = {name: params[name] for name in grid or {}}
+    return SweepResult(swept, minutes=len(demand), **merged)
+
+
+# -- Terraform ---------------------------------------------------------------
+
+
+def _number(value, what):
+    if isinstance(value, Expression):
+        raise BacktestError(f"{what} is not a literal: {value.source}")
+    return float(value)
+
+
+def _alarm(address, body):
+    name = address.split(".", 1)[1]
+    queries, expression = {}, None
+    for query in body.get("metric_query", []):
+        if query.get("expression"):
+            expression = query["expression"]
+        else:
+            metric = query["metric"][0]
+            queries[query["id"]] = (f"{metric['namespace']}:{metric['metric_name']}", metric.get("stat", "Average"))
+    periods = {int(query["metric"][0].get("period", 300)) for query in body.get("metric_query", []) if "metric" in query}
+    namespace = body.get("namespace")
+    if expression is None and (isinstance(namespace, Expression) or "metric_name" not in body):
+        return None
+    actions = tuple(reference.split(".")[1] for action in body.get("alarm_actions", [])
+                    if isinstance(action, Expression) for reference in action.references
+                    if reference.startswith("aws_autoscaling_policy."))
+    return MetricAlarm(
+        name, body["comparison_operator"], _number(body["threshold"], f"{address}.threshold"),
+        int(_number(body.get("evaluation_periods", 1), f"{address}.evaluation_periods")),
+        int(_number(body.get("period", periods.pop() if periods else 300), f"{address}.period")),
+        None if expression else f"{namespace}:{body['metric_name']}", body.get("statistic", "Average"),
+        int(body["datapoints_to_alarm"]) if "datapoints_to_alarm" in body else None,
+        body.get("treat_missing_data", "missing"), expression, queries, actions)
+
+
+def load_alarms(model=None):
+    """Metric alarms of the compute and monitoring modules, keyed by resource name.
+
+    Alarms on log metric filters (custom namespaces) are left to
+    :mod:`tools.metricfilters`.
+    """
+    model = model or TerraformModel()
+    alarms = {}
+    for module in ("compute", "monitoring"):
+        for address, body in model[module].of_type("aws_cloudwatch_metric_alarm").items():
+            alarm = _alarm(address, body)
+            if alarm is not None:
+                alarms[alarm.name] = alarm
+    return alarms
+
+
+def load_scaling(model=None, environments=None, environment="prod"):
+    """:class:`ScalingConfig` for the app group as ``environment`` deploys it."""
+    model = model or TerraformModel()
+    compute = model["compute"]
+    alarms = load_alarms(model)
+    high, low = alarms["high_cpu"], alarms["low_cpu"]
+    if high.period != low.period:
+        raise BacktestError("high_cpu and low_cpu must share a period")
+    policies = compute.of_type("aws_autoscaling_policy")
+    up = policies[f"aws_autoscaling_policy.{high.actions[0]}"]
+    down = policies[f"aws_autoscaling_policy.{low.actions[0]}"]
+    sizes = {name: compute[f"var.{name}.default"] for name in ("min_size", "max_size", "desired_capacity")}
+    if environment:
+        environments = environments or TerraformModel(ENVIRONMENTS_DIR)
+        call = environments[environment].module_calls.get("compute", {})
+        sizes.update({name: call[name] for name in sizes if name in call and not isinstance(call[name], Expression)})
+    return ScalingConfig(
+        int(sizes["min_size"]), int(sizes["max_size"]), int(sizes["desired_capacity"]),
+        high.threshold, low.threshold, high.evaluation_periods, low.evaluation_periods,
+        int(_number(up["scaling_adjustment"], "scale_up.scaling_adjustment")),
+        -int(_number(down["scaling_adjustment"], "scale_down.scaling_adjustment")),
+        int(_number(up.get("cooldown", 300), "scale_up.cooldown")), high.period,
+        int(compute["aws_autoscaling_group.app_asg.health_check_grace_period"]),
+        high.comparison_operator, low.comparison_operator)
+
+
+# -- CLI -----------------------------------------------------------------------
+
+
+def _parse_grid(values):
+    grid = {}
+    for item in values:
+        name, _, spec = item.partition("=")
+        if not spec:
+            raise click.BadParameter(f"expected NAME=V1,V2,... got {item!r}", param_hint="--grid")
+        if ":" in spec:
+            start, stop, step = (float(part) for part in spec.split(":"))
+            grid[name] = list(np.arange(start, stop + step / 2, step))
+        else:
+            grid[name] = [float(part) for part in spec.split(",")]
+    return grid
+
+
+@click.group()
+def main():
+    """Backtest CloudWatch alarms and Auto Scaling on exported metrics."""
+
+
+@main.command("alarms")
+@click.argument("metrics", type=click.Path(exists=True, dir_okay=False))
+@click.option("--alarm", "names", multiple=True, help="Only these alarms (resource names).")
+@click.option("--thresholds", help="Comma-separated thresholds to try instead of each alarm's own.")
+def alarms_command(metrics, names, thresholds):
+    """Alarm flaps and time in ALARM for the module alarms whose metrics are in METRICS."""
+    series = load_series(metrics)
+    for name, alarm in sorted(load_alarms().items()):
+        if names and name not in names:
+            continue
+        needed = [alarm.metric] if alarm.expression is None else [metric for metric, _ in alarm.queries.values()]
+        if not all(metric in series for metric in needed):
+            continue
+        grid = [float(value) for value in thresholds.split(",")] if thresholds else None
+        result = evaluate(alarm, series, grid)
+        for threshold, alarms, transitions, minutes in zip(result.thresholds, result.alarms, result.transitions,
+                                                           result.alarm_minutes):
+            click.echo(f"{name:<14} threshold={threshold:<14g} alarms={alarms:<6} transitions={transitions:<6} "
+                       f"minutes_in_alarm={minutes}")
+
+
+@main.command("asg")
+@click.argument("metrics", type=click.Path(exists=True, dir_okay=False))
+@click.option("--environment", default="prod", show_default=True)
+@click.option("--grid", "grid_specs", multiple=True,
+              help="NAME=V1,V2,... or NAME=START:STOP:STEP; repeat to sweep a cartesian product.")
+@click.option("--saturation", default=90.0, show_default=True, help="CPU percent counted as under-provisioned.")
+@click.option("--jobs", "-j", default=os.cpu_count() or 1, show_default=True)
+@click.option("--top", default=20, show_default=True, help="Parameter sets to print, fewest under-provisioned first.")
+def asg_command(metrics, environment, grid_specs, saturation, jobs, top):
+    """Sweep the app group's alarm thresholds, periods and cooldowns over METRICS."""
+    config = load_scaling(environment=environment)
+    try:
+        result = sweep(load_series(metrics), config, _parse_grid(grid_specs), jobs, saturation)
+    except BacktestError as exc:
+        raise click.ClickException(str(exc))
+    rows = sorted(result.rows(), key=lambda row: (row["underprovisioned_minutes"], row["instance_minutes"]))
+    click.echo(f"{len(result)} parameter set(s) over {result.minutes} minutes; base: {config}")
+    for row in rows[:top]:
+        capacity = " ".join(f"{size}:{minutes}" for size, minutes in row.pop("time_at_capacity").items())
+        click.echo("  ".join(f"{key}={value:g}" if isinstance(value, float) else f"{key}={value}"
+                             for key, value in row.items()) + f"  at_capacity[{capacity}]")
+
+
+if __name__ == "__main__":
+    main()
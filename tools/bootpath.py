@@ -0,0 +1,497 @@
+"""Profile the app instances' user data and split it into bake and boot steps.
+
+The compute module renders ``templates/user_data.sh`` with ``templatefile``
+and every instance runs all of it on first boot: two ``yum update``
+passes, the CloudWatch agent, iptables-services and Node.js packages and
+an AWS CLI download all sit between a scale-out event and the app
+answering its health check.
+
+:func:`split` renders the template with the variables the compute module
+passes it (resolved through an environment's module call), cuts it into
+steps -- one shell command, with its continuation lines and heredoc body
+-- and classifies each one:
+
+* **bake** -- package installs and updates, downloads and installers,
+  static files and ``systemctl enable``.  These belong in the AMI.
+* **boot** -- anything that renders a template variable (so one AMI
+  serves every environment), reads instance metadata, calls the AWS API,
+  starts services or changes runtime firewall state, plus any bake step
+  that needs a file written at boot.  Unrecognised commands stay here.
+
+A bake step repeating an earlier package update, install or enable is
+dropped.  :func:`bake_manifest` lists what the image needs and
+:func:`boot_script` is the remaining user data, still a Terraform template
+by default so it can replace ``user_data.sh``.  Step durations are
+estimates for a t3 instance in region; :func:`measure` runs a script
+in a local container, a chroot or the current shell and reports measured
+step times and the time until the app answers on its health port.
+"""
+
+import json
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+
+import click
+
+from tools.hcl import ENVIRONMENTS_DIR, Expression, TerraformModel
+
+BAKE, BOOT = "bake", "boot"
+
+# Terraform template syntax: $${ and %%{ are escapes, ${name} interpolates.
+_TEMPLATE_RE = re.compile(r"\$\$\{|%%\{|\$\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}|\$\{|%\{")
+_HEREDOC_RE = re.compile(r"(?<!<)<<(-?)\s*(['\"]?)([A-Za-z_][A-Za-z0-9_]*)\2")
+_WRITE_RE = re.compile(r">>?\s*(/[^\s;|&<>]+)")
+
+# (kind, phase, seconds, pattern) -- first match on the command wins.
+_RULES = tuple((kind, phase, seconds, re.compile(pattern)) for kind, phase, seconds, pattern in (
+    ("metadata", BOOT, 0.05, r"169\.254\.169\.254"),
+    ("package-update", BAKE, 90.0, r"^(yum|dnf)\s+(-\S+\s+)*(update|upgrade)\b"),
+    ("package-install", BAKE, 5.0, r"^(yum|dnf)\s+(-\S+\s+)*install\b"),
+    ("download", BAKE, 8.0, r"^(curl|wget)\b"),
+    ("unpack", BAKE, 4.0, r"^(unzip|tar)\b"),
+    ("installer", BAKE, 6.0, r"^\./\S+/install\b"),
+    ("enable", BAKE, 0.3, r"^systemctl\s+enable\b"),
+    ("start", BOOT, 1.0, r"^systemctl\s+(start|restart|reload)\b|^service\s+\S+\s+(start|restart|reload)\b"),
+    ("firewall", BOOT, 0.02, r"^ip6?tables\b|^service\s+ip6?tables\s+save\b"),
+    ("api-call", BOOT, 2.0, r"^aws\s"),
+    ("file", BAKE, 0.01, r"^(cat|tee|echo|printf)\b.*>|^(mkdir|chmod|chown|cp|ln|touch)\b"),
+    ("shell", BOOT, 0.01, r""),
+))
+PACKAGE_SECONDS = 7.0
+_IDEMPOTENT = {"package-update", "package-install", "enable"}
+
+
+class BootPathError(ValueError):
+    """Raised for templates or variables that cannot be rendered or split."""
+
+
+@dataclass
+class Step:
+    """One command of the user data script and where it belongs."""
+
+    number: int
+    line: int
+    section: str
+    source: str
+    kind: str
+    phase: str
+    estimate: float
+    reason: str
+    variables: tuple = ()
+    text: str = ""
+    duplicate_of: int = None
+
+    @property
+    def head(self):
+        """The command on one line, without its heredoc body."""
+        return _head(self.source)
+
+
+@dataclass
+class BootRun:
+    """Timings from :func:`measure`, in seconds since the script started."""
+
+    exit_code: int
+    healthy_after: float
+    steps: list = field(default_factory=list)
+    output: str = ""
+
+
+def render(text, variables):
+    """Render ``text`` the way Terraform's ``templatefile`` would."""
+    def substitute(match):
+        token, name = match.group(0), match.group(1)
+        if token in ("$${", "%%{"):
+            return token[1:]
+        if name is None:
+            raise BootPathError(f"unsupported template syntax at {text[match.start():match.start() + 30]!r}")
+        if name not in variables:
+            raise BootPathError(f"template variable {name!r} is not set")
+        value = variables[name]
+        if isinstance(value, bool):
+            return str(value).lower()
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value)
+
+    return _TEMPLATE_RE.sub(substitute, text)
+
+
+def template_variables(text):
+    """Names of the variables ``text`` interpolates, in order of first use."""
+    names = [match.group(1) for match in _TEMPLATE_RE.finditer(text) if match.group(1)]
+    return tuple(dict.fromkeys(names))
+
+
+def parse_steps(text):
+    """Cut a shell script into ``(line, section, source)`` commands.
+
+    ``section`` is the nearest comment above the command; continuation
+    lines and heredoc bodies belong to the command that opens them.
+    """
+    lines = text.splitlines()
+    steps, section, index = [], "", 0
+    while index < len(lines):
+        stripped = lines[index].strip()
+        if not stripped or (index == 0 and stripped.startswith("#!")):
+            index += 1
+            continue
+        if stripped.startswith("#"):
+            section = stripped.lstrip("#").strip()
+            index += 1
+            continue
+        start, command = index, [lines[index]]
+        while command[-1].rstrip().endswith("\\") and index + 1 < len(lines):
+            index += 1
+            command.append(lines[index])
+        heredoc = _HEREDOC_RE.search("\n".join(command))
+        if heredoc:
+            strip_tabs, delimiter = heredoc.group(1), heredoc.group(3)
+            while True:
+                index += 1
+                if index >= len(lines):
+                    raise BootPathError(f"line {start + 1}: heredoc {delimiter!r} is never closed")
+                command.append(lines[index])
+                if (lines[index].lstrip("\t") if strip_tabs else lines[index]) == delimiter:
+                    break
+        steps.append((start + 1, section, "\n".join(command)))
+        index += 1
+    return steps
+
+
+def _head(source):
+    lines = []
+    for line in source.splitlines():
+        lines.append(line.rstrip("\\").strip())
+        if _HEREDOC_RE.search(line):
+            break
+    return " ".join(lines)
+
+
+def classify(source):
+    """``(kind, phase, estimated seconds)`` for one command's source."""
+    head = _head(source)
+    for kind, phase, seconds, pattern in _RULES:
+        if pattern.search(head):
+            if kind == "package-install":
+                words = shlex.split(head.split(" install", 1)[1])
+                seconds += PACKAGE_SECONDS * sum(1 for word in words if not word.startswith("-"))
+            return kind, phase, seconds
+    raise AssertionError("the catch-all rule always matches")
+
+
+def _writes(step):
+    match = _WRITE_RE.search(step.head)
+    return match.group(1) if match else None
+
+
+def split(text, variables):
+    """Render and classify every step of the user data template ``text``."""
+    steps, booted, seen = [], set(), {}
+    for number, (line, section, source) in enumerate(parse_steps(text), 1):
+        kind, phase, estimate = classify(source)
+        used = template_variables(source)
+        step = Step(number, line, section, source, kind, phase, estimate, "", used, render(source, variables))
+        if phase == BAKE and used:
+            step.phase, step.reason = BOOT, "renders " + ", ".join(f"${{{name}}}" for name in used)
+        elif phase == BAKE:
+            needs = next((path for path in booted if path in step.head or (
+                kind == "enable" and os.path.basename(path) in {f"{unit}.service" for unit in step.head.split()[2:]})),
+                None)
+            if needs:
+                step.phase, step.reason = BOOT, f"needs {needs}, written at boot"
+        if step.phase == BOOT and kind == "file" and _writes(step):
+            booted.add(_writes(step))
+        key = " ".join(source.split())
+        if step.phase == BAKE and kind in _IDEMPOTENT:
+            if key in seen:
+                step.duplicate_of, step.reason = seen[key], f"repeats line {steps[seen[key] - 1].line}"
+            else:
+                seen[key] = number
+        steps.append(step)
+    return steps
+
+
+def bake_manifest(steps, template=None, variables=None):
+    """What the AMI needs, as a JSON-serialisable dict, in script order."""
+    baked = [step for step in steps if step.phase == BAKE and step.duplicate_of is None]
+    packages, services, files, downloads = [], [], [], []
+    for step in baked:
+        words = step.head.replace("\\", " ").split()
+        if step.kind == "package-install":
+            packages += [word for word in words[words.index("install") + 1:] if not word.startswith("-")]
+        elif step.kind == "enable":
+            services += [word for word in words[2:] if not word.startswith("-")]
+        elif step.kind == "download":
+            downloads += [word.strip("\"'") for word in words if "://" in word]
+        elif step.kind == "file" and _writes(step):
+            files.append(_writes(step))
+    return {
+        "template": template, "variables": variables or {},
+        "packages": list(dict.fromkeys(packages)), "services": services, "files": files, "downloads": downloads,
+        "estimated_seconds": round(sum(step.estimate for step in baked), 2),
+        "steps": [{"line": step.line, "section": step.section, "kind": step.kind, "estimate": step.estimate,
+                   "command": step.text} for step in baked],
+        "dropped": [{"line": step.line, "repeats_line": steps[step.duplicate_of - 1].line, "command": step.text}
+                    for step in steps if step.duplicate_of is not None],
+    }
+
+
+def boot_script(steps, rendered=False):
+    """The boot steps as user data; a Terraform template unless ``rendered``."""
+    lines, section = ["#!/bin/bash", "# Boot-time user data; everything else is baked into the AMI."], None
+    for step in steps:
+        if step.phase != BOOT:
+            continue
+        if step.section != section and step.section:
+            lines += ["", f"# {step.section}"]
+            section = step.section
+        lines.append(step.text if rendered else step.source)
+    return "\n".join(lines) + "\n"
+
+
+# -- Terraform -----------------------------------------------------------------
+
+
+def _find_call(value, function):
+    if isinstance(value, Expression):
+        if value.function == function:
+            return value
+        for arg in value.args:
+            found = _find_call(arg, function)
+            if found is not None:
+                return found
+    return None
+
+
+def _variable(name, compute, call, environment_module, environment):
+    value = call.get(name) if name in call else compute.get(f"var.{name}.default")
+    if isinstance(value, Expression):
+        match = re.fullmatch(r"var\.(\w+)", value.source.strip())
+        if match and environment_module is not None:
+            value = environment_module.get(f"var.{match.group(1)}.default")
+    if value is None or isinstance(value, Expression):
+        raise BootPathError(f"cannot resolve var.{name} for {environment or 'module defaults'}")
+    return value
+
+
+def launch_template(model=None, environments=None, environment="prod"):
+    """``(template path, variables)`` of the app launch template's user data.
+
+    Variables are resolved through ``environment``'s ``module "compute"``
+    call, its variable defaults and the compute module's own defaults.
+    """
+    model = model or TerraformModel()
+    compute = model["compute"]
+    for address, body in compute.of_type("aws_launch_template").items():
+        call = _find_call(body.get("user_data"), "templatefile")
+        if call is not None:
+            break
+    else:
+        raise BootPathError("compute has no launch template rendering user data with templatefile")
+    path = call.args[0].source.strip('"').replace("${path.module}", compute.path)
+    module_call, environment_module = {}, None
+    if environment:
+        environment_module = (environments or TerraformModel(ENVIRONMENTS_DIR))[environment]
+        module_call = environment_module.module_calls.get("compute", {})
+    variables = {}
+    for name, value in call.args[1].items():
+        match = re.fullmatch(r"var\.(\w+)", value.source.strip()) if isinstance(value, Expression) else None
+        variables[name] = (_variable(match.group(1), compute, module_call, environment_module, environment)
+                           if match else value)
+    return path, variables
+
+
+# -- Harness -------------------------------------------------------------------
+
+
+def instrument(script, trace):
+    """``script`` with a timestamp appended to ``trace`` before every step."""
+    starts = {line: number for number, (line, _, _) in enumerate(parse_steps(script), 1)}
+    marker = "printf '%s %s\\n' {} \"$(date +%s.%N)\" >> " + shlex.quote(trace)
+    lines = []
+    for number, line in enumerate(script.splitlines(), 1):
+        if number in starts:
+            lines.append(marker.format(starts[number]))
+        lines.append(line)
+    lines.append(marker.format("end"))
+    return "\n".join(lines) + "\n"
+
+
+def _healthy(port, path):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=0.5) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def _runner(runtime, directory, inside, port, image, root):
+    script = f"{inside}/boot.sh"
+    if runtime == "shell":
+        return ["bash", script], None
+    if runtime in ("docker", "podman"):
+        name = f"bootpath-{os.getpid()}-{int(time.time())}"
+        return [runtime, "run", "--rm", "--name", name, "-v", f"{directory}:{inside}", "-p", f"{port}:{port}",
+                image, "/bin/bash", script], [runtime, "rm", "-f", name]
+    if runtime == "chroot":
+        return ["chroot", root, "/bin/bash", script], None
+    raise BootPathError(f"unknown runtime {runtime!r}")
+
+
+def measure(script, runtime="shell", port=8080, health_path="/health", image="amazonlinux:2", root=None,
+            timeout=900.0, settle=30.0, poll=0.05):
+    """Run ``script`` and time each step and the app answering on ``port``.
+
+    ``runtime`` is ``shell`` (this machine, as the current user),
+    ``docker``/``podman`` (``image``, publishing ``port``) or ``chroot``
+    (into ``root``, which needs privileges).  The run stops once the
+    health check passes, ``settle`` seconds after the script exits
+    without it passing, or at ``timeout``.
+    """
+    if runtime == "chroot" and not root:
+        raise BootPathError("the chroot runtime needs a root directory")
+    steps = dict((number, (line, section, source)) for number, (line, section, source)
+                 in enumerate(parse_steps(script), 1))
+    with tempfile.TemporaryDirectory(prefix="bootpath-", dir=root if runtime == "chroot" else None) as directory:
+        inside = {"shell": directory, "chroot": "/" + os.path.relpath(directory, root or "/")}.get(runtime, "/bootpath")
+        with open(os.path.join(directory, "boot.sh"), "w") as fh:
+            fh.write(instrument(script, f"{inside}/trace"))
+        command, cleanup = _runner(runtime, directory, inside, port, image, root)
+        log = open(os.path.join(directory, "output"), "w+")
+        started = time.time()
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        healthy = exited = None
+        try:
+            while time.time() - started < timeout:
+                if _healthy(port, health_path):
+                    healthy = time.time() - started
+                    break
+                if exited is None and process.poll() is not None:
+                    exited = time.time()
+                if exited is not None and time.time() - exited > settle:
+                    break
+                time.sleep(poll)
+        finally:
+            if process.poll() is None:
+                os.killpg(process.pid, signal.SIGTERM)
+            if cleanup:
+                subprocess.run(cleanup, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            exit_code = process.wait()
+            log.seek(0)
+            output = log.read()
+            log.close()
+        stopped = time.time() - started
+        marks = []
+        trace = os.path.join(directory, "trace")
+        if os.path.exists(trace):
+            with open(trace) as fh:
+                marks = [(name, float(stamp) - started) for name, stamp in
+                         (line.split() for line in fh if line.strip())]
+    timeline = []
+    for index, (name, at) in enumerate(marks):
+        if name == "end":
+            break
+        until = marks[index + 1][1] if index + 1 < len(marks) else stopped
+        line, section, source = steps[int(name)]
+        timeline.append((line, section, source, at, until - at))
+    return BootRun(exit_code, healthy, timeline, output)
+
+
+# -- CLI -----------------------------------------------------------------------
+
+
+def _variables(environment, overrides):
+    path, variables = launch_template(environment=environment)
+    for item in overrides:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise click.BadParameter(f"expected NAME=VALUE, got {item!r}", param_hint="--var")
+        variables[name] = value
+    return path, variables
+
+
+@click.group()
+def main():
+    """Split the app user data into bake and boot steps and time the boot path."""
+
+
+@main.command("split")
+@click.option("--environment", default="prod", show_default=True)
+@click.option("--var", "overrides", multiple=True, help="NAME=VALUE, overriding a template variable.")
+@click.option("--out", type=click.Path(file_okay=False), help="Write bake-manifest.json and boot.sh here.")
+@click.option("--render", is_flag=True, help="Write boot.sh rendered instead of as a Terraform template.")
+def split_command(environment, overrides, out, render):
+    """Classify each user data step and estimate the boot path before and after baking."""
+    try:
+        path, variables = _variables(environment, overrides)
+        with open(path) as fh:
+            steps = split(fh.read(), variables)
+    except BootPathError as exc:
+        raise click.ClickException(str(exc))
+    for step in steps:
+        phase = "drop" if step.duplicate_of else step.phase
+        click.echo(f"{step.line:>4}  {phase:<5} {step.kind:<16} {step.estimate:7.2f}s  "
+                   f"{step.head[:60]:<60}  {step.reason}")
+    total = sum(step.estimate for step in steps)
+    boot = sum(step.estimate for step in steps if step.phase == BOOT)
+    click.echo(f"estimated boot path: {total:.1f} s now, {boot:.1f} s with a baked AMI")
+    if out:
+        os.makedirs(out, exist_ok=True)
+        with open(os.path.join(out, "bake-manifest.json"), "w") as fh:
+            json.dump(bake_manifest(steps, path, variables), fh, indent=2)
+            fh.write("\n")
+        with open(os.path.join(out, "boot.sh"), "w") as fh:
+            fh.write(boot_script(steps, rendered=render))
+        click.echo(f"wrote {out}/bake-manifest.json and {out}/boot.sh")
+
+
+@main.command("run")
+@click.argument("script", required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option("--environment", default="prod", show_default=True,
+              help="Render this environment's user data when SCRIPT is not given.")
+@click.option("--var", "overrides", multiple=True, help="NAME=VALUE, overriding a template variable.")
+@click.option("--boot-only", is_flag=True, help="Run only the boot steps of the rendered user data.")
+@click.option("--runtime", type=click.Choice(["docker", "podman", "chroot", "shell"]), default="docker",
+              show_default=True)
+@click.option("--image", default="amazonlinux:2", show_default=True, help="Container image (docker/podman).")
+@click.option("--root", type=click.Path(file_okay=False, exists=True), help="Root directory (chroot).")
+@click.option("--port", type=int, help="Health check port [default: app_port].")
+@click.option("--health-path", default="/health", show_default=True)
+@click.option("--timeout", default=900.0, show_default=True)
+def run_command(script, environment, overrides, boot_only, runtime, image, root, port, health_path, timeout):
+    """Run SCRIPT (or the rendered user data) and report step times and time to healthy."""
+    try:
+        variables = {}
+        if script:
+            with open(script) as fh:
+                text = fh.read()
+        else:
+            path, variables = _variables(environment, overrides)
+            with open(path) as fh:
+                template = fh.read()
+            text = boot_script(split(template, variables), rendered=True) if boot_only else render(template, variables)
+        result = measure(text, runtime, port or int(variables.get("app_port", 8080)), health_path, image, root,
+                         timeout)
+    except BootPathError as exc:
+        raise click.ClickException(str(exc))
+    for line, section, source, at, seconds in result.steps:
+        click.echo(f"{at:8.2f}s  {seconds:7.2f}s  line {line:<4} {source.splitlines()[0][:70]}")
+    if result.healthy_after is None:
+        click.echo(result.output[-2000:], err=True)
+        click.echo(f"app never answered on {health_path} (script exit code {result.exit_code})", err=True)
+        sys.exit(1)
+    click.echo(f"healthy after {result.healthy_after:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
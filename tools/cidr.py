@@ -0,0 +1,236 @@
+"""CIDR layout, overlap detection and allocation.
+
+``subnet_layout`` reproduces the ``cidrsubnet`` arithmetic used by
+``terraform/modules/networking`` so tests can check the real layout for
+any ``vpc_cidr``.  Overlap detection and allocation work on sorted integer
+ranges: two CIDR blocks are always either disjoint or nested, so a single
+sorted sweep with a stack of enclosing blocks finds every overlap in
+O(n log n) without pairwise ``ipaddress`` comparisons.
+"""
+
+import bisect
+import ipaddress
+import itertools
+from dataclasses import dataclass
+
+import click
+
+SUBNET_NEWBITS = 8
+TIERS = ("public", "private", "restricted")
+
+
+class CidrError(ValueError):
+    """Raised for invalid CIDR arithmetic or conflicting allocations."""
+
+
+def cidrsubnet(prefix, newbits, netnum):
+    """Terraform's ``cidrsubnet(prefix, newbits, netnum)``."""
+    network = ipaddress.ip_network(prefix, strict=False)
+    new_prefix = network.prefixlen + newbits
+    if new_prefix > network.max_prefixlen:
+        raise CidrError(f"cannot extend {network} by {newbits} bits")
+    if not 0 <= netnum < 2 ** newbits:
+        raise CidrError(f"netnum {netnum} does not fit in {newbits} bits of {network}")
+    size = 2 ** (network.max_prefixlen - new_prefix)
+    address = int(network.network_address) + netnum * size
+    return ipaddress.ip_network((address, new_prefix))
+
+
+def subnet_layout(vpc_cidr, availability_zones, newbits=SUBNET_NEWBITS):
+    """Return the networking module's subnets as ``{tier: [network, ...]}``.
+
+    Mirrors ``cidrsubnet(var.vpc_cidr, 8, count.index + k * length(var.availability_zones))``
+    with ``k`` = 0, 1, 2 for the public, private and restricted tiers.
+    ``availability_zones`` may be a list of names or a count.
+    """
+    count = availability_zones if isinstance(availability_zones, int) else len(availability_zones)
+    return {
+        tier: [cidrsubnet(vpc_cidr, newbits, index + k * count) for index in range(count)]
+        for k, tier in enumerate(TIERS)
+    }
+
+
+def parse(network):
+    """Return ``network`` as an ``ipaddress`` network object."""
+    if isinstance(network, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        return network
+    return ipaddress.ip_network(network, strict=False)
+
+
+def to_range(network):
+    """Return ``(version, first, last)`` integer bounds of a network."""
+    network = parse(network)
+    first = int(network.network_address)
+    return network.version, first, first + (1 << (network.max_prefixlen - network.prefixlen)) - 1
+
+
+@dataclass(frozen=True)
+class Overlap:
+    """``inner`` lies inside ``outer``; ``kind`` is ``duplicate`` or ``contains``.
+
+    The labels are set when :func:`find_overlaps` is given labelled networks.
+    """
+
+    outer: object
+    inner: object
+    kind: str
+    outer_label: object = None
+    inner_label: object = None
+
+
+def find_overlaps(networks, labelled=False):
+    """Return every overlapping pair as :class:`Overlap` records.
+
+    Each network is reported against the innermost block that contains it,
+    which is enough to identify every conflict while keeping the output
+    linear in the number of networks.  With ``labelled=True`` the items are
+    ``(label, network)`` pairs and each overlap carries both labels, so
+    equal networks from different owners stay distinguishable.
+    """
+    entries = []
+    for position, item in enumerate(networks):
+        label, network = item if labelled else (None, item)
+        parsed = parse(network)
+        version, first, last = to_range(parsed)
+        entries.append((version, first, -last, position, parsed, label))
+    entries.sort()
+
+    overlaps = []
+    stack = []
+    for version, first, negative_last, _, network, label in entries:
+        last = -negative_last
+        while stack and (stack[-1][0] != version or stack[-1][2] < first):
+            stack.pop()
+        if stack:
+            outer, outer_label = stack[-1][3:]
+            kind = "duplicate" if (stack[-1][1], stack[-1][2]) == (first, last) else "contains"
+            overlaps.append(Overlap(outer, network, kind, outer_label, label))
+        stack.append((version, first, last, network, label))
+    return overlaps
+
+
+class CidrAllocator:
+    """Tracks allocated blocks inside a supernet and hands out free ones.
+
+    Allocations are kept as sorted, non-overlapping integer ranges, so
+    conflict checks are a binary search and free-space search walks gaps
+    in address order.
+    """
+
+    def __init__(self, supernet, allocated=()):
+        self.supernet = parse(supernet)
+        self._starts = []
+        self._ranges = []
+        self._floors = {}
+        for network in allocated:
+            self.add(network)
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def __iter__(self):
+        return (network for _, _, network in self._ranges)
+
+    def conflicts(self, network):
+        """Return allocated networks overlapping ``network``."""
+        _, first, last = to_range(network)
+        position = bisect.bisect_right(self._starts, last)
+        found = []
+        while position > 0:
+            position -= 1
+            start, end, existing = self._ranges[position]
+            if end < first:
+                break
+            found.append(existing)
+        return found[::-1]
+
+    def add(self, network):
+        """Record ``network`` as allocated, refusing overlaps and strays."""
+        network = parse(network)
+        if network.version != self.supernet.version or not network.subnet_of(self.supernet):
+            raise CidrError(f"{network} is outside {self.supernet}")
+        conflicts = self.conflicts(network)
+        if conflicts:
+            raise CidrError(f"{network} overlaps {', '.join(map(str, conflicts))}")
+        _, first, last = to_range(network)
+        position = bisect.bisect_left(self._starts, first)
+        self._starts.insert(position, first)
+        self._ranges.insert(position, (first, last, network))
+        return network
+
+    def next_free(self, prefixlen):
+        """Return the lowest free, aligned block of ``prefixlen`` without allocating it.
+
+        Blocks are only ever added, so the answer for a prefix length can
+        never move down; the scan resumes from the last answer instead of
+        from the start of the supernet.
+        """
+        if not self.supernet.prefixlen <= prefixlen <= self.supernet.max_prefixlen:
+            raise CidrError(f"/{prefixlen} does not fit in {self.supernet}")
+        size = 1 << (self.supernet.max_prefixlen - prefixlen)
+        _, lowest, limit = to_range(self.supernet)
+        cursor = max(lowest, self._floors.get(prefixlen, lowest))
+        position = bisect.bisect_left(self._starts, cursor)
+        if position and self._ranges[position - 1][1] >= cursor:
+            cursor = self._ranges[position - 1][1] + 1
+        for start, end, _ in itertools.islice(self._ranges, position, None):
+            aligned = -(-cursor // size) * size
+            if aligned + size - 1 < start:
+                break
+            cursor = max(cursor, end + 1)
+        aligned = -(-cursor // size) * size
+        if aligned + size - 1 > limit:
+            raise CidrError(f"no free /{prefixlen} left in {self.supernet}")
+        self._floors[prefixlen] = aligned
+        return type(self.supernet)((aligned, prefixlen))
+
+    def allocate(self, prefixlen):
+        """Allocate and return the lowest free block of ``prefixlen``."""
+        return self.add(self.next_free(prefixlen))
+
+
+def _read_networks(path):
+    with open(path) as fh:
+        return [line.split("#", 1)[0].strip() for line in fh if line.split("#", 1)[0].strip()]
+
+
+@click.group()
+def main():
+    """CIDR layout and overlap tooling for the networking module."""
+
+
+@main.command()
+@click.option("--vpc-cidr", required=True, help="VPC CIDR block, e.g. 10.0.0.0/16.")
+@click.option("--azs", default=3, show_default=True, help="Number of availability zones.")
+def layout(vpc_cidr, azs):
+    """Print the public/private/restricted subnet layout."""
+    for tier, networks in subnet_layout(vpc_cidr, azs).items():
+        for index, network in enumerate(networks):
+            click.echo(f"{tier:<10} {index:>3}  {network}")
+
+
+@main.command()
+@click.argument("path", type=click.Path(exists=True))
+def check(path):
+    """Report overlapping CIDRs listed one per line in PATH."""
+    overlaps = find_overlaps(_read_networks(path))
+    for overlap in overlaps:
+        click.echo(f"{overlap.kind:<9} {overlap.outer} > {overlap.inner}")
+    raise SystemExit(1 if overlaps else 0)
+
+
+@main.command("next-free")
+@click.option("--within", required=True, help="Supernet to allocate from.")
+@click.option("--prefix", "prefixlen", required=True, type=int, help="Prefix length wanted.")
+@click.argument("path", type=click.Path(exists=True))
+def next_free(within, prefixlen, path):
+    """Propose the next free block given allocations listed in PATH."""
+    allocator = CidrAllocator(within)
+    for network in map(ipaddress.ip_network, _read_networks(path)):
+        if network.version == allocator.supernet.version and network.subnet_of(allocator.supernet):
+            allocator.add(network)
+    click.echo(allocator.next_free(prefixlen))
+
+
+if __name__ == "__main__":
+    main()
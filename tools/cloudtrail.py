@@ -0,0 +1,715 @@
+"""Columnar store and queries for the monitoring module's CloudTrail logs.
+
+``aws_cloudtrail.main`` is a multi-region trail of every management event
+plus S3 object data events.  CloudTrail delivers them as gzipped JSON
+``{"Records": [...]}`` files under
+``AWSLogs/<account>/CloudTrail/<region>/YYYY/MM/DD/`` in the trail bucket,
+with the log file validation digests under ``CloudTrail-Digest/``.
+
+:func:`ingest` reads a local copy of that bucket.  Files not yet in the
+store are split into batches that worker processes decompress, parse and
+flatten into one row per record (:data:`STRINGS`, :data:`BLOBS` and the
+event time and read-only flag), each string column dictionary-encoded
+per batch.  The parent re-codes every batch against the store's global
+dictionaries, groups the rows by partition -- day, region, eventSource and
+eventName -- and, once ``flush_rows`` rows are pending, writes one part
+per partition under ``day=<day>/region=<region>/source=<source>/name=<name>/``.
+A part is a JSON header giving each column's dtype, offset and size
+followed by the raw column arrays, so a reader fetches only the byte
+ranges of the columns it needs, and a small part in one read.
+
+A SQLite catalog beside the parts holds each part's partition, row count
+and time range, the dictionaries, and every file ingested.  It is
+committed only after the parts it names are written, so re-running
+:func:`ingest` over the bucket reads only new deliveries (CloudTrail never
+rewrites a delivered object) and parts left by an interrupted run are
+never read.  :meth:`TrailStore.compact` merges the parts of each partition
+that repeated ingests leave behind.
+
+:meth:`TrailStore.query` pushes predicates down before reading column
+data: partition values and the time range select parts through the
+catalog, each string predicate becomes a set of codes looked up once (a
+value never seen matches nothing without opening a part), and only the
+columns the predicates and the selection name are read from each part.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import click
+import numpy as np
+
+from tools.flowlogs import GZIP_MAGIC
+from tools.metricfilters import _bounded
+
+SCHEMA_VERSION = 1
+CATALOG = "catalog.db"
+PARTITION = ("day", "region", "source", "name")
+# Dictionary-encoded columns, partition columns first, and where each comes from in a record.
+STRINGS = {
+    "day": "eventTime (date)",
+    "region": "awsRegion",
+    "source": "eventSource",
+    "name": "eventName",
+    "event_type": "eventType",
+    "principal": "userIdentity.arn, else invokedBy, else type",
+    "principal_type": "userIdentity.type",
+    "account": "recipientAccountId",
+    "access_key": "userIdentity.accessKeyId",
+    "source_ip": "sourceIPAddress",
+    "user_agent": "userAgent",
+    "error_code": "errorCode",
+}
+# Variable-length columns stored as raw bytes with offsets, read only when selected.
+BLOBS = {"event_id": "eventID", "request": "requestParameters (JSON)"}
+NUMBERS = {"time": "eventTime (epoch seconds)", "read_only": "readOnly (1, 0 or -1 when absent)"}
+COLUMNS = tuple(NUMBERS) + tuple(STRINGS) + tuple(BLOBS)
+ROW_STRINGS = tuple(column for column in STRINGS if column not in PARTITION)
+MISSING = -1
+UNKNOWN = "unknown"
+BATCH_FILES = 64
+FLUSH_ROWS = 1_000_000
+DIGEST_DIRECTORY = "CloudTrail-Digest"
+PART_SUFFIX = ".part"
+PART_MAGIC = b"TRAILPART1"
+# Parts up to this size are read whole in one call.
+PART_READ = 64 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, records INTEGER NOT NULL, ingested_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS parts (
+    id INTEGER PRIMARY KEY, day TEXT NOT NULL, region TEXT NOT NULL, source TEXT NOT NULL, name TEXT NOT NULL,
+    path TEXT NOT NULL, rows INTEGER NOT NULL, first INTEGER NOT NULL, last INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parts_by_name ON parts (name, day);
+CREATE INDEX IF NOT EXISTS parts_by_day ON parts (day, region);
+CREATE TABLE IF NOT EXISTS strings (
+    field TEXT NOT NULL, code INTEGER NOT NULL, value TEXT NOT NULL,
+    PRIMARY KEY (field, code)
+) WITHOUT ROWID;
+"""
+
+
+class TrailError(ValueError):
+    """Raised for unreadable stores and queries on unknown columns."""
+
+
+# -- Parsing --------------------------------------------------------------------
+
+
+@dataclass
+class Batch:
+    """Flattened records of a batch of files with batch-local dictionaries.
+
+    ``codes`` index ``dictionaries``, in which None stands for an absent
+    field; ``blobs`` map a column to ``(lengths, bytes)``.
+    """
+
+    files: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    skipped: int = 0
+    time: np.ndarray = None
+    read_only: np.ndarray = None
+    codes: dict = field(default_factory=dict)
+    dictionaries: dict = field(default_factory=dict)
+    blobs: dict = field(default_factory=dict)
+
+    def __len__(self):
+        return 0 if self.time is None else len(self.time)
+
+
+def trail_files(root):
+    """Paths of the CloudTrail log files under ``root``, relative and ``/``-separated, in a stable order."""
+    found = []
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories[:] = [name for name in subdirectories if name != DIGEST_DIRECTORY]
+        relative = os.path.relpath(directory, root)
+        for name in names:
+            if name.endswith((".json.gz", ".json")):
+                found.append(name if relative == "." else f"{relative}/{name}".replace(os.sep, "/"))
+    return sorted(found)
+
+
+def _flatten(record):
+    identity = record.get("userIdentity") or {}
+    stamp = record["eventTime"]
+    return (stamp[:10], record.get("awsRegion") or UNKNOWN, record.get("eventSource") or UNKNOWN,
+            record.get("eventName") or UNKNOWN, record.get("eventType"),
+            identity.get("arn") or identity.get("invokedBy") or identity.get("type"), identity.get("type"),
+            record.get("recipientAccountId"), identity.get("accessKeyId"), record.get("sourceIPAddress"),
+            record.get("userAgent"), record.get("errorCode"))
+
+
+def parse_files(root, paths):
+    """Read and flatten the trail files ``paths`` under ``root`` into one :class:`Batch`.
+
+    A file that does not decompress or parse is reported in ``errors`` and
+    left out of ``files``, so the next ingest tries it again; records
+    without a usable ``eventTime`` are counted in ``skipped``.
+    """
+    batch = Batch()
+    rows, times, flags, event_ids, requests, days = [], [], [], [], [], {}
+    for path in paths:
+        try:
+            with open(os.path.join(root, path), "rb") as fh:
+                data = fh.read()
+            if data[:2] == GZIP_MAGIC:
+                data = gzip.decompress(data)
+            records = json.loads(data)["Records"]
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as exc:
+            batch.errors.append((path, f"{type(exc).__name__}: {exc}"))
+            continue
+        for record in records:
+            try:
+                stamp = record["eventTime"]
+                day = days.get(stamp[:10])
+                if day is None:
+                    day = days[stamp[:10]] = int(datetime.strptime(stamp[:10], "%Y-%m-%d").replace(
+                        tzinfo=timezone.utc).timestamp())
+                seconds = day + int(stamp[11:13]) * 3600 + int(stamp[14:16]) * 60 + int(stamp[17:19])
+                row = _flatten(record)
+            except (KeyError, TypeError, ValueError, AttributeError):
+                batch.skipped += 1
+                continue
+            rows.append(row)
+            times.append(seconds)
+            flags.append(record.get("readOnly"))
+            event_ids.append((record.get("eventID") or "").encode())
+            parameters = record.get("requestParameters")
+            requests.append(b"" if parameters is None else json.dumps(
+                parameters, sort_keys=True, separators=(",", ":")).encode())
+        batch.files.append((path, len(records)))
+    batch.time = np.array(times, dtype=np.int64)
+    batch.read_only = np.array([MISSING if flag is None else flag in (True, "true") for flag in flags], dtype=np.int8)
+    for column, values in zip(STRINGS, zip(*rows) if rows else [()] * len(STRINGS)):
+        dictionary = list(dict.fromkeys(values))
+        table = {value: code for code, value in enumerate(dictionary)}
+        batch.codes[column] = np.fromiter(map(table.__getitem__, values), dtype=np.int32, count=len(values))
+        batch.dictionaries[column] = dictionary
+    for column, values in (("event_id", event_ids), ("request", requests)):
+        batch.blobs[column] = (np.fromiter(map(len, values), dtype=np.int64, count=len(values)), b"".join(values))
+    return batch
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _take(lengths, data, rows, offsets=None):
+    """``(lengths, bytes)`` of the blob values at ``rows``, gathered in one vectorized pass.
+
+    Pass the ``offsets`` of ``lengths`` when taking many row sets from one blob.
+    """
+    offsets = _offsets(lengths) if offsets is None else offsets
+    taken = lengths[rows]
+    starts = _offsets(taken)
+    positions = np.repeat(offsets[rows] - starts[:-1], taken) + np.arange(starts[-1], dtype=np.int64)
+    return taken, np.frombuffer(data, dtype=np.uint8)[positions]
+
+
+# -- Parts ----------------------------------------------------------------------
+
+
+def write_part(path, arrays):
+    """Write ``arrays`` as a part: magic, header length, JSON header, then each array's bytes."""
+    columns, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        columns[name] = [array.dtype.str, offset, len(array)]
+        offset += array.nbytes
+    header = json.dumps({"columns": columns}, separators=(",", ":")).encode()
+    with open(path, "wb") as fh:
+        fh.write(PART_MAGIC + len(header).to_bytes(4, "little") + header)
+        for array in arrays.values():
+            fh.write(np.ascontiguousarray(array).tobytes())
+
+
+def read_part(path, names):
+    """``{name: array}`` of the columns ``names`` of the part at ``path``."""
+    with open(path, "rb") as fh:
+        head = fh.read(PART_READ)
+        if head[:len(PART_MAGIC)] != PART_MAGIC:
+            raise TrailError(f"{path}: not a trail part")
+        start = len(PART_MAGIC) + 4
+        size = int.from_bytes(head[len(PART_MAGIC):start], "little")
+        if start + size > len(head):
+            head += fh.read(start + size - len(head))
+        columns = json.loads(head[start:start + size])["columns"]
+        base, found = start + size, {}
+        for name in names:
+            dtype, offset, count = columns[name]
+            dtype = np.dtype(dtype)
+            first, last = base + offset, base + offset + count * dtype.itemsize
+            if last <= len(head):
+                found[name] = np.frombuffer(head, dtype=dtype, count=count, offset=first)
+            else:
+                fh.seek(first)
+                found[name] = np.frombuffer(fh.read(last - first), dtype=dtype, count=count)
+        return found
+
+
+# -- Store ----------------------------------------------------------------------
+
+
+def _empty(column):
+    if column in BLOBS:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    return np.zeros(0, dtype=np.int64 if column == "time" else np.int8 if column == "read_only" else np.int32)
+
+
+def _concatenate(pieces):
+    merged = {}
+    for column in pieces[0]:
+        if column in BLOBS:
+            merged[column] = (np.concatenate([piece[column][0] for piece in pieces]),
+                              np.concatenate([np.asarray(piece[column][1], dtype=np.uint8) for piece in pieces]))
+        else:
+            merged[column] = np.concatenate([piece[column] for piece in pieces])
+    return merged
+
+
+def _day(epoch):
+    return time.strftime("%Y-%m-%d", time.gmtime(epoch))
+
+
+class TrailStore:
+    """The partitioned columnar store in ``directory``."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(directory, CATALOG))
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise TrailError(f"{directory}: store schema {version}, expected {SCHEMA_VERSION}")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(_SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.strings = {column: [] for column in STRINGS}
+        for column, code, value in self.db.execute("SELECT field, code, value FROM strings ORDER BY field, code"):
+            self.strings[column].append(value)
+        self.codes = {column: {value: code for code, value in enumerate(values)}
+                      for column, values in self.strings.items()}
+        self._new_strings = []
+        self._pending = defaultdict(list)
+        self._pending_files = []
+        self._pending_rows = 0
+        self._folders = set()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def ingested(self):
+        """Relative paths of every file already in the store."""
+        return {row[0] for row in self.db.execute("SELECT path FROM files")}
+
+    def _code(self, column, value):
+        codes = self.codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.strings[column])
+            self.strings[column].append(value)
+            self._new_strings.append((column, code, value))
+        return code
+
+    def add(self, batch, flush_rows=FLUSH_ROWS):
+        """Re-code ``batch`` against the store's dictionaries and queue its rows by partition.
+
+        The queued rows and the batch's files are committed by :meth:`flush`,
+        which runs here once ``flush_rows`` rows are pending; returns the
+        parts written.
+        """
+        self._pending_files.extend(batch.files)
+        if len(batch):
+            codes = {}
+            for column, local in batch.codes.items():
+                mapping = np.array([MISSING if value is None else self._code(column, value)
+                                    for value in batch.dictionaries[column]], dtype=np.int32)
+                codes[column] = mapping[local]
+            keys = np.stack([codes[column] for column in PARTITION], axis=1)
+            partitions, inverse = np.unique(keys, axis=0, return_inverse=True)
+            order = np.argsort(inverse.ravel(), kind="stable")
+            bounds = np.cumsum(np.bincount(inverse.ravel(), minlength=len(partitions)))[:-1]
+            offsets = {column: _offsets(batch.blobs[column][0]) for column in BLOBS}
+            for key, rows in zip(partitions, np.split(order, bounds)):
+                piece = {"time": batch.time[rows], "read_only": batch.read_only[rows]}
+                piece.update((column, codes[column][rows]) for column in ROW_STRINGS)
+                piece.update((column, _take(*batch.blobs[column], rows, offsets[column])) for column in BLOBS)
+                partition = tuple(self.strings[column][code] for column, code in zip(PARTITION, key.tolist()))
+                self._pending[partition].append(piece)
+            self._pending_rows += len(batch)
+        return self.flush() if self._pending_rows >= flush_rows else 0
+
+    def _write_part(self, part_id, partition, columns):
+        folder = "/".join(f"{column}={quote(value, safe='')}" for column, value in zip(PARTITION, partition))
+        path = f"{folder}/part-{part_id:06d}{PART_SUFFIX}"
+        if folder not in self._folders:
+            os.makedirs(os.path.join(self.directory, folder), exist_ok=True)
+            self._folders.add(folder)
+        arrays = {column: columns[column] for column in ("time", "read_only") + ROW_STRINGS}
+        for column in BLOBS:
+            arrays[f"{column}_lengths"], arrays[f"{column}_data"] = columns[column]
+        write_part(os.path.join(self.directory, path), arrays)
+        times = columns["time"]
+        return (part_id, *partition, path, len(times), int(times.min()), int(times.max()))
+
+    def _next_part(self):
+        return (self.db.execute("SELECT MAX(id) FROM parts").fetchone()[0] or 0) + 1
+
+    def flush(self):
+        """Write one part per pending partition and commit the parts, new strings and files together."""
+        part_id, rows = self._next_part(), []
+        for partition, pieces in sorted(self._pending.items()):
+            rows.append(self._write_part(part_id, partition, _concatenate(pieces)))
+            part_id += 1
+        now = time.time()
+        with self.db:
+            self.db.executemany("INSERT INTO strings VALUES (?, ?, ?)", self._new_strings)
+            self.db.executemany("INSERT INTO parts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                                [(path, records, now) for path, records in self._pending_files])
+        self._new_strings, self._pending_files, self._pending_rows = [], [], 0
+        self._pending.clear()
+        return len(rows)
+
+    def compact(self):
+        """Merge the parts of every partition that has more than one; return (partitions, parts removed)."""
+        groups = self.db.execute("SELECT day, region, source, name FROM parts GROUP BY day, region, source, name "
+                                 "HAVING COUNT(*) > 1").fetchall()
+        merged = removed = 0
+        for partition in groups:
+            old = self.db.execute("SELECT id, path FROM parts WHERE day = ? AND region = ? AND source = ? "
+                                  "AND name = ? ORDER BY id", partition).fetchall()
+            columns = _concatenate([self._read(path, COLUMNS) for _, path in old])
+            row = self._write_part(self._next_part(), partition, columns)
+            with self.db:
+                self.db.executemany("DELETE FROM parts WHERE id = ?", [(part_id,) for part_id, _ in old])
+                self.db.execute("INSERT INTO parts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            for _, path in old:
+                os.remove(os.path.join(self.directory, path))
+            merged += 1
+            removed += len(old)
+        return merged, removed
+
+    def _read(self, path, columns):
+        names = []
+        for column in columns:
+            if column in BLOBS:
+                names += [f"{column}_lengths", f"{column}_data"]
+            elif column not in PARTITION:
+                names.append(column)
+        arrays = read_part(os.path.join(self.directory, path), names)
+        return {column: (arrays[f"{column}_lengths"], arrays[f"{column}_data"]) if column in BLOBS else arrays[column]
+                for column in columns if column not in PARTITION}
+
+    def stats(self):
+        """``{"files", "records", "parts", "rows", "bytes", "first", "last"}`` of the store."""
+        files, records = self.db.execute("SELECT COUNT(*), COALESCE(SUM(records), 0) FROM files").fetchone()
+        parts, rows, first, last = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(rows), 0), MIN(first), MAX(last) FROM parts").fetchone()
+        size = sum(os.path.getsize(os.path.join(self.directory, row[0])) for row in self.db.execute(
+            "SELECT path FROM parts"))
+        return {"files": files, "records": records, "parts": parts, "rows": rows, "bytes": size,
+                "first": first, "last": last}
+
+    def partitions(self, column):
+        """``[(value, rows)]`` of a partition column, most rows first."""
+        if column not in PARTITION:
+            raise TrailError(f"{column} is not a partition column ({', '.join(PARTITION)})")
+        return self.db.execute(f"SELECT {column}, SUM(rows) FROM parts GROUP BY {column} "
+                               "ORDER BY SUM(rows) DESC, 1").fetchall()
+
+    def query(self, start=None, end=None, columns=(), failed=None, **where):
+        """Rows with ``start <= time < end`` matching every ``where`` predicate, as a :class:`TrailResult`.
+
+        ``where`` maps a string column to a value or a collection of values;
+        ``failed`` keeps only rows with (True) or without (False) an error
+        code.  Only ``columns`` and the columns the predicates need are read.
+        """
+        unknown = (set(where) | set(columns)) - set(COLUMNS)
+        if unknown:
+            raise TrailError(f"unknown columns: {', '.join(sorted(unknown))}")
+        values = {column: [value] if isinstance(value, str) else list(value) for column, value in where.items()}
+        codes = {}
+        for column, wanted in values.items():
+            if column not in STRINGS:
+                raise TrailError(f"{column} cannot be filtered on; filter on string columns and the time range")
+            codes[column] = [self.codes[column][value] for value in wanted if value in self.codes[column]]
+            if not codes[column]:
+                return TrailResult(self, {column: _empty(column) for column in columns}, 0)
+
+        clauses, params = [], []
+        for column in PARTITION:
+            if column in values:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values[column]))})")
+                params.extend(values[column])
+        if start is not None:
+            clauses.append("last >= ? AND day >= ?")
+            params += [int(start), _day(start)]
+        if end is not None:
+            clauses.append("first < ? AND day <= ?")
+            params += [int(end), _day(end - 1)]
+        sql = "SELECT day, region, source, name, path, rows, first, last FROM parts"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        parts = self.db.execute(sql + " ORDER BY id", params).fetchall()
+
+        filters = {column: np.array(wanted, dtype=np.int32) for column, wanted in codes.items()
+                   if column not in PARTITION}
+        needed = set(columns) | set(filters) | ({"error_code"} if failed is not None else set())
+        pieces = []
+        for *partition, path, rows, first, last in parts:
+            clipped = (start is not None and first < start) or (end is not None and last >= end)
+            data = self._read(path, needed | ({"time"} if clipped else set()))
+            mask = np.ones(rows, dtype=bool)
+            if start is not None and first < start:
+                mask &= data["time"] >= start
+            if end is not None and last >= end:
+                mask &= data["time"] < end
+            for column, wanted in filters.items():
+                mask &= np.isin(data[column], wanted)
+            if failed is not None:
+                mask &= (data["error_code"] != MISSING) == failed
+            selected = np.flatnonzero(mask)
+            if not len(selected):
+                continue
+            whole = len(selected) == rows
+            piece = {}
+            for column in columns:
+                if column in PARTITION:
+                    value = partition[PARTITION.index(column)]
+                    piece[column] = np.full(len(selected), self.codes[column][value], dtype=np.int32)
+                elif column in BLOBS:
+                    piece[column] = data[column] if whole else _take(*data[column], selected)
+                else:
+                    piece[column] = data[column] if whole else data[column][selected]
+            pieces.append((len(selected), piece))
+        merged = _concatenate([piece for _, piece in pieces]) if pieces and columns else {
+            column: _empty(column) for column in columns}
+        return TrailResult(self, merged, sum(count for count, _ in pieces), len(parts))
+
+
+# -- Queries --------------------------------------------------------------------
+
+
+class TrailResult:
+    """Columns of the rows a query matched; string columns stay dictionary codes until decoded."""
+
+    def __init__(self, store, columns, rows, parts=0):
+        self.store = store
+        self.columns = columns
+        self.rows = rows
+        self.parts = parts
+
+    def __len__(self):
+        return self.rows
+
+    def values(self, column):
+        """Decoded values of ``column``: strings (None when absent), bytes for blobs, integers otherwise."""
+        data = self.columns[column]
+        if column in STRINGS:
+            strings = self.store.strings[column] + [None]
+            return [strings[code] for code in data.tolist()]
+        if column in BLOBS:
+            lengths, blob = data
+            ends = np.cumsum(lengths).tolist()
+            raw = bytes(blob)
+            return [raw[end - length:end] for end, length in zip(ends, lengths.tolist())]
+        return data.tolist()
+
+    def count_by(self, *columns):
+        """``[(values, rows)]`` per distinct combination of ``columns``, most rows first."""
+        if not self.rows:
+            return []
+        keys = np.stack([self.columns[column] for column in columns], axis=1)
+        unique, counts = np.unique(keys, axis=0, return_counts=True)
+        decoded = [self.store.strings[column] + [None] if column in STRINGS else None for column in columns]
+        found = [(tuple(value if strings is None else strings[value] for value, strings in zip(key, decoded)),
+                  int(count)) for key, count in zip(unique.tolist(), counts.tolist())]
+        return sorted(found, key=lambda item: (-item[1], tuple(str(value) for value in item[0])))
+
+    def records(self, limit=None):
+        """Rows as dicts of decoded values, in time order."""
+        order = np.argsort(self.columns["time"], kind="stable") if "time" in self.columns else np.arange(self.rows)
+        order = order[:limit] if limit is not None else order
+        values = {column: self.values(column) for column in self.columns}
+        return [{column: column_values[position] for column, column_values in values.items()}
+                for position in order.tolist()]
+
+
+# -- Ingest ---------------------------------------------------------------------
+
+
+@dataclass
+class IngestResult:
+    files: int = 0
+    records: int = 0
+    skipped: int = 0
+    parts: int = 0
+    already: int = 0
+    errors: list = field(default_factory=list)
+
+
+def ingest(source, store, jobs=1, batch_files=BATCH_FILES, flush_rows=FLUSH_ROWS):
+    """Add every trail file under ``source`` not yet in ``store``; return an :class:`IngestResult`.
+
+    With ``jobs > 1`` batches of ``batch_files`` files are decompressed and
+    parsed on that many worker processes, at most two per worker in
+    flight, while this process re-codes and writes the results.
+    """
+    done = store.ingested()
+    paths = trail_files(source)
+    new = [path for path in paths if path not in done]
+    result = IngestResult(already=len(paths) - len(new))
+    tasks = [(source, new[position:position + batch_files]) for position in range(0, len(new), batch_files)]
+    if jobs <= 1:
+        batches = (parse_files(*task) for task in tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        batches = _bounded(pool, parse_files, tasks, jobs * 2)
+    try:
+        for batch in batches:
+            result.files += len(batch.files)
+            result.records += len(batch)
+            result.skipped += batch.skipped
+            result.errors.extend(batch.errors)
+            result.parts += store.add(batch, flush_rows)
+        result.parts += store.flush()
+    finally:
+        if jobs > 1:
+            pool.shutdown()
+    return result
+
+
+# -- CLI ------------------------------------------------------------------------
+
+
+def _epoch(text):
+    """Epoch seconds of an ISO 8601 date or time, UTC unless it says otherwise."""
+    try:
+        moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        raise click.BadParameter(f"{text!r} is not an ISO 8601 date or time")
+    return int((moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).timestamp())
+
+
+def _timestamp(epoch):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+@click.group()
+def main():
+    """CloudTrail logs from the trail bucket, stored and queried column-wise."""
+
+
+@main.command("ingest")
+@click.argument("source", type=click.Path(exists=True, file_okay=False))
+@click.argument("store", type=click.Path(file_okay=False))
+@click.option("--jobs", "-j", default=1, show_default=True, help="Worker processes.")
+@click.option("--batch-files", default=BATCH_FILES, show_default=True, help="Files per worker task.")
+@click.option("--flush-rows", default=FLUSH_ROWS, show_default=True, help="Rows pending before parts are written.")
+def ingest_command(source, store, jobs, batch_files, flush_rows):
+    """Add the trail files under SOURCE (a copy of the trail bucket) that STORE has not seen."""
+    started = time.perf_counter()
+    with TrailStore(store) as trail:
+        result = ingest(source, trail, jobs, batch_files, flush_rows)
+    elapsed = time.perf_counter() - started
+    click.echo(f"files: {result.files}  records: {result.records}  skipped records: {result.skipped}  "
+               f"parts: {result.parts}  already ingested: {result.already}  "
+               f"({elapsed:.1f}s, {result.records / max(elapsed, 1e-9):.0f} records/s)")
+    for path, message in result.errors:
+        click.echo(f"  unreadable: {path}: {message}", err=True)
+    if result.errors:
+        raise click.ClickException(f"{len(result.errors)} files could not be read; they will be retried")
+
+
+@main.command("query")
+@click.argument("store", type=click.Path(exists=True, file_okay=False))
+@click.option("--name", "names", multiple=True, help="eventName, e.g. AuthorizeSecurityGroupIngress; repeatable.")
+@click.option("--source", "sources", multiple=True, help="eventSource, e.g. ec2.amazonaws.com; repeatable.")
+@click.option("--region", "regions", multiple=True, help="awsRegion; repeatable.")
+@click.option("--where", "conditions", multiple=True, help="COLUMN=VALUE on any string column; repeatable.")
+@click.option("--since", help="ISO 8601 start (inclusive).")
+@click.option("--until", help="ISO 8601 end (exclusive) [default: now].")
+@click.option("--days", type=int, help="Only the DAYS days before --until.")
+@click.option("--failed/--succeeded", default=None, help="Only calls with or without an error code.")
+@click.option("--by", "group_by", multiple=True, help="Count rows per value of these columns.")
+@click.option("--show", default=0, show_default=True, help="Print this many matching events.")
+@click.option("--top", default=20, show_default=True, help="Rows of the --by table.")
+def query_command(store, names, sources, regions, conditions, since, until, days, failed, group_by, show, top):
+    """Count or print the events in STORE matching every predicate."""
+    where = defaultdict(list)
+    for condition in conditions:
+        column, separator, value = condition.partition("=")
+        if not separator:
+            raise click.BadParameter(f"{condition!r} is not COLUMN=VALUE", param_hint="--where")
+        where[column].append(value)
+    for column, values in (("name", names), ("source", sources), ("region", regions)):
+        where[column] += values
+    end = _epoch(until) if until else (int(time.time()) if days else None)
+    start = _epoch(since) if since else (end - days * 86400 if days else None)
+    shown = ("time", "region", "name", "principal", "source_ip", "error_code", "request") if show else ()
+    started = time.perf_counter()
+    try:
+        with TrailStore(store) as trail:
+            result = trail.query(start, end, tuple(dict.fromkeys(group_by + shown)), failed,
+                                 **{column: values for column, values in where.items() if values})
+            elapsed = time.perf_counter() - started
+            click.echo(f"events: {len(result)}  parts read: {result.parts}  ({elapsed * 1000:.0f} ms)")
+            if group_by:
+                click.echo("\n" + "  ".join(group_by) + "  events")
+                for values, count in result.count_by(*group_by)[:top]:
+                    click.echo("  " + "  ".join(str(value) for value in values) + f"  {count}")
+            for record in result.records(show) if show else ():
+                request = record["request"].decode() or "-"
+                click.echo(f"{_timestamp(record['time'])} {record['region']:<10} {record['name']:<32} "
+                           f"{record['principal']} {record['source_ip']} {record['error_code'] or '-'} {request}")
+    except TrailError as exc:
+        raise click.ClickException(str(exc))
+
+
+@main.command("compact")
+@click.argument("store", type=click.Path(exists=True, file_okay=False))
+def compact_command(store):
+    """Merge the parts each partition has gathered over repeated ingests."""
+    with TrailStore(store) as trail:
+        merged, removed = trail.compact()
+    click.echo(f"merged {removed} parts into {merged}")
+
+
+@main.command("stats")
+@click.argument("store", type=click.Path(exists=True, file_okay=False))
+@click.option("--by", "column", type=click.Choice(PARTITION), default="name", show_default=True)
+@click.option("--top", default=20, show_default=True)
+def stats_command(store, column, top):
+    """Summarize STORE and its events per partition value."""
+    with TrailStore(store) as trail:
+        stats = trail.stats()
+        click.echo(f"files: {stats['files']}  events: {stats['rows']}  parts: {stats['parts']}  "
+                   f"size: {stats['bytes'] / 1024 / 1024:.1f} MB")
+        if stats["rows"]:
+            click.echo(f"from {_timestamp(stats['first'])} to {_timestamp(stats['last'])}")
+        for value, rows in trail.partitions(column)[:top]:
+            click.echo(f"  {value:<40} {rows:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""Native compliance checks for ``tests/compliance/*.feature`` over plan JSON."""
+
+from tools.compliance.engine import ComplianceEngine, ScenarioResult, StepOutcome, summarize
+from tools.compliance.gherkin import load_features, parse_feature
+from tools.compliance.registry import registry
+
+__all__ = [
+    "ComplianceEngine",
+    "ScenarioResult",
+    "StepOutcome",
+    "load_features",
+    "parse_feature",
+    "registry",
+    "summarize",
+]
@@ -0,0 +1,69 @@
+"""Command line entry point: ``python -m tools.compliance -p tfplan.json``."""
+
+import json
+import os
+import sys
+import time
+
+import click
+
+from tools.compliance.engine import FAILED, UNDEFINED, ComplianceEngine, summarize
+from tools.compliance.gherkin import load_features
+from tools.plan import PlanIndex
+
+STATUS_COLOURS = {"passed": "green", "failed": "red", "undefined": "red", "skipped": "yellow"}
+
+
+@click.command()
+@click.option("-p", "--plan", "plan_path", required=True, type=click.Path(exists=True),
+              help="Plan JSON produced by `terraform show -json`.")
+@click.option("-f", "--features", default="tests/compliance", show_default=True,
+              type=click.Path(exists=True), help="Feature file or directory.")
+@click.option("-j", "--jobs", default=os.cpu_count() or 1, show_default=True,
+              help="Scenarios evaluated concurrently.")
+@click.option("--approved-ami", "approved_amis", multiple=True, help="AMI ID allowed for instances.")
+@click.option("--format", "output_format", type=click.Choice(["text", "json"]), default="text")
+@click.option("-v", "--verbose", is_flag=True, help="Show skipped and manual step details.")
+def main(plan_path, features, jobs, approved_amis, output_format, verbose):
+    """Evaluate compliance feature files against a Terraform plan."""
+    started = time.perf_counter()
+    plan = PlanIndex.from_file(plan_path)
+    loaded = time.perf_counter()
+    engine = ComplianceEngine(plan, options={"approved_amis": set(approved_amis)})
+    results = engine.run(load_features(features), jobs=jobs)
+    finished = time.perf_counter()
+
+    if output_format == "json":
+        click.echo(json.dumps([
+            {
+                "feature": result.scenario.feature,
+                "scenario": result.scenario.name,
+                "status": result.status,
+                "duration_ms": round(result.duration * 1000, 3),
+                "steps": [
+                    {"text": f"{o.step.keyword} {o.step.text}", "status": o.status, "messages": o.messages}
+                    for o in result.steps
+                ],
+            }
+            for result in results
+        ], indent=2))
+    else:
+        for result in results:
+            status = click.style(f"{result.status.upper():<9}", fg=STATUS_COLOURS.get(result.status))
+            click.echo(f"{status} {result.duration * 1000:8.2f} ms  {result.scenario.id}")
+            for outcome in result.steps:
+                if outcome.status in (FAILED, UNDEFINED) or (verbose and outcome.messages):
+                    click.echo(f"    {outcome.status:<9} {outcome.step.keyword} {outcome.step.text}")
+                    for message in outcome.messages:
+                        click.echo(f"        - {message}")
+        counts = summarize(results)
+        click.echo("")
+        click.echo(", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+        click.echo(f"{len(plan.resources)} resources indexed in {(loaded - started) * 1000:.1f} ms, "
+                   f"{len(results)} scenarios evaluated in {(finished - loaded) * 1000:.1f} ms")
+
+    sys.exit(1 if any(result.failed for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
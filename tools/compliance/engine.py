@@ -0,0 +1,105 @@
+"""Run compliance scenarios against an indexed plan."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from tools.compliance import steps  # noqa: F401  (registers step definitions)
+from tools.compliance.registry import ManualCheck, SkipScenario, SkipStep, registry
+from tools.plan import PlanIndex
+
+PASSED = "passed"
+FAILED = "failed"
+SKIPPED = "skipped"
+MANUAL = "manual"
+UNDEFINED = "undefined"
+
+
+@dataclass
+class StepOutcome:
+    step: object
+    status: str
+    messages: list = field(default_factory=list)
+
+
+@dataclass
+class ScenarioResult:
+    scenario: object
+    status: str
+    steps: list = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def failed(self):
+        return self.status in (FAILED, UNDEFINED)
+
+
+class Context:
+    """State shared by the steps of one scenario."""
+
+    def __init__(self, plan, options):
+        self.plan = plan
+        self.options = options
+        self.selected = plan.resources
+
+
+class ComplianceEngine:
+    """Evaluates parsed feature scenarios against a :class:`PlanIndex`."""
+
+    def __init__(self, plan, options=None, step_registry=registry):
+        self.plan = plan if isinstance(plan, PlanIndex) else PlanIndex(plan)
+        self.options = options or {}
+        self.registry = step_registry
+
+    def run_scenario(self, scenario):
+        """Evaluate one scenario and return a :class:`ScenarioResult`."""
+        started = time.perf_counter()
+        ctx = Context(self.plan, self.options)
+        outcomes = []
+        status = PASSED
+        for index, step in enumerate(scenario.steps):
+            func, args = self.registry.match(step)
+            if func is None:
+                outcomes.append(StepOutcome(step, UNDEFINED, ["no step definition matches"]))
+                status = UNDEFINED
+                continue
+            try:
+                failures = func(ctx, *args) or []
+            except SkipScenario as exc:
+                outcomes.append(StepOutcome(step, SKIPPED, [str(exc)]))
+                outcomes.extend(StepOutcome(rest, SKIPPED) for rest in scenario.steps[index + 1:])
+                status = SKIPPED
+                break
+            except SkipStep as exc:
+                outcomes.append(StepOutcome(step, SKIPPED, [str(exc)]))
+                continue
+            except ManualCheck as exc:
+                outcomes.append(StepOutcome(step, MANUAL, [str(exc)]))
+                continue
+            if failures:
+                outcomes.append(StepOutcome(step, FAILED, list(failures)))
+                if status == PASSED:
+                    status = FAILED
+            else:
+                outcomes.append(StepOutcome(step, PASSED))
+        return ScenarioResult(scenario, status, outcomes, time.perf_counter() - started)
+
+    def run(self, features, jobs=1):
+        """Evaluate every scenario of ``features``, ``jobs`` at a time.
+
+        Scenarios only read the shared plan index, so they can run
+        concurrently; results are returned in feature file order.
+        """
+        scenarios = [scenario for feature in features for scenario in feature.scenarios]
+        if jobs <= 1:
+            return [self.run_scenario(scenario) for scenario in scenarios]
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(self.run_scenario, scenarios))
+
+
+def summarize(results):
+    """Count scenarios by status."""
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    return counts
@@ -0,0 +1,85 @@
+"""Minimal parser for the Gherkin subset used in ``tests/compliance``."""
+
+import os
+from dataclasses import dataclass, field
+
+_STEP_KEYWORDS = ("Given", "When", "Then", "And", "But")
+
+
+@dataclass
+class Step:
+    keyword: str
+    text: str
+    line: int
+    kind: str
+
+
+@dataclass
+class Scenario:
+    name: str
+    line: int
+    feature: str
+    steps: list = field(default_factory=list)
+
+    @property
+    def id(self):
+        return f"{self.feature}: {self.name}"
+
+
+@dataclass
+class Feature:
+    name: str
+    path: str
+    scenarios: list = field(default_factory=list)
+
+
+def parse_feature(text, path="<string>"):
+    """Parse one feature file into a :class:`Feature`.
+
+    ``And``/``But`` steps inherit the kind (``Given``/``When``/``Then``) of
+    the step before them, so step definitions only need to care about
+    the three primary kinds.
+    """
+    feature = None
+    scenario = None
+    kind = None
+    for number, raw in enumerate(text.splitlines(), start=1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("Feature:"):
+            feature = Feature(name=line[len("Feature:"):].strip(), path=path)
+        elif line.startswith("Scenario:"):
+            if feature is None:
+                raise ValueError(f"{path}:{number}: Scenario before Feature")
+            scenario = Scenario(name=line[len("Scenario:"):].strip(), line=number,
+                                feature=feature.name)
+            feature.scenarios.append(scenario)
+            kind = None
+        elif scenario is not None:
+            keyword, _, rest = line.partition(" ")
+            if keyword not in _STEP_KEYWORDS:
+                raise ValueError(f"{path}:{number}: unexpected line {line!r}")
+            if keyword in ("Given", "When", "Then"):
+                kind = keyword
+            elif kind is None:
+                raise ValueError(f"{path}:{number}: {keyword} without a preceding step")
+            scenario.steps.append(Step(keyword=keyword, text=rest.strip(), line=number, kind=kind))
+    if feature is None:
+        raise ValueError(f"{path}: no Feature found")
+    return feature
+
+
+def load_features(path):
+    """Load a single ``.feature`` file or every feature in a directory."""
+    if os.path.isdir(path):
+        paths = sorted(
+            os.path.join(path, name) for name in os.listdir(path) if name.endswith(".feature")
+        )
+    else:
+        paths = [path]
+    features = []
+    for feature_path in paths:
+        with open(feature_path) as fh:
+            features.append(parse_feature(fh.read(), feature_path))
+    return features
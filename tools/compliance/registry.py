@@ -0,0 +1,51 @@
+"""Step definition registry for the compliance engine."""
+
+import re
+
+
+class SkipScenario(Exception):
+    """Raised by a ``Given`` step when the plan has nothing for the scenario to check."""
+
+
+class SkipStep(Exception):
+    """Raised by a step when there are no resources it applies to."""
+
+
+class ManualCheck(Exception):
+    """Raised by a step whose control cannot be verified from a plan."""
+
+
+class StepRegistry:
+    """Maps step text to step definitions through anchored regular expressions."""
+
+    def __init__(self):
+        self._steps = {"Given": [], "When": [], "Then": []}
+
+    def register(self, kind, pattern):
+        """Decorator registering ``func`` for steps of ``kind`` matching ``pattern``."""
+        compiled = re.compile(f"^{pattern}$", re.IGNORECASE)
+
+        def decorator(func):
+            self._steps[kind].append((compiled, func))
+            return func
+
+        return decorator
+
+    def match(self, step):
+        """Return ``(func, args)`` for a parsed step, or ``(None, ())``."""
+        for pattern, func in self._steps[step.kind]:
+            found = pattern.match(step.text)
+            if found:
+                return func, found.groups()
+        return None, ()
+
+
+registry = StepRegistry()
+
+
+def given(pattern):
+    return registry.register("Given", pattern)
+
+
+def then(pattern):
+    return registry.register("Then", pattern)
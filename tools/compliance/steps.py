@@ -0,0 +1,1065 @@
+"""Step definitions for ``tests/compliance/*.feature``.
+
+``Given`` steps select the resources a scenario is about and skip the
+scenario when the plan has none.  ``Then`` steps return a list of failure
+messages (empty when the control holds), raise :class:`SkipStep` when no
+resource in the plan is subject to the control, or raise
+:class:`ManualCheck` for process controls a plan cannot prove.
+"""
+
+import json
+
+from tools.compliance.registry import ManualCheck, SkipScenario, SkipStep, given, then
+
+OPEN_CIDRS = ("0.0.0.0/0", "::/0")
+PUBLIC_PORTS = (80, 443)
+SECURE_SSL_POLICIES = (
+    "ELBSecurityPolicy-TLS-1-2-2017-01",
+    "ELBSecurityPolicy-TLS-1-2-Ext-2018-06",
+    "ELBSecurityPolicy-FS-1-2-2019-08",
+    "ELBSecurityPolicy-FS-1-2-Res-2019-08",
+    "ELBSecurityPolicy-FS-1-2-Res-2020-10",
+    "ELBSecurityPolicy-TLS13-1-2-2021-06",
+    "ELBSecurityPolicy-TLS13-1-2-Res-2021-06",
+    "ELBSecurityPolicy-TLS13-1-3-2021-06",
+)
+STRONG_VPN_ALGORITHMS = {"AES256", "AES256-GCM-16"}
+CLASSIFICATION_TAGS = ("DataClassification", "Classification", "Compliance")
+DATA_STORE_TYPES = ("aws_db_instance", "aws_rds_cluster", "aws_s3_bucket",
+                    "aws_dynamodb_table", "aws_ebs_volume")
+IAM_POLICY_TYPES = ("aws_iam_policy", "aws_iam_role_policy", "aws_iam_user_policy",
+                    "aws_iam_group_policy")
+ESCALATION_ACTIONS = ("iam:*", "iam:passrole", "iam:createpolicyversion",
+                      "iam:setdefaultpolicyversion", "iam:attachrolepolicy",
+                      "iam:attachuserpolicy", "iam:putrolepolicy", "iam:putuserpolicy",
+                      "iam:createaccesskey", "iam:updateassumerolepolicy", "sts:assumerole")
+SECRET_ATTRIBUTES = ("password", "master_password", "secret", "secret_key", "token")
+
+
+# Helpers ----------------------------------------------------------------
+
+def as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def policy_document(value):
+    """Decode a policy attribute, which the plan stores as a JSON string."""
+    if isinstance(value, dict):
+        return value
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def statements(document):
+    if not document:
+        return []
+    return as_list(document.get("Statement"))
+
+
+def require(ctx, *types):
+    """Return resources of ``types`` or skip the step if there are none."""
+    resources = ctx.plan.of_type(*types)
+    if not resources:
+        raise SkipStep(f"no {' / '.join(types)} resources in plan")
+    return resources
+
+
+def attribute_values(ctx, type_name, path):
+    """Map each resource address of ``type_name`` to its values at ``path``."""
+    found = {resource.address: [] for resource in ctx.plan.of_type(type_name)}
+    for resource, value in ctx.plan.attribute(type_name, path):
+        found[resource.address].append(value)
+    return found
+
+
+def is_production(resource):
+    return str(resource.tags.get("Environment", "")).lower().startswith("prod")
+
+
+def related(ctx, target_type, attribute, resource):
+    """Return resources of ``target_type`` whose ``attribute`` points at ``resource``."""
+    matches = []
+    for candidate in ctx.plan.of_type(target_type):
+        if resource in ctx.plan.resolve_attribute(candidate, attribute):
+            matches.append(candidate)
+            continue
+        value = candidate.values.get(attribute)
+        if value is not None and value in (resource.values.get("id"), resource.values.get("bucket")):
+            matches.append(candidate)
+    return matches
+
+
+def security_group_rules(ctx, direction):
+    """Yield ``(resource, rule)`` for every inline or standalone SG rule."""
+    for resource in ctx.plan.of_type("aws_security_group", "aws_default_security_group"):
+        for rule in resource.values.get(direction) or []:
+            yield resource, rule
+    for resource in ctx.plan.of_type("aws_security_group_rule"):
+        if resource.values.get("type") == direction:
+            yield resource, resource.values
+
+
+def is_open(rule):
+    cidrs = as_list(rule.get("cidr_blocks")) + as_list(rule.get("ipv6_cidr_blocks"))
+    return any(cidr in OPEN_CIDRS for cidr in cidrs)
+
+
+def is_all_ports(rule):
+    return str(rule.get("protocol")) == "-1" or (
+        rule.get("from_port") == 0 and rule.get("to_port") == 65535)
+
+
+def allow_statements(document):
+    return [stmt for stmt in statements(document) if stmt.get("Effect") == "Allow"]
+
+
+def iam_policies(ctx):
+    """Yield ``(resource, document)`` for every identity policy in the plan."""
+    for resource in ctx.plan.of_type(*IAM_POLICY_TYPES):
+        document = policy_document(resource.values.get("policy"))
+        if document is not None:
+            yield resource, document
+
+
+def subnet_azs(subnets):
+    return {subnet.values.get("availability_zone") for subnet in subnets} - {None}
+
+
+def missing_resource(ctx, type_name, description):
+    if not ctx.plan.of_type(type_name):
+        return [f"no {type_name} defined ({description})"]
+    return []
+
+
+def cloudtrails(ctx):
+    return require(ctx, "aws_cloudtrail")
+
+
+# Given ------------------------------------------------------------------
+
+GIVEN_TYPES = {
+    "AWS resources": None,
+    "network resources": ("aws_vpc", "aws_lb", "aws_lb_listener", "aws_vpn_connection",
+                          "aws_api_gateway_domain_name"),
+    "VPC resources": ("aws_vpc", "aws_subnet", "aws_security_group"),
+    "IAM resources": ("aws_iam_role", "aws_iam_user", "aws_iam_policy", "aws_iam_role_policy",
+                      "aws_iam_role_policy_attachment"),
+    "AWS services": None,
+    "backup": ("aws_db_instance", "aws_rds_cluster", "aws_cloudtrail", "aws_s3_bucket",
+               "aws_backup_plan"),
+    "security services": None,
+    "Security Hub": ("aws_securityhub_account",),
+    "data storage resources": DATA_STORE_TYPES,
+    "IAM password policy": ("aws_iam_account_password_policy",),
+    "KMS keys": ("aws_kms_key",),
+    "network security controls": ("aws_security_group", "aws_default_security_group",
+                                  "aws_network_acl", "aws_security_group_rule"),
+    "compute resources": ("aws_instance", "aws_launch_template", "aws_launch_configuration",
+                          "aws_autoscaling_group"),
+    "incident response procedures": None,
+    "access controls": ("aws_iam_role", "aws_iam_user", "aws_iam_policy",
+                        "aws_iam_instance_profile"),
+    "data protection controls": None,
+    "CI/CD pipelines": None,
+    "compliance monitoring": ("aws_config_configuration_recorder",),
+}
+
+
+def select(ctx, types):
+    resources = ctx.plan.resources if types is None else ctx.plan.of_type(*types)
+    if not resources:
+        raise SkipScenario("no matching resources in plan")
+    ctx.selected = resources
+
+
+@given(r"I have (AWS resources|network resources|VPC resources|IAM resources) defined")
+def given_resources_defined(ctx, kind):
+    select(ctx, GIVEN_TYPES[kind])
+
+
+@given(r"I have (AWS services|security services|Security Hub|IAM password policy|KMS keys|"
+       r"access controls|compliance monitoring) configured")
+def given_configured(ctx, kind):
+    select(ctx, GIVEN_TYPES[kind])
+
+
+@given(r"I have (backup) configurations")
+def given_backup(ctx, kind):
+    select(ctx, GIVEN_TYPES[kind])
+
+
+@given(r"I have (network security controls|data protection controls|compute resources|"
+       r"incident response procedures|CI/CD pipelines)")
+def given_controls(ctx, kind):
+    select(ctx, GIVEN_TYPES[kind])
+
+
+@given(r"I have production resources")
+def given_production(ctx):
+    resources = [resource for resource in ctx.plan.resources if is_production(resource)]
+    if not resources:
+        raise SkipScenario("no resources tagged Environment=prod")
+    ctx.selected = resources
+
+
+@given(r"I have data storage resources")
+def given_data_storage(ctx):
+    select(ctx, DATA_STORE_TYPES)
+
+
+@given(r"I have third-party integrations")
+def given_third_party(ctx):
+    roles = [role for role in ctx.plan.of_type("aws_iam_role") if cross_account_statements(role)]
+    if not roles:
+        raise SkipScenario("no cross-account IAM roles in plan")
+    ctx.selected = roles
+
+
+# Encryption -------------------------------------------------------------
+
+@then(r"all RDS instances must have encryption enabled")
+def rds_encrypted(ctx):
+    require(ctx, "aws_db_instance", "aws_rds_cluster")
+    failures = []
+    for type_name in ("aws_db_instance", "aws_rds_cluster"):
+        for address, values in attribute_values(ctx, type_name, "storage_encrypted").items():
+            if values != [True]:
+                failures.append(f"{address}: storage_encrypted is not true")
+    return failures
+
+
+@then(r"all S3 buckets must have encryption enabled")
+def s3_encrypted(ctx):
+    failures = []
+    for bucket in require(ctx, "aws_s3_bucket"):
+        inline = bucket.values.get("server_side_encryption_configuration")
+        if not inline and not related(ctx, "aws_s3_bucket_server_side_encryption_configuration",
+                                      "bucket", bucket):
+            failures.append(f"{bucket.address}: no server-side encryption configuration")
+    return failures
+
+
+@then(r"all EBS volumes must be encrypted")
+def ebs_encrypted(ctx):
+    require(ctx, "aws_ebs_volume", "aws_launch_template", "aws_instance")
+    failures = []
+    for address, values in attribute_values(ctx, "aws_ebs_volume", "encrypted").items():
+        if values != [True]:
+            failures.append(f"{address}: volume is not encrypted")
+    path = "block_device_mappings.*.ebs.*.encrypted"
+    for address, values in attribute_values(ctx, "aws_launch_template", path).items():
+        if any(str(value).lower() != "true" for value in values):
+            failures.append(f"{address}: block device mapping is not encrypted")
+    for address, values in attribute_values(ctx, "aws_instance", "root_block_device.*.encrypted").items():
+        if any(value is not True for value in values):
+            failures.append(f"{address}: root block device is not encrypted")
+    return failures
+
+
+@then(r"all DynamoDB tables must have encryption enabled")
+def dynamodb_encrypted(ctx):
+    failures = []
+    for table in require(ctx, "aws_dynamodb_table"):
+        sse = table.get("server_side_encryption.0.enabled")
+        if sse is not True:
+            failures.append(f"{table.address}: server_side_encryption is not enabled")
+    return failures
+
+
+@then(r"all load balancers must use HTTPS listeners")
+def lb_https(ctx):
+    require(ctx, "aws_lb", "aws_alb")
+    failures = []
+    for listener in ctx.plan.of_type("aws_lb_listener", "aws_alb_listener"):
+        protocol = listener.values.get("protocol")
+        if protocol in ("HTTPS", "TLS"):
+            continue
+        redirects = [action.get("redirect") or [] for action in listener.values.get("default_action") or []]
+        if any(redirect and redirect[0].get("protocol") == "HTTPS" for redirect in redirects):
+            continue
+        failures.append(f"{listener.address}: {protocol} listener does not redirect to HTTPS")
+    return failures
+
+
+@then(r"all API endpoints must enforce TLS 1.2 or higher")
+def tls12(ctx):
+    require(ctx, "aws_lb_listener", "aws_alb_listener", "aws_api_gateway_domain_name")
+    failures = []
+    for listener in ctx.plan.of_type("aws_lb_listener", "aws_alb_listener"):
+        if listener.values.get("protocol") not in ("HTTPS", "TLS"):
+            continue
+        policy = listener.values.get("ssl_policy")
+        if policy not in SECURE_SSL_POLICIES:
+            failures.append(f"{listener.address}: ssl_policy {policy!r} allows TLS < 1.2")
+    for domain in ctx.plan.of_type("aws_api_gateway_domain_name"):
+        if domain.values.get("security_policy") != "TLS_1_2":
+            failures.append(f"{domain.address}: security_policy is not TLS_1_2")
+    return failures
+
+
+@then(r"VPN connections must use strong encryption")
+def vpn_encryption(ctx):
+    failures = []
+    for vpn in require(ctx, "aws_vpn_connection"):
+        for tunnel in ("tunnel1", "tunnel2"):
+            for phase in ("phase1", "phase2"):
+                algorithms = set(vpn.values.get(f"{tunnel}_{phase}_encryption_algorithms") or [])
+                if not algorithms or not algorithms <= STRONG_VPN_ALGORITHMS:
+                    failures.append(f"{vpn.address}: {tunnel} {phase} allows weak encryption")
+    return failures
+
+
+# Network segmentation ---------------------------------------------------
+
+def public_subnets(subnets):
+    return [subnet for subnet in subnets if subnet.values.get("map_public_ip_on_launch")]
+
+
+@then(r"databases must be in private subnets only")
+def databases_private(ctx):
+    require(ctx, "aws_db_instance", "aws_rds_cluster", "aws_db_subnet_group")
+    failures = []
+    for database in ctx.plan.of_type("aws_db_instance", "aws_rds_cluster"):
+        if database.values.get("publicly_accessible"):
+            failures.append(f"{database.address}: publicly_accessible is true")
+    for group in ctx.plan.of_type("aws_db_subnet_group"):
+        for subnet in public_subnets(ctx.plan.resolve_attribute(group, "subnet_ids")):
+            failures.append(f"{group.address}: uses public subnet {subnet.address}")
+    return failures
+
+
+@then(r"public subnets must not contain sensitive workloads")
+def public_subnets_clean(ctx):
+    placements = (("aws_autoscaling_group", "vpc_zone_identifier"), ("aws_instance", "subnet_id"),
+                  ("aws_db_subnet_group", "subnet_ids"))
+    require(ctx, *(type_name for type_name, _ in placements))
+    failures = []
+    for type_name, attribute in placements:
+        for resource in ctx.plan.of_type(type_name):
+            for subnet in public_subnets(ctx.plan.resolve_attribute(resource, attribute)):
+                failures.append(f"{resource.address}: placed in public subnet {subnet.address}")
+    return failures
+
+
+def restricted_security_groups(ctx):
+    groups = {}
+    for database in ctx.plan.of_type("aws_db_instance", "aws_rds_cluster"):
+        for group in ctx.plan.resolve_attribute(database, "vpc_security_group_ids"):
+            groups[group.address] = group
+    for group in ctx.plan.of_type("aws_security_group"):
+        if "restricted" in str(group.values.get("name") or "") or group.tags.get("Tier") == "restricted":
+            groups[group.address] = group
+    return list(groups.values())
+
+
+@then(r"restricted subnets must have limited ingress rules")
+def restricted_ingress(ctx):
+    groups = restricted_security_groups(ctx)
+    if not groups:
+        raise SkipStep("no security groups protect restricted resources")
+    failures = []
+    for group in groups:
+        for rule in group.values.get("ingress") or []:
+            if as_list(rule.get("cidr_blocks")) or is_all_ports(rule):
+                failures.append(f"{group.address}: ingress {rule.get('from_port')}-{rule.get('to_port')} "
+                                f"is not limited to security group sources")
+    return failures
+
+
+@then(r"security groups must follow least privilege principle")
+def least_privilege_sg(ctx):
+    require(ctx, "aws_security_group", "aws_default_security_group", "aws_security_group_rule")
+    failures = []
+    for resource, rule in security_group_rules(ctx, "ingress"):
+        if is_all_ports(rule) and (as_list(rule.get("cidr_blocks")) or is_open(rule)):
+            failures.append(f"{resource.address}: ingress allows all protocols from "
+                            f"{', '.join(as_list(rule.get('cidr_blocks')))}")
+        elif is_open(rule) and rule.get("from_port") != rule.get("to_port"):
+            failures.append(f"{resource.address}: port range {rule.get('from_port')}-"
+                            f"{rule.get('to_port')} open to the internet")
+    return failures
+
+
+# Access control ---------------------------------------------------------
+
+def manual(reason):
+    raise ManualCheck(reason)
+
+
+@then(r"root account must have MFA enabled")
+def root_mfa(ctx):
+    manual("root account MFA is not managed by Terraform")
+
+
+@then(r"all IAM users must have MFA enabled")
+def user_mfa(ctx):
+    users = require(ctx, "aws_iam_user")
+    if not ctx.plan.of_type("aws_iam_virtual_mfa_device"):
+        return [f"{user.address}: no aws_iam_virtual_mfa_device defined" for user in users]
+    manual("MFA device association happens outside the plan")
+
+
+@then(r"IAM policies must not use wildcard actions")
+def no_wildcard_actions(ctx):
+    policies = list(iam_policies(ctx))
+    if not policies:
+        raise SkipStep("no inline or customer-managed IAM policies in plan")
+    failures = []
+    for resource, document in policies:
+        for stmt in allow_statements(document):
+            for action in as_list(stmt.get("Action")):
+                if action == "*" or action.endswith(":*"):
+                    failures.append(f"{resource.address}: allows wildcard action {action!r}")
+            if "NotAction" in stmt:
+                failures.append(f"{resource.address}: Allow with NotAction grants implicit wildcards")
+    return failures
+
+
+@then(r"IAM policies must not use wildcard resources")
+def no_wildcard_resources(ctx):
+    policies = list(iam_policies(ctx))
+    if not policies:
+        raise SkipStep("no inline or customer-managed IAM policies in plan")
+    failures = []
+    for resource, document in policies:
+        for stmt in allow_statements(document):
+            if "*" in as_list(stmt.get("Resource")) or "NotResource" in stmt:
+                failures.append(f"{resource.address}: allows actions on every resource")
+    return failures
+
+
+def cross_account_statements(role):
+    document = policy_document(role.values.get("assume_role_policy"))
+    found = []
+    for stmt in allow_statements(document):
+        principal = stmt.get("Principal")
+        if isinstance(principal, dict) and "AWS" in principal:
+            found.append(stmt)
+        elif principal == "*":
+            found.append(stmt)
+    return found
+
+
+@then(r"(?:cross-account roles|external access) must (?:have|use IAM roles with) external ID")
+def external_id(ctx):
+    failures = []
+    roles = require(ctx, "aws_iam_role")
+    for role in roles:
+        for stmt in cross_account_statements(role):
+            conditions = stmt.get("Condition") or {}
+            if not any("sts:ExternalId" in (block or {}) for block in conditions.values()):
+                failures.append(f"{role.address}: cross-account trust without sts:ExternalId")
+    return failures
+
+
+# Audit logging ----------------------------------------------------------
+
+@then(r"CloudTrail must be enabled in all regions")
+def cloudtrail_multi_region(ctx):
+    if not ctx.plan.of_type("aws_cloudtrail"):
+        return ["no aws_cloudtrail defined"]
+    return [f"{trail.address}: is_multi_region_trail is not true"
+            for trail in ctx.plan.of_type("aws_cloudtrail")
+            if trail.values.get("is_multi_region_trail") is not True]
+
+
+@then(r"CloudTrail logs must be encrypted")
+def cloudtrail_encrypted(ctx):
+    return [f"{trail.address}: kms_key_id is not set"
+            for trail in cloudtrails(ctx) if not trail.is_set("kms_key_id")]
+
+
+def flow_log_failures(ctx, traffic_types):
+    failures = []
+    for vpc in require(ctx, "aws_vpc"):
+        logs = [log for log in related(ctx, "aws_flow_log", "vpc_id", vpc)
+                if log.values.get("traffic_type") in traffic_types]
+        if not logs:
+            failures.append(f"{vpc.address}: no aws_flow_log capturing {'/'.join(traffic_types)} traffic")
+    return failures
+
+
+@then(r"VPC Flow Logs must be enabled")
+def flow_logs(ctx):
+    return flow_log_failures(ctx, ("ALL", "ACCEPT", "REJECT"))
+
+
+@then(r"S3 access logging must be enabled for sensitive buckets")
+def s3_access_logging(ctx):
+    failures = []
+    for bucket in require(ctx, "aws_s3_bucket"):
+        if not bucket.values.get("logging") and not related(ctx, "aws_s3_bucket_logging", "bucket", bucket):
+            failures.append(f"{bucket.address}: access logging is not enabled")
+    return failures
+
+
+@then(r"RDS audit logging must be enabled")
+def rds_audit_logging(ctx):
+    return [f"{db.address}: enabled_cloudwatch_logs_exports is empty"
+            for db in require(ctx, "aws_db_instance", "aws_rds_cluster")
+            if not db.is_set("enabled_cloudwatch_logs_exports")]
+
+
+# Data retention ---------------------------------------------------------
+
+@then(r"RDS backups must be retained for at least (\d+) days")
+def rds_backup_retention(ctx, days):
+    failures = []
+    for db in require(ctx, "aws_db_instance", "aws_rds_cluster"):
+        retention = db.values.get("backup_retention_period") or 0
+        if int(retention) < int(days):
+            failures.append(f"{db.address}: backup_retention_period is {retention}")
+    return failures
+
+
+@then(r"CloudTrail logs must be retained for at least (\d+) days")
+def cloudtrail_retention(ctx, days):
+    failures = []
+    checked = False
+    for trail in cloudtrails(ctx):
+        buckets = ctx.plan.resolve_attribute(trail, "s3_bucket_name")
+        for bucket in buckets:
+            checked = True
+            rules = [rule for config in related(ctx, "aws_s3_bucket_lifecycle_configuration", "bucket", bucket)
+                     for rule in config.values.get("rule") or []]
+            expirations = [exp.get("days") or 0 for rule in rules for exp in rule.get("expiration") or []]
+            if any(0 < expiry < int(days) for expiry in expirations):
+                failures.append(f"{bucket.address}: CloudTrail objects expire before {days} days")
+    if not checked:
+        raise SkipStep("CloudTrail buckets are not managed in this plan")
+    return failures
+
+
+@then(r"S3 objects must have lifecycle policies defined")
+def s3_lifecycle(ctx):
+    failures = []
+    for bucket in require(ctx, "aws_s3_bucket"):
+        if not bucket.values.get("lifecycle_rule") and not related(
+                ctx, "aws_s3_bucket_lifecycle_configuration", "bucket", bucket):
+            failures.append(f"{bucket.address}: no lifecycle configuration")
+    return failures
+
+
+@then(r"logs must be stored in immutable storage")
+def immutable_logs(ctx):
+    return [f"{trail.address}: enable_log_file_validation is not true"
+            for trail in cloudtrails(ctx) if trail.values.get("enable_log_file_validation") is not True]
+
+
+# High availability ------------------------------------------------------
+
+def production(ctx, *types):
+    resources = [resource for resource in ctx.selected if resource.type in types]
+    if not resources:
+        raise SkipStep(f"no production {' / '.join(types)} resources")
+    return resources
+
+
+@then(r"RDS must use Multi-AZ deployment")
+def rds_multi_az(ctx):
+    return [f"{db.address}: multi_az is not true"
+            for db in production(ctx, "aws_db_instance") if db.values.get("multi_az") is not True]
+
+
+@then(r"critical applications must span multiple availability zones")
+def apps_multi_az(ctx):
+    failures = []
+    for group in production(ctx, "aws_autoscaling_group"):
+        azs = subnet_azs(ctx.plan.resolve_attribute(group, "vpc_zone_identifier"))
+        azs |= set(group.values.get("availability_zones") or [])
+        if len(azs) < 2:
+            failures.append(f"{group.address}: spans {len(azs)} availability zone(s)")
+    return failures
+
+
+@then(r"load balancers must be cross-zone enabled")
+def lb_cross_zone(ctx):
+    failures = []
+    for lb in production(ctx, "aws_lb", "aws_alb"):
+        if lb.values.get("load_balancer_type", "application") == "application":
+            continue
+        if lb.values.get("enable_cross_zone_load_balancing") is not True:
+            failures.append(f"{lb.address}: enable_cross_zone_load_balancing is not true")
+    return failures
+
+
+@then(r"NAT gateways must be deployed in multiple AZs")
+def nat_multi_az(ctx):
+    gateways = production(ctx, "aws_nat_gateway")
+    by_module = {}
+    for gateway in gateways:
+        by_module.setdefault(gateway.module, []).append(gateway)
+    failures = []
+    for module, members in sorted(by_module.items()):
+        azs = set()
+        for gateway in members:
+            azs |= subnet_azs(ctx.plan.resolve_attribute(gateway, "subnet_id"))
+        count = len(azs) if azs else len(members)
+        if count < 2:
+            failures.append(f"{module or 'root'}: NAT gateways cover {count} availability zone(s)")
+    return failures
+
+
+# Security monitoring ----------------------------------------------------
+
+@then(r"GuardDuty must be enabled")
+def guardduty(ctx):
+    failures = missing_resource(ctx, "aws_guardduty_detector", "GuardDuty")
+    failures += [f"{detector.address}: enable is not true"
+                 for detector in ctx.plan.of_type("aws_guardduty_detector")
+                 if detector.values.get("enable") is False]
+    return failures
+
+
+@then(r"Security Hub must be enabled")
+def securityhub(ctx):
+    return missing_resource(ctx, "aws_securityhub_account", "Security Hub")
+
+
+@then(r"AWS Config must be enabled")
+def config_enabled(ctx):
+    failures = missing_resource(ctx, "aws_config_configuration_recorder", "AWS Config")
+    statuses = ctx.plan.of_type("aws_config_configuration_recorder_status")
+    if not failures and not any(status.values.get("is_enabled") for status in statuses):
+        failures.append("no enabled aws_config_configuration_recorder_status")
+    return failures
+
+
+@then(r"CloudWatch alarms must be configured for security events")
+def security_alarms(ctx):
+    filters = ctx.plan.of_type("aws_cloudwatch_log_metric_filter")
+    if not filters:
+        return ["no aws_cloudwatch_log_metric_filter defined"]
+    alarmed = {(alarm.values.get("namespace"), alarm.values.get("metric_name"))
+               for alarm in ctx.plan.of_type("aws_cloudwatch_metric_alarm")}
+    failures = []
+    for metric_filter in filters:
+        for transform in metric_filter.values.get("metric_transformation") or []:
+            key = (transform.get("namespace"), transform.get("name"))
+            if key not in alarmed:
+                failures.append(f"{metric_filter.address}: metric {key[1]} has no alarm")
+    return failures
+
+
+@then(r"SNS notifications must be configured for critical alerts")
+def alarm_notifications(ctx):
+    return [f"{alarm.address}: no alarm_actions"
+            for alarm in require(ctx, "aws_cloudwatch_metric_alarm")
+            if not alarm.is_set("alarm_actions")]
+
+
+def standard_enabled(ctx, fragment):
+    subscriptions = require(ctx, "aws_securityhub_standards_subscription")
+    if any(fragment in str(sub.values.get("standards_arn")) for sub in subscriptions):
+        return []
+    return [f"no aws_securityhub_standards_subscription for {fragment}"]
+
+
+@then(r"CIS AWS Foundations Benchmark must be enabled")
+def cis_standard(ctx):
+    return standard_enabled(ctx, "cis-aws-foundations-benchmark")
+
+
+@then(r"PCI-DSS compliance standard must be enabled")
+def pci_standard(ctx):
+    return standard_enabled(ctx, "pci-dss")
+
+
+@then(r"AWS Foundational Security Best Practices must be enabled")
+def fsbp_standard(ctx):
+    return standard_enabled(ctx, "aws-foundational-security-best-practices")
+
+
+@then(r"all findings must be remediated within SLA")
+def findings_sla(ctx):
+    manual("finding remediation SLAs are tracked outside Terraform")
+
+
+# Data privacy -----------------------------------------------------------
+
+@then(r"PII must be encrypted with customer-managed keys")
+def customer_managed_keys(ctx):
+    require(ctx, *DATA_STORE_TYPES)
+    failures = []
+    for db in ctx.plan.of_type("aws_db_instance", "aws_rds_cluster"):
+        if not db.is_set("kms_key_id"):
+            failures.append(f"{db.address}: no customer-managed kms_key_id")
+    for table in ctx.plan.of_type("aws_dynamodb_table"):
+        if not table.get("server_side_encryption.0.kms_key_arn"):
+            failures.append(f"{table.address}: no customer-managed kms_key_arn")
+    for bucket in ctx.plan.of_type("aws_s3_bucket"):
+        configs = related(ctx, "aws_s3_bucket_server_side_encryption_configuration", "bucket", bucket)
+        algorithms = [config.get("rule.0.apply_server_side_encryption_by_default.0.sse_algorithm")
+                      for config in configs]
+        if "aws:kms" not in algorithms:
+            failures.append(f"{bucket.address}: not encrypted with a KMS key")
+    return failures
+
+
+@then(r"data must be classified and tagged appropriately")
+def data_classified(ctx):
+    return [f"{resource.address}: no {'/'.join(CLASSIFICATION_TAGS)} tag"
+            for resource in require(ctx, *DATA_STORE_TYPES)
+            if not any(tag in resource.tags for tag in CLASSIFICATION_TAGS)]
+
+
+@then(r"S3 buckets must block public access")
+def s3_public_access(ctx):
+    flags = ("block_public_acls", "block_public_policy", "ignore_public_acls", "restrict_public_buckets")
+    failures = []
+    for bucket in require(ctx, "aws_s3_bucket"):
+        blocks = related(ctx, "aws_s3_bucket_public_access_block", "bucket", bucket)
+        if not any(all(block.values.get(flag) for flag in flags) for block in blocks):
+            failures.append(f"{bucket.address}: public access is not fully blocked")
+    return failures
+
+
+@then(r"databases must have deletion protection enabled")
+def deletion_protection(ctx):
+    return [f"{db.address}: deletion_protection is not true"
+            for db in require(ctx, "aws_db_instance", "aws_rds_cluster")
+            if db.values.get("deletion_protection") is not True]
+
+
+# Password policy --------------------------------------------------------
+
+def password_policy(ctx):
+    return require(ctx, "aws_iam_account_password_policy")
+
+
+@then(r"minimum password length must be (\d+) characters")
+def password_length(ctx, length):
+    return [f"{policy.address}: minimum_password_length below {length}"
+            for policy in password_policy(ctx)
+            if (policy.values.get("minimum_password_length") or 0) < int(length)]
+
+
+@then(r"passwords must require (uppercase letters|lowercase letters|numbers|symbols)")
+def password_characters(ctx, kind):
+    attribute = {
+        "uppercase letters": "require_uppercase_characters",
+        "lowercase letters": "require_lowercase_characters",
+        "numbers": "require_numbers",
+        "symbols": "require_symbols",
+    }[kind]
+    return [f"{policy.address}: {attribute} is not true"
+            for policy in password_policy(ctx) if policy.values.get(attribute) is not True]
+
+
+@then(r"password reuse must be prevented for (\d+) passwords")
+def password_reuse(ctx, count):
+    return [f"{policy.address}: password_reuse_prevention below {count}"
+            for policy in password_policy(ctx)
+            if (policy.values.get("password_reuse_prevention") or 0) < int(count)]
+
+
+@then(r"passwords must expire within (\d+) days")
+def password_expiry(ctx, days):
+    return [f"{policy.address}: max_password_age is not within {days} days"
+            for policy in password_policy(ctx)
+            if not 0 < (policy.values.get("max_password_age") or 0) <= int(days)]
+
+
+# Key management ---------------------------------------------------------
+
+@then(r"all KMS keys must have rotation enabled")
+def kms_rotation(ctx):
+    return [f"{address}: enable_key_rotation is not true"
+            for address, values in attribute_values(ctx, "aws_kms_key", "enable_key_rotation").items()
+            if values != [True]]
+
+
+@then(r"KMS key policies must restrict access")
+def kms_policy(ctx):
+    failures = []
+    for key in require(ctx, "aws_kms_key"):
+        if not key.is_set("policy"):
+            failures.append(f"{key.address}: relies on the default key policy")
+            continue
+        for stmt in allow_statements(policy_document(key.values.get("policy"))):
+            principal = stmt.get("Principal")
+            if (principal == "*" or (isinstance(principal, dict) and "*" in as_list(principal.get("AWS")))) \
+                    and not stmt.get("Condition"):
+                failures.append(f"{key.address}: grants access to any principal")
+    return failures
+
+
+@then(r"deletion protection must be enabled for production keys")
+def kms_deletion_window(ctx):
+    keys = [key for key in require(ctx, "aws_kms_key") if is_production(key)]
+    if not keys:
+        raise SkipStep("no production KMS keys")
+    return [f"{key.address}: deletion_window_in_days below 30"
+            for key in keys if (key.values.get("deletion_window_in_days") or 30) < 30]
+
+
+def management_events_logged(trail):
+    selectors = trail.values.get("event_selector") or []
+    if not selectors:
+        return True
+    return any(selector.get("include_management_events") and selector.get("read_write_type") == "All"
+               for selector in selectors)
+
+
+@then(r"key usage must be logged in CloudTrail")
+def kms_logged(ctx):
+    trails = ctx.plan.of_type("aws_cloudtrail")
+    if not any(management_events_logged(trail) for trail in trails):
+        return ["no CloudTrail trail records all management events"]
+    return []
+
+
+# Network security -------------------------------------------------------
+
+@then(r"default security groups must deny all inbound traffic")
+def default_sg(ctx):
+    return [f"{group.address}: has {len(group.values.get('ingress') or [])} ingress rule(s)"
+            for group in require(ctx, "aws_default_security_group")
+            if group.values.get("ingress")]
+
+
+@then(r"security group rules must be documented")
+def sg_documented(ctx):
+    failures = []
+    for direction in ("ingress", "egress"):
+        for resource, rule in security_group_rules(ctx, direction):
+            if not rule.get("description"):
+                failures.append(f"{resource.address}: {direction} rule "
+                                f"{rule.get('from_port')}-{rule.get('to_port')} has no description")
+    return failures
+
+
+@then(r"NACLs must provide defense in depth")
+def nacls(ctx):
+    failures = []
+    for vpc in require(ctx, "aws_vpc"):
+        if not related(ctx, "aws_network_acl", "vpc_id", vpc):
+            failures.append(f"{vpc.address}: no custom aws_network_acl")
+    return failures
+
+
+@then(r"unnecessary ports must be blocked")
+def unnecessary_ports(ctx):
+    failures = []
+    for resource, rule in security_group_rules(ctx, "ingress"):
+        if not is_open(rule):
+            continue
+        ports = (rule.get("from_port"), rule.get("to_port"))
+        if ports[0] != ports[1] or ports[0] not in PUBLIC_PORTS:
+            failures.append(f"{resource.address}: ports {ports[0]}-{ports[1]} open to the internet")
+    return failures
+
+
+# Vulnerability management -----------------------------------------------
+
+@then(r"instances must use approved AMIs only")
+def approved_amis(ctx):
+    approved = ctx.options.get("approved_amis")
+    if not approved:
+        manual("no approved AMI list supplied (--approved-ami)")
+    failures = []
+    for resource in require(ctx, "aws_instance", "aws_launch_template"):
+        image = resource.values.get("image_id") or resource.values.get("ami")
+        if image not in approved:
+            failures.append(f"{resource.address}: AMI {image} is not approved")
+    return failures
+
+
+@then(r"instances must have Systems Manager agent installed")
+def ssm_agent(ctx):
+    templates = require(ctx, "aws_launch_template", "aws_instance")
+    managed = {attachment.module for attachment in ctx.plan.of_type("aws_iam_role_policy_attachment")
+               if str(attachment.values.get("policy_arn")).endswith("/AmazonSSMManagedInstanceCore")}
+    return [f"{template.address}: instance role lacks AmazonSSMManagedInstanceCore"
+            for template in templates if template.module not in managed]
+
+
+@then(r"patch baselines must be defined")
+def patch_baselines(ctx):
+    return missing_resource(ctx, "aws_ssm_patch_baseline", "patch baseline")
+
+
+@then(r"vulnerability scanning must be scheduled")
+def vulnerability_scanning(ctx):
+    if ctx.plan.of_type("aws_inspector2_enabler", "aws_inspector_assessment_template"):
+        return []
+    return ["no Amazon Inspector configuration defined"]
+
+
+# Incident response ------------------------------------------------------
+
+@then(r"CloudWatch Logs must be centralized")
+def logs_centralized(ctx):
+    return missing_resource(ctx, "aws_cloudwatch_log_group", "centralized logging")
+
+
+@then(r"incident response runbooks must be defined")
+def runbooks(ctx):
+    if ctx.plan.of_type("aws_ssm_document"):
+        return []
+    manual("runbooks are not defined as aws_ssm_document resources")
+
+
+@then(r"automated remediation must be configured where possible")
+def remediation(ctx):
+    return missing_resource(ctx, "aws_config_remediation_configuration", "automated remediation")
+
+
+@then(r"forensic tools must be available")
+def forensic_tools(ctx):
+    manual("forensic tooling is an operational control")
+
+
+# Access management ------------------------------------------------------
+
+@then(r"service accounts must use IAM roles not keys")
+def roles_not_keys(ctx):
+    return [f"{key.address}: long-lived access key" for key in ctx.plan.of_type("aws_iam_access_key")]
+
+
+@then(r"temporary credentials must be preferred")
+def temporary_credentials(ctx):
+    templates = require(ctx, "aws_launch_template", "aws_instance")
+    return [f"{template.address}: no instance profile for temporary credentials"
+            for template in templates
+            if not template.values.get("iam_instance_profile") and not template.is_set("iam_instance_profile")]
+
+
+@then(r"privilege escalation must be prevented")
+def privilege_escalation(ctx):
+    failures = []
+    for resource, document in iam_policies(ctx):
+        for stmt in allow_statements(document):
+            if "*" not in as_list(stmt.get("Resource")):
+                continue
+            for action in as_list(stmt.get("Action")):
+                if action == "*" or action.lower() in ESCALATION_ACTIONS:
+                    failures.append(f"{resource.address}: allows {action} on every resource")
+    return failures
+
+
+@then(r"administrative access must be logged")
+def admin_logged(ctx):
+    trails = ctx.plan.of_type("aws_cloudtrail")
+    if not any(trail.values.get("include_global_service_events") is not False for trail in trails):
+        return ["no CloudTrail trail records global (IAM) service events"]
+    return []
+
+
+# Data loss prevention ---------------------------------------------------
+
+@then(r"S3 bucket policies must prevent data exfiltration")
+def bucket_policies(ctx):
+    failures = []
+    for bucket in require(ctx, "aws_s3_bucket"):
+        policies = related(ctx, "aws_s3_bucket_policy", "bucket", bucket)
+        denies = [stmt for policy in policies
+                  for stmt in statements(policy_document(policy.values.get("policy")))
+                  if stmt.get("Effect") == "Deny"]
+        if not denies:
+            failures.append(f"{bucket.address}: bucket policy has no Deny guard rails")
+    return failures
+
+
+@then(r"VPC endpoints must be used for AWS services")
+def vpc_endpoints(ctx):
+    return [f"{vpc.address}: no aws_vpc_endpoint"
+            for vpc in require(ctx, "aws_vpc") if not related(ctx, "aws_vpc_endpoint", "vpc_id", vpc)]
+
+
+@then(r"outbound traffic must be monitored")
+def outbound_monitored(ctx):
+    return flow_log_failures(ctx, ("ALL", "ACCEPT"))
+
+
+@then(r"sensitive data must not be in CloudWatch Logs")
+def logs_encrypted(ctx):
+    return [f"{group.address}: log group is not KMS encrypted"
+            for group in require(ctx, "aws_cloudwatch_log_group") if not group.is_set("kms_key_id")]
+
+
+# Secure development -----------------------------------------------------
+
+@then(r"infrastructure code must be scanned for vulnerabilities")
+def iac_scanned(ctx):
+    manual("covered by the tfsec/checkov CI jobs")
+
+
+@then(r"secrets must not be hardcoded")
+def hardcoded_secrets(ctx):
+    failures = []
+    for module, inputs in sorted(ctx.plan.module_inputs.items()):
+        for name, expression in inputs.items():
+            if any(word in name for word in SECRET_ATTRIBUTES) and "constant_value" in expression:
+                failures.append(f"{module}: {name} is a hardcoded literal")
+    for address, item in sorted(ctx.plan.config.items()):
+        for name, expression in item.get("expressions", {}).items():
+            if name in SECRET_ATTRIBUTES and isinstance(expression, dict) and "constant_value" in expression:
+                failures.append(f"{address}: {name} is a hardcoded literal")
+    return failures
+
+
+@then(r"dependencies must be scanned")
+def dependencies_scanned(ctx):
+    manual("dependency scanning runs in CI")
+
+
+@then(r"security tests must pass before deployment")
+def security_tests(ctx):
+    manual("enforced by the CI pipeline ordering")
+
+
+# Compliance monitoring --------------------------------------------------
+
+@then(r"AWS Config rules must evaluate continuously")
+def config_rules(ctx):
+    failures = missing_resource(ctx, "aws_config_config_rule", "Config rules")
+    for recorder in ctx.plan.of_type("aws_config_configuration_recorder"):
+        if not recorder.get("recording_group.0.all_supported"):
+            failures.append(f"{recorder.address}: does not record all supported resources")
+    return failures
+
+
+@then(r"non-compliant resources must trigger alerts")
+def noncompliance_alerts(ctx):
+    return [f"{channel.address}: no sns_topic_arn"
+            for channel in require(ctx, "aws_config_delivery_channel")
+            if not channel.is_set("sns_topic_arn")]
+
+
+@then(r"compliance reports must be generated monthly")
+def monthly_reports(ctx):
+    manual("report generation is an operational control")
+
+
+@then(r"remediation must be tracked")
+def remediation_tracked(ctx):
+    manual("remediation tracking is an operational control")
+
+
+# Third-party security ---------------------------------------------------
+
+@then(r"API keys must be rotated regularly")
+def api_key_rotation(ctx):
+    manual("key rotation cadence is not visible in a plan")
+
+
+@then(r"third-party services must be approved")
+def third_party_approved(ctx):
+    manual("vendor approval is an operational control")
+
+
+@then(r"data sharing must be encrypted")
+def data_sharing_encrypted(ctx):
+    failures = [f"{topic.address}: SNS topic is not KMS encrypted"
+                for topic in ctx.plan.of_type("aws_sns_topic") if not topic.is_set("kms_master_key_id")]
+    failures += [f"{queue.address}: SQS queue is not encrypted"
+                 for queue in ctx.plan.of_type("aws_sqs_queue")
+                 if not queue.is_set("kms_master_key_id") and not queue.values.get("sqs_managed_sse_enabled")]
+    return failures
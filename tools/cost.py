@@ -0,0 +1,328 @@
+"""Offline monthly cost model for the environment plans.
+
+:func:`quantities` reads a ``terraform show -json`` plan once and extracts
+the billable quantities -- NAT gateways and their addresses, the app
+group's instance type, sizes and EBS volumes, the database class, storage,
+Multi-AZ and Performance Insights retention, load balancers, KMS keys, log
+groups and the monitoring services -- together with the values of the
+variables worth comparing (:data:`VARIABLES`).
+
+:func:`evaluate` prices every combination of a variable grid in every
+environment in one pass: the grid is laid out with ``np.indices``, every
+variable becomes one array over all rows (grid values or the
+environment's own value), instance and database classes become indexes
+into price vectors, and each cost component is an array expression.
+Tens of thousands of rows price in milliseconds.  Combinations with
+``min_size`` above ``max_size`` are dropped, and the table is sorted by
+monthly cost.
+
+Prices come from the bundled, versioned table in ``tools/prices/``.  What
+the plan cannot say (NAT traffic, log volume, GuardDuty events) comes from
+its ``usage`` section, which ``--usage`` overrides.
+"""
+
+import json
+import math
+import os
+from dataclasses import dataclass
+
+import click
+import numpy as np
+
+from tools.plan import PlanIndex, load_plan
+
+PRICES_PATH = os.path.join(os.path.dirname(__file__), "prices", "aws-us-east-1.json")
+
+
+def _bool(value):
+    if isinstance(value, str):
+        if value.lower() not in ("true", "false"):
+            raise CostError(f"expected true or false, got {value!r}")
+        return value.lower() == "true"
+    return bool(value)
+
+
+VARIABLES = {
+    "azs": int,
+    "ha_nat_gateway": _bool,
+    "instance_type": str,
+    "min_size": int,
+    "max_size": int,
+    "desired_capacity": int,
+    "db_instance_class": str,
+    "multi_az": _bool,
+    "allocated_storage": int,
+    "performance_insights_retention_period": int,
+}
+COMPONENTS = ("nat_gateway", "public_ipv4", "ec2", "ebs", "rds", "performance_insights", "load_balancer", "kms",
+              "cloudwatch_logs", "guardduty", "config", "cloudtrail")
+
+
+class CostError(ValueError):
+    """Raised for plans, grids or price tables the cost model cannot use."""
+
+
+def load_prices(path=PRICES_PATH):
+    """Load a price table."""
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError) as exc:
+        raise CostError(f"cannot read price table {path}: {exc}") from None
+
+
+def quantities(plan):
+    """Billable quantities and variable values of one environment plan.
+
+    ``plan`` is a plan document, a path to one or a
+    :class:`~tools.plan.PlanIndex`.
+    """
+    if isinstance(plan, str):
+        plan = load_plan(plan)
+    if not isinstance(plan, PlanIndex):
+        plan = PlanIndex(plan)
+    nat = plan.of_type("aws_nat_gateway")
+    public = [subnet for subnet in plan.of_type("aws_subnet") if subnet.values.get("map_public_ip_on_launch")]
+    azs = len(public) or len(nat) or 1
+    groups = plan.of_type("aws_autoscaling_group")
+    group = groups[0].values if groups else {}
+    templates = plan.of_type("aws_launch_template")
+    template = templates[0].values if templates else {}
+    volumes = [ebs for mapping in template.get("block_device_mappings") or () for ebs in mapping.get("ebs") or ()]
+    databases = plan.of_type("aws_db_instance")
+    database = databases[0].values if databases else {}
+    trails = plan.of_type("aws_cloudtrail")
+    log_groups = plan.of_type("aws_cloudwatch_log_group")
+    return {
+        "azs": azs,
+        "ha_nat_gateway": len(nat) > 1,
+        "nat_gateways": len(nat),
+        "extra_public_ips": max(len(plan.of_type("aws_eip")) - len(nat), 0),
+        "groups": len(groups),
+        "instance_type": template.get("instance_type") or "t3.micro",
+        "min_size": int(group.get("min_size", 0)),
+        "max_size": int(group.get("max_size", 0)),
+        "desired_capacity": int(group.get("desired_capacity") or group.get("min_size", 0)),
+        "volume_gb": sum(int(ebs.get("volume_size") or 8) for ebs in volumes) or 8,
+        "volume_type": (volumes[0].get("volume_type") if volumes else None) or "gp3",
+        "databases": len(databases),
+        "db_instance_class": database.get("instance_class") or "db.t3.micro",
+        "multi_az": bool(database.get("multi_az")),
+        "allocated_storage": int(database.get("allocated_storage") or 0),
+        "db_storage_type": database.get("storage_type") or "gp2",
+        "performance_insights": bool(database.get("performance_insights_enabled")),
+        "performance_insights_retention_period": int(database.get("performance_insights_retention_period") or 7),
+        "load_balancers": sum(1 for lb in plan.of_type("aws_lb", "aws_alb")
+                              if lb.values.get("load_balancer_type", "application") == "application"),
+        "kms_keys": len(plan.of_type("aws_kms_key")),
+        "log_groups": len(log_groups),
+        "log_retention_months": sum((group.values.get("retention_in_days") or 365) / 30 for group in log_groups),
+        "guardduty": sum(1 for detector in plan.of_type("aws_guardduty_detector")
+                         if detector.values.get("enable", True)),
+        "config_recorders": len(plan.of_type("aws_config_configuration_recorder")),
+        "trails": len(trails),
+        "data_event_trails": sum(1 for trail in trails if any(
+            selector.get("data_resource") for selector in trail.values.get("event_selector") or ())),
+    }
+
+
+def _lookup(table, values, what):
+    """Vector of ``table`` entries for ``values`` via one ``searchsorted``."""
+    keys = np.array(sorted(table))
+    positions = np.clip(np.searchsorted(keys, values), 0, len(keys) - 1)
+    unknown = keys[positions] != values
+    if unknown.any():
+        raise CostError(f"no price for {what} {str(values[unknown][0])!r}; known: {', '.join(keys)}")
+    return np.array([table[key] for key in keys], dtype=np.float64)[positions]
+
+
+@dataclass
+class CostTable:
+    """Priced rows: ``environment``, the :data:`VARIABLES`, :data:`COMPONENTS`, ``monthly`` and ``peak``."""
+
+    columns: dict
+    version: str
+
+    def __len__(self):
+        return len(self.columns["monthly"])
+
+    def rows(self, limit=None):
+        """Row dicts in table order, at most ``limit``."""
+        count = len(self) if limit is None else min(limit, len(self))
+        return [{name: column[index].item() for name, column in self.columns.items()} for index in range(count)]
+
+
+def evaluate(environments, grid=None, prices=None, usage=None):
+    """Monthly cost of every combination of ``grid`` in every environment.
+
+    ``environments`` maps names to :func:`quantities`, ``grid`` maps
+    :data:`VARIABLES` to the values to try.  A variable not in the grid
+    keeps each environment's own value.  Returns a :class:`CostTable`
+    sorted by monthly cost.
+    """
+    prices = prices or load_prices()
+    usage = {**prices["usage"], **(usage or {})}
+    grid = grid or {}
+    for name in grid:
+        if name not in VARIABLES:
+            raise CostError(f"unknown variable {name!r}; expected one of {', '.join(VARIABLES)}")
+    names = list(environments)
+    if not names:
+        raise CostError("no environments to price")
+    shape = [len(values) for values in grid.values()]
+    combinations = math.prod(shape)
+    index = np.indices(shape).reshape(len(shape), combinations)
+    environment = np.repeat(np.arange(len(names)), combinations)
+
+    def constant(key):
+        return np.array([environments[name][key] for name in names])[environment]
+
+    columns = {"environment": np.array(names)[environment]}
+    for position, (name, values) in enumerate(grid.items()):
+        try:
+            values = np.array([VARIABLES[name](value) for value in values])
+        except ValueError as exc:
+            raise CostError(f"{name}: {exc}") from None
+        columns[name] = values[np.tile(index[position], len(names))]
+    for name in VARIABLES:
+        if name not in columns:
+            columns[name] = constant(name)
+
+    hours = prices["hours_per_month"]
+    groups = constant("groups")
+    running = np.clip(columns["desired_capacity"], columns["min_size"], columns["max_size"]) * groups
+    nat = np.where(columns["ha_nat_gateway"], columns["azs"], 1) * (constant("nat_gateways") > 0)
+    rds = prices["rds"]
+    classes = columns["db_instance_class"]
+    insights = rds["performance_insights"]
+    databases = constant("databases")
+    az_factor = np.where(columns["multi_az"], rds["multi_az_factor"], 1)
+    long_term = constant("performance_insights") & (columns["performance_insights_retention_period"] >
+                                                    insights["free_retention_days"])
+    instance_month = hours * _lookup(prices["ec2"]["hourly"], columns["instance_type"], "instance type")
+    volume_month = constant("volume_gb") * _lookup(prices["ebs"]["per_gb_month"], constant("volume_type"),
+                                                   "volume type")
+    trails = constant("trails")
+    components = {
+        "nat_gateway": nat * (hours * prices["nat_gateway"]["hourly"] +
+                              usage["nat_gb_per_gateway"] * prices["nat_gateway"]["per_gb"]),
+        "public_ipv4": (nat + constant("extra_public_ips")) * hours * prices["public_ipv4"]["hourly"],
+        "ec2": running * instance_month,
+        "ebs": running * volume_month,
+        "rds": databases * az_factor * (hours * _lookup(rds["hourly"], classes, "DB instance class") +
+                                        columns["allocated_storage"] *
+                                        _lookup(rds["storage_per_gb_month"], constant("db_storage_type"),
+                                                "DB storage type")),
+        "performance_insights": databases * long_term * _lookup(rds["vcpus"], classes, "DB instance class") *
+        insights["long_term_per_vcpu_month"],
+        "load_balancer": constant("load_balancers") * hours * (prices["alb"]["hourly"] +
+                                                               usage["alb_lcu"] * prices["alb"]["lcu_hourly"]),
+        "kms": constant("kms_keys") * (prices["kms"]["key_month"] +
+                                       usage["kms_requests_per_key"] / 1e4 * prices["kms"]["per_10k_requests"]),
+        "cloudwatch_logs": usage["log_gb_per_group"] * (
+            constant("log_groups") * prices["cloudwatch_logs"]["ingest_per_gb"] +
+            constant("log_retention_months") * prices["cloudwatch_logs"]["storage_per_gb_month"]),
+        "guardduty": constant("guardduty") * (
+            usage["guardduty_million_events"] * prices["guardduty"]["per_million_events"] +
+            usage["guardduty_log_gb"] * prices["guardduty"]["per_gb_logs"]),
+        "config": constant("config_recorders") * usage["config_items"] * prices["config"]["per_item"],
+        "cloudtrail": (np.maximum(trails - 1, 0) * usage["cloudtrail_management_100k"] *
+                       prices["cloudtrail"]["management_per_100k"] + constant("data_event_trails") *
+                       usage["cloudtrail_data_100k"] * prices["cloudtrail"]["data_per_100k"]),
+    }
+    for name in COMPONENTS:
+        columns[name] = np.broadcast_to(np.asarray(components[name], dtype=np.float64), environment.shape)
+    columns["monthly"] = np.sum([columns[name] for name in COMPONENTS], axis=0)
+    columns["peak"] = columns["monthly"] + (columns["max_size"] * groups - running) * (instance_month + volume_month)
+
+    order = np.flatnonzero(columns["min_size"] <= columns["max_size"])
+    order = order[np.argsort(columns["monthly"][order], kind="stable")]
+    return CostTable({name: column[order] for name, column in columns.items()}, prices["version"])
+
+
+# -- CLI ------------------------------------------------------------------------
+
+
+def _specs(specs, option):
+    pairs = {}
+    for spec in specs:
+        name, sep, value = spec.partition("=")
+        if not sep or not name or not value:
+            raise click.BadParameter(f"expected NAME=VALUE, got {spec!r}", param_hint=option)
+        pairs[name] = value
+    return pairs
+
+
+def _environments(plan_specs):
+    try:
+        return {name: quantities(path) for name, path in _specs(plan_specs, "PLANS").items()}
+    except (OSError, ValueError) as exc:
+        raise click.ClickException(f"cannot read plan: {exc}")
+
+
+def _usage(usage_specs):
+    try:
+        return {name: float(value) for name, value in _specs(usage_specs, "--usage").items()}
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint="--usage")
+
+
+@click.group()
+def main():
+    """Price the environment plans offline."""
+
+
+@main.command("breakdown")
+@click.argument("plan_specs", metavar="ENVIRONMENT=PLAN_JSON...", nargs=-1, required=True)
+@click.option("--prices", "prices_path", default=PRICES_PATH, type=click.Path(exists=True, dir_okay=False),
+              help="Price table [default: the bundled one].")
+@click.option("--usage", "usage_specs", multiple=True, help="KEY=NUMBER usage assumption; repeat.")
+def breakdown_command(plan_specs, prices_path, usage_specs):
+    """Monthly cost of each plan by component."""
+    try:
+        table = evaluate(_environments(plan_specs), prices=load_prices(prices_path), usage=_usage(usage_specs))
+    except CostError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Prices {table.version}, USD per month")
+    for row in sorted(table.rows(), key=lambda row: row["environment"]):
+        click.echo(f"\n{row['environment']}")
+        for name in COMPONENTS:
+            if row[name]:
+                click.echo(f"  {name:<22} {row[name]:>10.2f}")
+        click.echo(f"  {'total':<22} {row['monthly']:>10.2f}   (at max_size {row['peak']:.2f})")
+
+
+@main.command("grid")
+@click.argument("plan_specs", metavar="ENVIRONMENT=PLAN_JSON...", nargs=-1, required=True)
+@click.option("--vary", "vary_specs", multiple=True,
+              help="VARIABLE=V1,V2,... e.g. db_instance_class=db.r5.large,db.r5.xlarge; repeat.")
+@click.option("--prices", "prices_path", default=PRICES_PATH, type=click.Path(exists=True, dir_okay=False),
+              help="Price table [default: the bundled one].")
+@click.option("--usage", "usage_specs", multiple=True, help="KEY=NUMBER usage assumption; repeat.")
+@click.option("--limit", default=20, show_default=True, help="Rows to print, cheapest first (0 for all).")
+@click.option("--csv", "as_csv", is_flag=True, help="Print CSV.")
+def grid_command(plan_specs, vary_specs, prices_path, usage_specs, limit, as_csv):
+    """Price every combination of the --vary values in every environment."""
+    grid = {name: values.split(",") for name, values in _specs(vary_specs, "--vary").items()}
+    try:
+        table = evaluate(_environments(plan_specs), grid, load_prices(prices_path), _usage(usage_specs))
+    except CostError as exc:
+        raise click.ClickException(str(exc))
+    shown = ["environment", *grid, "monthly", "peak"]
+    rows = table.rows(limit or None)
+    if as_csv:
+        click.echo(",".join(shown))
+        for row in rows:
+            click.echo(",".join(f"{row[name]:.2f}" if isinstance(row[name], float) else str(row[name])
+                                for name in shown))
+        return
+    widths = {name: max(len(name), 10) for name in shown}
+    click.echo("  ".join(f"{name:<{widths[name]}}" for name in shown))
+    for row in rows:
+        click.echo("  ".join(f"{row[name]:>{widths[name]}.2f}" if isinstance(row[name], float)
+                             else f"{str(row[name]):<{widths[name]}}" for name in shown))
+    click.echo(f"{len(rows)} of {len(table)} combination(s), prices {table.version}")
+
+
+if __name__ == "__main__":
+    main()
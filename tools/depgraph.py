@@ -0,0 +1,591 @@
+"""Resource dependency graph of an environment, its apply critical path and parallelism.
+
+``terraform/environments/<env>/main.tf`` wires the networking outputs into
+the security, compute, database and monitoring modules, and every resource
+waits for the resources its expressions reference.  :func:`environment_index`
+turns the HCL of an environment and its modules into the ``configuration``
+and ``planned_values`` sections of a ``terraform show -json`` document --
+``count`` expressions of the forms the modules use (literals, ``var.x``,
+``length(...)`` and conditionals) are evaluated against the module call and
+the environment's variable defaults -- and indexes it with
+:class:`tools.plan.PlanIndex`.  A real plan can be given instead, in which
+case instance counts and actions come from it.
+
+:meth:`ApplyGraph.from_index` builds one :class:`Operation` per resource
+instance.  References are resolved through ``var.*`` inputs and
+``module.*`` outputs with :meth:`PlanIndex.resolve`, so an edge runs from a
+resource to the resources that actually produce the value, and, as in
+Terraform, an instance waits for every instance of a resource it refers to.
+Each operation is weighted by the typical create time of its type
+(:data:`CREATE_SECONDS`) scaled by its planned action, so no-op resources
+cost nothing.
+
+:meth:`ApplyGraph.critical_path` is the longest weighted chain, the wall
+clock of an apply with unlimited parallelism.  :meth:`ApplyGraph.simulate`
+replays an apply with ``-parallelism=N``: ready operations start in
+topological order as slots free up, so a slow resource starting later than
+it could shows up as waiting on the limit rather than on a dependency.
+:func:`placeholders` lists module inputs hard-coded to a literal where a
+sibling module has an output of that name, or whose value or comment says
+it is a placeholder -- the inputs that leave an edge out of the graph.
+"""
+
+import heapq
+import json
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import click
+
+from tools.hcl import ENVIRONMENTS_DIR, Expression, TerraformModel, references
+from tools.plan import PlanIndex, expression_references, parent_module
+
+# Typical seconds for the AWS provider to create a resource of each type,
+# waiters included.  ``type+attribute`` entries apply when that attribute is
+# true, e.g. a Multi-AZ database instance.
+CREATE_SECONDS = {
+    "aws_vpc": 3.0,
+    "aws_subnet": 2.0,
+    "aws_internet_gateway": 2.0,
+    "aws_eip": 2.0,
+    "aws_nat_gateway": 120.0,
+    "aws_route_table": 2.0,
+    "aws_route_table_association": 1.0,
+    "aws_default_security_group": 3.0,
+    "aws_security_group": 3.0,
+    "aws_iam_role": 2.0,
+    "aws_iam_instance_profile": 8.0,
+    "aws_iam_role_policy_attachment": 1.0,
+    "aws_kms_key": 30.0,
+    "aws_launch_template": 2.0,
+    "aws_autoscaling_group": 90.0,
+    "aws_autoscaling_policy": 1.0,
+    "aws_lb": 180.0,
+    "aws_lb_target_group": 2.0,
+    "aws_lb_listener": 2.0,
+    "aws_db_subnet_group": 2.0,
+    "aws_db_instance": 600.0,
+    "aws_db_instance+multi_az": 1080.0,
+    "aws_sns_topic": 2.0,
+    "aws_sns_topic_subscription": 2.0,
+    "aws_cloudtrail": 5.0,
+    "aws_cloudwatch_log_group": 1.0,
+    "aws_cloudwatch_metric_alarm": 1.0,
+    "aws_cloudwatch_dashboard": 1.0,
+    "aws_config_configuration_recorder": 2.0,
+    "aws_config_delivery_channel": 2.0,
+    "aws_config_configuration_recorder_status": 2.0,
+    "aws_guardduty_detector": 3.0,
+    "aws_securityhub_account": 5.0,
+    "aws_securityhub_standards_subscription": 30.0,
+    "aws_flow_log": 3.0,
+    "aws_s3_bucket": 3.0,
+}
+DEFAULT_SECONDS = 5.0
+# Attributes selecting a ``type+attribute`` entry of the duration table.
+VARIANTS = {"aws_db_instance": "multi_az", "aws_rds_cluster_instance": "multi_az"}
+# Share of the create time each planned action costs; a replacement deletes
+# the old object as well.
+ACTION_FACTORS = {"create": 1.0, "update": 0.25, "replace": 2.0, "delete": 0.5, "read": 0.0, "no-op": 0.0}
+DEFAULT_PARALLELISM = 10
+
+_UNKNOWN = object()
+_CONDITIONAL_RE = re.compile(r"(.+?)\?(.+?):(.+)", re.DOTALL)
+_LENGTH_RE = re.compile(r"length\((.+)\)", re.DOTALL)
+_VAR_RE = re.compile(r"var\.(\w+)")
+_COMMENT_RE = re.compile(r"^\s*(\w+)\s*=.*?(?:#|//)\s*(.*\S)\s*$")
+_FLAG_RE = re.compile(r"todo|placeholder", re.IGNORECASE)
+# Meta-arguments of resource and module blocks that are not expressions of the block.
+_META = ("count", "for_each", "depends_on", "lifecycle", "provider", "providers", "source", "version")
+
+
+class DepGraphError(ValueError):
+    """Raised for configurations whose dependency graph cannot be built."""
+
+
+# -- Configuration -------------------------------------------------------------
+
+
+def _evaluate(value, scope):
+    """Evaluate ``count`` forms: literals, ``var.x``, ``length(...)`` and ``a ? b : c``."""
+    if not isinstance(value, Expression):
+        return value
+    return _evaluate_source(value.source, scope)
+
+
+def _evaluate_source(source, scope):
+    source = source.strip()
+    match = _CONDITIONAL_RE.fullmatch(source)
+    if match:
+        test = _evaluate_source(match.group(1), scope)
+        if not isinstance(test, bool):
+            return _UNKNOWN
+        return _evaluate_source(match.group(2 if test else 3), scope)
+    match = _LENGTH_RE.fullmatch(source)
+    if match:
+        value = _evaluate_source(match.group(1), scope)
+        return len(value) if isinstance(value, (list, dict, str)) else _UNKNOWN
+    match = _VAR_RE.fullmatch(source)
+    if match:
+        return scope.get(match.group(1), _UNKNOWN)
+    try:
+        return json.loads(source)
+    except ValueError:
+        return _UNKNOWN
+
+
+def _expression(value):
+    """A plan ``configuration`` expression for an HCL value."""
+    found = references(value)
+    return {"references": found} if found or isinstance(value, Expression) else {"constant_value": value}
+
+
+def _instances(address, body, scope, warnings):
+    """The instance keys of a resource block: ``[None]``, count indexes or for_each keys."""
+    if "for_each" in body:
+        keys = _evaluate(body["for_each"], scope)
+        if isinstance(keys, (list, dict)):
+            return sorted(keys)
+        warnings.append(f"{address}: for_each not resolvable offline, counted as one instance")
+        return [None]
+    if "count" not in body:
+        return [None]
+    count = _evaluate(body["count"], scope)
+    if isinstance(count, bool) or not isinstance(count, int):
+        warnings.append(f"{address}: count not resolvable offline, counted as one instance")
+        return [None]
+    return list(range(count))
+
+
+def _module_documents(model, module_address, scope, warnings):
+    """The ``(planned, configuration)`` bodies of one module's managed resources."""
+    planned, configured = [], []
+    for address, body in sorted(model.resources.items()):
+        if address.startswith("data."):
+            continue
+        type_name, name = address.split(".", 1)
+        full = f"{module_address}.{address}" if module_address else address
+        expressions = {key: _expression(value) for key, value in body.items() if key not in _META}
+        item = {"address": address, "mode": "managed", "type": type_name, "name": name, "expressions": expressions}
+        if "depends_on" in body:
+            item["depends_on"] = references(body["depends_on"])
+        configured.append(item)
+        values = {}
+        for key, value in body.items():
+            resolved = _evaluate(value, scope) if key not in _META else _UNKNOWN
+            if resolved is not _UNKNOWN and not references(resolved):
+                values[key] = resolved
+        for key in _instances(full, body, scope, warnings):
+            suffix = "" if key is None else (f'["{key}"]' if isinstance(key, str) else f"[{key}]")
+            resource = {"address": f"{full}{suffix}", "mode": "managed", "type": type_name, "name": name,
+                        "values": values}
+            if key is not None:
+                resource["index"] = key
+            planned.append(resource)
+    return planned, configured
+
+
+def environment_document(environment="prod", modules=None, environments=None):
+    """A plan-shaped document for ``environment`` built from the HCL, and the count warnings.
+
+    Module inputs resolve against the module call's literals, the
+    environment's variable defaults and the module's own defaults.
+    """
+    modules = modules or TerraformModel()
+    environments = environments or TerraformModel(ENVIRONMENTS_DIR)
+    try:
+        root = environments[environment]
+    except KeyError as exc:
+        raise DepGraphError(str(exc.args[0]))
+    defaults = {name: body.get("default") for name, body in root.variables.items()}
+    warnings = []
+    planned, configured = _module_documents(root, "", defaults, warnings)
+    root_planned = {"resources": planned, "child_modules": []}
+    root_config = {"resources": configured, "module_calls": {}}
+    for name, call in sorted(root.module_calls.items()):
+        source = call.get("source", "")
+        try:
+            model = modules[os.path.basename(source.rstrip("/"))]
+        except KeyError:
+            raise DepGraphError(f"module {name!r}: no module at {source!r}")
+        scope = {key: body.get("default") for key, body in model.variables.items()}
+        for key, value in call.items():
+            if key not in _META:
+                resolved = _evaluate(value, defaults)
+                scope[key] = None if resolved is _UNKNOWN else resolved
+        address = f"module.{name}"
+        planned, configured = _module_documents(model, address, scope, warnings)
+        root_planned["child_modules"].append({"address": address, "resources": planned})
+        outputs = {key: {"expression": _expression(body.get("value"))} for key, body in model.outputs.items()}
+        root_config["module_calls"][name] = {
+            "source": source,
+            "expressions": {key: _expression(value) for key, value in call.items() if key not in _META},
+            "module": {"resources": configured, "outputs": outputs},
+        }
+    document = {"planned_values": {"root_module": root_planned}, "configuration": {"root_module": root_config}}
+    return document, warnings
+
+
+def input_comments(model):
+    """``{(module address, input): comment}`` for module inputs commented as TODO or placeholder."""
+    found = {}
+    for key, (filename, line) in model.locations.items():
+        if not key.startswith("module."):
+            continue
+        with open(os.path.join(model.path, filename)) as fh:
+            lines = fh.read().splitlines()
+        depth = 0
+        for text in lines[line - 1:]:
+            match = _COMMENT_RE.match(text)
+            if match and depth == 1 and _FLAG_RE.search(match.group(2)):
+                found[key, match.group(1)] = match.group(2)
+            depth += text.count("{") - text.count("}")
+            if depth <= 0:
+                break
+    return found
+
+
+def environment_index(environment="prod", plan_path=None, modules=None, environments=None):
+    """``(index, comments, warnings)`` for an environment, from its plan when given or else its HCL."""
+    environments = environments or TerraformModel(ENVIRONMENTS_DIR)
+    comments = {}
+    if environment in environments.names():
+        comments = input_comments(environments[environment])
+    if plan_path:
+        return PlanIndex.from_file(plan_path), comments, []
+    document, warnings = environment_document(environment, modules, environments)
+    return PlanIndex(document), comments, warnings
+
+
+# -- Placeholders --------------------------------------------------------------
+
+
+@dataclass
+class Placeholder:
+    """A module input hard-coded where the graph expects a reference."""
+
+    module: str
+    name: str
+    value: object
+    reasons: list
+    suggestion: str = None
+
+
+def placeholders(index, comments=None):
+    """Module inputs that are literals standing in for another module's output.
+
+    An input is flagged when a sibling module has an output of the same name
+    (``asg_name``) or one it derives from (``lb_arn`` for ``lb_arn_suffix``),
+    when its value contains "placeholder", or when ``comments`` (see
+    :func:`input_comments`) has a TODO or placeholder comment for it.
+    """
+    comments = comments or {}
+    found = []
+    for module, expressions in sorted(index.module_inputs.items()):
+        siblings = sorted(other for other in index.module_outputs
+                          if other != module and parent_module(other) == parent_module(module))
+        for name, expression in sorted(expressions.items()):
+            if expression.get("references") or "constant_value" not in expression:
+                continue
+            value, reasons, suggestion, exact = expression["constant_value"], [], None, False
+            for other in siblings:
+                for output in index.module_outputs[other]:
+                    if output == name and not exact:
+                        suggestion, exact = f"{other}.{output}", True
+                    elif name.startswith(f"{output}_") and suggestion is None:
+                        suggestion = f"{other}.{output}"
+            if suggestion:
+                reasons.append(f"hard-coded, {suggestion} is available" if exact
+                               else f"hard-coded, derivable from {suggestion}")
+            if isinstance(value, str) and "placeholder" in value.lower():
+                reasons.append("placeholder value")
+            if (module, name) in comments:
+                reasons.append(f"comment: {comments[module, name]}")
+            if reasons:
+                found.append(Placeholder(module, name, value, reasons, suggestion))
+    return found
+
+
+# -- Graph ---------------------------------------------------------------------
+
+
+def create_seconds(type_name, values, durations=CREATE_SECONDS):
+    """Typical create time of a resource, honouring :data:`VARIANTS`."""
+    attribute = VARIANTS.get(type_name)
+    if attribute and values.get(attribute) is True and f"{type_name}+{attribute}" in durations:
+        return durations[f"{type_name}+{attribute}"]
+    return durations.get(type_name, DEFAULT_SECONDS)
+
+
+def _action(actions):
+    if "delete" in actions and "create" in actions:
+        return "replace"
+    return actions[0] if actions else "no-op"
+
+
+@dataclass
+class Operation:
+    """One resource instance to apply and the instances it waits for."""
+
+    address: str
+    type: str
+    action: str
+    seconds: float
+    after: list = field(default_factory=list)
+
+
+@dataclass
+class Schedule:
+    """A simulated apply: start and finish second of each operation."""
+
+    parallelism: int
+    wall: float
+    start: dict
+    finish: dict
+    peak: int
+
+
+class ApplyGraph:
+    """Operations keyed by address, in a topological order."""
+
+    def __init__(self, operations):
+        self.operations = operations
+        self.dependents = defaultdict(list)
+        for address, operation in operations.items():
+            for dependency in operation.after:
+                if dependency not in operations:
+                    raise DepGraphError(f"{address} waits for unknown {dependency}")
+                self.dependents[dependency].append(address)
+        self.order = self._topological()
+        self.rank = {address: rank for rank, address in enumerate(self.order)}
+
+    def __len__(self):
+        return len(self.operations)
+
+    @classmethod
+    def from_index(cls, index, durations=CREATE_SECONDS):
+        """Build the graph of every managed resource instance of a :class:`PlanIndex`."""
+        operations = {}
+        for resource in index.resources:
+            config = index.config.get(resource.base_address, {})
+            refs = expression_references(config.get("expressions", {}))
+            for key in ("count_expression", "for_each_expression"):
+                refs.extend(expression_references(config.get(key, {})))
+            refs.extend(config.get("depends_on", ()))
+            after = []
+            for base in sorted(index.resolve(resource.module, refs)):
+                if base != resource.base_address:
+                    after.extend(item.address for item in index.by_base[base])
+            action = _action(resource.actions)
+            seconds = create_seconds(resource.type, resource.values, durations) * ACTION_FACTORS.get(action, 1.0)
+            operations[resource.address] = Operation(resource.address, resource.type, action, seconds, after)
+        return cls(operations)
+
+    def _topological(self):
+        waiting = {address: len(operation.after) for address, operation in self.operations.items()}
+        ready = sorted(address for address, count in waiting.items() if not count)
+        ready.reverse()
+        order = []
+        while ready:
+            address = ready.pop()
+            order.append(address)
+            for dependent in sorted(self.dependents[address], reverse=True):
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    ready.append(dependent)
+        if len(order) != len(self.operations):
+            cycle = sorted(address for address, count in waiting.items() if count)
+            raise DepGraphError(f"dependency cycle among {', '.join(cycle[:5])}"
+                                + (f" and {len(cycle) - 5} more" if len(cycle) > 5 else ""))
+        return order
+
+    @property
+    def edges(self):
+        return sum(len(operation.after) for operation in self.operations.values())
+
+    @property
+    def work(self):
+        """Seconds of work in the apply, its wall clock with ``-parallelism=1``."""
+        return sum(operation.seconds for operation in self.operations.values())
+
+    def critical_path(self):
+        """``(seconds, addresses)`` of the longest weighted chain of operations."""
+        finish, previous = {}, {}
+        for address in self.order:
+            operation = self.operations[address]
+            ready, before = 0.0, None
+            for dependency in operation.after:
+                if finish[dependency] > ready:
+                    ready, before = finish[dependency], dependency
+            finish[address], previous[address] = ready + operation.seconds, before
+        if not finish:
+            return 0.0, []
+        address = max(self.order, key=lambda item: (finish[item], -self.rank[item]))
+        path = []
+        while address is not None:
+            path.append(address)
+            address = previous[address]
+        path.reverse()
+        return finish[path[-1]], path
+
+    def waits_on(self, address, schedule):
+        """The chain of operations ``address`` waited for in ``schedule``, latest finisher first."""
+        chain = []
+        while True:
+            after = self.operations[address].after
+            if not after:
+                return chain
+            address = max(after, key=lambda item: (schedule.finish[item], -self.rank[item]))
+            chain.append(address)
+
+    def simulate(self, parallelism=DEFAULT_PARALLELISM):
+        """Replay the apply with at most ``parallelism`` operations in flight (None: unlimited).
+
+        Ready operations start in topological order as slots free up;
+        operations that cost nothing complete without taking a slot.
+        """
+        waiting = {address: len(operation.after) for address, operation in self.operations.items()}
+        ready = [(self.rank[address], address) for address, count in waiting.items() if not count]
+        heapq.heapify(ready)
+        running, start, finish = [], {}, {}
+        now, peak = 0.0, 0
+
+        def complete(address, at):
+            finish[address] = at
+            for dependent in self.dependents[address]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    heapq.heappush(ready, (self.rank[dependent], dependent))
+
+        while ready or running:
+            while ready and (parallelism is None or len(running) < parallelism):
+                _, address = heapq.heappop(ready)
+                start[address] = now
+                seconds = self.operations[address].seconds
+                if seconds:
+                    heapq.heappush(running, (now + seconds, self.rank[address], address))
+                else:
+                    complete(address, now)
+            peak = max(peak, len(running))
+            if running:
+                now, _, address = heapq.heappop(running)
+                complete(address, now)
+        return Schedule(parallelism, now, start, finish, peak)
+
+    def dot(self, highlight=()):
+        """The graph in Graphviz DOT, operations in ``highlight`` drawn bold."""
+        highlight = set(highlight)
+        lines = ["digraph apply {", "  rankdir=LR;", "  node [shape=box, fontsize=10];"]
+        for address in self.order:
+            operation = self.operations[address]
+            style = ", style=bold, color=red" if address in highlight else ""
+            lines.append(f'  "{address}" [label="{address}\\n{operation.action} {operation.seconds:g}s"{style}];')
+        for address in self.order:
+            for dependency in self.operations[address].after:
+                style = " [color=red]" if address in highlight and dependency in highlight else ""
+                lines.append(f'  "{dependency}" -> "{address}"{style};')
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+
+# -- CLI -----------------------------------------------------------------------
+
+
+def _durations(path):
+    if not path:
+        return CREATE_SECONDS
+    with open(path) as fh:
+        overrides = json.load(fh)
+    if not isinstance(overrides, dict) or not all(isinstance(value, (int, float)) for value in overrides.values()):
+        raise click.ClickException(f"{path}: expected an object of resource type to seconds")
+    return dict(CREATE_SECONDS, **overrides)
+
+
+def _levels(text):
+    try:
+        levels = sorted({int(item) for item in text.split(",") if item.strip()})
+    except ValueError:
+        raise click.BadParameter(f"expected comma-separated integers, got {text!r}", param_hint="--parallelism")
+    if not levels or levels[0] < 1:
+        raise click.BadParameter("values must be at least 1", param_hint="--parallelism")
+    return levels
+
+
+def _build(environment, plan_path, durations_path):
+    try:
+        index, comments, warnings = environment_index(environment, plan_path)
+        graph = ApplyGraph.from_index(index, _durations(durations_path))
+    except DepGraphError as error:
+        raise click.ClickException(str(error))
+    return index, comments, warnings, graph
+
+
+_ENVIRONMENT = click.option("--environment", default="prod", show_default=True)
+_PLAN = click.option("--plan", "plan_path", type=click.Path(exists=True, dir_okay=False),
+                     help="terraform show -json output; instance counts and actions come from it.")
+_DURATIONS = click.option("--durations", "durations_path", type=click.Path(exists=True, dir_okay=False),
+                          help="JSON object of resource type to create seconds, overriding the built-in table.")
+
+
+@click.group()
+def main():
+    """Resource dependency graph of an environment and its apply critical path."""
+
+
+@main.command("analyze")
+@_ENVIRONMENT
+@_PLAN
+@_DURATIONS
+@click.option("--parallelism", "levels", default="1,5,10,20", show_default=True,
+              help="Comma-separated -parallelism values to simulate.")
+@click.option("--slow", default=60.0, show_default=True, help="List operations taking at least this many seconds.")
+@click.option("--strict", is_flag=True, help="Exit 1 when a module input is a placeholder.")
+def analyze_command(environment, plan_path, durations_path, levels, slow, strict):
+    """Report the critical path, parallelism width, apply wall clock and placeholder inputs."""
+    levels = _levels(levels)
+    index, comments, warnings, graph = _build(environment, plan_path, durations_path)
+    seconds, path = graph.critical_path()
+    unlimited = graph.simulate(None)
+    default = graph.simulate(DEFAULT_PARALLELISM)
+    click.echo(f"{len(graph)} operations, {graph.edges} edges, {graph.work:.0f} s of work")
+    click.echo(f"critical path: {seconds:.0f} s")
+    for address in path:
+        operation = graph.operations[address]
+        click.echo(f"  {unlimited.start[address]:7.0f} s  +{operation.seconds:<6g} {address}")
+    average = graph.work / seconds if seconds else 0.0
+    click.echo(f"parallelism width: peak {unlimited.peak}, average {average:.1f}")
+    click.echo(f"{'-parallelism':>12}  {'wall clock':>10}  {'vs critical path':>16}")
+    for level in levels:
+        wall = graph.simulate(level).wall
+        click.echo(f"{level:>12}  {wall:>8.0f} s  {wall / seconds if seconds else 1.0:>15.2f}x")
+    slow_operations = [address for address in graph.order if graph.operations[address].seconds >= slow]
+    if slow_operations:
+        click.echo(f"operations of {slow:g} s or more (start unlimited / -parallelism={DEFAULT_PARALLELISM}):")
+    for address in slow_operations:
+        chain = graph.waits_on(address, unlimited)
+        click.echo(f"  {address}  {graph.operations[address].seconds:g} s  starts {unlimited.start[address]:.0f} s / "
+                   f"{default.start[address]:.0f} s" + (f", waits on {chain[0]}" if chain else ""))
+    found = placeholders(index, comments)
+    for placeholder in found:
+        click.echo(f"PLACEHOLDER {placeholder.module}.{placeholder.name} = {json.dumps(placeholder.value)}: "
+                   + "; ".join(placeholder.reasons))
+    for warning in warnings:
+        click.echo(f"warning: {warning}", err=True)
+    if strict and found:
+        raise SystemExit(1)
+
+
+@main.command("dot")
+@_ENVIRONMENT
+@_PLAN
+@_DURATIONS
+def dot_command(environment, plan_path, durations_path):
+    """Print the graph in Graphviz DOT with the critical path highlighted."""
+    graph = _build(environment, plan_path, durations_path)[3]
+    click.echo(graph.dot(graph.critical_path()[1]), nl=False)
+
+
+if __name__ == "__main__":
+    main()
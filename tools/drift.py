@@ -0,0 +1,487 @@
+"""Drift between Terraform plans and the live inventory, by canonical hash.
+
+Each managed resource a plan declares (``module.database.aws_db_instance.main``)
+is matched to the live resource it manages in a :mod:`tools.inventory`
+snapshot: by the ID recorded in the plan's ``prior_state`` when there is
+one, otherwise by its natural key (security group, role and DB instance
+names, the ``Name`` tag of VPCs and subnets).  Both sides are then reduced
+to the same canonical form: scalars coerced to one type, tags as a map,
+security group rules exploded to one ``[protocol, from, to, source,
+description]`` entry per source and sorted, policy documents with every
+list sorted, and security groups referenced by name instead of ID.  Lists
+are sets, so neither rule order nor ``"-1"`` versus ``"all"`` is drift.
+
+Only attributes the plan knows are compared.  A value that is known after
+apply is left out, and a security group reference the plan cannot resolve
+becomes the wildcard ``sg:*``, which matches any group on the same rule.
+Attributes the listing does not return (IAM role tags, for example) are
+left out as well.
+
+Both canonical forms are hashed and the pair of digests is stored per
+address next to the snapshot.  A resource whose digests match the
+previous run reuses that run's verdict.  Only resources whose plan or live
+hash moved are diffed attribute by attribute again.  Because the inventory
+refresh lists only the types CloudTrail shows as changed, a repeat check of
+every environment costs a few API calls.
+"""
+
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+
+import boto3
+import click
+import jmespath
+
+from tools.iam import PolicyError, load_document
+from tools.inventory import Clients, InventoryError, Snapshot, cloudtrail_changes, refresh
+from tools.plan import PlanIndex, load_plan
+
+IN_SYNC = "in-sync"
+DRIFTED = "drifted"
+MISSING = "missing"
+WILDCARD = "sg:*"
+_PROTOCOLS = {"-1": "all", "all": "all", "6": "tcp", "17": "udp", "1": "icmp", "58": "icmpv6"}
+_SOURCES = (("IpRanges", "CidrIp"), ("Ipv6Ranges", "CidrIpv6"), ("PrefixListIds", "PrefixListId"))
+_POLICY_LISTS = ("Action", "NotAction", "Resource", "NotResource")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drift (
+    environment TEXT NOT NULL, address TEXT NOT NULL, live_id TEXT, planned TEXT NOT NULL, live TEXT,
+    status TEXT NOT NULL, changes TEXT NOT NULL,
+    PRIMARY KEY (environment, address)
+) WITHOUT ROWID;
+"""
+
+
+class DriftError(ValueError):
+    """Raised for plan arguments that cannot be read."""
+
+
+def _bool(value):
+    return value if isinstance(value, bool) else str(value).lower() == "true"
+
+
+@dataclass(frozen=True)
+class Mapping:
+    """How a Terraform resource type lines up with an inventory type.
+
+    ``plan_key`` and ``live_key`` are JMESPath expressions for the natural
+    key on the plan values and on the API item.  ``fields`` are ``(attribute,
+    JMESPath on the API item, coerce)`` triples compared as plain values.
+    ``tags_key`` is ``None`` when the listing carries no tags.
+    """
+
+    inventory_type: str
+    plan_key: str
+    live_key: str
+    fields: tuple = ()
+    tags_key: str = "Tags"
+
+
+MAPPINGS = {
+    "aws_vpc": Mapping("AWS::EC2::VPC", '(tags_all || tags)."Name"', "Tags[?Key=='Name'].Value | [0]", (
+        ("cidr_block", "CidrBlock", str), ("instance_tenancy", "InstanceTenancy", str))),
+    "aws_subnet": Mapping("AWS::EC2::Subnet", '(tags_all || tags)."Name"', "Tags[?Key=='Name'].Value | [0]", (
+        ("cidr_block", "CidrBlock", str), ("availability_zone", "AvailabilityZone", str),
+        ("map_public_ip_on_launch", "MapPublicIpOnLaunch", _bool))),
+    "aws_security_group": Mapping("AWS::EC2::SecurityGroup", "name", "GroupName", (
+        ("name", "GroupName", str), ("description", "Description", str))),
+    "aws_db_instance": Mapping("AWS::RDS::DBInstance", "identifier", "DBInstanceIdentifier", (
+        ("identifier", "DBInstanceIdentifier", str), ("engine", "Engine", str),
+        ("engine_version", "EngineVersion", str), ("instance_class", "DBInstanceClass", str),
+        ("allocated_storage", "AllocatedStorage", int), ("storage_type", "StorageType", str),
+        ("storage_encrypted", "StorageEncrypted", _bool), ("multi_az", "MultiAZ", _bool),
+        ("backup_retention_period", "BackupRetentionPeriod", int),
+        ("deletion_protection", "DeletionProtection", _bool), ("publicly_accessible", "PubliclyAccessible", _bool),
+        ("performance_insights_enabled", "PerformanceInsightsEnabled", _bool),
+        ("db_subnet_group_name", "DBSubnetGroup.DBSubnetGroupName", str)), tags_key="TagList"),
+    "aws_db_subnet_group": Mapping("AWS::RDS::DBSubnetGroup", "name", "DBSubnetGroupName", (
+        ("name", "DBSubnetGroupName", str), ("description", "DBSubnetGroupDescription", str)), tags_key=None),
+    "aws_iam_role": Mapping("AWS::IAM::Role", "name", "RoleName", (
+        ("name", "RoleName", str), ("path", "Path", str), ("description", "Description", str),
+        ("max_session_duration", "MaxSessionDuration", int))),
+    "aws_s3_bucket": Mapping("AWS::S3::Bucket", "bucket", "Name", (("bucket", "Name", str),), tags_key=None),
+}
+
+
+@dataclass
+class Drift:
+    """The verdict for one planned resource.
+
+    ``changes`` are ``(attribute, planned, live)``; for a list attribute
+    they are the entries only the plan has and the entries only the live
+    resource has.  ``cached`` is set when neither hash moved since the
+    previous check and the verdict was reused.
+    """
+
+    environment: str
+    address: str
+    status: str
+    live_id: str = None
+    changes: list = field(default_factory=list)
+    cached: bool = False
+
+
+def digest(canonical):
+    """Content hash of a canonical form."""
+    text = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _sorted(items):
+    return sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+
+
+def _ports(protocol, from_port, to_port):
+    protocol = str(protocol).lower()
+    protocol = _PROTOCOLS.get(protocol, protocol)
+    if protocol == "all":
+        return [protocol, None, None]
+    return [protocol, None if from_port is None else int(from_port), None if to_port is None else int(to_port)]
+
+
+def canonical_policy(document):
+    """A policy document with single values wrapped and every list sorted."""
+    document = load_document(document)
+    statements = document["Statement"]
+    canonical = []
+    for statement in [statements] if isinstance(statements, dict) else statements:
+        statement = dict(statement)
+        for key in _POLICY_LISTS:
+            if key in statement:
+                value = statement[key]
+                statement[key] = sorted([value] if isinstance(value, str) else value)
+        principal = statement.get("Principal")
+        if isinstance(principal, dict):
+            statement["Principal"] = {key: sorted([value] if isinstance(value, str) else value)
+                                      for key, value in principal.items()}
+        canonical.append(statement)
+    return {"Version": document.get("Version"), "Statement": _sorted(canonical)}
+
+
+class LiveView:
+    """Lookups on a snapshot shared by every environment of one check."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self._by_key = {}
+        self._group_names = {}
+
+    def match(self, mapping, key, resource_id=None):
+        """The stored resource with ``resource_id``, or else with natural ``key``."""
+        if resource_id:
+            found = self.snapshot.find(id=resource_id, type=mapping.inventory_type)
+            return found[0] if found else None
+        index = self._by_key.get(mapping.inventory_type)
+        if index is None:
+            index = self._by_key[mapping.inventory_type] = {
+                jmespath.search(mapping.live_key, resource.data): resource
+                for resource in self.snapshot.find(type=mapping.inventory_type)}
+        return index.get(key)
+
+    def group_name(self, group_id):
+        """``GroupName`` of a security group ID, or the ID when it is not in the snapshot."""
+        if group_id not in self._group_names:
+            found = self.snapshot.find(id=group_id, type="AWS::EC2::SecurityGroup")
+            self._group_names[group_id] = found[0].data.get("GroupName", group_id) if found else group_id
+        return self._group_names[group_id]
+
+
+def _unknown(unknown, position, key):
+    if unknown is True:
+        return True
+    if isinstance(unknown, list) and position < len(unknown):
+        item = unknown[position]
+        return item is True or bool(isinstance(item, dict) and item.get(key))
+    return False
+
+
+def _referenced(plan, resource, attribute, type_name, name_key="name"):
+    """Names of the ``type_name`` resources an attribute's expression refers to."""
+    return sorted({target.values[name_key] for target in plan.resolve_attribute(resource, attribute)
+                   if target.type == type_name and target.address != resource.address
+                   and target.values.get(name_key)})
+
+
+def _planned_rules(resource, plan, live, direction):
+    unknown = resource.unknown.get(direction)
+    referenced = None
+    rules = []
+    for position, rule in enumerate(resource.values.get(direction) or ()):
+        ports = _ports(rule.get("protocol"), rule.get("from_port"), rule.get("to_port"))
+        sources = [*(rule.get("cidr_blocks") or ()), *(rule.get("ipv6_cidr_blocks") or ()),
+                   *(rule.get("prefix_list_ids") or ())]
+        if rule.get("self"):
+            sources.append("self")
+        sources += [f"sg:{live.group_name(group_id)}" for group_id in rule.get("security_groups") or ()]
+        if not sources or _unknown(unknown, position, "security_groups"):
+            if referenced is None:
+                referenced = [f"sg:{name}" for name in
+                              _referenced(plan, resource, direction, "aws_security_group")]
+            sources += referenced or [WILDCARD]
+        rules += [ports + [source, rule.get("description") or ""] for source in sources]
+    return _sorted({json.dumps(rule): rule for rule in rules}.values())
+
+
+def _live_rules(item, key, live):
+    rules = []
+    for permission in item.get(key) or ():
+        ports = _ports(permission.get("IpProtocol"), permission.get("FromPort"), permission.get("ToPort"))
+        for sources_key, source_key in _SOURCES:
+            rules += [ports + [entry[source_key], entry.get("Description") or ""]
+                      for entry in permission.get(sources_key) or ()]
+        for pair in permission.get("UserIdGroupPairs") or ():
+            source = "self" if pair.get("GroupId") == item.get("GroupId") else f"sg:{live.group_name(pair['GroupId'])}"
+            rules.append(ports + [source, pair.get("Description") or ""])
+    return _sorted({json.dumps(rule): rule for rule in rules}.values())
+
+
+def canonical_planned(resource, plan, live):
+    """Canonical form of the attributes a plan resource knows."""
+    mapping = MAPPINGS[resource.type]
+    values = resource.values
+    canonical = {}
+    for attribute, _, coerce in mapping.fields:
+        if values.get(attribute) is not None and not resource.is_unknown(attribute):
+            canonical[attribute] = coerce(values[attribute])
+    if mapping.tags_key and resource.tags:
+        canonical["tags"] = {key: str(value) for key, value in resource.tags.items()}
+    if resource.type == "aws_security_group":
+        for direction in ("ingress", "egress"):
+            if direction in values and resource.unknown.get(direction) is not True:
+                canonical[direction] = _planned_rules(resource, plan, live, direction)
+    elif resource.type == "aws_db_instance":
+        groups = values.get("vpc_security_group_ids")
+        if groups and not resource.is_unknown("vpc_security_group_ids"):
+            canonical["security_groups"] = sorted(f"sg:{live.group_name(group_id)}" for group_id in groups)
+        else:
+            names = _referenced(plan, resource, "vpc_security_group_ids", "aws_security_group")
+            if names:
+                canonical["security_groups"] = [f"sg:{name}" for name in names]
+        if "db_subnet_group_name" not in canonical:
+            names = _referenced(plan, resource, "db_subnet_group_name", "aws_db_subnet_group")
+            if len(names) == 1:
+                canonical["db_subnet_group_name"] = names[0]
+    elif resource.type == "aws_iam_role" and values.get("assume_role_policy"):
+        canonical["assume_role_policy"] = canonical_policy(values["assume_role_policy"])
+    return canonical
+
+
+def canonical_live(type_name, item, live):
+    """Canonical form of an API item, for the Terraform type ``type_name``."""
+    mapping = MAPPINGS[type_name]
+    canonical = {}
+    for attribute, path, coerce in mapping.fields:
+        value = jmespath.search(path, item)
+        if value is not None:
+            canonical[attribute] = coerce(value)
+    if mapping.tags_key and mapping.tags_key in item:
+        canonical["tags"] = {tag["Key"]: str(tag.get("Value", "")) for tag in item[mapping.tags_key] or ()}
+    elif mapping.tags_key and mapping.inventory_type.startswith("AWS::EC2::"):
+        canonical["tags"] = {}
+    if type_name == "aws_security_group":
+        canonical["ingress"] = _live_rules(item, "IpPermissions", live)
+        canonical["egress"] = _live_rules(item, "IpPermissionsEgress", live)
+    elif type_name == "aws_db_instance":
+        canonical["security_groups"] = sorted(f"sg:{live.group_name(group['VpcSecurityGroupId'])}"
+                                              for group in item.get("VpcSecurityGroups") or ())
+    elif type_name == "aws_iam_role" and item.get("AssumeRolePolicyDocument"):
+        try:
+            canonical["assume_role_policy"] = canonical_policy(item["AssumeRolePolicyDocument"])
+        except (PolicyError, ValueError):
+            canonical["assume_role_policy"] = item["AssumeRolePolicyDocument"]
+    return canonical
+
+
+def project(planned, observed):
+    """``observed`` cut down to what ``planned`` can be compared on.
+
+    Attributes the plan does not know are dropped, and a security group
+    source stands in for the wildcard when the plan has ``sg:*`` at the
+    same place.
+    """
+    projected = {}
+    for attribute, want in planned.items():
+        if attribute not in observed:
+            continue
+        have = observed[attribute]
+        if isinstance(want, list) and isinstance(have, list):
+            wild = {json.dumps(item[:3] + item[4:]) for item in want if isinstance(item, list) and item[3] == WILDCARD}
+            if wild or WILDCARD in want:
+                have = _sorted({json.dumps(item): item for item in
+                                (_wildcard(item, want, wild) for item in have)}.values())
+        projected[attribute] = have
+    return projected
+
+
+def _wildcard(item, want, wild):
+    if item in want:
+        return item
+    if isinstance(item, str):
+        return WILDCARD if WILDCARD in want and item.startswith("sg:") else item
+    if str(item[3]).startswith("sg:") and json.dumps(item[:3] + item[4:]) in wild:
+        return item[:3] + [WILDCARD] + item[4:]
+    return item
+
+
+def diff(planned, observed):
+    """``(attribute, planned, live)`` for every compared attribute that differs."""
+    changes = []
+    for attribute in sorted(planned):
+        want, have = planned[attribute], observed.get(attribute)
+        if want == have:
+            continue
+        if isinstance(want, dict) and isinstance(have, dict) and attribute == "tags":
+            changes += [(f"tags.{key}", want.get(key), have.get(key)) for key in sorted(want.keys() | have.keys())
+                        if want.get(key) != have.get(key)]
+        elif isinstance(want, list) and isinstance(have, list):
+            changes.append((attribute, [item for item in want if item not in have],
+                            [item for item in have if item not in want]))
+        else:
+            changes.append((attribute, want, have))
+    return changes
+
+
+def _prior_ids(document):
+    """``{address: id}`` from a plan's ``prior_state``."""
+    ids = {}
+    stack = [document.get("prior_state", {}).get("values", {}).get("root_module", {})]
+    while stack:
+        module = stack.pop()
+        for item in module.get("resources", ()):
+            if item.get("mode", "managed") == "managed" and (item.get("values") or {}).get("id"):
+                ids[item["address"]] = item["values"]["id"]
+        stack.extend(module.get("child_modules", ()))
+    return ids
+
+
+def _index(plan):
+    if isinstance(plan, PlanIndex):
+        return plan
+    if isinstance(plan, str):
+        try:
+            plan = load_plan(plan)
+        except (OSError, ValueError) as exc:
+            raise DriftError(f"cannot read plan: {exc}") from None
+    return PlanIndex(plan)
+
+
+def inventory_types(plans):
+    """Inventory types the resources of ``plans`` (PlanIndex values) map onto."""
+    return sorted({MAPPINGS[resource.type].inventory_type for plan in plans
+                   for resource in plan.resources if resource.type in MAPPINGS})
+
+
+def check(plans, snapshot, clients=None, regions=None, changes=cloudtrail_changes, workers=8):
+    """Compare every environment of ``plans`` with ``snapshot``; return :class:`Drift` per resource.
+
+    ``plans`` maps environment names to plan documents, paths or
+    :class:`~tools.plan.PlanIndex` objects.  With ``clients`` the snapshot
+    is refreshed first, listing only the mapped types that ``changes``
+    reports as moved (see :func:`tools.inventory.refresh`); a type that
+    cannot be listed raises :class:`DriftError` rather than being compared
+    stale.
+    """
+    indexes = {environment: _index(plan) for environment, plan in plans.items()}
+    if clients is not None:
+        _, errors = refresh(snapshot, clients, regions, inventory_types(indexes.values()), workers, changes)
+        if errors:
+            raise DriftError("cannot refresh the inventory: " + "; ".join(
+                f"{name} in {region}: {message}" for (name, region), message in sorted(errors.items())))
+    snapshot.db.executescript(_SCHEMA)
+    stored = {(row[0], row[1]): row[2:] for row in snapshot.db.execute(
+        "SELECT environment, address, live_id, planned, live, status, changes FROM drift")}
+    live = LiveView(snapshot)
+    results, rows = [], []
+    for environment, plan in indexes.items():
+        ids = _prior_ids(plan.plan)
+        for resource in plan.resources:
+            mapping = MAPPINGS.get(resource.type)
+            if mapping is None:
+                continue
+            planned = canonical_planned(resource, plan, live)
+            key = jmespath.search(mapping.plan_key, resource.values)
+            found = live.match(mapping, key, ids.get(resource.address)) if key or resource.address in ids else None
+            observed = project(planned, canonical_live(resource.type, found.data, live)) if found else None
+            if observed is not None:
+                planned = {attribute: planned[attribute] for attribute in observed}
+            current = (found.id if found else None, digest(planned), digest(observed) if found else None)
+            previous = stored.get((environment, resource.address))
+            if previous and tuple(previous[:3]) == current:
+                results.append(Drift(environment, resource.address, previous[3], current[0],
+                                     [tuple(change) for change in json.loads(previous[4])], cached=True))
+                continue
+            if found is None:
+                drift = Drift(environment, resource.address, MISSING)
+            elif current[1] == current[2]:
+                drift = Drift(environment, resource.address, IN_SYNC, found.id)
+            else:
+                drift = Drift(environment, resource.address, DRIFTED, found.id, diff(planned, observed))
+            results.append(drift)
+            rows.append((environment, resource.address, *current, drift.status, json.dumps(drift.changes)))
+    with snapshot.db:
+        for environment, plan in indexes.items():
+            addresses = {result.address for result in results if result.environment == environment}
+            snapshot.db.executemany("DELETE FROM drift WHERE environment = ? AND address = ?",
+                                    [key for key in stored if key[0] == environment and key[1] not in addresses])
+        snapshot.db.executemany("INSERT OR REPLACE INTO drift VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    return results
+
+
+# -- CLI ------------------------------------------------------------------------
+
+
+def _format(value):
+    return json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) else str(value)
+
+
+@click.group()
+def main():
+    """Detect drift between Terraform plans and the live inventory."""
+
+
+@main.command("check")
+@click.argument("database", type=click.Path(dir_okay=False))
+@click.option("--plan", "plan_specs", multiple=True, required=True,
+              help="ENVIRONMENT=PLAN_JSON (terraform show -json); repeat per environment.")
+@click.option("--region", "regions", multiple=True, help="Regions to refresh [default: the session region].")
+@click.option("--offline", is_flag=True, help="Compare with DATABASE as it is, without refreshing it.")
+@click.option("--workers", "-w", default=8, show_default=True)
+@click.option("--profile", help="AWS profile.")
+@click.option("--endpoint-url", envvar="AWS_ENDPOINT_URL", help="e.g. a local moto server.")
+@click.option("--all", "show_all", is_flag=True, help="Also list resources that are in sync.")
+def check_command(database, plan_specs, regions, offline, workers, profile, endpoint_url, show_all):
+    """Compare each environment's plan with the inventory in DATABASE, refreshing it first."""
+    plans = {}
+    for spec in plan_specs:
+        environment, sep, path = spec.partition("=")
+        if not sep or not environment or not path:
+            raise click.BadParameter(f"expected ENVIRONMENT=PLAN_JSON, got {spec!r}", param_hint="--plan")
+        plans[environment] = path
+    clients = None
+    if not offline:
+        clients = Clients(boto3.session.Session(profile_name=profile), endpoint_url,
+                          max_pool_connections=workers * 2)
+    started = time.perf_counter()
+    with Snapshot(database) as snapshot:
+        try:
+            results = check(plans, snapshot, clients, regions or None, workers=workers)
+        except (DriftError, InventoryError) as exc:
+            raise click.ClickException(str(exc))
+    for result in results:
+        if result.status == IN_SYNC and not show_all:
+            continue
+        click.echo(f"{result.environment:<10} {result.status:<8} {result.address}  {result.live_id or ''}")
+        for attribute, planned, actual in result.changes:
+            click.echo(f"    {attribute}: {_format(planned)} -> {_format(actual)}")
+    bad = [result for result in results if result.status != IN_SYNC]
+    rediffed = sum(not result.cached for result in results)
+    click.echo(f"{len(results)} resource(s) in {len(plans)} environment(s), {len(bad)} drifted or missing, "
+               f"{rediffed} re-diffed, {time.perf_counter() - started:.1f} s")
+    raise SystemExit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
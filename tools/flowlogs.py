@@ -0,0 +1,402 @@
+"""Streaming parser and aggregations for VPC Flow Logs.
+
+Reads files written with the flow log ``log_format`` the networking tests pin::
+
+    ${version} ${account-id} ${interface-id} ${srcaddr} ${dstaddr} ${srcport}
+    ${dstport} ${protocol} ${packets} ${bytes} ${start} ${end} ${action} ${log-status}
+
+Plain files are memory-mapped and gzip files are decompressed
+incrementally; either way the data is cut into newline-aligned chunks and
+each chunk is decoded column by column into NumPy arrays.  Aggregations
+consume one chunk at a time, so memory use depends on the chunk size and
+the aggregation capacity, never on the size of the input.
+"""
+
+import gzip
+import heapq
+import ipaddress
+import mmap
+import os
+from dataclasses import dataclass, field
+
+import click
+import numpy as np
+
+from tools.cidr import subnet_layout
+
+FLOW_LOG_FIELDS = (
+    "version", "account-id", "interface-id", "srcaddr", "dstaddr", "srcport", "dstport",
+    "protocol", "packets", "bytes", "start", "end", "action", "log-status",
+)
+FIELD_COUNT = len(FLOW_LOG_FIELDS)
+COLUMN = {name: position for position, name in enumerate(FLOW_LOG_FIELDS)}
+# Small enough for the decode passes to stay in cache.
+CHUNK_SIZE = 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+# Splitting on dots as well as spaces turns each IPv4 address into four tokens.
+RECORD_TOKENS = FIELD_COUNT + 6
+TOKEN = {name: position + (6 if position > COLUMN["dstaddr"] else 3 if position > COLUMN["srcaddr"] else 0)
+         for name, position in COLUMN.items()}
+ADDRESS_TOKENS = np.r_[TOKEN["srcaddr"]:TOKEN["srcaddr"] + 4, TOKEN["dstaddr"]:TOKEN["dstaddr"] + 4]
+_NEWLINE, _ZERO = ord("\n"), ord("0")
+_SEPARATOR = np.zeros(256, dtype=bool)
+_SEPARATOR[list(b" \n.")] = True
+
+
+@dataclass
+class FlowBatch:
+    """One chunk of decoded flow records, stored column-wise."""
+
+    srcaddr: np.ndarray
+    dstaddr: np.ndarray
+    srcport: np.ndarray
+    dstport: np.ndarray
+    protocol: np.ndarray
+    packets: np.ndarray
+    bytes: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    accepted: np.ndarray
+    skipped: int = 0
+
+    def __len__(self):
+        return len(self.srcaddr)
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield newline-aligned byte chunks of a plain or gzip flow log file."""
+    with open(path, "rb") as fh:
+        magic = fh.read(2)
+    if magic == GZIP_MAGIC:
+        yield from _gzip_chunks(path, chunk_size)
+    else:
+        yield from _mmap_chunks(path, chunk_size)
+
+
+def _mmap_chunks(path, chunk_size):
+    with open(path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            position = 0
+            while position < size:
+                end = min(position + chunk_size, size)
+                if end < size:
+                    newline = mapped.rfind(b"\n", position, end)
+                    if newline == -1:
+                        newline = mapped.find(b"\n", end)
+                    end = size if newline == -1 else newline + 1
+                yield mapped[position:end]
+                position = end
+
+
+def _gzip_chunks(path, chunk_size):
+    with gzip.open(path, "rb") as fh:
+        carry = b""
+        while True:
+            block = fh.read(chunk_size)
+            if not block:
+                break
+            block = carry + block
+            newline = block.rfind(b"\n")
+            if newline == -1:
+                carry = block
+                continue
+            carry = block[newline + 1:]
+            yield block[:newline + 1]
+        if carry:
+            yield carry
+
+
+def _decode_integers(buffer, starts, ends):
+    """Decode decimal tokens with one vectorized pass per place value.
+
+    Tokens are right-aligned on ``ends``; pass ``k`` reads the ``k``-th
+    digit from the left of a ``width``-wide field for every token at once.
+    Only the leading places that some tokens do not reach need masking.
+    Returns the values and a mask of tokens that were non-empty and all digits.
+    """
+    lengths = ends - starts
+    values = np.zeros(len(starts), dtype=np.int64)
+    valid = lengths > 0
+    width = int(lengths.max(initial=0))
+    shortest = int(lengths.min(initial=0))
+    clip = len(ends) and int(ends.min()) < width
+    for place in range(width):
+        positions = ends - (width - place)
+        digits = buffer[np.maximum(positions, 0) if clip else positions] - np.uint8(_ZERO)
+        if width - place > shortest:
+            digits = np.where(positions >= starts, digits, np.uint8(0))
+        valid &= digits <= 9
+        values *= 10
+        values += digits
+    return values, valid
+
+
+def parse_chunk(data):
+    """Decode a chunk of flow log lines into a :class:`FlowBatch`.
+
+    The chunk is viewed as a ``uint8`` array and split on spaces, newlines
+    and dots in one scan, so an IPv4 record becomes exactly
+    ``RECORD_TOKENS`` tokens and every numeric field, address octets
+    included, is decoded with array arithmetic.  Lines with any other
+    token count -- the header, ``NODATA``/``SKIPDATA`` records, IPv6 and
+    truncated records -- drop out without a per-line Python loop.  Only
+    ``OK`` IPv4 records are kept; the others are counted in ``skipped``.
+    """
+    if not data.endswith(b"\n"):
+        data = bytes(data) + b"\n"
+    header = data[:7] == b"version"
+    if header:
+        data = data[data.index(b"\n") + 1:]
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    separators = np.flatnonzero(_SEPARATOR[buffer])
+    newline = buffer[separators] == _NEWLINE
+    lines = int(np.count_nonzero(newline))
+    if len(separators) == lines * RECORD_TOKENS and newline[RECORD_TOKENS - 1::RECORD_TOKENS].all():
+        ends = separators.reshape(-1, RECORD_TOKENS)
+        skipped = 0
+    else:
+        line = np.cumsum(newline) - newline
+        complete = np.bincount(line, minlength=lines) == RECORD_TOKENS
+        ends = separators[complete[line]].reshape(-1, RECORD_TOKENS)
+        blank = np.diff(separators[newline], prepend=-1) == 1
+        skipped = int(np.count_nonzero(~complete & ~blank))
+
+    ok = buffer[ends[:, TOKEN["log-status"] - 1] + 1] == ord("O")
+    if not ok.all():
+        skipped += int(len(ok) - np.count_nonzero(ok))
+        ends = ends[ok]
+
+    def column(token):
+        return ends[:, token - 1] + 1, ends[:, token]
+
+    octets, octets_valid = _decode_integers(buffer, *(part.ravel() for part in column(ADDRESS_TOKENS)))
+    octets = octets.reshape(-1, 2, 4)
+    valid = (octets_valid.reshape(-1, 8) & (octets.reshape(-1, 8) <= 255)).all(axis=1)
+    addresses = (octets[:, :, 0] << 24) | (octets[:, :, 1] << 16) | (octets[:, :, 2] << 8) | octets[:, :, 3]
+    decoded = {}
+    for name in ("srcport", "dstport", "protocol", "packets", "bytes", "start", "end"):
+        decoded[name], column_valid = _decode_integers(buffer, *column(TOKEN[name]))
+        valid &= column_valid
+    accepted = buffer[column(TOKEN["action"])[0]] == ord("A")
+    skipped += int(len(valid) - np.count_nonzero(valid))
+
+    return FlowBatch(
+        srcaddr=addresses[valid, 0].astype(np.uint32),
+        dstaddr=addresses[valid, 1].astype(np.uint32),
+        srcport=decoded["srcport"][valid].astype(np.int32),
+        dstport=decoded["dstport"][valid].astype(np.int32),
+        protocol=decoded["protocol"][valid].astype(np.int16),
+        packets=decoded["packets"][valid],
+        bytes=decoded["bytes"][valid],
+        start=decoded["start"][valid],
+        end=decoded["end"][valid],
+        accepted=accepted[valid],
+        skipped=skipped,
+    )
+
+
+def iter_flow_logs(path, chunk_size=CHUNK_SIZE):
+    """Yield :class:`FlowBatch` objects for a file or every log under a directory.
+
+    A directory is treated like the flow log bucket, e.g. a local copy of
+    ``AWSLogs/<account>/vpcflowlogs/<region>/YYYY/MM/DD/*.log.gz``.
+    """
+    for log_path in log_files(path):
+        for chunk in iter_chunks(log_path, chunk_size):
+            yield parse_chunk(chunk)
+
+
+def log_files(path):
+    """Return flow log files under ``path`` in a stable order."""
+    if not os.path.isdir(path):
+        return [path]
+    found = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.endswith((".log", ".log.gz", ".gz", ".txt")):
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def int_to_ipv4(value):
+    return str(ipaddress.IPv4Address(int(value)))
+
+
+class HeavyHitters:
+    """Bounded-memory weighted top-k (lossy counting).
+
+    Keeps at most ``capacity`` keys.  When full, the lighter half is
+    dropped and the largest dropped weight is added to ``error``, which is
+    therefore an upper bound on how much any reported total may be
+    under-counted.
+    """
+
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self.counts = {}
+        self.error = 0
+
+    def update(self, keys, weights=None):
+        if not len(keys):
+            return
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=weights, minlength=len(unique))
+        counts = self.counts
+        for key, value in zip(unique.tolist(), sums.tolist()):
+            counts[key] = counts.get(key, 0) + value
+        if len(counts) > self.capacity:
+            kept = dict(heapq.nlargest(self.capacity // 2, counts.items(), key=lambda item: item[1]))
+            self.error += max((value for key, value in counts.items() if key not in kept), default=0)
+            self.counts = kept
+
+    def top(self, k):
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+
+class SubnetClassifier:
+    """Vectorized lookup of addresses into the networking module's subnets."""
+
+    def __init__(self, vpc_cidr, availability_zones):
+        subnets = []
+        for tier, networks in subnet_layout(vpc_cidr, availability_zones).items():
+            for index, network in enumerate(networks):
+                subnets.append((int(network.network_address), int(network.broadcast_address),
+                                f"{tier}-{index + 1}", tier, str(network)))
+        subnets.sort()
+        self.starts = np.array([s[0] for s in subnets], dtype=np.uint32)
+        self.ends = np.array([s[1] for s in subnets], dtype=np.uint32)
+        self.names = [s[2] for s in subnets]
+        self.tiers = [s[3] for s in subnets]
+        self.cidrs = [s[4] for s in subnets]
+
+    def __len__(self):
+        return len(self.names)
+
+    def classify(self, addresses):
+        """Return the subnet position of each address, or -1 outside every subnet."""
+        position = np.searchsorted(self.starts, addresses, side="right") - 1
+        inside = (position >= 0) & (addresses <= self.ends[np.maximum(position, 0)])
+        return np.where(inside, position, -1)
+
+
+@dataclass
+class SubnetTotals:
+    name: str
+    tier: str
+    cidr: str
+    bytes_out: int = 0
+    bytes_in: int = 0
+    accepted: int = 0
+    rejected: int = 0
+
+
+@dataclass
+class FlowSummary:
+    records: int = 0
+    bytes: int = 0
+    packets: int = 0
+    rejected: int = 0
+    skipped: int = 0
+    top_talkers: list = field(default_factory=list)
+    top_rejected: list = field(default_factory=list)
+    subnets: list = field(default_factory=list)
+    error: int = 0
+
+
+class FlowAggregator:
+    """Accumulates top talkers, rejected traffic and per-subnet totals."""
+
+    def __init__(self, vpc_cidr=None, availability_zones=3, capacity=200000):
+        self.talkers = HeavyHitters(capacity)
+        self.rejections = HeavyHitters(capacity)
+        self.classifier = SubnetClassifier(vpc_cidr, availability_zones) if vpc_cidr else None
+        size = len(self.classifier) + 1 if self.classifier else 1
+        self._subnet = np.zeros((4, size), dtype=np.int64)
+        self.summary = FlowSummary()
+
+    def add(self, batch):
+        summary = self.summary
+        summary.records += len(batch)
+        summary.skipped += batch.skipped
+        if not len(batch):
+            return
+        summary.bytes += int(batch.bytes.sum())
+        summary.packets += int(batch.packets.sum())
+        rejected = ~batch.accepted
+        summary.rejected += int(rejected.sum())
+
+        pairs = (batch.srcaddr.astype(np.uint64) << np.uint64(32)) | batch.dstaddr.astype(np.uint64)
+        self.talkers.update(pairs, batch.bytes.astype(np.float64))
+        targets = (batch.srcaddr[rejected].astype(np.uint64) << np.uint64(17)) \
+            | (batch.dstport[rejected].astype(np.uint64) << np.uint64(1)) \
+            | (batch.protocol[rejected] == 17).astype(np.uint64)
+        self.rejections.update(targets)
+
+        if self.classifier is not None:
+            size = self._subnet.shape[1]
+            source = self.classifier.classify(batch.srcaddr) % size
+            destination = self.classifier.classify(batch.dstaddr) % size
+            self._subnet[0] += np.bincount(source, weights=batch.bytes, minlength=size).astype(np.int64)
+            self._subnet[1] += np.bincount(destination, weights=batch.bytes, minlength=size).astype(np.int64)
+            self._subnet[2] += np.bincount(destination[batch.accepted], minlength=size)
+            self._subnet[3] += np.bincount(destination[rejected], minlength=size)
+
+    def result(self, top=10):
+        summary = self.summary
+        summary.top_talkers = [
+            (int_to_ipv4(key >> 32), int_to_ipv4(key & 0xFFFFFFFF), int(total))
+            for key, total in self.talkers.top(top)
+        ]
+        summary.top_rejected = [
+            (int_to_ipv4(key >> 17), (key >> 1) & 0xFFFF, "udp" if key & 1 else "tcp/other", int(count))
+            for key, count in self.rejections.top(top)
+        ]
+        summary.error = int(max(self.talkers.error, self.rejections.error))
+        if self.classifier is not None:
+            summary.subnets = [
+                SubnetTotals(name, tier, cidr, *(int(v) for v in self._subnet[:, position]))
+                for position, (name, tier, cidr) in enumerate(
+                    zip(self.classifier.names, self.classifier.tiers, self.classifier.cidrs))
+            ]
+        return summary
+
+
+def analyze(path, vpc_cidr=None, availability_zones=3, top=10, chunk_size=CHUNK_SIZE, capacity=200000):
+    """Stream every flow log under ``path`` through a :class:`FlowAggregator`."""
+    aggregator = FlowAggregator(vpc_cidr, availability_zones, capacity)
+    for batch in iter_flow_logs(path, chunk_size):
+        aggregator.add(batch)
+    return aggregator.result(top)
+
+
+@click.command()
+@click.argument("path", type=click.Path(exists=True))
+@click.option("--vpc-cidr", help="VPC CIDR used to classify public/private/restricted subnets.")
+@click.option("--azs", default=3, show_default=True, help="Number of availability zones in the VPC.")
+@click.option("--top", default=10, show_default=True, help="Entries in the top-N reports.")
+@click.option("--chunk-kb", default=1024, show_default=True, help="Chunk size in KiB.")
+def main(path, vpc_cidr, azs, top, chunk_kb):
+    """Summarize VPC Flow Logs from a file or a local copy of the log bucket."""
+    summary = analyze(path, vpc_cidr, azs, top, chunk_kb * 1024)
+    click.echo(f"records: {summary.records}  bytes: {summary.bytes}  packets: {summary.packets}  "
+               f"rejected: {summary.rejected}  skipped: {summary.skipped}")
+    click.echo("\nTop talkers (bytes):")
+    for src, dst, total in summary.top_talkers:
+        click.echo(f"  {src:>15} -> {dst:<15} {total:>15}")
+    click.echo("\nTop rejected (flows):")
+    for src, port, protocol, count in summary.top_rejected:
+        click.echo(f"  {src:>15} -> :{port:<5} {protocol:<9} {count:>10}")
+    if summary.subnets:
+        click.echo("\nPer subnet:")
+        for subnet in summary.subnets:
+            click.echo(f"  {subnet.name:<13} {subnet.cidr:<18} out={subnet.bytes_out:<14} in={subnet.bytes_in:<14} "
+                       f"accepted={subnet.accepted:<10} rejected={subnet.rejected}")
+    if summary.error:
+        click.echo(f"\nTop-N totals may be under-counted by up to {summary.error}.")
+
+
+if __name__ == "__main__":
+    main()
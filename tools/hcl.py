@@ -0,0 +1,693 @@
+"""Parse Terraform modules into an indexed, content-hash cached model.
+
+:func:`parse` is a small HCL2 parser covering the native syntax Terraform
+configurations use: blocks, attributes, literals, templates and heredocs,
+tuples, objects, function calls, traversals, operators, conditionals and
+``for`` expressions.  Literal values become plain Python values; anything
+that needs evaluation (a reference, call, operator or interpolated
+template) becomes an :class:`Expression` holding its source text and the
+references it uses.  Nested blocks are stored as lists of bodies, the
+layout ``terraform show -json`` uses for resource values, with block
+labels as nested keys.
+
+:class:`TerraformModel` parses a module directory the first time it is
+asked for and indexes its resources by address, so a lookup such as
+``model["database"]["aws_kms_key.db_encryption_key.enable_key_rotation"]``
+is a few dictionary hits.  Parsed files are cached by :class:`ParseCache`
+under the SHA-256 of their content, so only edited files are re-parsed.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+from collections import namedtuple
+from dataclasses import dataclass, field
+
+import click
+
+TERRAFORM_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "terraform")
+MODULES_DIR = os.path.join(TERRAFORM_DIR, "modules")
+ENVIRONMENTS_DIR = os.path.join(TERRAFORM_DIR, "environments")
+# Bump when the parsed representation changes so stale cache entries miss.
+CACHE_VERSION = b"hcl-model-1\n"
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>[ \t\r]+|\\\n)
+  | (?P<comment>(?:\#|//)[^\n]*|/\*.*?\*/)
+  | (?P<newline>\n)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_-]*)
+  | (?P<heredoc><<(?P<indent>-?)(?P<marker>[A-Za-z_][A-Za-z0-9_]*)[ \t]*\r?\n)
+  | (?P<quote>")
+  | (?P<punct>=>|==|!=|<=|>=|&&|\|\||\.\.\.|[-+*/%<>!?:=,.(){}\[\]])
+""", re.VERBOSE | re.DOTALL)
+_ESCAPES = {"n": "\n", "r": "\r", "t": "\t", '"': '"', "\\": "\\"}
+_KEYWORDS = {"true": True, "false": False, "null": None}
+_BINARY = {"||": 1, "&&": 2, "==": 3, "!=": 3, "<": 4, ">": 4, "<=": 4, ">=": 4,
+           "+": 5, "-": 5, "*": 6, "/": 6, "%": 6}
+_REFERENCE_ROOTS = {"var": "variables", "local": "locals", "module": "module_calls", "output": "outputs"}
+
+Token = namedtuple("Token", "kind value start end line")
+
+
+class HclError(ValueError):
+    """Raised for text that is not valid HCL."""
+
+
+@dataclass
+class Expression:
+    """An unevaluated expression: its source text and the references it uses.
+
+    ``function`` and ``args`` are set for function calls, so literal
+    arguments such as the document passed to ``jsonencode`` stay inspectable.
+    """
+
+    source: str
+    references: tuple = ()
+    function: str = None
+    args: tuple = ()
+
+
+@dataclass
+class Block:
+    """A top-level block such as ``resource "aws_vpc" "main" { ... }``."""
+
+    type: str
+    labels: list
+    body: dict
+    line: int
+
+
+@dataclass
+class Body:
+    """The top-level attributes and blocks of one file."""
+
+    attributes: dict = field(default_factory=dict)
+    blocks: list = field(default_factory=list)
+
+
+def references(value):
+    """Return every reference used anywhere in ``value``, in first-use order."""
+    found = {}
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Expression):
+            found.update(dict.fromkeys(item.references))
+        elif isinstance(item, dict):
+            stack.extend(reversed(list(item.values())))
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+    return list(found)
+
+
+def tokenize(text, filename="<string>", line=1):
+    """Split HCL ``text`` into tokens, ending with an ``eof`` token."""
+    tokens = []
+    pos, length = 0, len(text)
+    while pos < length:
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise HclError(f"{filename}:{line}: unexpected character {text[pos]!r}")
+        kind, end = match.lastgroup, match.end()
+        if kind == "quote":
+            parts, end = _template(text, end, None, filename, line)
+            tokens.append(Token("string", parts, pos, end, line))
+        elif kind == "heredoc":
+            closing = re.compile(r"^[ \t]*" + re.escape(match.group("marker")) + r"[ \t]*\r?$", re.MULTILINE)
+            found = closing.search(text, end)
+            if found is None:
+                raise HclError(f"{filename}:{line}: unterminated heredoc {match.group('marker')}")
+            content = text[end:found.start()]
+            if match.group("indent"):
+                lines = content.split("\n")
+                indent = min((len(item) - len(item.lstrip(" \t")) for item in lines if item.strip()), default=0)
+                content = "\n".join(item[indent:] for item in lines)
+            parts, _ = _template(content, 0, len(content), filename, line)
+            end = found.end()
+            tokens.append(Token("heredoc", parts, pos, end, line))
+        elif kind in ("number", "ident", "punct"):
+            tokens.append(Token(kind, match.group(), pos, end, line))
+        elif kind == "newline":
+            tokens.append(Token(kind, "\n", pos, end, line))
+        line += text.count("\n", pos, end)
+        pos = end
+    tokens.append(Token("eof", "", length, length, line))
+    return tokens
+
+
+def _template(text, pos, stop, filename, line):
+    """Split a template into literal strings and ``(marker, source)`` interpolations.
+
+    Quoted templates (``stop`` is None) end at the closing quote and process
+    escapes; heredoc templates run to ``stop`` verbatim.
+    """
+    parts, chunk = [], []
+    quoted = stop is None
+    limit = len(text) if quoted else stop
+    while pos < limit:
+        char = text[pos]
+        if quoted and char == '"':
+            if chunk or not parts:
+                parts.append("".join(chunk))
+            return parts, pos + 1
+        if quoted and char == "\\":
+            escape = text[pos + 1:pos + 2]
+            if escape in ("u", "U"):
+                width = 4 if escape == "u" else 8
+                chunk.append(chr(int(text[pos + 2:pos + 2 + width], 16)))
+                pos += 2 + width
+            else:
+                chunk.append(_ESCAPES.get(escape, escape))
+                pos += 2
+            continue
+        if quoted and char == "\n":
+            break
+        if char in "$%" and text.startswith(char * 2 + "{", pos):
+            chunk.append(char + "{")
+            pos += 3
+            continue
+        if char in "$%" and text.startswith("{", pos + 1):
+            end = _interpolation_end(text, pos + 2, filename, line)
+            if chunk:
+                parts.append("".join(chunk))
+                chunk = []
+            parts.append((char, text[pos + 2:end]))
+            pos = end + 1
+            continue
+        chunk.append(char)
+        pos += 1
+    if quoted:
+        raise HclError(f"{filename}:{line}: unterminated string")
+    if chunk or not parts:
+        parts.append("".join(chunk))
+    return parts, pos
+
+
+def _interpolation_end(text, pos, filename, line):
+    """Return the offset of the ``}`` closing an interpolation opened before ``pos``."""
+    depth = 0
+    while pos < len(text):
+        char = text[pos]
+        if char == '"':
+            pos = _template(text, pos + 1, None, filename, line)[1]
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            if not depth:
+                return pos
+            depth -= 1
+        pos += 1
+    raise HclError(f"{filename}:{line}: unterminated interpolation")
+
+
+class _Parser:
+    """Recursive-descent parser over the tokens of one file or interpolation."""
+
+    def __init__(self, text, filename="<string>", line=1):
+        self.text = text
+        self.filename = filename
+        self.tokens = tokenize(text, filename, line)
+        self.pos = 0
+        # Newlines end attributes in a body but are insignificant inside
+        # parentheses, brackets and object constructors.
+        self.nested = 0
+
+    def error(self, message):
+        token = self.tokens[self.pos]
+        return HclError(f"{self.filename}:{token.line}: {message}, found {token.value or token.kind!r}")
+
+    def peek(self):
+        if self.nested:
+            while self.tokens[self.pos].kind == "newline":
+                self.pos += 1
+        return self.tokens[self.pos]
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def accept(self, punct):
+        token = self.peek()
+        if token.kind == "punct" and token.value == punct:
+            self.pos += 1
+            return token
+        return None
+
+    def expect(self, punct):
+        token = self.accept(punct)
+        if token is None:
+            raise self.error(f"expected {punct!r}")
+        return token
+
+    def source_from(self, start):
+        index = self.pos - 1
+        while self.tokens[index].kind == "newline":
+            index -= 1
+        return self.text[start:self.tokens[index].end]
+
+    def body(self, closing):
+        """Parse attributes and blocks up to ``closing`` (``}`` or ``eof``)."""
+        attributes, blocks = {}, []
+        while True:
+            token = self.next()
+            if token.kind == "newline":
+                continue
+            if token.kind == closing or (token.kind == "punct" and token.value == closing):
+                return attributes, blocks
+            if token.kind != "ident":
+                self.pos -= 1
+                raise self.error("expected an attribute or block")
+            if self.accept("="):
+                attributes[token.value] = self.expression()
+                end = self.peek()
+                if end.kind not in ("newline", "eof") and end.value != "}":
+                    raise self.error("expected a newline after the attribute")
+                continue
+            labels = []
+            while not self.accept("{"):
+                label = self.next()
+                if label.kind == "ident":
+                    labels.append(label.value)
+                elif label.kind == "string" and len(label.value) == 1 and isinstance(label.value[0], str):
+                    labels.append(label.value[0])
+                else:
+                    self.pos -= 1
+                    raise self.error("expected a block label or '{'")
+            saved, self.nested = self.nested, 0
+            nested_attributes, nested_blocks = self.body("}")
+            self.nested = saved
+            blocks.append(Block(token.value, labels, _merge(nested_attributes, nested_blocks), token.line))
+
+    def expression(self):
+        start = self.peek().start
+        condition = self.binary(0)
+        if not self.accept("?"):
+            return condition
+        true_value = self.expression()
+        self.expect(":")
+        false_value = self.expression()
+        return self.derived(start, [condition, true_value, false_value])
+
+    def derived(self, start, operands):
+        return Expression(self.source_from(start), tuple(references(operands)))
+
+    def binary(self, min_precedence):
+        start = self.peek().start
+        left = self.unary()
+        while True:
+            token = self.peek()
+            precedence = _BINARY.get(token.value) if token.kind == "punct" else None
+            if precedence is None or precedence <= min_precedence:
+                return left
+            self.pos += 1
+            right = self.binary(precedence)
+            left = self.derived(start, [left, right])
+
+    def unary(self):
+        token = self.peek()
+        if token.kind == "punct" and token.value in ("-", "!"):
+            self.pos += 1
+            operand = self.unary()
+            if token.value == "-" and isinstance(operand, (int, float)) and not isinstance(operand, bool):
+                return -operand
+            if token.value == "!" and isinstance(operand, bool):
+                return not operand
+            return self.derived(token.start, [operand])
+        return self.postfix()
+
+    def postfix(self):
+        first = self.peek()
+        value = self.primary()
+        # A bare name starts a traversal; its reference grows with each
+        # ``.attr`` step until the first index or splat.
+        path = [first.value] if isinstance(value, Expression) and value.source == first.value else None
+        static = path is not None
+        operands = [value]
+        stepped = False
+        while True:
+            if self.accept("."):
+                token = self.next()
+                if token.kind == "ident":
+                    if static:
+                        path.append(token.value)
+                elif token.kind == "number" or token.value == "*":
+                    static = False
+                else:
+                    self.pos -= 1
+                    raise self.error("expected an attribute name")
+            elif self.peek().kind == "punct" and self.peek().value == "[":
+                self.pos += 1
+                self.nested += 1
+                if not self.accept("*"):
+                    operands.append(self.expression())
+                self.expect("]")
+                self.nested -= 1
+                static = False
+            else:
+                break
+            stepped = True
+        if not stepped:
+            return value
+        found = [".".join(path)] if path else []
+        found.extend(references(operands[0 if path is None else 1:]))
+        return Expression(self.source_from(first.start), tuple(dict.fromkeys(found)))
+
+    def primary(self):
+        token = self.next()
+        if token.kind == "number":
+            number = token.value
+            return float(number) if "." in number or "e" in number.lower() else int(number)
+        if token.kind in ("string", "heredoc"):
+            return self.template(token)
+        if token.kind == "ident":
+            if token.value in _KEYWORDS:
+                return _KEYWORDS[token.value]
+            if self.accept("("):
+                return self.call(token)
+            return Expression(token.value, (token.value,))
+        if token.kind == "punct" and token.value == "(":
+            self.nested += 1
+            value = self.expression()
+            self.expect(")")
+            self.nested -= 1
+            return value
+        if token.kind == "punct" and token.value == "[":
+            return self.collection(token, "]")
+        if token.kind == "punct" and token.value == "{":
+            return self.collection(token, "}")
+        self.pos -= 1
+        raise self.error("expected an expression")
+
+    def call(self, name):
+        self.nested += 1
+        args = []
+        while not self.accept(")"):
+            args.append(self.expression())
+            self.accept("...")
+            if not self.accept(","):
+                self.expect(")")
+                break
+        self.nested -= 1
+        return Expression(self.source_from(name.start), tuple(references(args)), name.value, tuple(args))
+
+    def collection(self, opening, closing):
+        self.nested += 1
+        token = self.peek()
+        if token.kind == "ident" and token.value == "for" and self.tokens[self.pos + 1].kind == "ident":
+            value = self.for_expression(opening, closing)
+        elif closing == "]":
+            value = []
+            while not self.accept("]"):
+                value.append(self.expression())
+                if not self.accept(","):
+                    self.expect("]")
+                    break
+        else:
+            value = {}
+            while not self.accept("}"):
+                key = self.expression()
+                if not (self.accept("=") or self.accept(":")):
+                    raise self.error("expected '=' after an object key")
+                value[key.source if isinstance(key, Expression) else str(key)] = self.expression()
+                self.accept(",")
+        self.nested -= 1
+        return value
+
+    def for_expression(self, opening, closing):
+        self.pos += 1
+        names = [self.next().value]
+        if self.accept(","):
+            names.append(self.next().value)
+        if self.next().value != "in":
+            self.pos -= 1
+            raise self.error("expected 'in'")
+        operands = [self.expression()]
+        self.expect(":")
+        operands.append(self.expression())
+        if self.accept("=>"):
+            operands.append(self.expression())
+            self.accept("...")
+        token = self.peek()
+        if token.kind == "ident" and token.value == "if":
+            self.pos += 1
+            operands.append(self.expression())
+        self.expect(closing)
+        found = [ref for ref in references(operands) if ref.split(".")[0] not in names]
+        return Expression(self.source_from(opening.start), tuple(found))
+
+    def template(self, token):
+        parts = token.value
+        if all(isinstance(part, str) for part in parts):
+            return "".join(parts)
+        found = []
+        for part in parts:
+            if isinstance(part, str):
+                continue
+            marker, source = part
+            source = source.strip().strip("~").strip()
+            if marker == "%":
+                keyword, _, rest = source.partition(" ")
+                if keyword == "for":
+                    rest = rest.partition(" in ")[2]
+                elif keyword != "if":
+                    continue
+                source = rest
+            parser = _Parser(source, self.filename, token.line)
+            found.extend(references(parser.expression()))
+            if parser.peek().kind not in ("eof", "newline"):
+                raise parser.error("unexpected text in interpolation")
+        return Expression(self.text[token.start:token.end], tuple(dict.fromkeys(found)))
+
+
+def _merge(attributes, blocks):
+    """Fold nested blocks into a body dict as lists, labels becoming nested keys."""
+    body = attributes
+    for block in blocks:
+        value = block.body
+        for label in reversed(block.labels):
+            value = {label: value}
+        body.setdefault(block.type, []).append(value)
+    return body
+
+
+def parse(text, filename="<string>"):
+    """Parse HCL ``text`` into a :class:`Body`."""
+    attributes, blocks = _Parser(text, filename).body("eof")
+    return Body(attributes, blocks)
+
+
+class ParseCache:
+    """Parsed ``.tf`` files keyed by the SHA-256 of their content.
+
+    Entries are kept in memory and, when ``directory`` is given, pickled
+    into it, so a later process only re-parses files whose content changed.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.parsed = {}
+        self.hits = 0
+        self.misses = 0
+
+    def parse_file(self, path):
+        with open(path, "rb") as fh:
+            data = fh.read()
+        digest = hashlib.sha256(CACHE_VERSION + data).hexdigest()
+        parsed = self.parsed.get(digest)
+        if parsed is None:
+            parsed = self._load(digest)
+        if parsed is None:
+            self.misses += 1
+            parsed = parse(data.decode("utf-8"), path)
+            self._store(digest, parsed)
+        else:
+            self.hits += 1
+        self.parsed[digest] = parsed
+        return parsed
+
+    def _load(self, digest):
+        if not self.directory:
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{digest}.pickle"), "rb") as fh:
+                return pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError):
+            return None
+
+    def _store(self, digest, parsed):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename so concurrent test workers never read a partial entry.
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as fh:
+            pickle.dump(parsed, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(fh.name, os.path.join(self.directory, f"{digest}.pickle"))
+
+
+class ModuleModel:
+    """The resources, data sources, variables, outputs and locals of one module.
+
+    Resources are keyed by address (``aws_vpc.main``, ``data.aws_ami.base``)
+    and :meth:`get` resolves dotted paths through them, e.g.
+    ``aws_kms_key.db_encryption_key.enable_key_rotation``,
+    ``var.ha_nat_gateway.default`` or ``output.vpc_id.value``.
+    """
+
+    def __init__(self, name, path, files):
+        self.name = name
+        self.path = path
+        self.files = files
+        self.resources = {}
+        self.variables = {}
+        self.outputs = {}
+        self.locals = {}
+        self.module_calls = {}
+        self.locations = {}
+        for filename, parsed in files.items():
+            for block in parsed.blocks:
+                if block.type == "resource":
+                    table, key = self.resources, ".".join(block.labels)
+                elif block.type == "data":
+                    table, key = self.resources, ".".join(["data", *block.labels])
+                elif block.type == "variable":
+                    table, key = self.variables, f"var.{block.labels[0]}"
+                elif block.type == "output":
+                    table, key = self.outputs, f"output.{block.labels[0]}"
+                elif block.type == "module":
+                    table, key = self.module_calls, f"module.{block.labels[0]}"
+                elif block.type == "locals":
+                    self.locals.update(block.body)
+                    self.locations.update((f"local.{name}", (filename, block.line)) for name in block.body)
+                    continue
+                else:
+                    continue
+                table[key.split(".", 1)[1] if table is not self.resources else key] = block.body
+                self.locations[key] = (filename, block.line)
+
+    def __repr__(self):
+        return f"ModuleModel({self.name!r}, {len(self.resources)} resources)"
+
+    def of_type(self, type_name):
+        """Return ``{address: body}`` for every resource of ``type_name``."""
+        return {address: body for address, body in self.resources.items()
+                if address.split(".", 1)[0] == type_name}
+
+    def get(self, path, default=None):
+        """Resolve a dotted ``path``, returning ``default`` if it does not exist."""
+        try:
+            return self[path]
+        except KeyError:
+            return default
+
+    def __getitem__(self, path):
+        parts = path.split(".")
+        table = _REFERENCE_ROOTS.get(parts[0])
+        if table is not None:
+            key, rest, table = parts[1:2], parts[2:], getattr(self, table)
+        else:
+            size = 3 if parts[0] == "data" else 2
+            key, rest, table = parts[:size], parts[size:], self.resources
+        try:
+            value = table[".".join(key)]
+            for part in rest:
+                if isinstance(value, list):
+                    if part.isdigit():
+                        value = value[int(part)]
+                        continue
+                    if len(value) != 1:
+                        raise KeyError(part)
+                    value = value[0]
+                value = value[part]
+        except (KeyError, IndexError, TypeError):
+            raise KeyError(f"{self.name}: {path}") from None
+        return value
+
+    def __contains__(self, path):
+        try:
+            self[path]
+        except KeyError:
+            return False
+        return True
+
+
+class TerraformModel:
+    """Lazily parsed models of every module directory under ``root``."""
+
+    def __init__(self, root=MODULES_DIR, cache=None):
+        self.root = root
+        self.cache = cache if cache is not None else ParseCache()
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        """Return the module names without parsing anything."""
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name))
+                      and any(f.endswith(".tf") for f in os.listdir(os.path.join(self.root, name))))
+
+    def module(self, name):
+        """Return the :class:`ModuleModel` for ``name``, parsing it on first use."""
+        model = self._modules.get(name)
+        if model is None:
+            with self._lock:
+                model = self._modules.get(name)
+                if model is None:
+                    path = os.path.join(self.root, name)
+                    if not os.path.isdir(path):
+                        raise KeyError(f"no module {name!r} under {self.root}")
+                    files = {filename: self.cache.parse_file(os.path.join(path, filename))
+                             for filename in sorted(os.listdir(path)) if filename.endswith(".tf")}
+                    model = self._modules[name] = ModuleModel(name, path, files)
+        return model
+
+    def __getitem__(self, name):
+        return self.module(name)
+
+    def get(self, path, default=None):
+        """Resolve ``<module>.<path>``, e.g. ``database.aws_db_instance.main.storage_encrypted``."""
+        name, _, rest = path.partition(".")
+        try:
+            return self.module(name)[rest]
+        except KeyError:
+            return default
+
+    def of_type(self, type_name):
+        """Yield ``(module, address, body)`` for ``type_name`` across every module."""
+        for name in self.names():
+            for address, body in self.module(name).of_type(type_name).items():
+                yield name, address, body
+
+
+def _json_default(value):
+    if isinstance(value, Expression):
+        return value.source
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+@click.command()
+@click.argument("path")
+@click.option("--root", default=MODULES_DIR, show_default=True, type=click.Path(exists=True, file_okay=False),
+              help="Directory containing one sub-directory per module.")
+@click.option("--cache-dir", type=click.Path(file_okay=False), help="Parse cache keyed by file content hash.")
+def main(path, root, cache_dir):
+    """Print the value at PATH, e.g. database.aws_kms_key.db_encryption_key.enable_key_rotation."""
+    name, _, rest = path.partition(".")
+    model = TerraformModel(root, ParseCache(cache_dir))
+    try:
+        module = model.module(name)
+        value = module[rest] if rest else {"resources": sorted(module.resources), "variables": sorted(module.variables),
+                                           "outputs": sorted(module.outputs)}
+    except KeyError as exc:
+        raise click.ClickException(f"not found: {exc.args[0]}")
+    click.echo(json.dumps(value, indent=2, default=_json_default))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,575 @@
+"""IAM policy compilation, grant queries and over-grant detection.
+
+Each policy document is compiled once into per-statement matchers: action
+patterns are split into exact names, trailing-``*`` prefixes and general
+globs, and resource ARNs into compiled globs.  :class:`PolicyAnalyzer`
+indexes every compiled statement by the actions it can match, so "which
+policies grant X on Y" only evaluates statements whose action patterns
+could cover X instead of scanning every statement of every policy.
+
+Compiled policies and over-grant findings are memoized by a SHA-256 hash
+of the canonical document, so identical documents attached under many
+names are compiled once and a repeated audit with a findings cache skips
+every unchanged policy.  ``Principal`` is not evaluated; resource
+policies are treated like identity policies.
+"""
+
+import functools
+import hashlib
+import ipaddress
+import json
+import os
+import re
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from urllib.parse import unquote
+
+import click
+
+from tools.plan import PlanIndex
+
+IDENTITY_POLICY_TYPES = ("aws_iam_policy", "aws_iam_role_policy", "aws_iam_user_policy", "aws_iam_group_policy")
+FAIL_KINDS = ("full-admin", "service-wildcard", "not-action")
+_VARIABLE_RE = re.compile(r"\$\{[^}]*\}")
+_WILDCARDS = ("*", "?")
+
+
+class PolicyError(ValueError):
+    """Raised for documents that are not IAM policies."""
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, (str, bool, int, float)) else list(value)
+
+
+def _has_wildcard(pattern):
+    return any(char in pattern for char in _WILDCARDS)
+
+
+def load_document(document):
+    """Return a policy document as a dict, decoding JSON or URL-encoded JSON text."""
+    if isinstance(document, (bytes, str)):
+        text = document.decode() if isinstance(document, bytes) else document
+        if text.lstrip().startswith("%7B"):
+            text = unquote(text)
+        document = json.loads(text)
+    if not isinstance(document, dict) or "Statement" not in document:
+        raise PolicyError("policy document has no Statement")
+    return document
+
+
+def canonical(document):
+    """Canonical JSON text of a policy document."""
+    return json.dumps(document, sort_keys=True, separators=(",", ":"))
+
+
+def document_hash(document):
+    """SHA-256 of the canonical document, the memoization key for policies."""
+    return hashlib.sha256(canonical(load_document(document)).encode()).hexdigest()
+
+
+@functools.lru_cache(maxsize=16384)
+def glob_regex(pattern, ignore_case=False):
+    """Compile an IAM glob (``*``, ``?``, ``${policy:variables}``) to a regex."""
+    pattern = _VARIABLE_RE.sub("*", pattern)
+    body = "".join(".*" if char == "*" else "." if char == "?" else re.escape(char) for char in pattern)
+    return re.compile(body, re.IGNORECASE | re.DOTALL if ignore_case else re.DOTALL)
+
+
+class ActionMatcher:
+    """Action patterns split into exact names, trailing-``*`` prefixes and globs.
+
+    Actions are case-insensitive, so everything is lower-cased once here.
+    """
+
+    __slots__ = ("patterns", "any", "exact", "prefixes", "globs")
+
+    def __init__(self, patterns):
+        self.patterns = [pattern.lower() for pattern in patterns]
+        self.any = False
+        self.exact = set()
+        self.prefixes = []
+        self.globs = []
+        for pattern in self.patterns:
+            if pattern == "*":
+                self.any = True
+            elif not _has_wildcard(pattern):
+                self.exact.add(pattern)
+            elif pattern.endswith("*") and not _has_wildcard(pattern[:-1]):
+                self.prefixes.append(pattern[:-1])
+            else:
+                self.globs.append(glob_regex(pattern))
+
+    def matches(self, action):
+        """Whether a lower-cased action name matches any pattern."""
+        return (self.any or action in self.exact
+                or any(action.startswith(prefix) for prefix in self.prefixes)
+                or any(glob.fullmatch(action) for glob in self.globs))
+
+
+class ResourceMatcher:
+    """Case-sensitive ARN globs; ``*`` matches every resource."""
+
+    __slots__ = ("patterns", "any", "exact", "globs")
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.any = "*" in self.patterns
+        self.exact = {pattern for pattern in self.patterns if not _has_wildcard(pattern) and "${" not in pattern}
+        self.globs = [glob_regex(pattern) for pattern in self.patterns if pattern not in self.exact]
+
+    def matches(self, resource):
+        return self.any or resource in self.exact or any(glob.fullmatch(resource) for glob in self.globs)
+
+
+def _string_equals(actual, expected):
+    return str(actual) == expected
+
+
+def _string_equals_ignore_case(actual, expected):
+    return str(actual).lower() == expected.lower()
+
+
+def _string_like(actual, expected):
+    return glob_regex(expected).fullmatch(str(actual)) is not None
+
+
+def _bool(actual, expected):
+    return str(actual).lower() == str(expected).lower()
+
+
+def _ip_address(actual, expected):
+    try:
+        return ipaddress.ip_address(str(actual)) in ipaddress.ip_network(expected, strict=False)
+    except ValueError:
+        return False
+
+
+def _numeric(compare):
+    def match(actual, expected):
+        try:
+            return compare(float(actual), float(expected))
+        except (TypeError, ValueError):
+            return False
+    return match
+
+
+# Operator -> (match function, negated).
+CONDITION_OPERATORS = {
+    "StringEquals": (_string_equals, False),
+    "StringNotEquals": (_string_equals, True),
+    "StringEqualsIgnoreCase": (_string_equals_ignore_case, False),
+    "StringNotEqualsIgnoreCase": (_string_equals_ignore_case, True),
+    "StringLike": (_string_like, False),
+    "StringNotLike": (_string_like, True),
+    "ArnEquals": (_string_like, False),
+    "ArnLike": (_string_like, False),
+    "ArnNotEquals": (_string_like, True),
+    "ArnNotLike": (_string_like, True),
+    "Bool": (_bool, False),
+    "IpAddress": (_ip_address, False),
+    "NotIpAddress": (_ip_address, True),
+    "NumericEquals": (_numeric(lambda a, b: a == b), False),
+    "NumericNotEquals": (_numeric(lambda a, b: a == b), True),
+    "NumericLessThan": (_numeric(lambda a, b: a < b), False),
+    "NumericLessThanEquals": (_numeric(lambda a, b: a <= b), False),
+    "NumericGreaterThan": (_numeric(lambda a, b: a > b), False),
+    "NumericGreaterThanEquals": (_numeric(lambda a, b: a >= b), False),
+}
+
+
+def evaluate_condition(block, context):
+    """Evaluate a statement's ``Condition`` block against a request context.
+
+    Returns ``True`` or ``False``, or ``None`` when the answer is unknown:
+    no context was supplied or an operator is not supported.  Context keys
+    are case-insensitive; list values are multi-valued keys.
+    """
+    if not block:
+        return True
+    if context is None:
+        return None
+    context = {key.lower(): value for key, value in context.items()}
+    unknown = False
+    for operator, conditions in block.items():
+        qualifier, _, name = operator.rpartition(":")
+        if_exists = name.endswith("IfExists")
+        name = name[:-len("IfExists")] if if_exists else name
+        for key, expected in conditions.items():
+            expected = [str(value) for value in _as_list(expected)]
+            present = key.lower() in context
+            if name == "Null":
+                outcome = (not present) == (expected[0].lower() == "true")
+            elif name not in CONDITION_OPERATORS:
+                unknown = True
+                continue
+            else:
+                match, negated = CONDITION_OPERATORS[name]
+                if not present:
+                    # Over an absent (empty) set ForAllValues holds vacuously and ForAnyValue never does.
+                    outcome = qualifier == "ForAllValues" if qualifier else if_exists or negated
+                else:
+                    # Negation applies to each value before the set qualifier combines them.
+                    hits = [any(match(value, item) for item in expected) != negated
+                            for value in _as_list(context[key.lower()])]
+                    if qualifier == "ForAllValues" or (not qualifier and negated):
+                        outcome = all(hits)
+                    else:
+                        outcome = any(hits)
+            if not outcome:
+                return False
+    return None if unknown else True
+
+
+class Statement:
+    """One compiled policy statement."""
+
+    __slots__ = ("sid", "effect", "actions", "not_action", "resources", "not_resource", "condition")
+
+    def __init__(self, statement, position):
+        self.sid = statement.get("Sid") or f"#{position}"
+        self.effect = statement.get("Effect", "Allow")
+        self.not_action = "NotAction" in statement
+        self.actions = ActionMatcher(_as_list(statement.get("NotAction" if self.not_action else "Action")))
+        self.not_resource = "NotResource" in statement
+        resources = statement.get("NotResource" if self.not_resource else "Resource", "*")
+        self.resources = ResourceMatcher(_as_list(resources))
+        self.condition = statement.get("Condition") or {}
+
+    def matches(self, action, resource):
+        """Whether the statement applies to a lower-cased action and a resource ARN."""
+        if self.actions.matches(action) == self.not_action:
+            return False
+        return self.resources.matches(resource) != self.not_resource
+
+    def over_grants(self):
+        """Return ``(kind, detail)`` pairs for broad grants made by an Allow statement."""
+        if self.effect != "Allow":
+            return []
+        found = []
+        if self.not_action:
+            found.append(("not-action", ", ".join(self.actions.patterns)))
+        elif self.actions.any:
+            if self.resources.any and not self.not_resource:
+                return [("full-admin", "*")]
+            found.append(("action-wildcard", "*"))
+        else:
+            for pattern in self.actions.patterns:
+                service, _, name = pattern.partition(":")
+                if name == "*" or _has_wildcard(service):
+                    found.append(("service-wildcard", pattern))
+                elif _has_wildcard(pattern):
+                    found.append(("action-pattern", pattern))
+        if self.not_resource:
+            found.append(("not-resource", ", ".join(self.resources.patterns)))
+        elif self.resources.any:
+            found.append(("resource-wildcard", "*"))
+        return found
+
+
+class CompiledPolicy:
+    """A policy document compiled once into statement matchers."""
+
+    __slots__ = ("hash", "statements")
+
+    def __init__(self, document, digest=None):
+        document = load_document(document)
+        self.hash = digest or document_hash(document)
+        self.statements = [Statement(statement, position)
+                           for position, statement in enumerate(_as_list(document["Statement"]))]
+
+    def evaluate(self, action, resource, context=None):
+        """Return ``allow``, ``deny``, ``conditional`` or ``None`` for one request.
+
+        An explicit Deny wins; ``conditional`` means the outcome depends on
+        a Condition that could not be decided without (more) context.
+        """
+        return decide(self.matching(action.lower(), resource), context)
+
+    def matching(self, action, resource):
+        return [statement for statement in self.statements if statement.matches(action, resource)]
+
+    def over_grants(self):
+        return [(statement.sid, kind, detail)
+                for statement in self.statements for kind, detail in statement.over_grants()]
+
+
+def decide(statements, context=None):
+    """Combine matching statements of one policy into a decision."""
+    allow = deny = False
+    for statement in statements:
+        outcome = evaluate_condition(statement.condition, context)
+        if outcome is False:
+            continue
+        if statement.effect == "Deny":
+            deny = deny or outcome
+            if deny is True:
+                return "deny"
+        else:
+            allow = allow or outcome
+    if allow is True and deny is False:
+        return "allow"
+    if allow is not False:
+        return "conditional"
+    return None
+
+
+class PolicyCache:
+    """Compiled policies and over-grant findings keyed by document hash.
+
+    Findings can be saved to and loaded from a JSON file so a later audit
+    only compiles documents it has not seen before.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.compiled = {}
+        self.findings = {}
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            with open(path) as fh:
+                self.findings = {digest: [tuple(item) for item in items]
+                                 for digest, items in json.load(fh).items()}
+
+    def compile(self, document, digest=None):
+        digest = digest or document_hash(document)
+        policy = self.compiled.get(digest)
+        if policy is None:
+            self.misses += 1
+            policy = self.compiled[digest] = CompiledPolicy(document, digest)
+        else:
+            self.hits += 1
+        return policy
+
+    def over_grants(self, document, digest=None):
+        digest = digest or document_hash(document)
+        findings = self.findings.get(digest)
+        if findings is None:
+            findings = self.findings[digest] = self.compile(document, digest).over_grants()
+        else:
+            self.hits += 1
+        return findings
+
+    def save(self):
+        if self.path:
+            with open(self.path, "w") as fh:
+                json.dump(self.findings, fh, sort_keys=True)
+
+
+@dataclass(frozen=True)
+class Grant:
+    policy: str
+    decision: str
+    statements: tuple
+
+
+@dataclass(frozen=True)
+class OverGrant:
+    policy: str
+    sid: str
+    kind: str
+    detail: str
+
+
+class PolicyAnalyzer:
+    """Answers grant queries across many named policies through an action index.
+
+    Statements are indexed by lower-cased exact action, by trailing-``*``
+    prefix and by service for other globs; ``NotAction`` statements and
+    patterns with a wildcard service are checked for every query.  The
+    index is built lazily and rebuilt after :meth:`add`.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or PolicyCache()
+        self.documents = {}
+        self.names = defaultdict(list)
+        self._index = None
+
+    def add(self, name, document):
+        document = load_document(document)
+        digest = document_hash(document)
+        if name in self.documents:
+            self.names[self.documents[name][0]].remove(name)
+        self.documents[name] = (digest, document)
+        self.names[digest].append(name)
+        self._index = None
+        return digest
+
+    def extend(self, policies):
+        for name, document in policies:
+            self.add(name, document)
+        return self
+
+    def _build_index(self):
+        exact = defaultdict(list)
+        prefixes = defaultdict(list)
+        service_globs = defaultdict(list)
+        unindexed = []
+        for digest, names in self.names.items():
+            if not names:
+                continue
+            policy = self.cache.compile(self.documents[names[0]][1], digest)
+            for statement in policy.statements:
+                entry = (digest, statement)
+                matcher = statement.actions
+                if statement.not_action or matcher.any:
+                    unindexed.append(entry)
+                    continue
+                for action in matcher.exact:
+                    exact[action].append(entry)
+                for prefix in matcher.prefixes:
+                    prefixes[prefix].append(entry)
+                for pattern in matcher.patterns:
+                    service, colon, _ = pattern.partition(":")
+                    if pattern in matcher.exact or pattern[:-1] in matcher.prefixes:
+                        continue
+                    if colon and not _has_wildcard(service):
+                        service_globs[service].append(entry)
+                    else:
+                        unindexed.append(entry)
+        lengths = sorted({len(prefix) for prefix in prefixes})
+        self._index = (exact, prefixes, lengths, service_globs, unindexed)
+        return self._index
+
+    def candidates(self, action):
+        """Statements whose action patterns could match a lower-cased action."""
+        exact, prefixes, lengths, service_globs, unindexed = self._index or self._build_index()
+        found = list(exact.get(action, ()))
+        for length in lengths:
+            if length > len(action):
+                break
+            found.extend(prefixes.get(action[:length], ()))
+        found.extend(service_globs.get(action.partition(":")[0], ()))
+        found.extend(unindexed)
+        return found
+
+    def grants(self, action, resource, context=None, include_conditional=True):
+        """Return :class:`Grant` records for every policy allowing ``action`` on ``resource``."""
+        action = action.lower()
+        matched = defaultdict(dict)
+        for digest, statement in self.candidates(action):
+            if statement.matches(action, resource):
+                matched[digest][id(statement)] = statement
+        grants = []
+        for digest, statements in matched.items():
+            statements = list(statements.values())
+            decision = decide(statements, context)
+            if decision == "allow" or (decision == "conditional" and include_conditional):
+                sids = tuple(statement.sid for statement in statements if statement.effect == "Allow")
+                grants.extend(Grant(name, decision, sids) for name in self.names[digest])
+        return sorted(grants, key=lambda grant: grant.policy)
+
+    def over_grants(self, kinds=None):
+        """Return :class:`OverGrant` findings for every policy, optionally filtered by kind."""
+        findings = []
+        for name, (digest, document) in sorted(self.documents.items()):
+            for sid, kind, detail in self.cache.over_grants(document, digest):
+                if kinds is None or kind in kinds:
+                    findings.append(OverGrant(name, sid, kind, detail))
+        return findings
+
+
+def over_grants(document):
+    """Return ``(sid, kind, detail)`` over-grant findings for a single document."""
+    return CompiledPolicy(document).over_grants()
+
+
+def policies_from_authorization_details(details):
+    """Yield ``(name, document)`` from ``aws iam get-account-authorization-details`` output."""
+    for policy in details.get("Policies", []):
+        for version in policy.get("PolicyVersionList", []):
+            if version.get("IsDefaultVersion"):
+                yield policy.get("Arn") or policy["PolicyName"], version["Document"]
+    for key, kind, name_key in (("RoleDetailList", "role", "RoleName"),
+                                ("UserDetailList", "user", "UserName"),
+                                ("GroupDetailList", "group", "GroupName")):
+        for principal in details.get(key, []):
+            policy_key = f"{kind.capitalize()}PolicyList"
+            for inline in principal.get(policy_key, []):
+                yield f"{kind}/{principal[name_key]}/{inline['PolicyName']}", inline["PolicyDocument"]
+
+
+def policies_from_plan(plan):
+    """Yield ``(address, document)`` for identity policies with known documents in a plan."""
+    index = plan if isinstance(plan, PlanIndex) else PlanIndex(plan)
+    for resource in index.of_type(*IDENTITY_POLICY_TYPES):
+        document = resource.values.get("policy")
+        if document:
+            yield resource.address, document
+
+
+def load_policies(path):
+    """Yield ``(name, document)`` pairs from a policy file, export, plan or directory of them."""
+    if os.path.isdir(path):
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                if name.endswith(".json"):
+                    yield from load_policies(os.path.join(root, name))
+        return
+    with open(path) as fh:
+        document = json.load(fh)
+    if "Statement" in document:
+        yield path, document
+    elif "planned_values" in document:
+        yield from policies_from_plan(document)
+    elif any(key in document for key in ("Policies", "RoleDetailList", "UserDetailList", "GroupDetailList")):
+        yield from policies_from_authorization_details(document)
+    else:
+        raise PolicyError(f"{path}: not a policy, plan or authorization details export")
+
+
+def _analyzer(sources, cache_path=None):
+    analyzer = PolicyAnalyzer(PolicyCache(cache_path))
+    for source in sources:
+        analyzer.extend(load_policies(source))
+    return analyzer
+
+
+@click.group()
+def main():
+    """Least-privilege queries over IAM policy documents."""
+
+
+@main.command("who-can")
+@click.argument("action")
+@click.argument("resource")
+@click.option("-s", "--source", "sources", multiple=True, required=True, type=click.Path(exists=True),
+              help="Policy JSON, plan JSON, authorization details export or a directory of them.")
+@click.option("-c", "--context", "context_items", multiple=True, metavar="KEY=VALUE",
+              help="Request context for Condition evaluation (repeatable).")
+def who_can(action, resource, sources, context_items):
+    """List policies that grant ACTION on RESOURCE."""
+    context = None
+    if context_items:
+        context = defaultdict(list)
+        for item in context_items:
+            key, _, value = item.partition("=")
+            context[key].append(value)
+    for grant in _analyzer(sources).grants(action, resource, context):
+        click.echo(f"{grant.decision:<12} {grant.policy}  ({', '.join(grant.statements)})")
+
+
+@main.command("over-grants")
+@click.option("-s", "--source", "sources", multiple=True, required=True, type=click.Path(exists=True),
+              help="Policy JSON, plan JSON, authorization details export or a directory of them.")
+@click.option("--cache", "cache_path", type=click.Path(), help="Findings cache keyed by document hash.")
+@click.option("--format", "output_format", type=click.Choice(["text", "json"]), default="text", show_default=True)
+def over_grants_command(sources, cache_path, output_format):
+    """List wildcard over-grants; exit 1 on full-admin, service-wide or NotAction grants."""
+    analyzer = _analyzer(sources, cache_path)
+    findings = analyzer.over_grants()
+    analyzer.cache.save()
+    if output_format == "json":
+        click.echo(json.dumps([asdict(finding) for finding in findings], indent=2))
+    else:
+        for finding in findings:
+            click.echo(f"{finding.kind:<18} {finding.policy} [{finding.sid}] {finding.detail}")
+    raise SystemExit(1 if any(finding.kind in FAIL_KINDS for finding in findings) else 0)
+
+
+if __name__ == "__main__":
+    main()
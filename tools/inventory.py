@@ -0,0 +1,487 @@
+"""Snapshot the account's AWS inventory into an indexed SQLite file.
+
+:func:`refresh` fans paginated ``describe_*`` / ``list_*`` calls for every
+resource type in :data:`RESOURCE_TYPES` out across regions on a bounded
+thread pool.  Calls go through :class:`Clients`: one botocore client per
+service and region, created once, shared by every worker thread, with a
+connection pool sized for the workers and adaptive retry, so throttling
+slows the client-side token bucket down instead of failing the snapshot.
+
+:class:`Snapshot` keeps one row per resource -- compact JSON of the API
+item plus its account, VPC, name and a content digest -- and its tags in a
+side table, indexed by resource ID, type, VPC and tag key/value.  Writes
+are diffed against the stored digests, so an unchanged resource is never
+rewritten.
+
+Refreshes are incremental.  Each ``(type, region)`` records when it was
+last listed and when CloudTrail last showed it unchanged, and by default
+the CloudTrail management events since the later of the two are the
+change markers: only types with a write event (``CreateTags`` on an
+``sg-`` ID, ``AuthorizeSecurityGroupIngress``, ``PutRolePolicy``, ...) are
+listed again.  Types never listed or not listed for ``max_age`` are always
+refreshed, and if CloudTrail cannot be read everything is.  A listing that
+fails is reported for its ``(type, region)`` and leaves the stored one in
+place; the rest of the refresh carries on.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+
+import boto3
+import click
+import jmespath
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+GLOBAL = "global"
+SCHEMA_VERSION = 2
+_TAG_EVENTS = {"CreateTags", "DeleteTags", "AddTagsToResource", "RemoveTagsFromResource"}
+
+
+class InventoryError(ValueError):
+    """Raised for unknown resource types and unreadable snapshots."""
+
+
+@dataclass(frozen=True)
+class ResourceType:
+    """How to list one resource type and index its items.
+
+    ``result_key``, ``vpc_key`` and ``name_key`` are JMESPath expressions on
+    the API response and item.  A CloudTrail event marks the type changed
+    when its name contains one of ``nouns`` (``AuthorizeSecurityGroupIngress``
+    contains ``SecurityGroup``), or when it tags an ID starting ``id_prefix``.
+    """
+
+    name: str
+    service: str
+    operation: str
+    result_key: str
+    id_key: str
+    nouns: tuple
+    id_prefix: str = None
+    vpc_key: str = "VpcId"
+    name_key: str = None
+    tags_key: str = "Tags"
+    page_size: int = None
+    regional: bool = True
+    params: tuple = ()
+
+
+RESOURCE_TYPES = (
+    ResourceType("AWS::EC2::VPC", "ec2", "describe_vpcs", "Vpcs", "VpcId", ("Vpc",), "vpc-", page_size=1000),
+    ResourceType("AWS::EC2::Subnet", "ec2", "describe_subnets", "Subnets", "SubnetId", ("Subnet",), "subnet-",
+                  page_size=1000),
+    ResourceType("AWS::EC2::SecurityGroup", "ec2", "describe_security_groups", "SecurityGroups", "GroupId",
+                  ("SecurityGroup",), "sg-", name_key="GroupName", page_size=1000),
+    ResourceType("AWS::EC2::NetworkInterface", "ec2", "describe_network_interfaces", "NetworkInterfaces",
+                  "NetworkInterfaceId", ("NetworkInterface", "Instances", "Address"), "eni-", tags_key="TagSet",
+                  page_size=1000),
+    ResourceType("AWS::EC2::Instance", "ec2", "describe_instances", "Reservations[].Instances[]", "InstanceId",
+                  ("Instance",), "i-", page_size=1000),
+    ResourceType("AWS::EC2::RouteTable", "ec2", "describe_route_tables", "RouteTables", "RouteTableId", ("Route",),
+                  "rtb-", page_size=100),
+    ResourceType("AWS::EC2::NetworkAcl", "ec2", "describe_network_acls", "NetworkAcls", "NetworkAclId",
+                  ("NetworkAcl",), "acl-", page_size=1000),
+    ResourceType("AWS::EC2::InternetGateway", "ec2", "describe_internet_gateways", "InternetGateways",
+                  "InternetGatewayId", ("InternetGateway",), "igw-", vpc_key="Attachments[0].VpcId", page_size=1000),
+    ResourceType("AWS::EC2::NatGateway", "ec2", "describe_nat_gateways", "NatGateways", "NatGatewayId",
+                  ("NatGateway",), "nat-", page_size=1000),
+    ResourceType("AWS::EC2::VPCEndpoint", "ec2", "describe_vpc_endpoints", "VpcEndpoints", "VpcEndpointId",
+                  ("VpcEndpoint",), "vpce-", page_size=1000),
+    ResourceType("AWS::EC2::Volume", "ec2", "describe_volumes", "Volumes", "VolumeId", ("Volume", "Instances"),
+                  "vol-", vpc_key=None, page_size=1000),
+    ResourceType("AWS::IAM::Role", "iam", "list_roles", "Roles", "RoleName", ("Role",), vpc_key=None,
+                  name_key="RoleName", page_size=1000, regional=False),
+    ResourceType("AWS::IAM::User", "iam", "list_users", "Users", "UserName", ("User",), vpc_key=None,
+                  name_key="UserName", page_size=1000, regional=False),
+    ResourceType("AWS::IAM::Policy", "iam", "list_policies", "Policies", "PolicyName", ("Policy",), vpc_key=None,
+                  name_key="PolicyName", page_size=1000, regional=False, params=(("Scope", "Local"),)),
+    ResourceType("AWS::IAM::InstanceProfile", "iam", "list_instance_profiles", "InstanceProfiles",
+                  "InstanceProfileName", ("InstanceProfile",), vpc_key=None, name_key="InstanceProfileName",
+                  page_size=1000, regional=False),
+    ResourceType("AWS::S3::Bucket", "s3", "list_buckets", "Buckets", "Name", ("Bucket",), vpc_key=None,
+                  name_key="Name", regional=False),
+    ResourceType("AWS::RDS::DBInstance", "rds", "describe_db_instances", "DBInstances", "DBInstanceIdentifier",
+                  ("DBInstance",), vpc_key="DBSubnetGroup.VpcId", name_key="DBInstanceIdentifier", tags_key="TagList",
+                  page_size=100),
+    ResourceType("AWS::RDS::DBSubnetGroup", "rds", "describe_db_subnet_groups", "DBSubnetGroups",
+                  "DBSubnetGroupName", ("DBSubnetGroup",), name_key="DBSubnetGroupName", page_size=100),
+)
+TYPES = {resource_type.name: resource_type for resource_type in RESOURCE_TYPES}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    raise TypeError(f"cannot serialise {type(value).__name__}")
+
+
+def _tags(resource_type, item):
+    return {tag["Key"]: tag.get("Value") for tag in item.get(resource_type.tags_key) or ()}
+
+
+class Clients:
+    """Thread-safe cache of botocore clients sharing one session.
+
+    Every client gets a connection pool of ``max_pool_connections`` and
+    adaptive retry, and :attr:`calls` counts API calls per
+    ``(service, operation)``.
+    """
+
+    def __init__(self, session=None, endpoint_url=None, max_pool_connections=32, max_attempts=10):
+        self.session = session or boto3.session.Session()
+        self.endpoint_url = endpoint_url
+        self.config = Config(retries={"mode": "adaptive", "max_attempts": max_attempts},
+                             max_pool_connections=max_pool_connections,
+                             s3={"addressing_style": "path"} if endpoint_url else None)
+        self.calls = Counter()
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, service, region, max_attempts=None):
+        """Return the shared client for ``service`` in ``region``."""
+        key = (service, region, max_attempts)
+        client = self._clients.get(key)
+        if client is None:
+            # Sessions are not thread-safe, so creation is serialised.
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    config = self.config if max_attempts is None else self.config.merge(
+                        Config(retries={"mode": "adaptive", "max_attempts": max_attempts}))
+                    client = self.session.client(service, region_name=region, endpoint_url=self.endpoint_url,
+                                                 config=config)
+                    client.meta.events.register("after-call", self._count)
+                    self._clients[key] = client
+        return client
+
+    def _count(self, model, **kwargs):
+        with self._lock:
+            self.calls[(model.service_model.service_name, model.name)] += 1
+
+    def default_region(self):
+        return self.session.region_name or "us-east-1"
+
+    def account_id(self, region=None):
+        return self.client("sts", region or self.default_region()).get_caller_identity()["Account"]
+
+
+def list_resources(clients, resource_type, region):
+    """Every item of ``resource_type`` in ``region``, following pagination."""
+    client = clients.client(resource_type.service, clients.default_region() if region == GLOBAL else region)
+    params = dict(resource_type.params)
+    if not client.can_paginate(resource_type.operation):
+        return jmespath.search(resource_type.result_key, getattr(client, resource_type.operation)(**params)) or []
+    if resource_type.page_size:
+        params["PaginationConfig"] = {"PageSize": resource_type.page_size}
+    pages = client.get_paginator(resource_type.operation).paginate(**params)
+    return [item for item in pages.search(resource_type.result_key) if item is not None]
+
+
+# -- Change markers -------------------------------------------------------------
+
+
+def changed_types(event, region):
+    """``{(type, region)}`` a CloudTrail management ``event`` may have changed."""
+    service = event.get("EventSource", "").split(".", 1)[0]
+    name = event.get("EventName", "")
+    candidates = [resource_type for resource_type in RESOURCE_TYPES if resource_type.service == service]
+    if name in _TAG_EVENTS:
+        ids = [resource.get("ResourceName") or "" for resource in event.get("Resources") or ()]
+        tagged = [resource_type for resource_type in candidates
+                  if resource_type.id_prefix and any(item.startswith(resource_type.id_prefix) for item in ids)]
+        candidates = tagged or candidates
+    else:
+        candidates = [resource_type for resource_type in candidates
+                      if any(noun in name for noun in resource_type.nouns)]
+    return {(resource_type.name, region if resource_type.regional else GLOBAL) for resource_type in candidates}
+
+
+def cloudtrail_changes(clients, regions, since, lag=900, max_attempts=3):
+    """``(type, region)`` pairs with CloudTrail write events since ``since``.
+
+    ``lag`` seconds are re-read because CloudTrail delivers events up to
+    15 minutes late.  Returns ``None`` when events cannot be looked up,
+    after at most ``max_attempts`` tries, since listing everything is the
+    fallback anyway.
+    """
+    start = datetime.fromtimestamp(since - lag, timezone.utc)
+    changed = set()
+    for region in regions:
+        paginator = clients.client("cloudtrail", region, max_attempts).get_paginator("lookup_events")
+        try:
+            for page in paginator.paginate(StartTime=start, LookupAttributes=[
+                    {"AttributeKey": "ReadOnly", "AttributeValue": "false"}]):
+                for event in page.get("Events", ()):
+                    changed |= changed_types(event, region)
+        except (BotoCoreError, ClientError):
+            return None
+    return changed
+
+
+# -- Snapshot store -------------------------------------------------------------
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    type TEXT NOT NULL, region TEXT NOT NULL, id TEXT NOT NULL, account TEXT, vpc_id TEXT, name TEXT,
+    digest TEXT NOT NULL, data TEXT NOT NULL,
+    PRIMARY KEY (type, region, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS resources_by_id ON resources (id);
+CREATE INDEX IF NOT EXISTS resources_by_vpc ON resources (vpc_id, type) WHERE vpc_id IS NOT NULL;
+CREATE TABLE IF NOT EXISTS tags (
+    type TEXT NOT NULL, region TEXT NOT NULL, id TEXT NOT NULL, key TEXT NOT NULL, value TEXT,
+    PRIMARY KEY (type, region, id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tags_by_value ON tags (key, value);
+CREATE TABLE IF NOT EXISTS refreshes (
+    type TEXT NOT NULL, region TEXT NOT NULL, account TEXT, refreshed_at REAL NOT NULL, count INTEGER NOT NULL,
+    checked_at REAL,
+    PRIMARY KEY (type, region)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class Resource:
+    """One stored resource."""
+
+    type: str
+    region: str
+    id: str
+    account: str
+    vpc_id: str
+    name: str
+    data: dict
+
+    @property
+    def tags(self):
+        return _tags(TYPES[self.type], self.data) if self.type in TYPES else {}
+
+
+class Snapshot:
+    """The SQLite inventory file at ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, 1, SCHEMA_VERSION):
+            raise InventoryError(f"{path}: snapshot schema {version}, expected {SCHEMA_VERSION}")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        if version == 1:
+            self.db.execute("ALTER TABLE refreshes ADD COLUMN checked_at REAL")
+        self.db.executescript(_SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def refreshed(self):
+        """``{(type, region): epoch seconds}`` of the last listing of each."""
+        return {(row[0], row[1]): row[2] for row in self.db.execute("SELECT type, region, refreshed_at FROM refreshes")}
+
+    def checked(self):
+        """``{(type, region): epoch seconds}`` since which each is known to be current."""
+        return {(row[0], row[1]): row[2] for row in self.db.execute(
+            "SELECT type, region, MAX(refreshed_at, COALESCE(checked_at, refreshed_at)) FROM refreshes")}
+
+    def mark_checked(self, keys, checked_at):
+        """Record that the ``(type, region)`` ``keys`` were seen unchanged as of ``checked_at``."""
+        with self.db:
+            self.db.executemany("UPDATE refreshes SET checked_at = ? WHERE type = ? AND region = ?",
+                                [(checked_at, name, region) for name, region in keys])
+
+    def write(self, resource_type, region, account, items, refreshed_at=None):
+        """Replace the stored ``(type, region)`` with ``items``; return (added, changed, removed)."""
+        rows, tags = {}, []
+        for item in items:
+            resource_id = item[resource_type.id_key]
+            data = json.dumps(item, sort_keys=True, separators=(",", ":"), default=_json_default)
+            item_tags = _tags(resource_type, item)
+            name = item_tags.get("Name") or (jmespath.search(resource_type.name_key, item)
+                                             if resource_type.name_key else None)
+            vpc_id = jmespath.search(resource_type.vpc_key, item) if resource_type.vpc_key else None
+            digest = hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
+            rows[resource_id] = (resource_type.name, region, resource_id, account, vpc_id, name, digest, data)
+            tags.extend((resource_type.name, region, resource_id, key, value) for key, value in item_tags.items())
+        stored = dict(self.db.execute("SELECT id, digest FROM resources WHERE type = ? AND region = ?",
+                                      (resource_type.name, region)))
+        removed = [(resource_type.name, region, resource_id) for resource_id in stored.keys() - rows.keys()]
+        upsert = [row for resource_id, row in rows.items() if stored.get(resource_id) != row[6]]
+        touched = {row[2] for row in upsert}
+        with self.db:
+            key = "type = ? AND region = ? AND id = ?"
+            self.db.executemany(f"DELETE FROM resources WHERE {key}", removed)
+            self.db.executemany(f"DELETE FROM tags WHERE {key}", removed + [row[:3] for row in upsert])
+            self.db.executemany("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?)", upsert)
+            self.db.executemany("INSERT INTO tags VALUES (?, ?, ?, ?, ?)", [tag for tag in tags if tag[2] in touched])
+            refreshed_at = refreshed_at or time.time()
+            self.db.execute("INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?, ?, ?, ?)",
+                            (resource_type.name, region, account, refreshed_at, len(rows), refreshed_at))
+        added = len(touched - stored.keys())
+        return added, len(touched) - added, len(removed)
+
+    def find(self, id=None, type=None, vpc_id=None, tags=None, region=None, limit=None):
+        """Resources matching every given criterion; ``tags`` maps keys to values (``None`` for any)."""
+        clauses, params = [], []
+        for column, value in (("id", id), ("type", type), ("vpc_id", vpc_id), ("region", region)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        for key, value in (tags or {}).items():
+            condition = "key = ?" + (" AND value = ?" if value is not None else "")
+            clauses.append(f"(type, region, id) IN (SELECT type, region, id FROM tags WHERE {condition})")
+            params.extend([key] if value is None else [key, value])
+        sql = "SELECT type, region, id, account, vpc_id, name, data FROM resources"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY type, region, id"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [Resource(*row[:6], json.loads(row[6])) for row in self.db.execute(sql, params)]
+
+    def counts(self):
+        """``{(type, region): (resources, refreshed_at)}``."""
+        return {(row[0], row[1]): (row[2], row[3]) for row in
+                self.db.execute("SELECT type, region, count, refreshed_at FROM refreshes ORDER BY type, region")}
+
+
+# -- Refresh --------------------------------------------------------------------
+
+
+def refresh(snapshot, clients, regions=None, types=None, workers=16, changes=cloudtrail_changes, max_age=86400.0,
+            full=False):
+    """Bring ``snapshot`` up to date; return ``(results, errors)``.
+
+    ``results`` maps each ``(type, region)`` listed to ``(added, changed,
+    removed)`` and ``errors`` maps each one whose listing failed to the
+    message; those keep their stored resources and are due again next time.
+    ``changes(clients, regions, since)`` returns the ``(type, region)``
+    pairs that moved since ``since`` (``None`` if unknown); pass
+    ``changes=None`` or ``full=True`` to list everything.
+    """
+    regions = list(regions or [clients.default_region()])
+    try:
+        selected = [TYPES[name] for name in types] if types else list(RESOURCE_TYPES)
+    except KeyError as exc:
+        raise InventoryError(f"unknown resource type {exc.args[0]!r}") from None
+    tasks = [(resource_type, region) for resource_type in selected
+             for region in (regions if resource_type.regional else [GLOBAL])]
+    started = time.time()
+    previous = snapshot.refreshed()
+    due = [task for task in tasks if full or changes is None or (task[0].name, task[1]) not in previous
+           or started - previous[(task[0].name, task[1])] > max_age]
+    known = [task for task in tasks if task not in due]
+    if known:
+        checked = snapshot.checked()
+        changed = changes(clients, regions, min(checked[(task[0].name, task[1])] for task in known))
+        due += [task for task in known if changed is None or (task[0].name, task[1]) in changed]
+        if changed is not None:
+            snapshot.mark_checked([(resource_type.name, region) for resource_type, region in known
+                                   if (resource_type.name, region) not in changed], started)
+    if not due:
+        return {}, {}
+    account = clients.account_id()
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(list_resources, clients, resource_type, region): (resource_type, region)
+                   for resource_type, region in due}
+        for future in as_completed(futures):
+            resource_type, region = futures[future]
+            try:
+                items = future.result()
+            except (BotoCoreError, ClientError) as exc:
+                errors[(resource_type.name, region)] = str(exc)
+                continue
+            results[(resource_type.name, region)] = snapshot.write(resource_type, region, account, items, started)
+    return results, errors
+
+
+# -- CLI ------------------------------------------------------------------------
+
+
+@click.group()
+def main():
+    """Snapshot and query the AWS inventory."""
+
+
+@main.command("snapshot")
+@click.argument("database", type=click.Path(dir_okay=False))
+@click.option("--region", "regions", multiple=True, help="Regions to list [default: the session region].")
+@click.option("--type", "types", multiple=True, type=click.Choice(sorted(TYPES)), help="Only these types.")
+@click.option("--workers", "-w", default=16, show_default=True)
+@click.option("--profile", help="AWS profile.")
+@click.option("--endpoint-url", envvar="AWS_ENDPOINT_URL", help="e.g. a local moto server.")
+@click.option("--full", is_flag=True, help="List every type instead of only those with CloudTrail changes.")
+@click.option("--max-age", default=86400.0, show_default=True, help="Seconds before a type is listed regardless.")
+def snapshot_command(database, regions, types, workers, profile, endpoint_url, full, max_age):
+    """Create or incrementally refresh the inventory in DATABASE."""
+    clients = Clients(boto3.session.Session(profile_name=profile), endpoint_url, max_pool_connections=workers * 2)
+    started = time.perf_counter()
+    with Snapshot(database) as snapshot:
+        try:
+            results, errors = refresh(snapshot, clients, regions, types, workers, max_age=max_age, full=full)
+        except InventoryError as exc:
+            raise click.ClickException(str(exc))
+        for (name, region), (added, changed, removed) in sorted(results.items()):
+            click.echo(f"{name:<28} {region:<14} +{added:<6} ~{changed:<6} -{removed}")
+        for (name, region), message in sorted(errors.items()):
+            click.echo(f"{name:<28} {region:<14} failed: {message}", err=True)
+    calls = sum(clients.calls.values())
+    click.echo(f"{len(results)} type(s) listed in {time.perf_counter() - started:.1f} s with {calls} API call(s)")
+    if errors:
+        raise click.ClickException(f"{len(errors)} type(s) could not be listed; their stored resources were kept")
+
+
+@main.command("query")
+@click.argument("database", type=click.Path(exists=True, dir_okay=False))
+@click.option("--id", "resource_id")
+@click.option("--type", "resource_type")
+@click.option("--vpc", "vpc_id")
+@click.option("--region")
+@click.option("--tag", "tag_specs", multiple=True, help="KEY=VALUE or KEY; repeat to require several.")
+@click.option("--json", "as_json", is_flag=True, help="Print the stored API items as JSON lines.")
+@click.option("--limit", type=int)
+def query_command(database, resource_id, resource_type, vpc_id, region, tag_specs, as_json, limit):
+    """Find resources in DATABASE by ID, type, VPC, region and tags."""
+    tags = dict((spec.split("=", 1) + [None])[:2] for spec in tag_specs)
+    with Snapshot(database) as snapshot:
+        for resource in snapshot.find(resource_id, resource_type, vpc_id, tags, region, limit):
+            if as_json:
+                click.echo(json.dumps(resource.data, sort_keys=True))
+            else:
+                click.echo(f"{resource.type:<28} {resource.region:<14} {resource.id:<28} {resource.vpc_id or '-':<24} "
+                           f"{resource.name or ''}")
+
+
+@main.command("stats")
+@click.argument("database", type=click.Path(exists=True, dir_okay=False))
+def stats_command(database):
+    """Resource counts and refresh times per type and region."""
+    with Snapshot(database) as snapshot:
+        for (name, region), (count, refreshed_at) in snapshot.counts().items():
+            stamp = datetime.fromtimestamp(refreshed_at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            click.echo(f"{name:<28} {region:<14} {count:>8}  {stamp}")
+    click.echo(f"{os.path.getsize(database)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,719 @@
+"""Offline evaluator for CloudWatch Logs metric filters and their alarms.
+
+:func:`compile_pattern` turns the three filter pattern syntaxes into
+matchers:
+
+* term patterns -- ``Failed password for * from * port * ssh2`` -- where
+  every term must occur in the event, ``?term`` terms are alternatives,
+  ``-term`` excludes, ``"quoted phrases"`` are literal and ``*`` inside a
+  bare term matches any run of non-blank characters;
+* space-delimited patterns -- ``[ip, user, ..., status = 4*, bytes > 1000]``
+  -- matching whitespace-separated fields, with ``"..."`` and ``[...]``
+  fields kept whole and ``...`` standing for any number of fields;
+* JSON patterns -- ``{ ($.eventName = Create*) && ($.errorCode NOT EXISTS) }``
+  -- with ``=``, ``!=``, ``<``, ``<=``, ``>``, ``>=``, ``IS TRUE|FALSE|NULL``,
+  ``NOT EXISTS``, ``&&``, ``||``, parentheses and ``[n]`` / ``[*]`` selectors.
+
+Each matcher also yields the literal strings an event must contain, so a
+chunk of log text is searched for those with ``str.find`` and the full
+matcher (and timestamp parsing) only runs on candidate lines.
+
+:func:`replay` streams any number of plain or gzip log files through all
+filters in one pass, chunk by chunk across worker processes, and buckets
+metric values per minute.  :func:`evaluate_alarm` then rolls the buckets up
+into an alarm's period and statistic and steps through its evaluation
+window, so a day of ``/var/log/secure`` shows exactly when
+``excessive-failed-logins`` would have fired.  Filters and alarms are read
+from ``terraform/modules/monitoring`` by :func:`load_monitoring`.
+Metric ``default_value`` and dimensions are not modelled.
+"""
+
+import calendar
+import functools
+import json
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import click
+
+from tools.flowlogs import CHUNK_SIZE, iter_chunks, log_files
+from tools.hcl import Expression, TerraformModel
+
+# Metric values are bucketed at CloudWatch's standard one-minute resolution.
+RESOLUTION = 60
+STATISTICS = ("Sum", "SampleCount", "Average", "Minimum", "Maximum")
+COMPARISONS = {
+    "GreaterThanThreshold": lambda value, threshold: value > threshold,
+    "GreaterThanOrEqualToThreshold": lambda value, threshold: value >= threshold,
+    "LessThanThreshold": lambda value, threshold: value < threshold,
+    "LessThanOrEqualToThreshold": lambda value, threshold: value <= threshold,
+}
+_MONTHS = {name: number for number, name in enumerate(calendar.month_abbr) if name}
+_SYSLOG_TIME = re.compile(r"([A-Z][a-z]{2}) +(\d{1,2}) (\d\d):(\d\d):(\d\d)")
+_ISO_TIME = re.compile(r"(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:\.\d+)?(Z|[+-]\d\d:?\d\d)?")
+_EVENT_TIME = re.compile(r'"eventTime"\s*:\s*"([^"]+)"')
+_LITERAL = re.compile(r"[\w.:/@-]+")
+_TERM = re.compile(r'\s*(?P<prefix>[?-]?)(?:"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<bare>[^\s"]\S*))')
+_FIELD = re.compile(r'"([^"]*)"|\[([^\]]*)\]|(\S+)')
+_JSON_TOKEN = re.compile(r"""\s*(?:
+    (?P<selector>\$(?:\.[A-Za-z0-9_@-]+|\[(?:\d+|\*)\])*)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<op>&&|\|\||!=|<=|>=|=|<|>|\(|\))
+  | (?P<word>[^\s()&|=!<>"]+)
+)""", re.VERBOSE)
+
+
+class PatternError(ValueError):
+    """A filter pattern CloudWatch would reject."""
+
+
+def _glob(value):
+    """Compile a ``*`` wildcard string to an anchored regex, or return None if literal."""
+    if "*" not in value:
+        return None
+    return re.compile(".*".join(map(re.escape, value.split("*"))), re.DOTALL)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Comparison:
+    """``value <op> operand`` for space-delimited fields and JSON selectors."""
+
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+        self.number = _number(operand) if not isinstance(operand, bool) else None
+        self.glob = _glob(operand) if isinstance(operand, str) else None
+        if op not in ("=", "!=") and self.number is None:
+            raise PatternError(f"{op} needs a numeric operand, got {operand!r}")
+
+    def __call__(self, value):
+        if self.op in ("=", "!="):
+            if isinstance(value, bool) or isinstance(self.operand, bool):
+                equal = value is self.operand or str(value).lower() == str(self.operand).lower()
+            elif self.number is not None and _number(value) is not None:
+                equal = _number(value) == self.number
+            elif self.glob is not None:
+                equal = isinstance(value, str) and self.glob.fullmatch(value) is not None
+            else:
+                equal = value == self.operand if not isinstance(value, (int, float)) else False
+            return equal if self.op == "=" else not equal
+        number = _number(value) if not isinstance(value, bool) else None
+        if number is None:
+            return False
+        return {"<": number < self.number, "<=": number <= self.number,
+                ">": number > self.number, ">=": number >= self.number}[self.op]
+
+    def needles(self):
+        if self.op == "=" and self.glob is None and isinstance(self.operand, str) \
+                and _LITERAL.fullmatch(self.operand):
+            return (self.operand,)
+        return None
+
+
+def _contains(term):
+    return lambda line: term in line
+
+
+class TermPattern:
+    """Every required term present, at least one ``?`` term if any, no ``-`` term."""
+
+    kind = "term"
+
+    def __init__(self, pattern):
+        self.required, self.optional, self.excluded = [], [], []
+        position = 0
+        while position < len(pattern.rstrip()):
+            match = _TERM.match(pattern, position)
+            if match is None:
+                raise PatternError(f"unterminated quote in {pattern!r}")
+            position = match.end()
+            if match.group("quoted") is not None:
+                term = re.sub(r"\\(.)", r"\1", match.group("quoted"))
+                test = _contains(term) if term else None
+            else:
+                term = match.group("bare")
+                if term.strip("*") == "":
+                    continue
+                test = re.compile(r"\S*".join(map(re.escape, term.split("*")))).search if "*" in term \
+                    else _contains(term)
+            if test is None:
+                continue
+            target = {"?": self.optional, "-": self.excluded}.get(match.group("prefix"), self.required)
+            target.append((term, test))
+
+    def match(self, line):
+        if not all(test(line) for _, test in self.required):
+            return None
+        if self.optional and not any(test(line) for _, test in self.optional):
+            return None
+        if any(test(line) for _, test in self.excluded):
+            return None
+        return {}
+
+    def needles(self):
+        literals = [max(term.split("*"), key=len) for term, _ in self.required]
+        literals = [literal for literal in literals if literal]
+        if literals:
+            return (max(literals, key=len),)
+        if self.optional and all("*" not in term for term, _ in self.optional):
+            return tuple(term for term, _ in self.optional)
+        return None
+
+
+class DelimitedPattern:
+    """``[name, name = value, ..., name > n]`` over whitespace-separated fields."""
+
+    kind = "delimited"
+
+    def __init__(self, pattern):
+        body = pattern.strip()[1:-1].strip()
+        self.fields = []
+        for spec in (part.strip() for part in body.split(",")) if body else ():
+            if spec == "...":
+                self.fields.append(None)
+                continue
+            alternatives, name = [], None
+            for alternative in spec.split("||"):
+                conditions = []
+                for condition in alternative.split("&&"):
+                    match = re.fullmatch(r'\s*([\w.-]*)\s*(?:(!=|<=|>=|=|<|>)\s*(.+?))?\s*', condition)
+                    if match is None:
+                        raise PatternError(f"bad field {spec!r} in {pattern!r}")
+                    field_name, op, operand = match.groups()
+                    name = name or field_name or None
+                    if op:
+                        conditions.append(_Comparison(op, operand.strip('"')))
+                alternatives.append(conditions)
+            self.fields.append((name, [conditions for conditions in alternatives if conditions]))
+
+    def _fits(self, spec, value):
+        _, alternatives = spec
+        return not alternatives or any(all(test(value) for test in conditions) for conditions in alternatives)
+
+    def match(self, line):
+        values = [quoted or bracketed or bare for quoted, bracketed, bare in _FIELD.findall(line)]
+        captured = {}
+        if None not in self.fields:
+            if len(values) != len(self.fields) or not all(map(self._fits, self.fields, values)):
+                return None
+            return {spec[0]: value for spec, value in zip(self.fields, values) if spec[0]}
+
+        @functools.lru_cache(maxsize=None)
+        def walk(spec_index, value_index):
+            if spec_index == len(self.fields):
+                return value_index == len(values)
+            spec = self.fields[spec_index]
+            if spec is None:
+                return any(walk(spec_index + 1, skip) for skip in range(value_index, len(values) + 1))
+            if value_index < len(values) and self._fits(spec, values[value_index]) \
+                    and walk(spec_index + 1, value_index + 1):
+                if spec[0]:
+                    captured[spec[0]] = values[value_index]
+                return True
+            return False
+
+        return captured if walk(0, 0) else None
+
+    def needles(self):
+        for spec in self.fields:
+            if spec and len(spec[1]) == 1:
+                for test in spec[1][0]:
+                    found = test.needles()
+                    if found:
+                        return found
+        return None
+
+
+class JsonPattern:
+    """``{ selector op value && ... || ... }`` over JSON log events."""
+
+    kind = "json"
+
+    def __init__(self, pattern):
+        self.tokens = []
+        text = pattern.strip()[1:-1]
+        position = 0
+        while text[position:].strip():
+            match = _JSON_TOKEN.match(text, position)
+            if match is None:
+                raise PatternError(f"cannot parse {text[position:].strip()!r} in {pattern!r}")
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind)))
+            position = match.end()
+        self.position = 0
+        self.tree = self._or()
+        if self.position != len(self.tokens):
+            raise PatternError(f"unexpected {self.tokens[self.position][1]!r} in {pattern!r}")
+        del self.tokens
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def _or(self):
+        nodes = [self._and()]
+        while self._peek() == ("op", "||"):
+            self._next()
+            nodes.append(self._and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def _and(self):
+        nodes = [self._unary()]
+        while self._peek() == ("op", "&&"):
+            self._next()
+            nodes.append(self._unary())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def _unary(self):
+        kind, value = self._next()
+        if (kind, value) == ("op", "("):
+            node = self._or()
+            if self._next() != ("op", ")"):
+                raise PatternError("missing ')'")
+            return node
+        if kind != "selector":
+            raise PatternError(f"expected a $. selector, got {value!r}")
+        selector = re.findall(r"\.([^.\[]+)|\[(\d+|\*)\]", value)
+        kind, word = self._next()
+        if kind == "word" and word.upper() == "IS":
+            _, operand = self._next()
+            literal = {"TRUE": True, "FALSE": False, "NULL": None}.get(operand.upper(), operand)
+            return ("is", selector, literal)
+        if kind == "word" and word.upper() == "NOT":
+            if self._next()[1].upper() != "EXISTS":
+                raise PatternError("expected NOT EXISTS")
+            return ("missing", selector)
+        if kind != "op" or word in ("(", ")", "&&", "||"):
+            raise PatternError(f"expected a comparison after {value}")
+        operand_kind, operand = self._next()
+        if operand_kind == "string":
+            operand = json.loads(operand)
+        elif operand_kind != "word":
+            raise PatternError(f"expected a value after {value} {word}")
+        return ("compare", selector, _Comparison(word, operand))
+
+    @staticmethod
+    def _select(document, selector):
+        values = [document]
+        for key, index in selector:
+            selected = []
+            for value in values:
+                if key and isinstance(value, dict) and key in value:
+                    selected.append(value[key])
+                elif index == "*" and isinstance(value, list):
+                    selected.extend(value)
+                elif index and index != "*" and isinstance(value, list) and int(index) < len(value):
+                    selected.append(value[int(index)])
+            values = selected
+        return values
+
+    def _evaluate(self, node, document):
+        kind = node[0]
+        if kind == "and":
+            return all(self._evaluate(child, document) for child in node[1])
+        if kind == "or":
+            return any(self._evaluate(child, document) for child in node[1])
+        values = self._select(document, node[1])
+        if kind == "missing":
+            return not values
+        if kind == "is":
+            return any(value is node[2] for value in values)
+        return any(node[2](value) for value in values)
+
+    def match(self, line):
+        start = line.find("{")
+        if start == -1:
+            return None
+        try:
+            document = json.loads(line[start:])
+        except ValueError:
+            return None
+        return document if self._evaluate(self.tree, document) else None
+
+    def needles(self):
+        return self._needles(self.tree)
+
+    def _needles(self, node):
+        if node[0] == "compare":
+            return node[2].needles()
+        if node[0] == "or":
+            found = [self._needles(child) for child in node[1]]
+            return tuple(needle for needles in found for needle in needles) if all(found) else None
+        if node[0] == "and":
+            return next(filter(None, (self._needles(child) for child in node[1])), None)
+        return None
+
+
+def compile_pattern(pattern):
+    """Compile a CloudWatch Logs filter pattern into a matcher."""
+    stripped = pattern.strip()
+    if stripped.startswith("{"):
+        if not stripped.endswith("}"):
+            raise PatternError(f"unbalanced braces in {pattern!r}")
+        return JsonPattern(stripped)
+    if stripped.startswith("["):
+        if not stripped.endswith("]"):
+            raise PatternError(f"unbalanced brackets in {pattern!r}")
+        return DelimitedPattern(stripped)
+    return TermPattern(stripped)
+
+
+@dataclass
+class MetricFilter:
+    """A metric filter: events matching ``pattern`` emit ``value`` to ``metric_name``."""
+
+    name: str
+    pattern: str
+    metric_name: str
+    value: str = "1"
+    log_group: str = None
+
+    def __post_init__(self):
+        self.matcher = compile_pattern(self.pattern)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("matcher", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.matcher = compile_pattern(self.pattern)
+
+    def metric_value(self, captured):
+        """The emitted value for a match, resolving ``$field`` / ``$.path`` against the event."""
+        if not self.value.startswith("$"):
+            return float(self.value)
+        if self.value.startswith("$."):
+            found = JsonPattern._select(captured, re.findall(r"\.([^.\[]+)|\[(\d+|\*)\]", self.value))
+        else:
+            found = [captured.get(self.value[1:])]
+        return _number(found[0]) if found else None
+
+
+@dataclass
+class Alarm:
+    name: str
+    metric_name: str
+    comparison_operator: str
+    threshold: float
+    period: int = 300
+    evaluation_periods: int = 1
+    statistic: str = "Sum"
+    datapoints_to_alarm: int = None
+    treat_missing_data: str = "missing"
+
+
+@dataclass
+class Transition:
+    """An alarm state change at the end of the period starting at ``timestamp``."""
+
+    timestamp: int
+    state: str
+    value: float = None
+
+
+@dataclass
+class ReplayResult:
+    """Per-filter ``{minute: [count, sum, min, max]}`` buckets and counters.
+
+    ``untimed`` counts matches dropped for lacking a timestamp or a value.
+    """
+
+    buckets: dict = field(default_factory=dict)
+    lines: int = 0
+    matches: dict = field(default_factory=dict)
+    untimed: int = 0
+
+    def merge(self, other):
+        self.lines += other.lines
+        self.untimed += other.untimed
+        for name, count in other.matches.items():
+            self.matches[name] = self.matches.get(name, 0) + count
+        for name, buckets in other.buckets.items():
+            mine = self.buckets.setdefault(name, {})
+            for minute, (count, total, low, high) in buckets.items():
+                bucket = mine.get(minute)
+                if bucket is None:
+                    mine[minute] = [count, total, low, high]
+                else:
+                    bucket[0] += count
+                    bucket[1] += total
+                    bucket[2] = min(bucket[2], low)
+                    bucket[3] = max(bucket[3], high)
+        return self
+
+    def span(self):
+        """``(first, last)`` minute across every filter, or None if nothing matched."""
+        minutes = [minute for buckets in self.buckets.values() for minute in buckets]
+        return (min(minutes), max(minutes)) if minutes else None
+
+    def datapoints(self, filter_name, period=RESOLUTION, statistic="Sum"):
+        """``{period_start: value}`` for one filter's metric."""
+        rolled = {}
+        for minute, (count, total, low, high) in self.buckets.get(filter_name, {}).items():
+            start = minute - minute % period
+            bucket = rolled.get(start)
+            if bucket is None:
+                rolled[start] = [count, total, low, high]
+            else:
+                bucket[0] += count
+                bucket[1] += total
+                bucket[2] = min(bucket[2], low)
+                bucket[3] = max(bucket[3], high)
+        return {start: _statistic(statistic, *bucket) for start, bucket in sorted(rolled.items())}
+
+
+def _statistic(name, count, total, low, high):
+    if name == "Sum":
+        return total
+    if name == "SampleCount":
+        return count
+    if name == "Average":
+        return total / count
+    if name == "Minimum":
+        return low
+    if name == "Maximum":
+        return high
+    raise ValueError(f"unsupported statistic {name!r}; expected one of {', '.join(STATISTICS)}")
+
+
+def parse_timestamp(line, year):
+    """Epoch seconds of a syslog, ISO 8601 or CloudTrail ``eventTime`` line, or None.
+
+    Syslog timestamps carry no year, so ``year`` supplies it.
+    """
+    match = _SYSLOG_TIME.match(line)
+    if match and match.group(1) in _MONTHS:
+        month, day, hour, minute, second = match.groups()
+        return calendar.timegm((year, _MONTHS[month], int(day), int(hour), int(minute), int(second)))
+    match = _ISO_TIME.match(line)
+    if match is None:
+        event_time = _EVENT_TIME.search(line)
+        match = event_time and _ISO_TIME.match(event_time.group(1))
+    if not match:
+        return None
+    parts = [int(part) for part in match.groups()[:6]]
+    stamp = calendar.timegm(tuple(parts))
+    zone = match.group(7)
+    if zone and zone != "Z":
+        sign = 1 if zone[0] == "+" else -1
+        digits = zone[1:].replace(":", "")
+        stamp -= sign * (int(digits[:2]) * 3600 + int(digits[2:]) * 60)
+    return stamp
+
+
+def _candidate_lines(text, needles):
+    """Yield each line of ``text`` containing one of ``needles``, once."""
+    seen = set()
+    for needle in needles:
+        position = text.find(needle)
+        while position != -1:
+            start = text.rfind("\n", 0, position) + 1
+            end = text.find("\n", position)
+            end = len(text) if end == -1 else end
+            if start not in seen:
+                seen.add(start)
+                yield text[start:end]
+            position = text.find(needle, end)
+
+
+def scan_chunk(data, filters, year):
+    """Run every filter over one newline-aligned chunk of log text."""
+    text = data.decode("utf-8", "replace") if isinstance(data, (bytes, bytearray, memoryview)) else data
+    result = ReplayResult(lines=text.count("\n") + (0 if not text or text.endswith("\n") else 1))
+    for metric_filter in filters:
+        needles = metric_filter.matcher.needles()
+        lines = _candidate_lines(text, needles) if needles else text.splitlines()
+        buckets = result.buckets.setdefault(metric_filter.name, {})
+        matched = 0
+        for line in lines:
+            captured = metric_filter.matcher.match(line)
+            if captured is None:
+                continue
+            matched += 1
+            value = metric_filter.metric_value(captured)
+            stamp = parse_timestamp(line, year)
+            if stamp is None or value is None:
+                result.untimed += 1
+                continue
+            minute = stamp - stamp % RESOLUTION
+            bucket = buckets.get(minute)
+            if bucket is None:
+                buckets[minute] = [1, value, value, value]
+            else:
+                bucket[0] += 1
+                bucket[1] += value
+                bucket[2] = min(bucket[2], value)
+                bucket[3] = max(bucket[3], value)
+        result.matches[metric_filter.name] = matched
+    return result
+
+
+def _bounded(pool, function, items, limit):
+    """``pool.map`` that keeps at most ``limit`` items in flight, in order."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(function, *item))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def replay(paths, filters, jobs=1, year=None, chunk_size=CHUNK_SIZE):
+    """Stream every log file under ``paths`` through ``filters`` in a single pass.
+
+    With ``jobs > 1`` chunks are scanned by that many worker processes.
+    ``year`` dates syslog lines and defaults to the current UTC year.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    year = year or time.gmtime().tm_year
+    filters = list(filters)
+    chunks = ((chunk, filters, year) for path in paths for log_path in log_files(path)
+              for chunk in iter_chunks(log_path, chunk_size))
+    result = ReplayResult()
+    if jobs <= 1:
+        for item in chunks:
+            result.merge(scan_chunk(*item))
+        return result
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for partial in _bounded(pool, scan_chunk, ((bytes(chunk), *rest) for chunk, *rest in chunks), jobs * 2):
+            result.merge(partial)
+    return result
+
+
+def evaluate_alarm(alarm, datapoints, start, end):
+    """Step ``alarm`` through every period in ``[start, end]`` and return its state transitions.
+
+    ``datapoints`` maps period start to the statistic's value, as returned
+    by :meth:`ReplayResult.datapoints` for the alarm's period and statistic.
+    """
+    compare = COMPARISONS[alarm.comparison_operator]
+    required = alarm.datapoints_to_alarm or alarm.evaluation_periods
+    state, transitions = "INSUFFICIENT_DATA", []
+    window = deque(maxlen=alarm.evaluation_periods)
+    first = start - start % alarm.period
+    for period_start in range(first, end + 1, alarm.period):
+        value = datapoints.get(period_start)
+        window.append(value)
+        present = [item for item in window if item is not None]
+        breaching = sum(1 for item in present if compare(item, alarm.threshold))
+        missing = len(window) - len(present)
+        if alarm.treat_missing_data == "breaching":
+            breaching += missing
+        if breaching >= required:
+            new_state = "ALARM"
+        elif present or alarm.treat_missing_data in ("breaching", "notBreaching"):
+            new_state = "OK"
+        elif alarm.treat_missing_data == "ignore":
+            new_state = state
+        else:
+            new_state = "INSUFFICIENT_DATA"
+        if new_state != state:
+            transitions.append(Transition(period_start, new_state, value))
+            state = new_state
+    return transitions
+
+
+def _literal(value, what):
+    if isinstance(value, Expression):
+        raise ValueError(f"{what} is not a literal: {value.source}")
+    return value
+
+
+def load_monitoring(model=None):
+    """Return ``(filters, alarms)`` declared in the monitoring module."""
+    module = (model or TerraformModel())["monitoring"]
+    filters = []
+    for address, body in module.of_type("aws_cloudwatch_log_metric_filter").items():
+        transformation = body["metric_transformation"][0]
+        log_group = body.get("log_group_name")
+        filters.append(MetricFilter(address.split(".", 1)[1], _literal(body["pattern"], f"{address}.pattern"),
+                                    _literal(transformation["name"], f"{address} metric name"),
+                                    str(_literal(transformation.get("value", "1"), f"{address} value")),
+                                    log_group.source if isinstance(log_group, Expression) else log_group))
+    metrics = {metric_filter.metric_name for metric_filter in filters}
+    alarms = []
+    for address, body in module.of_type("aws_cloudwatch_metric_alarm").items():
+        if body.get("metric_name") not in metrics:
+            continue
+        alarms.append(Alarm(address.split(".", 1)[1], body["metric_name"], body["comparison_operator"],
+                            float(body["threshold"]), int(body.get("period", 300)),
+                            int(body.get("evaluation_periods", 1)), body.get("statistic", "Sum"),
+                            body.get("datapoints_to_alarm"), body.get("treat_missing_data", "missing")))
+    return filters, alarms
+
+
+def _timestamp(stamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stamp))
+
+
+@click.group()
+def main():
+    """CloudWatch Logs metric filters, evaluated locally."""
+
+
+@main.command("test")
+@click.argument("pattern")
+@click.argument("events", type=click.File("r"), default="-")
+def test_command(pattern, events):
+    """Print the lines of EVENTS (default stdin) that PATTERN matches, like test-metric-filter."""
+    try:
+        matcher = compile_pattern(pattern)
+    except PatternError as exc:
+        raise click.ClickException(str(exc))
+    for number, line in enumerate(events, 1):
+        captured = matcher.match(line.rstrip("\n"))
+        if captured is not None:
+            fields = f"  {json.dumps(captured)}" if captured and matcher.kind == "delimited" else ""
+            click.echo(f"{number}: {line.rstrip()}{fields}")
+
+
+@main.command("replay")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--filter", "names", multiple=True, help="Only these metric filters (resource names).")
+@click.option("--jobs", "-j", default=1, show_default=True, help="Worker processes.")
+@click.option("--year", type=int, help="Year for syslog timestamps (default: current year).")
+@click.option("--chunk-kb", default=1024, show_default=True, help="Chunk size in KiB.")
+def replay_command(paths, names, jobs, year, chunk_kb):
+    """Replay log files through the monitoring module's metric filters and alarms."""
+    filters, alarms = load_monitoring()
+    if names:
+        unknown = set(names) - {metric_filter.name for metric_filter in filters}
+        if unknown:
+            raise click.BadParameter(f"unknown filter(s): {', '.join(sorted(unknown))}", param_hint="--filter")
+        filters = [metric_filter for metric_filter in filters if metric_filter.name in names]
+    result = replay(paths, filters, jobs, year, chunk_kb * 1024)
+    click.echo(f"lines: {result.lines}  matches without a timestamp: {result.untimed}")
+    span = result.span()
+    for metric_filter in filters:
+        click.echo(f"\n{metric_filter.name} ({metric_filter.metric_name}): "
+                   f"{result.matches.get(metric_filter.name, 0)} matches")
+        for alarm in (alarm for alarm in alarms if alarm.metric_name == metric_filter.metric_name):
+            datapoints = result.datapoints(metric_filter.name, alarm.period, alarm.statistic)
+            transitions = evaluate_alarm(alarm, datapoints, *span) if span else []
+            fired = sum(1 for transition in transitions if transition.state == "ALARM")
+            click.echo(f"  alarm {alarm.name}: {alarm.statistic} {alarm.comparison_operator} {alarm.threshold:g} "
+                       f"over {alarm.period}s -> fired {fired} time(s)")
+            for transition in transitions:
+                value = "" if transition.value is None else f"  ({alarm.statistic}={transition.value:g})"
+                click.echo(f"    {_timestamp(transition.timestamp)}  {transition.state}{value}")
+
+
+if __name__ == "__main__":
+    main()
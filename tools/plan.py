@@ -0,0 +1,302 @@
+"""Load and index ``terraform show -json`` plan output.
+
+A plan document is walked once and every managed resource is recorded in
+indexes keyed by resource type, module address and base address (the
+address without a ``count``/``for_each`` index).  Attribute-path indexes
+are built lazily per resource type the first time a check asks for them,
+so checks become dictionary lookups instead of rescans of the plan.
+"""
+
+import json
+import re
+import threading
+from collections import defaultdict
+
+_INDEX_RE = re.compile(r"\[[^\]]*\]$")
+_BRACKETS_RE = re.compile(r"\[[^\]]*\]")
+
+
+def load_plan(path):
+    """Load a plan JSON document from ``path``."""
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def join_address(module, address):
+    """Join a module address and a relative resource or module address."""
+    return f"{module}.{address}" if module else address
+
+
+def strip_index(address):
+    """Return ``address`` without a trailing ``[index]`` component."""
+    return _INDEX_RE.sub("", address)
+
+
+def parent_module(module):
+    """Return the address of the module that calls ``module``."""
+    parts = module.split(".")
+    return ".".join(parts[:-2])
+
+
+def flatten(value, prefix=""):
+    """Yield ``(path, leaf)`` pairs for a nested attribute value.
+
+    List positions are collapsed to ``*`` so that every element of a
+    repeated block shares one path, e.g. ``ingress.*.cidr_blocks.*``.
+    """
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, list):
+        if not value:
+            yield prefix, value
+        for item in value:
+            yield from flatten(item, f"{prefix}.*" if prefix else "*")
+    else:
+        yield prefix, value
+
+
+def expression_references(expression):
+    """Return every reference string used anywhere in a config expression."""
+    refs = []
+    if isinstance(expression, dict):
+        refs.extend(expression.get("references", []))
+        for key, item in expression.items():
+            if key not in ("references", "constant_value"):
+                refs.extend(expression_references(item))
+    elif isinstance(expression, list):
+        for item in expression:
+            refs.extend(expression_references(item))
+    return refs
+
+
+class Resource:
+    """A single planned resource instance."""
+
+    __slots__ = ("address", "module", "type", "name", "index", "values",
+                 "unknown", "actions")
+
+    def __init__(self, address, module, type, name, index=None, values=None,
+                 unknown=None, actions=None):
+        self.address = address
+        self.module = module
+        self.type = type
+        self.name = name
+        self.index = index
+        self.values = values or {}
+        self.unknown = unknown or {}
+        self.actions = actions or ["create"]
+
+    def __repr__(self):
+        return f"Resource({self.address!r})"
+
+    @property
+    def base_address(self):
+        """Address of the resource block, without an instance index."""
+        return join_address(self.module, f"{self.type}.{self.name}")
+
+    @property
+    def tags(self):
+        """Effective tags, including provider ``default_tags`` when known."""
+        return self.values.get("tags_all") or self.values.get("tags") or {}
+
+    def get(self, path, default=None):
+        """Look up a dotted attribute path such as ``ebs.0.encrypted``."""
+        value = self.values
+        for part in path.split("."):
+            if isinstance(value, list):
+                try:
+                    value = value[int(part)]
+                except (ValueError, IndexError):
+                    return default
+            elif isinstance(value, dict):
+                if part not in value:
+                    return default
+                value = value[part]
+            else:
+                return default
+        return value
+
+    def is_unknown(self, attribute):
+        """Whether a top-level attribute is only known after apply."""
+        return bool(self.unknown.get(attribute))
+
+    def is_set(self, attribute):
+        """Whether an attribute has a non-empty or known-after-apply value."""
+        return self.is_unknown(attribute) or self.values.get(attribute) not in (None, "", [], {})
+
+
+class PlanIndex:
+    """Indexed, read-only view over a plan JSON document."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.resources = []
+        self.by_address = {}
+        self.by_type = defaultdict(list)
+        self.by_module = defaultdict(list)
+        self.by_base = defaultdict(list)
+        self.config = {}
+        self.module_inputs = {}
+        self.module_outputs = {}
+        self._attribute_index = {}
+        self._lock = threading.Lock()
+
+        unknown, actions = self._index_changes(plan.get("resource_changes", []))
+        root = plan.get("planned_values", {}).get("root_module", {})
+        self._walk_planned(root, unknown, actions)
+        config_root = plan.get("configuration", {}).get("root_module", {})
+        self._walk_config(config_root, "")
+
+    @classmethod
+    def from_file(cls, path):
+        """Build an index from a plan JSON file."""
+        return cls(load_plan(path))
+
+    def _index_changes(self, changes):
+        unknown = {}
+        actions = {}
+        for change in changes:
+            if change.get("mode", "managed") != "managed":
+                continue
+            body = change.get("change", {})
+            unknown[change["address"]] = body.get("after_unknown") or {}
+            actions[change["address"]] = body.get("actions", ["no-op"])
+        return unknown, actions
+
+    def _walk_planned(self, module, unknown, actions):
+        module_address = module.get("address", "")
+        for item in module.get("resources", []):
+            if item.get("mode", "managed") != "managed":
+                continue
+            address = item["address"]
+            resource = Resource(
+                address=address,
+                module=module_address,
+                type=item["type"],
+                name=item["name"],
+                index=item.get("index"),
+                values=item.get("values") or {},
+                unknown=unknown.get(address),
+                actions=actions.get(address),
+            )
+            self.add(resource)
+        for child in module.get("child_modules", []):
+            self._walk_planned(child, unknown, actions)
+
+    def _walk_config(self, module, module_address):
+        for item in module.get("resources", []):
+            address = join_address(module_address, item["address"])
+            self.config[address] = item
+        for name, call in module.get("module_calls", {}).items():
+            child = join_address(module_address, f"module.{name}")
+            self.module_inputs[child] = call.get("expressions", {})
+            child_module = call.get("module", {})
+            self.module_outputs[child] = {
+                key: output.get("expression", {})
+                for key, output in child_module.get("outputs", {}).items()
+            }
+            self._walk_config(child_module, child)
+
+    def add(self, resource):
+        """Register a resource in every index."""
+        self.resources.append(resource)
+        self.by_address[resource.address] = resource
+        self.by_type[resource.type].append(resource)
+        self.by_module[resource.module].append(resource)
+        self.by_base[resource.base_address].append(resource)
+
+    def of_type(self, *types):
+        """Return all resources of the given types."""
+        found = []
+        for type_name in types:
+            found.extend(self.by_type.get(type_name, ()))
+        return found
+
+    def modules(self):
+        """Return every module address that owns at least one resource."""
+        return sorted(self.by_module)
+
+    def attribute(self, type_name, path):
+        """Return ``(resource, value)`` pairs for an attribute path of a type.
+
+        The first call for a resource type flattens all of its instances
+        once; later calls for any path on that type are dictionary lookups.
+        """
+        index = self._attribute_index.get(type_name)
+        if index is None:
+            with self._lock:
+                index = self._attribute_index.get(type_name)
+                if index is None:
+                    index = defaultdict(list)
+                    for resource in self.by_type.get(type_name, ()):
+                        for leaf_path, value in flatten(resource.values):
+                            index[leaf_path].append((resource, value))
+                    self._attribute_index[type_name] = index
+        return index.get(path, [])
+
+    def expressions(self, resource):
+        """Return the configuration expressions for a resource block."""
+        address = resource if isinstance(resource, str) else resource.base_address
+        return self.config.get(address, {}).get("expressions", {})
+
+    def references(self, resource, attribute):
+        """Return the references used by one attribute of a resource block."""
+        return expression_references(self.expressions(resource).get(attribute, {}))
+
+    def resolve(self, module, refs, _seen=None):
+        """Resolve references made inside ``module`` to resource base addresses.
+
+        ``var.*`` references are followed to the calling module's input
+        expression and ``module.<name>.<output>`` references to the output
+        expression inside the child module, so a reference crossing module
+        boundaries ends at the resources that actually produce the value.
+        """
+        seen = _seen if _seen is not None else set()
+        found = set()
+        for ref in refs:
+            key = (module, ref)
+            if key in seen:
+                continue
+            seen.add(key)
+            parts = _BRACKETS_RE.sub("", ref).split(".")
+            if parts[0] in ("count", "each", "path", "local", "self", "terraform"):
+                continue
+            if parts[0] == "var":
+                if not module:
+                    continue
+                name = parts[1]
+                expression = self.module_inputs.get(module, {}).get(name, {})
+                found |= self.resolve(parent_module(module),
+                                      expression_references(expression), seen)
+            elif parts[0] == "module":
+                if len(parts) < 3:
+                    continue
+                child = join_address(module, f"module.{parts[1]}")
+                expression = self.module_outputs.get(child, {}).get(parts[2], {})
+                found |= self.resolve(child, expression_references(expression), seen)
+            elif parts[0] == "data":
+                continue
+            elif len(parts) >= 2:
+                address = join_address(module, f"{parts[0]}.{parts[1]}")
+                if address in self.by_base:
+                    found.add(address)
+        return found
+
+    def resolve_attribute(self, resource, attribute):
+        """Resolve one attribute of ``resource`` to the resources it refers to.
+
+        An attribute indexed by ``count.index`` (``aws_subnet.public[count.index]``)
+        resolves to the instance with the same index as ``resource``.
+        """
+        refs = self.references(resource, attribute)
+        addresses = self.resolve(resource.module, refs)
+        by_count = resource.index is not None and any("count.index" in ref for ref in refs)
+        found = []
+        for address in sorted(addresses):
+            instances = self.by_base[address]
+            if by_count:
+                matching = [item for item in instances if item.index == resource.index]
+                instances = matching or instances
+            found.extend(instances)
+        return found
@@ -0,0 +1,405 @@
+"""Stream large ``terraform show -json`` plans without loading them whole.
+
+With every module, several autoscaling groups and accounts, the prod plan
+runs to hundreds of MB once ``prior_state`` and ``resource_changes`` are
+included, and ``json.load`` (:func:`tools.plan.load_plan`) turns that into
+several GB of Python objects.  :class:`PlanStream` reads the file in chunks
+instead and walks it container by container: objects and arrays are
+descended into until an array element -- a resource change, a planned or
+prior-state resource, a module's configured resource -- is reached, which
+is decoded on its own by the C decoder and dropped again, so peak memory is
+bounded by the largest single record rather than the plan.  Module trees
+(``child_modules``) are descended into like any other object.
+
+:meth:`PlanStream.changes` yields a :class:`ResourceChange` per element of
+``resource_changes``: a ``__slots__`` view holding the address, type,
+actions and the record's byte span in the file.  ``before``, ``after`` and
+the other attribute blobs are read back from that span and decoded only
+when first accessed.  :meth:`PlanStream.summary` counts create, update,
+replace and delete actions per module and per resource type without
+touching the blobs, and flags replacements and deletions of stateful
+resources such as ``aws_db_instance.main``.
+
+Chunks are decoded as Latin-1 so that character positions are byte
+positions; UTF-8 never uses ASCII bytes inside a multi-byte sequence, so the
+JSON structure is unaffected and the few strings kept on a view are
+re-decoded as UTF-8 (:func:`_text`).  Blobs are decoded from bytes directly.
+"""
+
+import json
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+import click
+
+CHUNK_SIZE = 1 << 20
+ACTIONS = ("create", "update", "replace", "delete")
+# Resources whose replacement or deletion loses data, keys or addresses.
+STATEFUL_TYPES = frozenset({
+    "aws_db_instance", "aws_rds_cluster", "aws_dynamodb_table", "aws_s3_bucket", "aws_efs_file_system",
+    "aws_ebs_volume", "aws_elasticache_cluster", "aws_elasticache_replication_group", "aws_kms_key",
+    "aws_secretsmanager_secret", "aws_cloudwatch_log_group", "aws_eip", "aws_opensearch_domain",
+    "aws_redshift_cluster",
+})
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+class PlanStreamError(ValueError):
+    """Raised when a plan file is not valid JSON."""
+
+
+def _text(value):
+    """A string decoded from the Latin-1 view of the file, re-decoded as UTF-8."""
+    if not isinstance(value, str) or value.isascii():
+        return value
+    try:
+        return value.encode("latin-1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return value
+
+
+def _descend(path):
+    """Whether the container at ``path`` is walked rather than decoded whole.
+
+    Array elements are records and decoded whole, except the module objects
+    of ``child_modules``.
+    """
+    return all(parent == "child_modules" for parent, part in zip(("",) + path, path) if part == "*")
+
+
+class _Scanner:
+    """A cursor over a binary file read in chunks, with file offsets."""
+
+    def __init__(self, fh, chunk_size=CHUNK_SIZE):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.text = ""
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+
+    def _more(self, size):
+        """Drop the consumed text and append ``size`` more bytes; False at end of file."""
+        if self.eof:
+            return False
+        data = self.fh.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.offset += self.pos
+        self.text = self.text[self.pos:] + data.decode("latin-1")
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """The next non-whitespace character, or ``""`` at end of file."""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._more(self.chunk_size):
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else "end of file"
+            raise PlanStreamError(f"expected one of {chars!r} at byte {self.offset + self.pos}, found {found}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the value at the cursor; returns ``(value, start, end)`` with file offsets.
+
+        A value running past the buffer is retried with geometrically more
+        text, so decoding stays linear in its size.  One ending exactly at the
+        buffer's end is retried too: a number may continue in the next chunk.
+        """
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as error:
+                if not self._more(size):
+                    raise PlanStreamError(f"invalid JSON at byte {self.offset + error.pos}: {error.msg}") from None
+            else:
+                if end < len(self.text) or not self._more(size):
+                    start = self.offset + self.pos
+                    self.pos = end
+                    return value, start, self.offset + end
+            size *= 2
+
+    def walk(self, path=()):
+        """Yield ``(path, value, start, end)`` for every record below the cursor.
+
+        Object keys and ``"*"`` for array positions make up ``path``.
+        """
+        char = self.peek()
+        if char in ("{", "[") and _descend(path):
+            self.pos += 1
+            close = "}" if char == "{" else "]"
+            if self.peek() == close:
+                self.pos += 1
+                return
+            while True:
+                if char == "{":
+                    key, start, _ = self.value()
+                    if not isinstance(key, str):
+                        raise PlanStreamError(f"expected an object key at byte {start}")
+                    self.expect(":")
+                    yield from self.walk(path + (_text(key),))
+                else:
+                    yield from self.walk(path + ("*",))
+                if self.expect("," + close) == close:
+                    return
+        else:
+            value, start, end = self.value()
+            yield (path, value, start, end)
+
+
+class ResourceChange:
+    """One element of a plan's ``resource_changes``, with its blobs left on disk.
+
+    ``before``, ``after``, ``after_unknown`` and the sensitivity maps are
+    read back from the record's byte span and decoded on first access; the
+    decoded change is kept until :meth:`release`.
+    """
+
+    __slots__ = ("address", "module", "mode", "type", "name", "index", "actions", "action_reason",
+                 "_source", "_span", "_change")
+
+    def __init__(self, address, module, mode, type, name, index=None, actions=None, action_reason=None,
+                 source=None, span=None):
+        self.address = address
+        self.module = module
+        self.mode = mode
+        self.type = type
+        self.name = name
+        self.index = index
+        self.actions = actions or ["no-op"]
+        self.action_reason = action_reason
+        self._source = source
+        self._span = span
+        self._change = None
+
+    @classmethod
+    def from_record(cls, record, source=None, span=None):
+        """A view over a decoded ``resource_changes`` element."""
+        change = record.get("change") or {}
+        return cls(_text(record["address"]), _text(record.get("module_address", "")), record.get("mode", "managed"),
+                   record["type"], _text(record["name"]), _text(record.get("index")),
+                   [_text(action) for action in change.get("actions") or ["no-op"]],
+                   _text(record.get("action_reason")), source, span)
+
+    def __repr__(self):
+        return f"ResourceChange({self.address!r}, {self.action!r})"
+
+    @property
+    def action(self):
+        """``create``, ``update``, ``replace``, ``delete``, ``read`` or ``no-op``."""
+        if "create" in self.actions and "delete" in self.actions:
+            return "replace"
+        return self.actions[0]
+
+    @property
+    def change(self):
+        """The record's decoded ``change`` object."""
+        if self._change is None:
+            if self._source is None:
+                return {}
+            self._change = json.loads(self._source.read(*self._span)).get("change") or {}
+        return self._change
+
+    @property
+    def before(self):
+        return self.change.get("before")
+
+    @property
+    def after(self):
+        return self.change.get("after")
+
+    @property
+    def after_unknown(self):
+        return self.change.get("after_unknown") or {}
+
+    @property
+    def before_sensitive(self):
+        return self.change.get("before_sensitive") or {}
+
+    @property
+    def after_sensitive(self):
+        return self.change.get("after_sensitive") or {}
+
+    @property
+    def replace_paths(self):
+        return self.change.get("replace_paths") or []
+
+    def changed_attributes(self):
+        """Top-level attributes whose value differs or is only known after apply."""
+        before = self.before or {}
+        after = self.after or {}
+        unknown = self.after_unknown
+        return sorted(key for key in set(before) | set(after) | set(unknown)
+                      if unknown.get(key) or before.get(key) != after.get(key))
+
+    def release(self):
+        """Drop the decoded blobs; they are read again on next access."""
+        self._change = None
+
+
+@dataclass
+class ChangeSummary:
+    """Counts of planned actions per module and per resource type.
+
+    ``stateful`` lists ``(address, action, reason)`` for replacements and
+    deletions of :data:`STATEFUL_TYPES`.  Data sources and no-op changes are
+    not counted beyond ``resources``.
+    """
+
+    resources: int = 0
+    actions: Counter = field(default_factory=Counter)
+    by_module: Counter = field(default_factory=Counter)
+    by_type: Counter = field(default_factory=Counter)
+    stateful: list = field(default_factory=list)
+
+    def add(self, change, stateful_types=STATEFUL_TYPES):
+        """Count one :class:`ResourceChange`."""
+        self.resources += 1
+        action = change.action
+        if change.mode != "managed" or action not in ACTIONS:
+            return
+        self.actions[action] += 1
+        self.by_module[change.module, action] += 1
+        self.by_type[change.type, action] += 1
+        if action in ("replace", "delete") and change.type in stateful_types:
+            self.stateful.append((change.address, action, change.action_reason))
+
+    def table(self, by="module"):
+        """``(name, create, update, replace, delete)`` rows, most changes first."""
+        counts = self.by_module if by == "module" else self.by_type
+        names = {name for name, _ in counts}
+        rows = [(name or "(root)",) + tuple(counts[name, action] for action in ACTIONS) for name in names]
+        return sorted(rows, key=lambda row: (-sum(row[1:]), row[0]))
+
+
+class PlanStream:
+    """A plan JSON file, read incrementally on every pass.
+
+    Top-level scalars (``format_version``, ``terraform_version`` ...) are
+    collected into ``header`` as a pass reaches them.  Views keep a
+    reference to the stream to read their blobs, so close it only once they
+    are no longer needed.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.header = {}
+        self._fh = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def read(self, start, end):
+        """The raw bytes of the file between two offsets."""
+        with self._lock:
+            if self._fh is None:
+                self._fh = open(self.path, "rb")
+            self._fh.seek(start)
+            return self._fh.read(end - start)
+
+    def records(self):
+        """Yield ``(path, value, start, end)`` for every record of the plan."""
+        with open(self.path, "rb") as fh:
+            scanner = _Scanner(fh, self.chunk_size)
+            if scanner.peek() != "{":
+                raise PlanStreamError(f"{self.path}: not a plan document")
+            yield from scanner.walk()
+            if scanner.peek():
+                raise PlanStreamError(f"{self.path}: unexpected data at byte {scanner.offset + scanner.pos}")
+
+    def changes(self, section="resource_changes"):
+        """Yield a :class:`ResourceChange` per element of ``section`` (or ``resource_drift``)."""
+        for path, value, start, end in self.records():
+            if len(path) == 2 and path[0] == section:
+                yield ResourceChange.from_record(value, self, (start, end))
+            elif len(path) == 1 and not isinstance(value, (dict, list)):
+                self.header[path[0]] = value
+
+    def summary(self, stateful_types=STATEFUL_TYPES):
+        """A :class:`ChangeSummary` of ``resource_changes`` in one pass."""
+        summary = ChangeSummary()
+        for change in self.changes():
+            summary.add(change, stateful_types)
+        return summary
+
+
+# -- CLI -----------------------------------------------------------------------
+
+
+@click.group()
+def main():
+    """Plan JSON read in constant memory."""
+
+
+@main.command("summary")
+@click.argument("plan_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--by", type=click.Choice(["module", "type"]), default="module", show_default=True)
+@click.option("--strict", is_flag=True, help="Exit 1 when a stateful resource is replaced or deleted.")
+def summary_command(plan_path, by, strict):
+    """Count planned actions per module or resource type."""
+    try:
+        summary = PlanStream(plan_path).summary()
+    except PlanStreamError as error:
+        raise click.ClickException(str(error))
+    click.echo(f"{by:<48} " + " ".join(f"{action:>8}" for action in ACTIONS))
+    for name, *counts in summary.table(by):
+        click.echo(f"{name:<48} " + " ".join(f"{count:>8}" for count in counts))
+    click.echo(f"{'total':<48} " + " ".join(f"{summary.actions[action]:>8}" for action in ACTIONS))
+    click.echo(f"{summary.resources} resource changes")
+    for address, action, reason in summary.stateful:
+        click.echo(f"STATEFUL {action.upper()} {address}" + (f" ({reason})" if reason else ""))
+    if strict and summary.stateful:
+        raise SystemExit(1)
+
+
+@main.command("show")
+@click.argument("plan_path", type=click.Path(exists=True, dir_okay=False))
+@click.argument("addresses", nargs=-1, required=True)
+def show_command(plan_path, addresses):
+    """Show the changed attributes of the given resource addresses."""
+    wanted = set(addresses)
+    try:
+        with PlanStream(plan_path) as stream:
+            for change in stream.changes():
+                if change.address not in wanted:
+                    continue
+                wanted.discard(change.address)
+                click.echo(f"{change.address}: {change.action}")
+                before, after, unknown = change.before or {}, change.after or {}, change.after_unknown
+                for key in change.changed_attributes():
+                    new = "(known after apply)" if unknown.get(key) else json.dumps(after.get(key))
+                    click.echo(f"  {key}: {json.dumps(before.get(key))} -> {new}")
+                change.release()
+    except PlanStreamError as error:
+        raise click.ClickException(str(error))
+    if wanted:
+        raise click.ClickException(f"not in the plan: {', '.join(sorted(wanted))}")
+
+
+if __name__ == "__main__":
+    main()
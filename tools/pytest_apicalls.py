@@ -0,0 +1,89 @@
+"""pytest plugin recording AWS API calls per test with :mod:`tools.apicalls`.
+
+Loaded for the whole suite from ``pytest.ini`` and idle unless one of the
+``--api-calls`` options is given.  Each test's setup, call and teardown
+are recorded under its node ID; under xdist every worker ships its
+recording to the controller, which merges them, prints the summary,
+writes ``--api-calls-json`` and fails the run when
+``--api-calls-baseline`` finds a test whose call count or p95 latency
+regressed.
+"""
+
+import pytest
+
+from tools.apicalls import Recorder, describe, compare, install, report, uninstall
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("apicalls", "AWS API call instrumentation")
+    group.addoption("--api-calls", action="store_true", help="Record AWS API calls per test and summarize them.")
+    group.addoption("--api-calls-json", metavar="PATH", help="Write the per-test recording as JSON.")
+    group.addoption("--api-calls-baseline", metavar="PATH",
+                    help="Fail when a test's call count or p95 latency regresses past this recording.")
+    group.addoption("--api-calls-slack", type=int, default=0, help="Extra calls a test may make over its baseline.")
+    group.addoption("--api-calls-latency-factor", type=float, default=1.5,
+                    help="How many times its baseline p95 a test's p95 may reach.")
+
+
+def _enabled(config):
+    return any(config.getoption(name) for name in ("--api-calls", "--api-calls-json", "--api-calls-baseline"))
+
+
+def pytest_configure(config):
+    if _enabled(config):
+        config._apicalls = install()
+        config._apicalls_regressions = []
+
+
+def pytest_unconfigure(config):
+    if getattr(config, "_apicalls", None) is not None:
+        uninstall()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    recorder = getattr(item.config, "_apicalls", None)
+    if recorder is None:
+        yield
+        return
+    with recorder.scoped(item.nodeid):
+        yield
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    recorder = getattr(node.config, "_apicalls", None)
+    output = getattr(node, "workeroutput", {}).get("apicalls")
+    if recorder is not None and output:
+        recorder.merge(Recorder.from_dict(output))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    recorder = getattr(config, "_apicalls", None)
+    if recorder is None:
+        return
+    if hasattr(config, "workerinput"):
+        config.workeroutput["apicalls"] = recorder.to_dict()
+        return
+    if config.getoption("--api-calls-json"):
+        recorder.dump(config.getoption("--api-calls-json"))
+    baseline = config.getoption("--api-calls-baseline")
+    if baseline:
+        config._apicalls_regressions = compare(recorder, Recorder.load(baseline),
+                                               config.getoption("--api-calls-slack"),
+                                               config.getoption("--api-calls-latency-factor"))
+        if config._apicalls_regressions and session.exitstatus == pytest.ExitCode.OK:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    recorder = getattr(config, "_apicalls", None)
+    if recorder is None or hasattr(config, "workerinput"):
+        return
+    write = terminalreporter.write_line
+    terminalreporter.section("AWS API calls")
+    for line in report(recorder, top=10):
+        write(line)
+    for regression in config._apicalls_regressions:
+        write(describe(regression), red=True)
@@ -0,0 +1,873 @@
+"""Network reachability over security groups, network ACLs and route tables.
+
+Traffic is a bitset: one Python integer with a bit per (protocol, port)
+for TCP and UDP ports and ICMP types, so combining rules is a handful of
+big-integer ``|`` and ``&`` operations.  Addresses are split into
+elementary intervals ("atoms") at every CIDR boundary used by a subnet,
+rule or route; every rule either covers an atom entirely or not at all,
+so each component compiles to an atom -> traffic table that is computed
+on demand and memoized:
+
+* security groups: the union of the rules whose CIDR covers the peer
+  atom, plus rules referencing a security group attached to the peer;
+* network ACLs: rules in ``rule_number`` order, the first rule matching a
+  (protocol, port) bit deciding it, with the implicit final deny; replies
+  must pass both ACLs on the ephemeral range since ACLs are stateless;
+* route tables: the longest-prefix route for the atom (``local``, ``igw``,
+  ``nat``, ...), which decides whether traffic leaves the VPC.  Only the
+  subnet's own VPC is ``local``; another VPC needs a ``peering`` or
+  ``tgw`` route from each side.
+
+Endpoints are *workloads* -- a set of security groups placed in subnets
+(a load balancer, an Auto Scaling group, an RDS instance) -- and the
+``internet`` outside every VPC CIDR.  A cell of the matrix is the traffic
+some address of the source can send to some address of the destination.
+Cells are cached per (workload, subnet) placement pair, and replacing a
+security group, ACL, route table or workload only drops the cells that
+depend on it.
+"""
+
+import bisect
+import functools
+import ipaddress
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import click
+
+from tools.cidr import to_range
+from tools.plan import PlanIndex, expression_references, load_plan
+
+INTERNET = "internet"
+_SEGMENTS = {"tcp": (0, 65536), "udp": (65536, 65536), "icmp": (131072, 256)}
+_PROTOCOLS = {"-1": "all", "all": "all", "6": "tcp", "17": "udp", "1": "icmp",
+              "tcp": "tcp", "udp": "udp", "icmp": "icmp"}
+ALL_TRAFFIC = (1 << sum(width for _, width in _SEGMENTS.values())) - 1
+SECURITY_GROUP_TYPES = ("aws_security_group", "aws_default_security_group")
+NETWORK_ACL_TYPES = ("aws_network_acl", "aws_default_network_acl")
+_SPACE = (0, (1 << 32) - 1)
+_BETWEEN_VPCS = ("peering", "tgw")
+
+
+def _segment(name, first=0, last=None):
+    offset, width = _SEGMENTS[name]
+    last = width - 1 if last is None else last
+    return ((1 << (last - first + 1)) - 1) << (offset + first)
+
+
+_FULL = {name: _segment(name) for name in _SEGMENTS}
+# Replies go to the client's ephemeral port; ICMP replies only need the protocol.
+_REPLY = {"tcp": _segment("tcp", 1024), "udp": _segment("udp", 1024), "icmp": _FULL["icmp"]}
+
+
+def traffic_mask(protocol, from_port=None, to_port=None):
+    """Bitset for ``protocol`` between two ports (ICMP: ``from_port`` is the type).
+
+    Protocols other than TCP, UDP and ICMP are not modelled and return 0.
+    """
+    name = _PROTOCOLS.get(str(protocol).lower())
+    if name is None:
+        return 0
+    if name == "all":
+        return ALL_TRAFFIC
+    if name == "icmp":
+        if from_port in (None, -1):
+            return _FULL["icmp"]
+        return _segment("icmp", from_port, from_port)
+    first = 0 if from_port in (None, -1) else int(from_port)
+    last = 65535 if to_port in (None, -1) else int(to_port)
+    return _segment(name, first, last)
+
+
+def _runs(bits):
+    position = 0
+    while bits:
+        skip = (bits & -bits).bit_length() - 1
+        bits >>= skip
+        position += skip
+        length = (~bits & (bits + 1)).bit_length() - 1
+        yield position, position + length - 1
+        bits >>= length
+        position += length
+
+
+class Traffic:
+    """A set of (protocol, port) pairs."""
+
+    __slots__ = ("mask",)
+
+    def __init__(self, mask=0):
+        self.mask = mask
+
+    def __bool__(self):
+        return bool(self.mask)
+
+    def __eq__(self, other):
+        return isinstance(other, Traffic) and other.mask == self.mask
+
+    def __or__(self, other):
+        return Traffic(self.mask | other.mask)
+
+    def __and__(self, other):
+        return Traffic(self.mask & other.mask)
+
+    def allows(self, protocol, port=None):
+        """Whether ``protocol`` is allowed on ``port``, or on any port if None."""
+        wanted = traffic_mask(protocol, port, port) if port is not None else traffic_mask(protocol)
+        return bool(self.mask & wanted) if port is None else self.mask & wanted == wanted
+
+    def ranges(self):
+        """Return ``{protocol: [(first, last), ...]}`` of the allowed ports."""
+        found = {}
+        for name, (offset, width) in _SEGMENTS.items():
+            runs = list(_runs((self.mask >> offset) & ((1 << width) - 1)))
+            if runs:
+                found[name] = runs
+        return found
+
+    def __str__(self):
+        if self.mask == ALL_TRAFFIC:
+            return "all"
+        parts = []
+        for name, runs in self.ranges().items():
+            if runs == [(0, _SEGMENTS[name][1] - 1)]:
+                parts.append(name)
+            else:
+                parts.extend(f"{name}:{first}" if first == last else f"{name}:{first}-{last}" for first, last in runs)
+        return ", ".join(parts) or "none"
+
+    def __repr__(self):
+        return f"Traffic({str(self)!r})"
+
+
+@dataclass
+class Rule:
+    """A security group rule; ``self_ref`` matches peers carrying the same group."""
+
+    protocol: str
+    from_port: int = None
+    to_port: int = None
+    cidrs: tuple = ()
+    groups: tuple = ()
+    self_ref: bool = False
+
+
+@dataclass
+class SecurityGroup:
+    id: str
+    ingress: list = field(default_factory=list)
+    egress: list = field(default_factory=list)
+    name: str = None
+
+
+@dataclass
+class AclEntry:
+    rule_number: int
+    action: str
+    protocol: str
+    cidr: str
+    from_port: int = None
+    to_port: int = None
+
+
+@dataclass
+class NetworkAcl:
+    id: str
+    subnets: tuple = ()
+    ingress: list = field(default_factory=list)
+    egress: list = field(default_factory=list)
+
+
+@dataclass
+class Route:
+    """A route; ``target`` is ``local``, ``igw``, ``nat``, ``peering``, ``tgw`` or ``other``."""
+
+    cidr: str
+    target: str
+
+
+@dataclass
+class RouteTable:
+    id: str
+    subnets: tuple = ()
+    routes: list = field(default_factory=list)
+
+
+@dataclass
+class Subnet:
+    """A subnet; without ``vpc_id`` its VPC is the VPC CIDR that contains it."""
+
+    id: str
+    cidr: str
+    name: str = None
+    vpc_id: str = None
+
+
+@dataclass
+class Workload:
+    """Network interfaces sharing ``security_groups``, placed in ``subnets``."""
+
+    name: str
+    subnets: tuple
+    security_groups: tuple
+
+
+@functools.lru_cache(maxsize=None)
+def _range(cidr):
+    version, first, last = to_range(cidr)
+    return (first, last) if version == 4 else None
+
+
+class Matrix:
+    """Reachability cells keyed by ``(source, destination)`` endpoint names."""
+
+    def __init__(self, endpoints, cells):
+        self.endpoints = endpoints
+        self.cells = cells
+
+    def __getitem__(self, key):
+        return self.cells.get(key, Traffic())
+
+    def allows(self, source, destination, protocol, port=None):
+        return self[source, destination].allows(protocol, port)
+
+    def reachable(self):
+        """Yield ``(source, destination, traffic)`` for every non-empty cell."""
+        for (source, destination), traffic in self.cells.items():
+            if traffic:
+                yield source, destination, traffic
+
+
+class Network:
+    """Compiled reachability model of one or more VPCs."""
+
+    def __init__(self, subnets=(), security_groups=(), network_acls=(), route_tables=(), workloads=(),
+                 vpc_cidrs=()):
+        self.subnets = {subnet.id: subnet for subnet in subnets}
+        self.security_groups = {group.id: group for group in security_groups}
+        self.network_acls = {acl.id: acl for acl in network_acls}
+        self.route_tables = {table.id: table for table in route_tables}
+        self.workloads = {workload.name: workload for workload in workloads}
+        # Without VPC CIDRs every subnet is taken to share one VPC.
+        self._one_vpc = not vpc_cidrs
+        self.vpc_cidrs = list(vpc_cidrs) or [subnet.cidr for subnet in self.subnets.values()]
+        self.evaluations = 0
+        self._cells = {}
+        self._rebuild()
+
+    # -- compilation -------------------------------------------------------
+
+    def _cidrs(self):
+        yield from self.vpc_cidrs
+        for subnet in self.subnets.values():
+            yield subnet.cidr
+        for group in self.security_groups.values():
+            for rule in group.ingress + group.egress:
+                yield from rule.cidrs
+        for acl in self.network_acls.values():
+            for entry in acl.ingress + acl.egress:
+                yield entry.cidr
+        for table in self.route_tables.values():
+            for route in table.routes:
+                yield route.cidr
+
+    def _boundaries(self, cidrs):
+        bounds = set()
+        for cidr in cidrs:
+            bounds_range = _range(cidr)
+            if bounds_range:
+                bounds.update((bounds_range[0], bounds_range[1] + 1))
+        return bounds
+
+    def _rebuild(self):
+        """Recompute atoms and associations and drop every cached result."""
+        self._bounds = sorted(self._boundaries(self._cidrs()) | {_SPACE[0], _SPACE[1] + 1})
+        self._bound_set = set(self._bounds)
+        self._acl_of = {subnet: acl.id for acl in self.network_acls.values() for subnet in acl.subnets}
+        self._table_of = {subnet: table.id for table in self.route_tables.values() for subnet in table.subnets}
+        self._carriers = defaultdict(set)
+        for workload in self.workloads.values():
+            for group in workload.security_groups:
+                self._carriers[group].add(workload.name)
+        self._group_memo = {}
+        self._acl_memo = {}
+        self._route_memo = {}
+        self._cells.clear()
+        internal = [_range(cidr) for cidr in self.vpc_cidrs if _range(cidr)]
+        self._vpc_of, self._local = {}, defaultdict(list)
+        for subnet in self.subnets.values():
+            bounds = _range(subnet.cidr)
+            if not bounds:
+                continue
+            owner = None if self._one_vpc else next(
+                (vpc for vpc in internal if vpc[0] <= bounds[0] and bounds[1] <= vpc[1]), None)
+            vpc = self._vpc_of[subnet.id] = subnet.vpc_id or owner
+            if (owner or bounds) not in self._local[vpc]:
+                self._local[vpc].append(owner or bounds)
+        self._atoms = {subnet.id: self._atoms_in(*_range(subnet.cidr))
+                       for subnet in self.subnets.values() if _range(subnet.cidr)}
+        self._atoms[INTERNET] = [atom for atom in self._atoms_in(*_SPACE)
+                                 if not any(first <= atom <= last for first, last in internal)]
+
+    def _atoms_in(self, first, last):
+        start = bisect.bisect_left(self._bounds, first)
+        stop = bisect.bisect_left(self._bounds, last + 1)
+        return self._bounds[start:stop]
+
+    def _needs_rebuild(self, cidrs):
+        return not self._boundaries(cidrs) <= self._bound_set
+
+    def _compiled_group(self, group_id, direction):
+        """One direction of a security group as ``(per-atom masks, per-peer-group masks)``."""
+        key = (group_id, direction)
+        compiled = self._group_memo.get(key)
+        if compiled is None:
+            by_atom, by_group = defaultdict(int), defaultdict(int)
+            group = self.security_groups.get(group_id)
+            for rule in (getattr(group, direction) if group else ()):
+                traffic = traffic_mask(rule.protocol, rule.from_port, rule.to_port)
+                for cidr in rule.cidrs:
+                    bounds = _range(cidr)
+                    for atom in (self._atoms_in(*bounds) if bounds else ()):
+                        by_atom[atom] |= traffic
+                for peer in rule.groups + ((group_id,) if rule.self_ref else ()):
+                    by_group[peer] |= traffic
+            compiled = self._group_memo[key] = (dict(by_atom), dict(by_group))
+        return compiled
+
+    def _group_traffic(self, group_id, direction, atom, peer_groups):
+        """Traffic one security group allows to or from a peer at ``atom``."""
+        by_atom, by_group = self._compiled_group(group_id, direction)
+        mask = by_atom.get(atom, 0)
+        for peer in peer_groups:
+            mask |= by_group.get(peer, 0)
+        return mask
+
+    def _acl_traffic(self, subnet_id, direction, atom):
+        """Traffic a subnet's ACL lets through to or from ``atom``, first match wins."""
+        acl_id = self._acl_of.get(subnet_id)
+        if acl_id is None:
+            return ALL_TRAFFIC
+        key = (acl_id, direction, atom)
+        mask = self._acl_memo.get(key)
+        if mask is None:
+            mask = decided = 0
+            for entry in sorted(getattr(self.network_acls[acl_id], direction), key=lambda item: item.rule_number):
+                if not _covers(entry.cidr, atom):
+                    continue
+                traffic = traffic_mask(entry.protocol, entry.from_port, entry.to_port) & ~decided
+                if entry.action.lower() == "allow":
+                    mask |= traffic
+                decided |= traffic
+                if decided == ALL_TRAFFIC:
+                    break
+            self._acl_memo[key] = mask
+        return mask
+
+    def _route_target(self, subnet_id, atom):
+        table_id = self._table_of.get(subnet_id)
+        vpc = self._vpc_of[subnet_id]
+        key = (table_id, vpc, atom)
+        target = self._route_memo.get(key)
+        if target is None:
+            target, best = None, -1
+            for route in (self.route_tables[table_id].routes if table_id else ()):
+                network = ipaddress.ip_network(route.cidr, strict=False)
+                if network.version == 4 and network.prefixlen > best and _covers(route.cidr, atom):
+                    target, best = route.target, network.prefixlen
+            if target is None and any(first <= atom <= last for first, last in self._local[vpc]):
+                target = "local"
+            self._route_memo[key] = target = target or "none"
+        return target
+
+    @staticmethod
+    def _reply_filter(reply):
+        allowed = 0
+        for name, needed in _REPLY.items():
+            if reply & needed:
+                allowed |= _FULL[name]
+        return allowed
+
+    # -- evaluation --------------------------------------------------------
+
+    def _placements(self, endpoint):
+        if endpoint == INTERNET:
+            return [(INTERNET, INTERNET)]
+        return [(endpoint, subnet) for subnet in self.workloads[endpoint].subnets if subnet in self._atoms]
+
+    def _groups(self, endpoint):
+        return frozenset(self.workloads[endpoint].security_groups) if endpoint != INTERNET else frozenset()
+
+    def _cell(self, source, destination):
+        cached = self._cells.get((source, destination))
+        if cached is not None:
+            return cached
+        self.evaluations += 1
+        (source_name, source_subnet), (target_name, target_subnet) = source, destination
+        source_groups, target_groups = self._groups(source_name), self._groups(target_name)
+        crossing = source_subnet != target_subnet
+        total = 0
+        for source_atom in self._atoms[source_subnet]:
+            for target_atom in self._atoms[target_subnet]:
+                mask = ALL_TRAFFIC
+                if source_name != INTERNET:
+                    mask = 0
+                    for group in source_groups:
+                        mask |= self._group_traffic(group, "egress", target_atom, target_groups)
+                if target_name != INTERNET:
+                    allowed = 0
+                    for group in target_groups:
+                        allowed |= self._group_traffic(group, "ingress", source_atom, source_groups)
+                    mask &= allowed
+                if not mask or not crossing:
+                    total |= mask
+                    continue
+                if target_subnet == INTERNET:
+                    if self._route_target(source_subnet, target_atom) not in ("igw", "nat"):
+                        continue
+                elif source_subnet == INTERNET:
+                    # Inbound only works where replies route straight back out an internet gateway.
+                    if self._route_target(target_subnet, source_atom) != "igw":
+                        continue
+                elif self._vpc_of[source_subnet] != self._vpc_of[target_subnet]:
+                    # Another VPC is reached, and answers, only over a peering connection or transit gateway.
+                    if self._route_target(source_subnet, target_atom) not in _BETWEEN_VPCS \
+                            or self._route_target(target_subnet, source_atom) not in _BETWEEN_VPCS:
+                        continue
+                reply = ALL_TRAFFIC
+                if source_subnet != INTERNET:
+                    mask &= self._acl_traffic(source_subnet, "egress", target_atom)
+                    reply &= self._acl_traffic(source_subnet, "ingress", target_atom)
+                if target_subnet != INTERNET:
+                    mask &= self._acl_traffic(target_subnet, "ingress", source_atom)
+                    reply &= self._acl_traffic(target_subnet, "egress", source_atom)
+                total |= mask & self._reply_filter(reply)
+        self._cells[(source, destination)] = total
+        return total
+
+    def endpoints(self):
+        return sorted(self.workloads) + [INTERNET]
+
+    def traffic(self, source, destination):
+        """Traffic ``source`` can open to ``destination`` (workload names or ``internet``)."""
+        mask = 0
+        for source_placement in self._placements(source):
+            for target_placement in self._placements(destination):
+                mask |= self._cell(source_placement, target_placement)
+        return Traffic(mask)
+
+    def matrix(self, by="workload"):
+        """Full reachability matrix between workloads, or between subnets when ``by="subnet"``."""
+        endpoints = self.endpoints()
+        cells = defaultdict(int)
+        for source in endpoints:
+            for destination in endpoints:
+                if source == destination == INTERNET:
+                    continue
+                for source_placement in self._placements(source):
+                    for target_placement in self._placements(destination):
+                        mask = self._cell(source_placement, target_placement)
+                        key = (source, destination) if by == "workload" else (source_placement[1], target_placement[1])
+                        cells[key] |= mask
+        names = endpoints if by == "workload" else sorted(self.subnets) + [INTERNET]
+        return Matrix(names, {key: Traffic(mask) for key, mask in cells.items()})
+
+    # -- incremental updates -----------------------------------------------
+
+    def _drop_cells(self, affected):
+        for key in [key for key in self._cells if affected(key)]:
+            del self._cells[key]
+
+    def set_security_group(self, group):
+        """Add or replace a security group, re-evaluating only the cells that use it."""
+        cidrs = [cidr for rule in group.ingress + group.egress for cidr in rule.cidrs]
+        self.security_groups[group.id] = group
+        if self._needs_rebuild(cidrs):
+            return self._rebuild()
+        self._group_memo.pop((group.id, "ingress"), None)
+        self._group_memo.pop((group.id, "egress"), None)
+        carriers = self._carriers.get(group.id, set())
+        self._drop_cells(lambda key: key[0][0] in carriers or key[1][0] in carriers)
+
+    def set_network_acl(self, acl):
+        """Add or replace a network ACL, re-evaluating only the cells through its subnets."""
+        previous = self.network_acls.get(acl.id)
+        self.network_acls[acl.id] = acl
+        subnets = set(acl.subnets) | set(previous.subnets if previous else ())
+        if self._needs_rebuild(entry.cidr for entry in acl.ingress + acl.egress) \
+                or any(self._acl_of.get(subnet) not in (None, acl.id) for subnet in subnets):
+            return self._rebuild()
+        self._acl_of.update((subnet, acl.id) for subnet in acl.subnets)
+        for subnet in subnets - set(acl.subnets):
+            self._acl_of.pop(subnet, None)
+        self._acl_memo = {key: mask for key, mask in self._acl_memo.items() if key[0] != acl.id}
+        self._drop_cells(lambda key: key[0][1] in subnets or key[1][1] in subnets)
+
+    def set_route_table(self, table):
+        """Add or replace a route table, re-evaluating only the cells through its subnets."""
+        previous = self.route_tables.get(table.id)
+        self.route_tables[table.id] = table
+        subnets = set(table.subnets) | set(previous.subnets if previous else ())
+        if self._needs_rebuild(route.cidr for route in table.routes) \
+                or any(self._table_of.get(subnet) not in (None, table.id) for subnet in subnets):
+            return self._rebuild()
+        self._table_of.update((subnet, table.id) for subnet in table.subnets)
+        for subnet in subnets - set(table.subnets):
+            self._table_of.pop(subnet, None)
+        self._route_memo = {key: target for key, target in self._route_memo.items() if key[0] != table.id}
+        self._drop_cells(lambda key: key[0][1] in subnets or key[1][1] in subnets)
+
+    def set_workload(self, workload):
+        """Add or replace a workload, re-evaluating only the cells it takes part in."""
+        previous = self.workloads.get(workload.name)
+        self.workloads[workload.name] = workload
+        for group in (previous.security_groups if previous else ()):
+            self._carriers[group].discard(workload.name)
+        for group in workload.security_groups:
+            self._carriers[group].add(workload.name)
+        # Rules referencing a group now match different peers.
+        touched = set(workload.security_groups) | set(previous.security_groups if previous else ())
+        names = {workload.name} | {name for group in touched for name in self._carriers.get(group, ())}
+        self._drop_cells(lambda key: key[0][0] in names or key[1][0] in names
+                         or self._references_any(key, touched))
+
+    def _references_any(self, key, groups):
+        for name in (key[0][0], key[1][0]):
+            if name == INTERNET or name not in self.workloads:
+                continue
+            for group_id in self.workloads[name].security_groups:
+                group = self.security_groups.get(group_id)
+                if group and any(groups.intersection(rule.groups) for rule in group.ingress + group.egress):
+                    return True
+        return False
+
+
+def _covers(cidr, atom):
+    bounds = _range(cidr)
+    return bounds is not None and bounds[0] <= atom <= bounds[1]
+
+
+# -- plan JSON -------------------------------------------------------------
+
+
+def _resolve(index, resource, refs, types):
+    """Instance addresses of ``types`` that ``refs`` made in ``resource``'s module point at."""
+    found = []
+    for address in sorted(index.resolve(resource.module, refs)):
+        found.extend(item for item in index.by_base[address] if item.type in types)
+    return found
+
+
+def _pick(resource, candidates):
+    """The candidate with ``resource``'s count index, else the first one."""
+    for candidate in candidates:
+        if candidate.index == resource.index:
+            return candidate
+    return candidates[0] if candidates else None
+
+
+def _targets(index, ids, resource, attribute, types):
+    """Addresses an attribute points at, by known ID or by configuration reference."""
+    value = resource.values.get(attribute)
+    known = [ids[item] for item in (value if isinstance(value, list) else [value])
+             if isinstance(item, str) and item in ids]
+    if known:
+        return known
+    return [item.address for item in index.resolve_attribute(resource, attribute) if item.type in types]
+
+
+def _item_references(index, resource, attribute, position):
+    expression = index.expressions(resource).get(attribute, {})
+    if isinstance(expression, list):
+        return expression_references(expression[position]) if position < len(expression) else []
+    return expression_references(expression)
+
+
+def _plan_rules(index, ids, resource, attribute):
+    rules = []
+    for position, item in enumerate(resource.values.get(attribute) or []):
+        cidrs = tuple(item.get("cidr_blocks") or ())
+        groups = tuple(ids[group] for group in item.get("security_groups") or () if group in ids)
+        if not (cidrs or groups or item.get("self")):
+            refs = _item_references(index, resource, attribute, position)
+            groups = tuple(group.address for group in _resolve(index, resource, refs, SECURITY_GROUP_TYPES))
+        rules.append(Rule(item.get("protocol", "-1"), item.get("from_port"), item.get("to_port"),
+                          cidrs, groups, bool(item.get("self"))))
+    return rules
+
+
+def _acl_entries(items, number_key, action_key):
+    return [AclEntry(item.get(number_key, 0), item.get(action_key, "deny"), item.get("protocol", "-1"),
+                     item.get("cidr_block") or "0.0.0.0/32",
+                     item.get("icmp_type") if str(item.get("protocol")) in ("icmp", "1") else item.get("from_port"),
+                     item.get("to_port")) for item in items if item.get("cidr_block")]
+
+
+def _route_target(route, resolved_types):
+    gateway = route.get("gateway_id") or ""
+    if gateway == "local":
+        return "local"
+    if gateway.startswith("igw-") or "aws_internet_gateway" in resolved_types:
+        return "igw"
+    if route.get("nat_gateway_id") or "aws_nat_gateway" in resolved_types:
+        return "nat"
+    if route.get("vpc_peering_connection_id") or "aws_vpc_peering_connection" in resolved_types:
+        return "peering"
+    if route.get("transit_gateway_id") or "aws_ec2_transit_gateway" in resolved_types:
+        return "tgw"
+    return "other"
+
+
+def from_plan(plan):
+    """Build a :class:`Network` from a plan document, file path or :class:`PlanIndex`.
+
+    Computed IDs are followed through configuration references, across
+    module inputs and outputs, the same way the compliance checks do.
+    """
+    if isinstance(plan, str):
+        plan = load_plan(plan)
+    index = plan if isinstance(plan, PlanIndex) else PlanIndex(plan)
+    ids = {resource.values["id"]: resource.address for resource in index.resources
+           if isinstance(resource.values.get("id"), str)}
+
+    subnets = [Subnet(resource.address, resource.values["cidr_block"], resource.tags.get("Name"),
+                      next(iter(_targets(index, ids, resource, "vpc_id", ("aws_vpc",))), None))
+               for resource in index.of_type("aws_subnet") if resource.values.get("cidr_block")]
+    vpc_cidrs = [resource.values["cidr_block"] for resource in index.of_type("aws_vpc")
+                 if resource.values.get("cidr_block")]
+    vpc_cidrs += [resource.values["cidr_block"] for resource in index.of_type("aws_vpc_ipv4_cidr_block_association")
+                  if resource.values.get("cidr_block")]
+
+    groups = {}
+    for resource in index.of_type(*SECURITY_GROUP_TYPES):
+        groups[resource.address] = SecurityGroup(resource.address, _plan_rules(index, ids, resource, "ingress"),
+                                                 _plan_rules(index, ids, resource, "egress"),
+                                                 resource.values.get("name") or resource.address)
+    for resource in index.of_type("aws_security_group_rule", "aws_vpc_security_group_ingress_rule",
+                                  "aws_vpc_security_group_egress_rule"):
+        owners = _targets(index, ids, resource, "security_group_id", SECURITY_GROUP_TYPES)
+        if not owners or owners[0] not in groups:
+            continue
+        values = resource.values
+        if resource.type == "aws_security_group_rule":
+            direction = values.get("type")
+            peer_attribute, cidrs = "source_security_group_id", tuple(values.get("cidr_blocks") or ())
+            protocol = values.get("protocol", "-1")
+        else:
+            direction = "ingress" if resource.type.endswith("ingress_rule") else "egress"
+            peer_attribute, cidrs = "referenced_security_group_id", tuple(filter(None, [values.get("cidr_ipv4")]))
+            protocol = values.get("ip_protocol", "-1")
+        peers = () if cidrs or values.get("self") else tuple(
+            _targets(index, ids, resource, peer_attribute, SECURITY_GROUP_TYPES))
+        rule = Rule(protocol, values.get("from_port"), values.get("to_port"), cidrs, peers, bool(values.get("self")))
+        getattr(groups[owners[0]], direction).append(rule)
+
+    acls = {}
+    for resource in index.of_type(*NETWORK_ACL_TYPES):
+        acls[resource.address] = NetworkAcl(
+            resource.address, tuple(_targets(index, ids, resource, "subnet_ids", ("aws_subnet",))),
+            _acl_entries(resource.values.get("ingress") or [], "rule_no", "action"),
+            _acl_entries(resource.values.get("egress") or [], "rule_no", "action"))
+    for resource in index.of_type("aws_network_acl_rule"):
+        owners = _targets(index, ids, resource, "network_acl_id", NETWORK_ACL_TYPES)
+        if owners and owners[0] in acls:
+            direction = "egress" if resource.values.get("egress") else "ingress"
+            getattr(acls[owners[0]], direction).extend(
+                _acl_entries([resource.values], "rule_number", "rule_action"))
+
+    tables = {}
+    for resource in index.of_type("aws_route_table"):
+        routes = []
+        for position, route in enumerate(resource.values.get("route") or []):
+            if not route.get("cidr_block"):
+                continue
+            refs = _item_references(index, resource, "route", position)
+            resolved = {item.type for item in _resolve(index, resource, refs, (
+                "aws_internet_gateway", "aws_nat_gateway", "aws_vpc_peering_connection", "aws_ec2_transit_gateway"))}
+            routes.append(Route(route["cidr_block"], _route_target(route, resolved)))
+        tables[resource.address] = RouteTable(resource.address, (), routes)
+    for resource in index.of_type("aws_route"):
+        owner = _pick(resource, [item for item in index.resolve_attribute(resource, "route_table_id")
+                                 if item.type == "aws_route_table"])
+        if owner is not None and resource.values.get("destination_cidr_block"):
+            resolved = {item.type for attribute in ("gateway_id", "nat_gateway_id", "transit_gateway_id",
+                                                    "vpc_peering_connection_id")
+                        for item in index.resolve_attribute(resource, attribute)}
+            tables[owner.address].routes.append(
+                Route(resource.values["destination_cidr_block"], _route_target(resource.values, resolved)))
+    associations = defaultdict(list)
+    for resource in index.of_type("aws_route_table_association"):
+        table = _pick(resource, [item for item in index.resolve_attribute(resource, "route_table_id")
+                                 if item.type == "aws_route_table"])
+        subnet = _pick(resource, [item for item in index.resolve_attribute(resource, "subnet_id")
+                                  if item.type == "aws_subnet"])
+        if table is not None and subnet is not None:
+            associations[table.address].append(subnet.address)
+    for address, subnet_ids in associations.items():
+        tables[address].subnets = tuple(subnet_ids)
+
+    workloads = []
+
+    def place(resource, subnet_ids, group_ids):
+        if subnet_ids and group_ids:
+            workloads.append(Workload(resource.address, tuple(dict.fromkeys(subnet_ids)),
+                                      tuple(dict.fromkeys(group_ids))))
+
+    for resource in index.of_type("aws_lb", "aws_alb", "aws_elb", "aws_instance"):
+        subnet_attribute = "subnet_id" if resource.type == "aws_instance" else "subnets"
+        group_attribute = "vpc_security_group_ids" if resource.type == "aws_instance" else "security_groups"
+        place(resource, _targets(index, ids, resource, subnet_attribute, ("aws_subnet",)),
+              _targets(index, ids, resource, group_attribute, SECURITY_GROUP_TYPES))
+    for resource in index.of_type("aws_autoscaling_group"):
+        group_ids = []
+        for template in index.resolve_attribute(resource, "launch_template"):
+            if template.type == "aws_launch_template":
+                group_ids += _targets(index, ids, template, "vpc_security_group_ids", SECURITY_GROUP_TYPES)
+            elif template.type == "aws_launch_configuration":
+                group_ids += _targets(index, ids, template, "security_groups", SECURITY_GROUP_TYPES)
+        place(resource, _targets(index, ids, resource, "vpc_zone_identifier", ("aws_subnet",)), group_ids)
+    for resource in index.of_type("aws_db_instance", "aws_rds_cluster"):
+        subnet_ids = []
+        for subnet_group in index.resolve_attribute(resource, "db_subnet_group_name"):
+            subnet_ids += _targets(index, ids, subnet_group, "subnet_ids", ("aws_subnet",))
+        place(resource, subnet_ids, _targets(index, ids, resource, "vpc_security_group_ids", SECURITY_GROUP_TYPES))
+
+    return Network(subnets, groups.values(), acls.values(), tables.values(), workloads, vpc_cidrs)
+
+
+# -- EC2 API (boto3 / moto) -------------------------------------------------
+
+
+def _paginate(client, operation, key, **kwargs):
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        yield from page.get(key, [])
+
+
+def _api_rules(permissions):
+    rules = []
+    for permission in permissions:
+        protocol = permission.get("IpProtocol", "-1")
+        groups = tuple(pair["GroupId"] for pair in permission.get("UserIdGroupPairs", []))
+        cidrs = tuple(item["CidrIp"] for item in permission.get("IpRanges", []))
+        if cidrs or groups:
+            rules.append(Rule(protocol, permission.get("FromPort"), permission.get("ToPort"), cidrs, groups))
+    return rules
+
+
+def _api_target(route):
+    gateway = route.get("GatewayId", "")
+    if gateway == "local":
+        return "local"
+    if gateway.startswith("igw-"):
+        return "igw"
+    if route.get("NatGatewayId"):
+        return "nat"
+    if route.get("VpcPeeringConnectionId"):
+        return "peering"
+    if route.get("TransitGatewayId"):
+        return "tgw"
+    return "other"
+
+
+def from_ec2(client, vpc_id=None):
+    """Build a :class:`Network` from the EC2 API (``describe_*`` on ``client``).
+
+    Network interfaces become workloads grouped by their security groups,
+    so every instance of an Auto Scaling group shares one workload.
+    """
+    filters = {"Filters": [{"Name": "vpc-id", "Values": [vpc_id]}]} if vpc_id else {}
+    vpcs = client.describe_vpcs(**({"VpcIds": [vpc_id]} if vpc_id else {}))["Vpcs"]
+    vpc_cidrs = [association["CidrBlock"] for vpc in vpcs
+                 for association in vpc.get("CidrBlockAssociationSet", [{"CidrBlock": vpc["CidrBlock"]}])]
+    subnets = [Subnet(item["SubnetId"], item["CidrBlock"],
+                      next((tag["Value"] for tag in item.get("Tags", []) if tag["Key"] == "Name"), None),
+                      item["VpcId"])
+               for item in _paginate(client, "describe_subnets", "Subnets", **filters)]
+    groups = [SecurityGroup(item["GroupId"], _api_rules(item.get("IpPermissions", [])),
+                            _api_rules(item.get("IpPermissionsEgress", [])), item.get("GroupName"))
+              for item in _paginate(client, "describe_security_groups", "SecurityGroups", **filters)]
+    acls = []
+    for item in _paginate(client, "describe_network_acls", "NetworkAcls", **filters):
+        entries = {True: [], False: []}
+        for entry in item.get("Entries", []):
+            if "CidrBlock" not in entry:
+                continue
+            ports = entry.get("PortRange", {})
+            icmp = entry.get("IcmpTypeCode", {})
+            first = icmp.get("Type") if entry.get("Protocol") == "1" else ports.get("From")
+            entries[entry["Egress"]].append(AclEntry(entry["RuleNumber"], entry["RuleAction"], entry["Protocol"],
+                                                     entry["CidrBlock"], first, ports.get("To")))
+        acls.append(NetworkAcl(item["NetworkAclId"], tuple(association["SubnetId"] for association in
+                                                           item.get("Associations", [])),
+                               entries[False], entries[True]))
+    tables = []
+    main_tables = {}
+    associated = set()
+    for item in _paginate(client, "describe_route_tables", "RouteTables", **filters):
+        routes = [Route(route["DestinationCidrBlock"], _api_target(route)) for route in item.get("Routes", [])
+                  if "DestinationCidrBlock" in route]
+        subnet_ids = tuple(association["SubnetId"] for association in item.get("Associations", [])
+                           if association.get("SubnetId"))
+        associated.update(subnet_ids)
+        if any(association.get("Main") for association in item.get("Associations", [])):
+            main_tables[item["VpcId"]] = item["RouteTableId"]
+        tables.append(RouteTable(item["RouteTableId"], subnet_ids, routes))
+    vpc_of = {item["SubnetId"]: item["VpcId"] for item in _paginate(client, "describe_subnets", "Subnets", **filters)}
+    for table in tables:
+        # Subnets without an explicit association use their VPC's main route table.
+        implicit = tuple(subnet for subnet, vpc in vpc_of.items()
+                         if subnet not in associated and main_tables.get(vpc) == table.id)
+        table.subnets += implicit
+    placements = defaultdict(list)
+    names = {group.id: group.name or group.id for group in groups}
+    for interface in _paginate(client, "describe_network_interfaces", "NetworkInterfaces", **filters):
+        group_ids = tuple(sorted(group["GroupId"] for group in interface.get("Groups", [])))
+        if group_ids:
+            placements[group_ids].append(interface["SubnetId"])
+    workloads = [Workload("+".join(names.get(group, group) for group in group_ids),
+                          tuple(dict.fromkeys(subnet_ids)), group_ids)
+                 for group_ids, subnet_ids in sorted(placements.items())]
+    return Network(subnets, groups, acls, tables, workloads, vpc_cidrs)
+
+
+@click.group()
+def main():
+    """Security group, network ACL and route table reachability."""
+
+
+@main.command("matrix")
+@click.argument("plan_path", type=click.Path(exists=True))
+@click.option("--by", type=click.Choice(["workload", "subnet"]), default="workload", show_default=True)
+@click.option("--format", "output_format", type=click.Choice(["text", "json"]), default="text", show_default=True)
+def matrix_command(plan_path, by, output_format):
+    """Print every non-empty reachability cell of a plan JSON document."""
+    matrix = from_plan(plan_path).matrix(by)
+    cells = sorted(matrix.reachable(), key=lambda cell: cell[:2])
+    if output_format == "json":
+        click.echo(json.dumps([{"source": source, "destination": destination, "traffic": traffic.ranges()}
+                               for source, destination, traffic in cells], indent=2))
+        return
+    for source, destination, traffic in cells:
+        click.echo(f"{source} -> {destination}: {traffic}")
+
+
+@main.command("can-reach")
+@click.argument("plan_path", type=click.Path(exists=True))
+@click.argument("source")
+@click.argument("destination")
+@click.option("--protocol", default="tcp", show_default=True)
+@click.option("--port", type=int, help="Port (or ICMP type); any port if omitted.")
+def can_reach(plan_path, source, destination, protocol, port):
+    """Exit 0 if SOURCE can reach DESTINATION (workload addresses or 'internet'), else 1."""
+    network = from_plan(plan_path)
+    for endpoint in (source, destination):
+        if endpoint != INTERNET and endpoint not in network.workloads:
+            raise click.BadParameter(f"unknown endpoint {endpoint!r}; one of: {', '.join(network.endpoints())}")
+    traffic = network.traffic(source, destination)
+    click.echo(f"{source} -> {destination}: {traffic}")
+    raise SystemExit(0 if traffic.allows(protocol, port) else 1)
+
+
+if __name__ == "__main__":
+    main()
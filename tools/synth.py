@@ -0,0 +1,1197 @@
+"""Seeded synthetic infrastructure and log corpora at a chosen scale.
+
+The unit and integration fixtures describe one VPC over three AZs with a
+handful of subnets, groups and roles; the checks in this package run
+against many environments and gigabytes of logs.  This module generates
+both from a :class:`Scale` -- environments, AZs, ASGs per environment,
+extra ingress rules per group, IAM policies, megabytes per log corpus,
+audited hosts and a seed:
+
+* plan JSON per environment, modelled on ``terraform/environments`` with
+  :class:`PlanBuilder`, and all of them nested under ``module.<env>`` in
+  one plan so references still resolve through each environment's module
+  inputs and outputs;
+* moto seed data -- VPCs, subnets, security groups, instances and their
+  volumes, IAM roles and users, S3 buckets and VPC flow logs -- that
+  :func:`seed` creates through the API;
+* an IAM authorization details export with each environment's instance
+  role and ``policies`` customer managed policies;
+* a VPC flow log, an ``audit.log`` per host in the format the app user
+  data's audit rules produce, and ``/var/log/secure`` and CloudTrail lines
+  for the monitoring module's metric filters;
+* a local copy of the trail bucket: gzipped CloudTrail delivery files for
+  every region and day, as ``aws_cloudtrail.main`` writes them.
+
+Every generator draws from its own ``random.Random`` seeded with the seed
+and the generator's name, so the same scale always yields byte-identical
+corpora and a change to one generator does not shift the others.
+:func:`write_corpus` writes everything to a directory with a
+``manifest.json`` the benchmark suite and the command line read.
+
+Environments cycle through prod, staging and dev with the settings of the
+real ones; the first three use their real VPC CIDRs and the rest count up
+from ``10.103.0.0/16`` to ``10.255.0.0/16`` and then wrap, so past 156
+environments the VPC blocks overlap, which the CIDR checks then report.
+"""
+
+import gzip
+import json
+import os
+import random
+import time
+from dataclasses import asdict, dataclass, replace
+
+import click
+
+from tools.audit import load_rules
+from tools.inventory import Clients
+
+PROVIDER = "registry.terraform.io/hashicorp/aws"
+ACCOUNT_ID = "123456789012"
+REGION = "us-east-1"
+ZONE_LETTERS = "abcdef"
+MB = 1024 * 1024
+EPOCH = 1729036800  # 2024-10-16T00:00:00Z
+KINDS = ("prod", "staging", "dev")
+# build_environment_plan arguments matching terraform/environments/<kind>.
+PROFILES = {
+    "prod": {"vpc_cidr": "10.100.0.0/16", "ha_nat_gateway": True, "multi_az": True, "backup_retention_period": 30},
+    "staging": {"vpc_cidr": "10.1.0.0/16", "ha_nat_gateway": False, "multi_az": False, "backup_retention_period": 7},
+    "dev": {"vpc_cidr": "10.0.0.0/16", "ha_nat_gateway": False, "multi_az": False, "backup_retention_period": 7,
+            "include_compute": False, "include_database": False, "include_monitoring": False},
+}
+BUCKET_PURPOSES = ("cloudtrail", "config", "logs")
+SERVICES = {
+    "s3": ["GetObject", "PutObject", "DeleteObject", "ListBucket", "GetBucketPolicy", "PutBucketPolicy",
+           "GetObjectAcl", "PutObjectAcl", "GetBucketLocation", "ListAllMyBuckets"],
+    "ec2": ["DescribeInstances", "RunInstances", "TerminateInstances", "DescribeSecurityGroups",
+            "AuthorizeSecurityGroupIngress", "CreateTags", "DescribeVolumes", "AttachVolume"],
+    "kms": ["Decrypt", "Encrypt", "GenerateDataKey", "DescribeKey", "CreateGrant", "ScheduleKeyDeletion"],
+    "logs": ["CreateLogGroup", "CreateLogStream", "PutLogEvents", "DescribeLogGroups", "GetLogEvents"],
+    "iam": ["PassRole", "GetRole", "CreateRole", "AttachRolePolicy", "CreateUser", "ListRoles"],
+    "rds": ["DescribeDBInstances", "CreateDBSnapshot", "DeleteDBInstance", "ModifyDBInstance"],
+    "cloudwatch": ["PutMetricData", "GetMetricData", "PutMetricAlarm", "DescribeAlarms"],
+    "ssm": ["GetParameter", "GetParameters", "PutParameter", "SendCommand", "StartSession"],
+}
+FLOW_HEADER = (b"version account-id interface-id srcaddr dstaddr srcport dstport protocol packets bytes start end "
+               b"action log-status\n")
+EXECVE, OPENAT = 59, 257
+UNSET_AUID = "4294967295"
+AUDIT_SYSCALL = ("node={host} type=SYSCALL msg=audit({stamp}.{ms:03d}:{serial}): arch=c000003e syscall={syscall} "
+                 "success={success} exit=0 a0=55d1c a1=55d2a a2=55d3f a3=0 items={items} ppid={ppid} pid={pid} "
+                 "auid={auid} uid={uid} gid=0 euid={uid} suid={uid} fsuid={uid} egid=0 sgid=0 fsgid=0 tty={tty} "
+                 "ses={ses} comm=\"{comm}\" exe=\"{exe}\" key=\"{key}\"")
+AUDIT_PART = "node={host} type={type} msg=audit({stamp}.{ms:03d}:{serial}): {body}"
+AUDIT_USER = ("node={host} type={type} msg=audit({stamp}.{ms:03d}:{serial}): pid={pid} uid=0 auid={auid} ses={ses} "
+              "msg='op={op} acct=\"{acct}\" exe=\"{exe}\" hostname=? addr={addr} terminal={tty} res={res}'")
+COMMANDS = ["/usr/bin/bash", "/usr/bin/curl", "/usr/bin/node", "/usr/bin/systemctl", "/usr/bin/grep",
+            "/usr/bin/awk", "/usr/bin/sed", "/usr/bin/aws", "/usr/bin/ps", "/usr/bin/date"]
+SECURE = (
+    "sshd[{pid}]: Accepted publickey for ec2-user from {peer} port {port} ssh2",
+    "sshd[{pid}]: Connection closed by {peer} port {port} [preauth]",
+    "sshd[{pid}]: pam_unix(sshd:session): session opened for user ec2-user by (uid=0)",
+    "sshd[{pid}]: Failed password for invalid user admin from 203.0.113.{b} port {port} ssh2",
+    "sudo: ec2-user : TTY=pts/0 ; PWD=/home/ec2-user ; USER=root ; COMMAND=/bin/systemctl status app",
+)
+SECURE_WEIGHTS = (40, 40, 18, 1.5, 0.5)
+TRAIL_EVENTS = (("ec2", "DescribeInstances"), ("s3", "GetObject"), ("sts", "AssumeRole"),
+                ("ec2", "AuthorizeSecurityGroupIngress"))
+# Regions of the multi-region trail's deliveries and their share of the records.
+TRAIL_REGIONS = (("us-east-1", 0.8), ("us-west-2", 0.12), ("eu-west-1", 0.08))
+TRAIL_DAYS = 35
+TRAIL_FILE_RECORDS = 250
+# Approximate bytes of one record once serialised.
+TRAIL_RECORD_BYTES = 1000
+ENDPOINTS = {"cloudwatch": "monitoring"}
+
+
+# -- Plan builder ---------------------------------------------------------------
+
+
+class PlanBuilder:
+    """Builds ``terraform show -json`` style documents."""
+
+    def __init__(self):
+        self.modules = {}
+        self.calls = {}
+
+    def _module(self, module):
+        return self.modules.setdefault(module, {"resources": [], "config": {}})
+
+    def resource(self, module, type_name, name, values, index=None, refs=None, unknown=None,
+                 constants=None, actions=None):
+        """Add a resource instance; ``refs`` maps attributes to reference lists."""
+        relative = f"{type_name}.{name}"
+        suffix = "" if index is None else (f'["{index}"]' if isinstance(index, str) else f"[{index}]")
+        address = f"{module}.{relative}{suffix}" if module else f"{relative}{suffix}"
+        entry = {
+            "address": address,
+            "mode": "managed",
+            "type": type_name,
+            "name": name,
+            "provider_name": PROVIDER,
+            "schema_version": 0,
+            "values": values,
+            "sensitive_values": {},
+        }
+        if index is not None:
+            entry["index"] = index
+        owner = self._module(module)
+        owner["resources"].append((entry, unknown or {}, actions or ["create"]))
+        config = owner["config"].setdefault(relative, {
+            "address": relative, "mode": "managed", "type": type_name, "name": name,
+            "provider_config_key": "aws", "expressions": {}, "schema_version": 0,
+        })
+        for attribute, references in (refs or {}).items():
+            config["expressions"][attribute] = {"references": references}
+        for attribute, value in (constants or {}).items():
+            config["expressions"][attribute] = {"constant_value": value}
+        return address
+
+    def module_call(self, module, inputs=None, outputs=None, constants=None):
+        """Declare a module call with input references and output expressions."""
+        expressions = {key: {"references": refs} for key, refs in (inputs or {}).items()}
+        expressions.update({key: {"constant_value": value} for key, value in (constants or {}).items()})
+        self.calls[module] = {
+            "expressions": expressions,
+            "outputs": {key: {"expression": {"references": refs}} for key, refs in (outputs or {}).items()},
+        }
+        self._module(module)
+
+    def build(self):
+        def child_modules(address):
+            prefix = f"{address}.module." if address else "module."
+            return sorted(m for m in self.modules if m.startswith(prefix) and "." not in m[len(prefix):])
+
+        def planned(address):
+            children = child_modules(address)
+            body = {"resources": [entry for entry, _, _ in self.modules.get(address, {}).get("resources", [])]}
+            if address:
+                body["address"] = address
+            if children:
+                body["child_modules"] = [planned(child) for child in children]
+            return body
+
+        def configuration(address):
+            owner = self.modules.get(address, {"config": {}})
+            body = {"resources": list(owner["config"].values())}
+            prefix = f"{address}.module." if address else "module."
+            calls = {}
+            for child, call in self.calls.items():
+                if child.startswith(prefix) and "." not in child[len(prefix):]:
+                    child_body = configuration(child)
+                    child_body["outputs"] = call["outputs"]
+                    calls[child[len(prefix):]] = {
+                        "source": f"../../modules/{child[len(prefix):]}",
+                        "expressions": call["expressions"],
+                        "module": child_body,
+                    }
+            if calls:
+                body["module_calls"] = calls
+            return body
+
+        changes = []
+        for module, owner in self.modules.items():
+            for entry, unknown, actions in owner["resources"]:
+                change = {
+                    "address": entry["address"],
+                    "mode": "managed",
+                    "type": entry["type"],
+                    "name": entry["name"],
+                    "provider_name": PROVIDER,
+                    "change": {"actions": actions, "before": None, "after": entry["values"],
+                               "after_unknown": unknown},
+                }
+                if module:
+                    change["module_address"] = module
+                if "index" in entry:
+                    change["index"] = entry["index"]
+                changes.append(change)
+        return {
+            "format_version": "1.2",
+            "terraform_version": "1.5.0",
+            "planned_values": {"root_module": planned("")},
+            "resource_changes": changes,
+            "configuration": {"root_module": configuration("")},
+        }
+
+
+def build_environment_plan(environment="prod", azs=("us-east-1a", "us-east-1b", "us-east-1c"),
+                           ha_nat_gateway=True, vpc_cidr="10.100.0.0/16", multi_az=True,
+                           backup_retention_period=30, include_compute=True,
+                           include_database=True, include_monitoring=True, asgs=1, rules=0):
+    """Return a plan document modelled on ``terraform/environments/<environment>``.
+
+    ``asgs`` counts the compute module's Auto Scaling groups, each with its
+    own launch template and target group, and ``rules`` adds that many
+    :func:`partner_rules` to the private security group's ingress.
+    """
+    b = PlanBuilder()
+    tags = {"Environment": environment}
+    tags_all = {"Environment": environment, "Project": "financial-infrastructure", "ManagedBy": "terraform"}
+    if environment == "prod":
+        tags_all["Compliance"] = "PCI-DSS,SOC2"
+
+    def tagged(tag_name, **values):
+        values.setdefault("tags", dict(tags, Name=tag_name))
+        values.setdefault("tags_all", dict(tags_all, Name=tag_name))
+        return values
+
+    net = "module.networking"
+    b.module_call(net, inputs={"vpc_cidr": ["var.vpc_cidr"], "availability_zones": ["var.availability_zones"]},
+                  outputs={"vpc_id": ["aws_vpc.main.id", "aws_vpc.main"],
+                           "vpc_cidr": ["aws_vpc.main.cidr_block", "aws_vpc.main"],
+                           "public_subnet_ids": ["aws_subnet.public"],
+                           "private_subnet_ids": ["aws_subnet.private"],
+                           "restricted_subnet_ids": ["aws_subnet.restricted"],
+                           "nat_gateway_ids": ["aws_nat_gateway.main"]},
+                  constants={"environment": environment, "ha_nat_gateway": ha_nat_gateway})
+    b.resource(net, "aws_vpc", "main", tagged(f"{environment}-vpc", cidr_block=vpc_cidr,
+                                              enable_dns_support=True, enable_dns_hostnames=True),
+               refs={"cidr_block": ["var.vpc_cidr"]}, unknown={"id": True})
+    base = vpc_cidr.split(".")
+    for tier_number, tier in enumerate(("public", "private", "restricted")):
+        for i, az in enumerate(azs):
+            third = tier_number * len(azs) + i
+            values = tagged(f"{environment}-{tier}-subnet-{i + 1}",
+                            cidr_block=f"{base[0]}.{base[1]}.{third}.0/24", availability_zone=az,
+                            map_public_ip_on_launch=tier == "public")
+            values["tags"]["Tier"] = values["tags_all"]["Tier"] = tier
+            b.resource(net, "aws_subnet", tier, values, index=i, refs={"vpc_id": ["aws_vpc.main.id", "aws_vpc.main"]},
+                       unknown={"id": True})
+    b.resource(net, "aws_internet_gateway", "main", tagged(f"{environment}-igw"),
+               refs={"vpc_id": ["aws_vpc.main.id", "aws_vpc.main"]})
+    nat_count = len(azs) if ha_nat_gateway else 1
+    for i in range(nat_count):
+        b.resource(net, "aws_eip", "nat", tagged(f"{environment}-nat-eip-{i + 1}", vpc=True), index=i)
+        b.resource(net, "aws_nat_gateway", "main", tagged(f"{environment}-nat-gw-{i + 1}"), index=i,
+                   refs={"allocation_id": ["aws_eip.nat[count.index].id", "aws_eip.nat", "count.index"],
+                         "subnet_id": ["aws_subnet.public[count.index].id", "aws_subnet.public",
+                                       "count.index"]},
+                   unknown={"subnet_id": True, "allocation_id": True})
+    b.resource(net, "aws_route_table", "public", tagged(f"{environment}-public-route-table",
+                                                       route=[{"cidr_block": "0.0.0.0/0"}]),
+               refs={"route": ["aws_internet_gateway.main.id"]})
+    for i in range(nat_count):
+        b.resource(net, "aws_route_table", "private",
+                   tagged(f"{environment}-private-route-table-{i + 1}", route=[{"cidr_block": "0.0.0.0/0"}]),
+                   index=i, refs={"route": ["aws_nat_gateway.main[count.index].id", "aws_nat_gateway.main",
+                                            "count.index"]})
+    b.resource(net, "aws_route_table", "restricted", tagged(f"{environment}-restricted-route-table", route=[]))
+    for tier in ("public", "private", "restricted"):
+        for i in range(len(azs)):
+            b.resource(net, "aws_route_table_association", tier, {}, index=i,
+                       refs={"subnet_id": [f"aws_subnet.{tier}[count.index].id", f"aws_subnet.{tier}",
+                                           "count.index"],
+                             "route_table_id": [f"aws_route_table.{tier}"]})
+
+    sec = "module.security"
+    b.module_call(sec, inputs={"vpc_id": ["module.networking.vpc_id", "module.networking"],
+                               "vpc_cidr": ["module.networking.vpc_cidr", "module.networking"]},
+                  outputs={"public_security_group_id": ["aws_security_group.public.id", "aws_security_group.public"],
+                           "private_security_group_id": ["aws_security_group.private.id",
+                                                         "aws_security_group.private"],
+                           "restricted_security_group_id": ["aws_security_group.restricted.id",
+                                                            "aws_security_group.restricted"]},
+                  constants={"environment": environment})
+    everything = {"from_port": 0, "to_port": 0, "protocol": "-1", "cidr_blocks": ["0.0.0.0/0"],
+                  "description": "Allow all outbound traffic", "security_groups": [], "self": False}
+    b.resource(sec, "aws_default_security_group", "default", tagged(
+        f"{environment}-default-sg", ingress=[{"from_port": 0, "to_port": 0, "protocol": "-1", "self": True,
+                                               "cidr_blocks": [], "security_groups": [], "description": ""}],
+        egress=[]), refs={"vpc_id": ["var.vpc_id"]})
+    b.resource(sec, "aws_security_group", "public", tagged(
+        f"{environment}-public-sg", name=f"{environment}-public-sg",
+        ingress=[dict(everything, from_port=80, to_port=80, protocol="tcp", description="Allow HTTP traffic"),
+                 dict(everything, from_port=443, to_port=443, protocol="tcp", description="Allow HTTPS traffic")],
+        egress=[everything]), refs={"vpc_id": ["var.vpc_id"]}, unknown={"id": True})
+    b.resource(sec, "aws_security_group", "private", tagged(
+        f"{environment}-private-sg", name=f"{environment}-private-sg",
+        ingress=[dict(everything, cidr_blocks=[vpc_cidr], description="Allow all traffic from within the VPC")] + [
+            dict(everything, from_port=port, to_port=port, protocol="tcp", cidr_blocks=[network],
+                 description=f"Allow partner traffic on {port}") for port, network in partner_rules(rules)],
+        egress=[everything]), refs={"vpc_id": ["var.vpc_id"]}, unknown={"id": True})
+    b.resource(sec, "aws_security_group", "restricted", tagged(
+        f"{environment}-restricted-sg", name=f"{environment}-restricted-sg",
+        ingress=[{"from_port": 5432, "to_port": 5432, "protocol": "tcp", "cidr_blocks": [], "self": False,
+                  "security_groups": [], "description": "Allow PostgreSQL traffic from private security group"}],
+        egress=[everything]), refs={"vpc_id": ["var.vpc_id"],
+                                    "ingress": ["aws_security_group.private.id", "aws_security_group.private"]},
+        unknown={"id": True, "ingress": [{"security_groups": [True]}]})
+
+    if include_compute:
+        comp = "module.compute"
+        b.module_call(comp, inputs={"vpc_id": ["module.networking.vpc_id", "module.networking"],
+                                    "private_subnet_ids": ["module.networking.private_subnet_ids",
+                                                           "module.networking"],
+                                    "public_subnet_ids": ["module.networking.public_subnet_ids",
+                                                          "module.networking"],
+                                    "db_security_group_id": ["module.security.restricted_security_group_id",
+                                                             "module.security"]},
+                      outputs={"asg_name": ["aws_autoscaling_group.app_asg.name", "aws_autoscaling_group.app_asg"],
+                               "lb_arn": ["aws_lb.app_lb.arn", "aws_lb.app_lb"],
+                               "app_security_group_id": ["aws_security_group.app_security_group.id",
+                                                         "aws_security_group.app_security_group"]},
+                      constants={"environment": environment, "min_size": 2, "max_size": 10,
+                                 "instance_type": "t3.large"})
+        b.resource(comp, "aws_security_group", "app_security_group", tagged(
+            f"{environment}-app-sg", name=f"{environment}-app-sg",
+            ingress=[{"from_port": 8080, "to_port": 8080, "protocol": "tcp", "cidr_blocks": [], "self": False,
+                      "security_groups": [], "description": "Allow traffic from load balancer"}],
+            egress=[{"from_port": 5432, "to_port": 5432, "protocol": "tcp", "cidr_blocks": [], "self": False,
+                     "security_groups": [], "description": "Allow traffic to database"},
+                    dict(everything, description="Allow outbound internet access for package updates, etc.")]),
+            refs={"vpc_id": ["var.vpc_id"], "egress": ["var.db_security_group_id"],
+                  "ingress": ["var.lb_security_group_id"]}, unknown={"id": True})
+        b.resource(comp, "aws_security_group", "lb_security_group", tagged(
+            f"{environment}-lb-sg", name=f"{environment}-lb-sg",
+            ingress=[dict(everything, from_port=443, to_port=443, protocol="tcp",
+                          description="Allow HTTPS traffic from internet")],
+            egress=[{"from_port": 8080, "to_port": 8080, "protocol": "tcp", "cidr_blocks": [], "self": False,
+                     "security_groups": [], "description": "Allow traffic to application instances"}]),
+            refs={"vpc_id": ["var.vpc_id"], "egress": ["aws_security_group.app_security_group.id",
+                                                      "aws_security_group.app_security_group"]},
+            unknown={"id": True})
+        assume = json.dumps({"Version": "2012-10-17", "Statement": [
+            {"Action": "sts:AssumeRole", "Effect": "Allow", "Principal": {"Service": "ec2.amazonaws.com"}}]})
+        b.resource(comp, "aws_iam_role", "ec2_role", tagged(f"{environment}-ec2-role", name=f"{environment}-ec2-role",
+                                                           assume_role_policy=assume))
+        b.resource(comp, "aws_iam_instance_profile", "ec2_profile", {"name": f"{environment}-ec2-profile"},
+                   refs={"role": ["aws_iam_role.ec2_role.name", "aws_iam_role.ec2_role"]})
+        for name, arn in (("ssm_policy", "AmazonSSMManagedInstanceCore"), ("s3_read_policy", "AmazonS3ReadOnlyAccess"),
+                          ("cloudwatch_policy", "CloudWatchAgentServerPolicy")):
+            b.resource(comp, "aws_iam_role_policy_attachment", name,
+                       {"role": f"{environment}-ec2-role", "policy_arn": f"arn:aws:iam::aws:policy/{arn}"},
+                       refs={"role": ["aws_iam_role.ec2_role.name", "aws_iam_role.ec2_role"]})
+        b.resource(comp, "aws_kms_key", "ebs_encryption_key", tagged(
+            f"{environment}-ebs-encryption-key", deletion_window_in_days=30, enable_key_rotation=True,
+            policy=json.dumps({"Version": "2012-10-17", "Statement": [
+                {"Sid": "Enable IAM User Permissions", "Effect": "Allow",
+                 "Principal": {"AWS": "arn:aws:iam::123456789012:root"}, "Action": "kms:*", "Resource": "*"}]})),
+            unknown={"arn": True})
+        def app_group(suffix, label):
+            b.resource(comp, "aws_launch_template", f"app_launch_template{suffix}", tagged(
+                f"{environment}-{label}-launch-template", name=f"{environment}-{label}-launch-template",
+                image_id="ami-0c02fb55956c7d316", instance_type="t3.large",
+                iam_instance_profile=[{"name": f"{environment}-ec2-profile"}],
+                block_device_mappings=[{"device_name": "/dev/xvda", "ebs": [
+                    {"volume_size": 20, "volume_type": "gp3", "delete_on_termination": "true", "encrypted": "true"}]}],
+                metadata_options=[{"http_endpoint": "enabled", "http_tokens": "required"}]),
+                refs={"vpc_security_group_ids": ["aws_security_group.app_security_group.id"],
+                      "iam_instance_profile": ["aws_iam_instance_profile.ec2_profile.name"]})
+            b.resource(comp, "aws_autoscaling_group", f"app_asg{suffix}", {
+                "name": f"{environment}-{label}-asg", "min_size": 2, "max_size": 10, "desired_capacity": 3,
+                "health_check_type": "ELB", "health_check_grace_period": 300,
+                "tag": [{"key": "Environment", "value": environment, "propagate_at_launch": True}],
+                "tags_all": dict(tags_all)},
+                refs={"vpc_zone_identifier": ["var.private_subnet_ids"],
+                      "launch_template": [f"aws_launch_template.app_launch_template{suffix}.id"],
+                      "target_group_arns": [f"aws_lb_target_group.app_tg{suffix}.arn",
+                                            f"aws_lb_target_group.app_tg{suffix}"]},
+                unknown={"vpc_zone_identifier": True})
+
+        def target_group(suffix, label):
+            b.resource(comp, "aws_lb_target_group", f"app_tg{suffix}", tagged(
+                f"{environment}-{label}-tg", name=f"{environment}-{label}-tg", port=8080, protocol="HTTP"),
+                refs={"vpc_id": ["var.vpc_id"]})
+
+        app_group("", "app")
+        b.resource(comp, "aws_lb", "app_lb", tagged(
+            f"{environment}-app-lb", name=f"{environment}-app-lb", internal=False,
+            load_balancer_type="application", enable_deletion_protection=True, drop_invalid_header_fields=True),
+            refs={"subnets": ["var.public_subnet_ids"],
+                  "security_groups": ["aws_security_group.lb_security_group.id"]}, unknown={"arn": True})
+        target_group("", "app")
+        b.resource(comp, "aws_lb_listener", "https", {
+            "port": 443, "protocol": "HTTPS", "ssl_policy": "ELBSecurityPolicy-TLS-1-2-2017-01",
+            "default_action": [{"type": "forward", "redirect": []}]},
+            refs={"load_balancer_arn": ["aws_lb.app_lb.arn", "aws_lb.app_lb"]})
+        b.resource(comp, "aws_lb_listener", "http_redirect", {
+            "port": 80, "protocol": "HTTP",
+            "default_action": [{"type": "redirect", "redirect": [
+                {"port": "443", "protocol": "HTTPS", "status_code": "HTTP_301"}]}]},
+            refs={"load_balancer_arn": ["aws_lb.app_lb.arn", "aws_lb.app_lb"]})
+        for name, adjustment in (("scale_up", 1), ("scale_down", -1)):
+            b.resource(comp, "aws_autoscaling_policy", name, {
+                "name": f"{environment}-app-{name.replace('_', '-')}", "scaling_adjustment": adjustment,
+                "adjustment_type": "ChangeInCapacity", "cooldown": 300},
+                refs={"autoscaling_group_name": ["aws_autoscaling_group.app_asg.name",
+                                                 "aws_autoscaling_group.app_asg"]})
+        for name, operator, threshold, policy in (
+                ("high_cpu", "GreaterThanOrEqualToThreshold", "70", "scale_up"),
+                ("low_cpu", "LessThanOrEqualToThreshold", "30", "scale_down")):
+            b.resource(comp, "aws_cloudwatch_metric_alarm", name, {
+                "alarm_name": f"{environment}-app-{name.replace('_', '-')}", "comparison_operator": operator,
+                "evaluation_periods": 2, "metric_name": "CPUUtilization", "namespace": "AWS/EC2", "period": 300,
+                "statistic": "Average", "threshold": float(threshold),
+                "dimensions": {"AutoScalingGroupName": f"{environment}-app-asg"}},
+                refs={"alarm_actions": [f"aws_autoscaling_policy.{policy}.arn", f"aws_autoscaling_policy.{policy}"]},
+                unknown={"alarm_actions": True})
+        for number in range(1, asgs):
+            app_group(f"_{number}", f"app-{number}")
+            target_group(f"_{number}", f"app-{number}")
+
+    if include_database:
+        db = "module.database"
+        b.module_call(db, inputs={"vpc_id": ["module.networking.vpc_id", "module.networking"],
+                                  "db_subnet_ids": ["module.networking.private_subnet_ids", "module.networking"],
+                                  "app_security_group_id": ["module.security.private_security_group_id",
+                                                            "module.security"]},
+                      outputs={"db_instance_id": ["aws_db_instance.main.id", "aws_db_instance.main"]},
+                      constants={"environment": environment, "db_name": f"{environment}db",
+                                 "db_password": "changeme123!", "multi_az": multi_az,
+                                 "db_instance_class": "db.r5.xlarge"})
+        b.resource(db, "aws_security_group", "db_security_group", tagged(
+            f"{environment}-db-sg", name=f"{environment}-db-sg",
+            ingress=[{"from_port": 5432, "to_port": 5432, "protocol": "tcp", "cidr_blocks": [], "self": False,
+                      "security_groups": [], "description": "Allow database connection from application tier"}],
+            egress=[dict(everything, description="Allow outbound connections (for updates)")]),
+            refs={"vpc_id": ["var.vpc_id"], "ingress": ["var.app_security_group_id"]}, unknown={"id": True})
+        b.resource(db, "aws_db_subnet_group", "db_subnet_group", tagged(
+            f"{environment}-db-subnet-group", name=f"{environment}-db-subnet-group"),
+            refs={"subnet_ids": ["var.db_subnet_ids"]}, unknown={"subnet_ids": True})
+        b.resource(db, "aws_kms_key", "db_encryption_key", tagged(
+            f"{environment}-db-encryption-key", deletion_window_in_days=30, enable_key_rotation=True, policy=None),
+            unknown={"arn": True, "policy": True})
+        b.resource(db, "aws_db_instance", "main", tagged(
+            f"{environment}-{environment}db", identifier=f"{environment}-{environment}db", engine="postgres",
+            instance_class="db.r5.xlarge", allocated_storage=100, storage_type="gp3", storage_encrypted=True,
+            multi_az=multi_az, backup_retention_period=backup_retention_period, deletion_protection=True,
+            publicly_accessible=False, performance_insights_enabled=True,
+            performance_insights_retention_period=7, enabled_cloudwatch_logs_exports=[]),
+            refs={"kms_key_id": ["aws_kms_key.db_encryption_key.arn", "aws_kms_key.db_encryption_key"],
+                  "vpc_security_group_ids": ["aws_security_group.db_security_group.id",
+                                             "aws_security_group.db_security_group"],
+                  "db_subnet_group_name": ["aws_db_subnet_group.db_subnet_group.name",
+                                           "aws_db_subnet_group.db_subnet_group"]},
+            unknown={"kms_key_id": True})
+
+    if include_monitoring:
+        mon = "module.monitoring"
+        b.module_call(mon, inputs={"vpc_id": ["module.networking.vpc_id", "module.networking"]},
+                      constants={"environment": environment, "asg_name": f"{environment}-app-asg",
+                                 "db_instance_id": f"{environment}-rds-instance",
+                                 "lb_arn_suffix": f"app/{environment}-alb/1234567890abcdef"})
+        b.resource(mon, "aws_sns_topic", "alerts", tagged(f"{environment}-alerts", name=f"{environment}-alerts"))
+        b.resource(mon, "aws_kms_key", "cloudtrail_kms_key", tagged(
+            f"{environment}-cloudtrail-kms-key", deletion_window_in_days=30, enable_key_rotation=True,
+            policy=json.dumps({"Version": "2012-10-17", "Statement": [
+                {"Sid": "Allow CloudTrail to encrypt logs", "Effect": "Allow",
+                 "Principal": {"Service": "cloudtrail.amazonaws.com"},
+                 "Action": ["kms:GenerateDataKey*", "kms:DescribeKey"], "Resource": "*"}]})),
+            unknown={"arn": True})
+        b.resource(mon, "aws_cloudtrail", "main", tagged(
+            f"{environment}-cloudtrail", name=f"{environment}-cloudtrail",
+            s3_bucket_name=f"{environment}-cloudtrail-123456789012", include_global_service_events=True,
+            is_multi_region_trail=True, enable_log_file_validation=True,
+            event_selector=[{"read_write_type": "All", "include_management_events": True,
+                             "data_resource": [{"type": "AWS::S3::Object",
+                                                "values": [f"arn:aws:s3:::{environment}-cloudtrail-123456789012/"]}]}]),
+            refs={"kms_key_id": ["aws_kms_key.cloudtrail_kms_key.arn", "aws_kms_key.cloudtrail_kms_key"],
+                  "s3_bucket_name": ["var.cloudtrail_bucket"]},
+            unknown={"kms_key_id": True})
+        config_assume = json.dumps({"Version": "2012-10-17", "Statement": [
+            {"Action": "sts:AssumeRole", "Effect": "Allow", "Principal": {"Service": "config.amazonaws.com"}}]})
+        b.resource(mon, "aws_iam_role", "config_role", tagged(
+            f"{environment}-config-role", name=f"{environment}-config-role", assume_role_policy=config_assume))
+        b.resource(mon, "aws_iam_role_policy_attachment", "config_policy", {
+            "policy_arn": "arn:aws:iam::aws:policy/service-role/AWS_ConfigRole"},
+            refs={"role": ["aws_iam_role.config_role.name", "aws_iam_role.config_role"]})
+        b.resource(mon, "aws_config_configuration_recorder", "main", {
+            "name": f"{environment}-config-recorder",
+            "recording_group": [{"all_supported": True, "include_global_resource_types": True}]},
+            refs={"role_arn": ["aws_iam_role.config_role.arn", "aws_iam_role.config_role"]})
+        b.resource(mon, "aws_config_delivery_channel", "main", {
+            "name": f"{environment}-config-delivery-channel", "s3_bucket_name": f"{environment}-config-123456789012"},
+            refs={"sns_topic_arn": ["aws_sns_topic.alerts.arn", "aws_sns_topic.alerts"]},
+            unknown={"sns_topic_arn": True})
+        b.resource(mon, "aws_config_configuration_recorder_status", "main", {"is_enabled": True},
+                   refs={"name": ["aws_config_configuration_recorder.main.name"]})
+        b.resource(mon, "aws_securityhub_account", "main", {})
+        for name, standard in (("cis", "cis-aws-foundations-benchmark/v/1.2.0"), ("pci", "pci-dss/v/3.2.1")):
+            b.resource(mon, "aws_securityhub_standards_subscription", name, {
+                "standards_arn": f"arn:aws:securityhub:us-east-1::standards/{standard}"})
+        b.resource(mon, "aws_guardduty_detector", "main", tagged(
+            f"{environment}-guardduty", enable=True, finding_publishing_frequency="FIFTEEN_MINUTES"))
+        b.resource(mon, "aws_kms_key", "logs_kms_key", tagged(
+            f"{environment}-logs-kms-key", deletion_window_in_days=30, enable_key_rotation=True,
+            policy=json.dumps({"Version": "2012-10-17", "Statement": []})), unknown={"arn": True})
+        for name, path, retention in (("application", "application", 30), ("secure", "var/log/secure", 90),
+                                      ("audit", "var/log/audit", 90)):
+            b.resource(mon, "aws_cloudwatch_log_group", name, tagged(
+                f"{environment}-{name}-logs", name=f"/{environment}/{path}", retention_in_days=retention),
+                refs={"kms_key_id": ["aws_kms_key.logs_kms_key.arn", "aws_kms_key.logs_kms_key"]},
+                unknown={"kms_key_id": True})
+        for name, pattern, metric in (
+                ("failed_logins", "Failed password for * from * port * ssh2", "FailedLoginAttempts"),
+                ("sudo_commands", "sudo: * : TTY=* ; PWD=* ; USER=root ; COMMAND=*", "SudoCommands")):
+            b.resource(mon, "aws_cloudwatch_log_metric_filter", name, {
+                "name": f"{environment}-{name.replace('_', '-')}", "pattern": pattern,
+                "log_group_name": f"/{environment}/var/log/secure",
+                "metric_transformation": [{"name": metric, "namespace": f"{environment}/Security", "value": "1"}]})
+        for name, alarm_name, metric, threshold in (
+                ("rds_cpu", "rds-high-cpu", "CPUUtilization", 80),
+                ("failed_logins", "excessive-failed-logins", "FailedLoginAttempts", 5)):
+            namespace = "AWS/RDS" if name == "rds_cpu" else f"{environment}/Security"
+            b.resource(mon, "aws_cloudwatch_metric_alarm", name, tagged(
+                f"{environment}-{alarm_name}", alarm_name=f"{environment}-{alarm_name}",
+                comparison_operator="GreaterThanThreshold", evaluation_periods=1 if name != "rds_cpu" else 3,
+                metric_name=metric, namespace=namespace, period=300,
+                statistic="Sum" if name != "rds_cpu" else "Average", threshold=threshold),
+                refs={"alarm_actions": ["aws_sns_topic.alerts.arn", "aws_sns_topic.alerts"]},
+                unknown={"alarm_actions": True})
+
+    return b.build()
+
+
+# -- Scale ----------------------------------------------------------------------
+
+
+class SynthError(ValueError):
+    """Raised for a scale the generators cannot honour."""
+
+
+@dataclass(frozen=True)
+class Scale:
+    """Size of a synthetic corpus; :meth:`times` multiplies its counts."""
+
+    environments: int = 3
+    azs: int = 3
+    asgs: int = 1
+    rules: int = 0
+    policies: int = 100
+    log_mb: float = 1.0
+    hosts: int = 4
+    seed: int = 7
+
+    def __post_init__(self):
+        if not 1 <= self.azs <= len(ZONE_LETTERS):
+            raise SynthError(f"azs must be between 1 and {len(ZONE_LETTERS)}, {REGION} has no more")
+        if self.environments < 1 or self.asgs < 1 or self.hosts < 1:
+            raise SynthError("environments, asgs and hosts must be at least 1")
+
+    def times(self, factor):
+        """This scale with ``factor`` times the environments, policies, log volume and hosts."""
+        return replace(self, environments=self.environments * factor, policies=self.policies * factor,
+                       log_mb=self.log_mb * factor, hosts=self.hosts * factor)
+
+    @property
+    def zones(self):
+        return tuple(f"{REGION}{letter}" for letter in ZONE_LETTERS[:self.azs])
+
+
+def _rng(scale, name):
+    return random.Random(f"{scale.seed}:{name}")
+
+
+def partner_rules(count):
+    """``(port, cidr)`` of ``count`` extra ingress rules from partner networks."""
+    return [(1024 + number, f"172.{16 + number // 256 % 16}.{number % 256}.0/24") for number in range(count)]
+
+
+def environments(scale):
+    """``[(name, build_environment_plan keyword arguments)]`` for ``scale``."""
+    found = []
+    for number in range(scale.environments):
+        kind = KINDS[number % len(KINDS)]
+        settings = dict(PROFILES[kind], azs=scale.zones, asgs=scale.asgs, rules=scale.rules)
+        if number >= len(KINDS):
+            settings["vpc_cidr"] = f"10.{(100 + number) % 256}.0.0/16"
+        found.append((kind if number < len(KINDS) else f"{kind}{number // len(KINDS)}", settings))
+    return found
+
+
+# -- Plans ----------------------------------------------------------------------
+
+
+def plans(scale):
+    """Yield ``(environment, plan)`` for every environment of ``scale``."""
+    for name, settings in environments(scale):
+        yield name, build_environment_plan(name, **settings)
+
+
+def nest(named_plans):
+    """One plan holding each ``(name, plan)`` as ``module.<name>``."""
+    children, calls, changes = [], {}, []
+    for name, plan in named_plans:
+        prefix = f"module.{name}"
+        text = json.dumps({"planned": plan["planned_values"]["root_module"], "changes": plan["resource_changes"]})
+        renamed = json.loads(text.replace('"module.', f'"{prefix}.module.'))
+        children.append(dict(renamed["planned"], address=prefix))
+        changes.extend(renamed["changes"])
+        calls[name] = {"source": f"../{name}", "expressions": {}, "module": plan["configuration"]["root_module"]}
+    return {"format_version": "1.2", "terraform_version": "1.5.0",
+            "planned_values": {"root_module": {"resources": [], "child_modules": children}},
+            "resource_changes": changes, "configuration": {"root_module": {"resources": [], "module_calls": calls}}}
+
+
+# -- IAM ------------------------------------------------------------------------
+
+
+def instance_role_policy(environment):
+    """Inline policy of an environment's instance role: its log bucket, log groups and KMS."""
+    bucket = f"arn:aws:s3:::{environment}-logs-{ACCOUNT_ID}"
+    return {"Version": "2012-10-17", "Statement": [
+        {"Effect": "Allow", "Action": ["s3:GetObject", "s3:ListBucket"], "Resource": [bucket, f"{bucket}/*"]},
+        {"Effect": "Allow", "Action": ["logs:CreateLogStream", "logs:PutLogEvents"],
+         "Resource": f"arn:aws:logs:{REGION}:{ACCOUNT_ID}:log-group:/{environment}/*"},
+        {"Effect": "Allow", "Action": ["kms:Decrypt", "kms:GenerateDataKey"], "Resource": "*"}]}
+
+
+def random_policy(rng, buckets):
+    """A customer managed policy: mostly scoped grants, some service and global wildcards."""
+    statements = []
+    for _ in range(rng.randint(1, 4)):
+        service = rng.choice(list(SERVICES))
+        roll = rng.random()
+        if roll < 0.6:
+            actions = [f"{service}:{name}" for name in rng.sample(SERVICES[service], rng.randint(1, 4))]
+        elif roll < 0.85:
+            actions = [f"{service}:{rng.choice(('Get', 'Describe', 'List', 'Put'))}*"]
+        elif roll < 0.97:
+            actions = [f"{service}:*"]
+        else:
+            actions = ["*"]
+        if service == "s3" and rng.random() < 0.8:
+            bucket = rng.choice(buckets)
+            resources = [f"arn:aws:s3:::{bucket}", f"arn:aws:s3:::{bucket}/*"]
+        else:
+            resources = "*"
+        statement = {"Effect": "Deny" if rng.random() < 0.05 else "Allow", "Action": actions, "Resource": resources}
+        if rng.random() < 0.1:
+            statement["Condition"] = {"Bool": {"aws:SecureTransport": "true"}}
+        statements.append(statement)
+    return {"Version": "2012-10-17", "Statement": statements}
+
+
+def authorization_details(scale):
+    """``get-account-authorization-details`` output: instance roles and ``scale.policies`` managed policies."""
+    rng = _rng(scale, "iam")
+    names = [name for name, _ in environments(scale)]
+    buckets = [f"{name}-{purpose}-{ACCOUNT_ID}" for name in names for purpose in BUCKET_PURPOSES]
+    roles = [{"RoleName": f"{name}-ec2-role", "Arn": f"arn:aws:iam::{ACCOUNT_ID}:role/{name}-ec2-role",
+              "RolePolicyList": [{"PolicyName": "app", "PolicyDocument": instance_role_policy(name)}]}
+             for name in names]
+    policies = []
+    for number in range(scale.policies):
+        # Real accounts carry the same documents under many names.
+        if number and rng.random() < 0.15:
+            document = policies[rng.randrange(number)]["PolicyVersionList"][0]["Document"]
+        else:
+            document = random_policy(rng, buckets)
+        policies.append({"PolicyName": f"synthetic-{number}", "DefaultVersionId": "v1",
+                         "Arn": f"arn:aws:iam::{ACCOUNT_ID}:policy/synthetic-{number}",
+                         "PolicyVersionList": [{"VersionId": "v1", "IsDefaultVersion": True, "Document": document}]})
+    return {"RoleDetailList": roles, "Policies": policies, "UserDetailList": [], "GroupDetailList": []}
+
+
+# -- moto -----------------------------------------------------------------------
+
+
+def _assume(service):
+    return {"Version": "2012-10-17", "Statement": [
+        {"Action": "sts:AssumeRole", "Effect": "Allow", "Principal": {"Service": f"{service}.amazonaws.com"}}]}
+
+
+def _ssl_only(bucket):
+    return {"Version": "2012-10-17", "Statement": [
+        {"Effect": "Deny", "Principal": "*", "Action": "s3:*",
+         "Resource": [f"arn:aws:s3:::{bucket}", f"arn:aws:s3:::{bucket}/*"],
+         "Condition": {"Bool": {"aws:SecureTransport": "false"}}}]}
+
+
+def seed_data(scale):
+    """Resources :func:`seed` creates for ``scale``, as JSON-serialisable data.
+
+    Each environment gets its VPC with the module's subnet layout, the
+    security module's groups (and the compute module's where it has one),
+    an instance with a data volume per ASG, its instance and Config roles,
+    a deploy user and two console operators, and its CloudTrail, Config
+    and log buckets.  A few volumes are unencrypted, buckets lack the
+    SSL-only policy or public access block, operators lack MFA and
+    non-production VPCs lack flow logs, so the Config rules have findings.
+    """
+    rng = _rng(scale, "moto")
+    data = {"region": REGION, "vpcs": [], "roles": [], "users": [], "buckets": []}
+    for name, settings in environments(scale):
+        cidr, kind = settings["vpc_cidr"], name.rstrip("0123456789")
+        base = cidr.split(".")
+        subnets = [{"tier": tier, "cidr": f"{base[0]}.{base[1]}.{number * scale.azs + position}.0/24", "az": zone}
+                   for number, tier in enumerate(("public", "private", "restricted"))
+                   for position, zone in enumerate(scale.zones)]
+        groups = [{"name": f"{name}-public-sg",
+                   "ingress": [["tcp", 80, 80, "0.0.0.0/0"], ["tcp", 443, 443, "0.0.0.0/0"]]},
+                  {"name": f"{name}-private-sg", "ingress": [["-1", None, None, cidr]] + [
+                      ["tcp", port, port, network] for port, network in partner_rules(scale.rules)]},
+                  {"name": f"{name}-restricted-sg", "ingress": [["tcp", 5432, 5432, cidr]]}]
+        instances = []
+        if settings.get("include_compute", True):
+            groups += [{"name": f"{name}-app-sg", "ingress": [["tcp", 8080, 8080, cidr]]},
+                       {"name": f"{name}-lb-sg", "ingress": [["tcp", 443, 443, "0.0.0.0/0"]]}]
+            instances = [{"subnet": scale.azs + number % scale.azs,
+                          "volumes": [{"size": 20, "encrypted": rng.random() >= 0.1}]} for number in range(scale.asgs)]
+        data["vpcs"].append({"environment": name, "cidr": cidr, "subnets": subnets, "security_groups": groups,
+                             "instances": instances, "flow_logs": kind == "prod" or rng.random() < 0.5})
+        data["roles"] += [{"name": f"{name}-ec2-role", "service": "ec2",
+                           "policies": {"app": instance_role_policy(name)}},
+                          {"name": f"{name}-config-role", "service": "config", "policies": {}}]
+        data["users"] += [{"name": f"{name}-deploy", "console": False, "mfa": False}] + [
+            {"name": f"{name}-operator-{number}", "console": True, "mfa": rng.random() >= 0.2} for number in range(2)]
+        data["buckets"] += [{"name": f"{name}-{purpose}-{ACCOUNT_ID}", "ssl_only": rng.random() >= 0.1,
+                             "block_public": rng.random() >= 0.05} for purpose in BUCKET_PURPOSES]
+    return data
+
+
+def _tags(resource_type, environment, name):
+    return [{"ResourceType": resource_type, "Tags": [{"Key": "Environment", "Value": environment},
+                                                    {"Key": "Name", "Value": name}]}]
+
+
+def _permission(protocol, from_port, to_port, cidr):
+    permission = {"IpProtocol": protocol, "IpRanges": [{"CidrIp": cidr}]}
+    if from_port is not None:
+        permission.update(FromPort=from_port, ToPort=to_port)
+    return permission
+
+
+def seed(clients, data):
+    """Create ``data`` from :func:`seed_data` on a moto server through :class:`~tools.inventory.Clients`.
+
+    Returns the number of resources created by kind.
+    """
+    ec2, s3, iam = (clients.client(service, data["region"]) for service in ("ec2", "s3", "iam"))
+    counts = dict.fromkeys(("buckets", "roles", "users", "vpcs", "subnets", "security_groups", "instances",
+                            "volumes"), 0)
+    for bucket in data["buckets"]:
+        s3.create_bucket(Bucket=bucket["name"])
+        if bucket["ssl_only"]:
+            s3.put_bucket_policy(Bucket=bucket["name"], Policy=json.dumps(_ssl_only(bucket["name"])))
+        if bucket["block_public"]:
+            s3.put_public_access_block(Bucket=bucket["name"], PublicAccessBlockConfiguration={
+                "BlockPublicAcls": True, "IgnorePublicAcls": True, "BlockPublicPolicy": True,
+                "RestrictPublicBuckets": True})
+        counts["buckets"] += 1
+    for role in data["roles"]:
+        iam.create_role(RoleName=role["name"], AssumeRolePolicyDocument=json.dumps(_assume(role["service"])))
+        for policy_name, document in role["policies"].items():
+            iam.put_role_policy(RoleName=role["name"], PolicyName=policy_name, PolicyDocument=json.dumps(document))
+        counts["roles"] += 1
+    for user in data["users"]:
+        iam.create_user(UserName=user["name"])
+        if user["console"]:
+            iam.create_login_profile(UserName=user["name"], Password="Synthetic-Passw0rd!")
+        if user["mfa"]:
+            device = iam.create_virtual_mfa_device(VirtualMFADeviceName=user["name"])["VirtualMFADevice"]
+            iam.enable_mfa_device(UserName=user["name"], SerialNumber=device["SerialNumber"],
+                                  AuthenticationCode1="123456", AuthenticationCode2="654321")
+        counts["users"] += 1
+    # moto only launches the images it ships with.
+    launches = any(vpc["instances"] for vpc in data["vpcs"])
+    images = ec2.describe_images(Owners=["amazon"])["Images"] if launches else []
+    for vpc in data["vpcs"]:
+        environment = vpc["environment"]
+        vpc_id = ec2.create_vpc(CidrBlock=vpc["cidr"],
+                                TagSpecifications=_tags("vpc", environment, f"{environment}-vpc"))["Vpc"]["VpcId"]
+        subnet_ids = [ec2.create_subnet(VpcId=vpc_id, CidrBlock=subnet["cidr"], AvailabilityZone=subnet["az"],
+                                        TagSpecifications=_tags("subnet", environment,
+                                                                f"{environment}-{subnet['tier']}-subnet"))[
+            "Subnet"]["SubnetId"] for subnet in vpc["subnets"]]
+        for group in vpc["security_groups"]:
+            group_id = ec2.create_security_group(GroupName=group["name"], Description=group["name"], VpcId=vpc_id)[
+                "GroupId"]
+            ec2.authorize_security_group_ingress(GroupId=group_id,
+                                                 IpPermissions=[_permission(*rule) for rule in group["ingress"]])
+        for instance in vpc["instances"]:
+            subnet = vpc["subnets"][instance["subnet"]]
+            instance_id = ec2.run_instances(ImageId=images[0]["ImageId"], MinCount=1, MaxCount=1,
+                                            InstanceType="t3.large", SubnetId=subnet_ids[instance["subnet"]])[
+                "Instances"][0]["InstanceId"]
+            for position, volume in enumerate(instance["volumes"]):
+                volume_id = ec2.create_volume(AvailabilityZone=subnet["az"], Size=volume["size"], VolumeType="gp3",
+                                              Encrypted=volume["encrypted"])["VolumeId"]
+                ec2.attach_volume(Device=f"/dev/sd{'fghijklmnop'[position]}", InstanceId=instance_id,
+                                  VolumeId=volume_id)
+            counts["instances"] += 1
+            counts["volumes"] += len(instance["volumes"])
+        if vpc["flow_logs"]:
+            ec2.create_flow_logs(ResourceIds=[vpc_id], ResourceType="VPC", TrafficType="ALL", LogDestinationType="s3",
+                                 LogDestination=f"arn:aws:s3:::{environment}-logs-{ACCOUNT_ID}")
+        counts["vpcs"] += 1
+        counts["subnets"] += len(subnet_ids)
+        counts["security_groups"] += len(vpc["security_groups"])
+    return counts
+
+
+# -- Logs -----------------------------------------------------------------------
+
+
+def _hosts(rng, scale, per_environment):
+    """Private addresses spread over every environment's subnets."""
+    found = []
+    for _, settings in environments(scale):
+        first, second = settings["vpc_cidr"].split(".")[:2]
+        found += [f"{first}.{second}.{rng.randrange(3 * scale.azs)}.{rng.randrange(4, 255)}"
+                  for _ in range(per_environment)]
+    return found
+
+
+def write_flow_log(path, scale):
+    """Write about ``scale.log_mb`` MB of flow records; return the number of records.
+
+    Instances talk to each other and to internet peers on the ports the
+    security groups open, one ENI per instance, with one flow in ten
+    rejected.
+    """
+    rng = _rng(scale, "flowlogs")
+    hosts = _hosts(rng, scale, 20)
+    enis = {host: f"eni-{rng.getrandbits(68):017x}" for host in hosts}
+    peers = [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+             for _ in range(2000)]
+    target, records = int(scale.log_mb * MB), 0
+    with open(path, "wb") as fh:
+        fh.write(FLOW_HEADER)
+        while fh.tell() < target:
+            lines = []
+            for _ in range(5000):
+                source, destination = rng.choice(hosts), rng.choice(hosts + peers)
+                action = "REJECT" if rng.random() < 0.1 else "ACCEPT"
+                start = EPOCH + rng.randrange(86400)
+                lines.append(f"2 {ACCOUNT_ID} {enis[source]} {source} {destination} {rng.randrange(1024, 65535)} "
+                             f"{rng.choice((22, 80, 443, 5432, 8080))} 6 {rng.randrange(1, 500)} "
+                             f"{rng.randrange(40, 1500000)} {start} {start + 60} {action} OK")
+            fh.write(("\n".join(lines) + "\n").encode())
+            records += len(lines)
+    return records
+
+
+def _syscall_event(host, stamp, serial, key, exe, auid, syscall, paths, rng, success="yes"):
+    common = {"host": host, "stamp": stamp, "ms": rng.randrange(1000), "serial": serial}
+    uid = 0 if auid in (UNSET_AUID, "1000") else int(auid)
+    lines = [AUDIT_SYSCALL.format(**common, syscall=syscall, success=success, items=len(paths), ppid=1,
+                                  pid=rng.randrange(2000, 60000), auid=auid, uid=uid,
+                                  tty="pts0" if auid != UNSET_AUID else "(none)", ses=3,
+                                  comm=exe.rsplit("/", 1)[1][:15], exe=exe, key=key)]
+    if syscall == EXECVE:
+        lines.append(AUDIT_PART.format(**common, type="EXECVE", body=f'argc=2 a0="{exe}" a1="--version"'))
+    lines.append(AUDIT_PART.format(**common, type="CWD", body='cwd="/"'))
+    lines += [AUDIT_PART.format(**common, type="PATH", body=f'item={item} name="{path}" '
+                                f"inode={rng.randrange(1, 1 << 20)} dev=ca:01 mode=0100755 ouid=0 ogid=0 rdev=00:00 "
+                                "nametype=NORMAL cap_fp=0 cap_fi=0")
+              for item, path in enumerate(paths)]
+    lines.append(AUDIT_PART.format(**common, type="PROCTITLE", body=exe.encode().hex().upper()))
+    lines.append(AUDIT_PART.format(**common, type="EOE", body="").rstrip())
+    return lines
+
+
+def _user_event(host, stamp, serial, kind, auid, rng, res="success", addr="10.100.0.5"):
+    op, exe, tty = {"login": ("login", "/usr/sbin/sshd", "ssh"), "sudo": ("PAM:session_open", "/usr/bin/sudo",
+                                                                         "/dev/pts/0")}[kind]
+    return [AUDIT_USER.format(host=host, type="USER_LOGIN" if kind == "login" else "USER_START", stamp=stamp,
+                              ms=rng.randrange(1000), serial=serial, pid=rng.randrange(2000, 60000), auid=auid, ses=3,
+                              op=op, acct="root", exe=exe, addr=addr, tty=tty, res=res)]
+
+
+def _touches(rules):
+    """``(key, syscall, paths, exe)`` for each watch rule: an edit, or a run for ``x`` watches."""
+    found = []
+    for rule in rules:
+        if rule.kind != "watch":
+            continue
+        target = rule.target + "config" if rule.target.endswith("/") else rule.target
+        if "x" in (rule.permissions or ""):
+            found.append((rule.key, EXECVE, [target], target))
+        else:
+            found.append((rule.key, OPENAT, [os.path.dirname(target) + "/", target], "/usr/bin/vi"))
+    return found
+
+
+def write_audit_logs(directory, scale, rules=None):
+    """Write ``<host>/audit.log`` for ``scale.hosts`` instances, ``scale.log_mb`` MB in all; return the event count.
+
+    Records follow the app user data's audit ``rules`` (by default
+    :func:`tools.audit.load_rules`): mostly ``exec`` events from daemons
+    and a few logged-in users, sudo sessions and edits of the watched
+    files, with one pair of events in ten interleaved.  Half way through,
+    the first host sees a burst of edits under the last watch key, the
+    second an edit of the first and the third a run of failed root logins.
+    """
+    touches = _touches(load_rules() if rules is None else rules)
+    if not touches:
+        raise SynthError("the audit rules watch no files")
+    rng = _rng(scale, "audit")
+    hosts = [f"i-0{number:016x}" for number in range(scale.hosts)]
+    target, events = int(scale.log_mb * MB / scale.hosts), 0
+    for number, host in enumerate(hosts):
+        os.makedirs(os.path.join(directory, host), exist_ok=True)
+        serial, stamp, written, injected = 1000, EPOCH, 0, False
+        with open(os.path.join(directory, host, "audit.log"), "w") as fh:
+            while written < target:
+                stamp += 1
+                block = []
+                for _ in range(rng.randrange(1, 4)):
+                    serial += 1
+                    roll = rng.random()
+                    if roll < 0.9:
+                        auid = UNSET_AUID if rng.random() < 0.7 else str(rng.choice((1000, 1001, 1002)))
+                        exe = rng.choice(COMMANDS)
+                        lines = _syscall_event(host, stamp, serial, "exec", exe, auid, EXECVE, [exe, "/lib64/ld"], rng)
+                    elif roll < 0.96:
+                        lines = _user_event(host, stamp, serial, "sudo", str(rng.choice((1000, 1001))), rng)
+                    else:
+                        key, syscall, paths, exe = rng.choice(touches)
+                        lines = _syscall_event(host, stamp, serial, key, exe, "1000", syscall, paths, rng)
+                    if block and rng.random() < 0.1:
+                        previous = block.pop()
+                        lines = [line for pair in zip(previous, lines) for line in pair] + \
+                            previous[len(lines):] + lines[len(previous):]
+                    block.append(lines)
+                    events += 1
+                if not injected and written >= target // 2:
+                    injected = True
+                    events += _inject(block, number, host, stamp, touches, rng)
+                text = "\n".join(line for lines in block for line in lines) + "\n"
+                fh.write(text)
+                written += len(text)
+    return events
+
+
+def _inject(block, number, host, stamp, touches, rng):
+    if number == 0:
+        key, syscall, paths, exe = touches[-1]
+        block += [_syscall_event(host, stamp, 10 ** 9 + serial, key, exe, "1001", syscall, paths, rng)
+                  for serial in range(300)]
+        return 300
+    if number == 1:
+        key, syscall, paths, exe = touches[0]
+        block.append(_syscall_event(host, stamp, 10 ** 9, key, exe, "1007", syscall, paths, rng))
+        return 1
+    if number == 2:
+        block += [_user_event(host, stamp, 10 ** 9 + serial, "login", UNSET_AUID, rng, "failed",
+                              "203.0.113.9") for serial in range(50)]
+        return 50
+    return 0
+
+
+def write_secure_logs(directory, scale):
+    """Write ``secure.log`` and ``cloudtrail.log``, ``scale.log_mb`` MB together; return the line count.
+
+    ``secure.log`` is sshd noise with failed logins and sudo from the
+    environments' instances, ``cloudtrail.log`` management events with a
+    rare security group change, for the monitoring module's metric filters.
+    """
+    rng = _rng(scale, "secure")
+    hosts = _hosts(rng, scale, 5)
+    lines_written = 0
+    for name, share in (("secure.log", 0.8), ("cloudtrail.log", 0.2)):
+        target, stamp = int(scale.log_mb * share * MB), float(EPOCH)
+        with open(os.path.join(directory, name), "w") as fh:
+            written = 0
+            while written < target:
+                lines = []
+                for _ in range(1000):
+                    stamp += rng.random() * 2
+                    clock = time.gmtime(EPOCH + int(stamp) % 86400)
+                    host = rng.choice(hosts)
+                    if name == "secure.log":
+                        message = rng.choices(SECURE, SECURE_WEIGHTS)[0].format(
+                            pid=rng.randrange(1000, 9999), peer=rng.choice(hosts), b=rng.randrange(256),
+                            port=rng.randrange(1024, 65535))
+                        lines.append(f"{time.strftime('%b %d %H:%M:%S', clock)} ip-{host.replace('.', '-')} {message}")
+                    else:
+                        service, event = rng.choices(TRAIL_EVENTS, (60, 30, 9.99, 0.01))[0]
+                        lines.append(json.dumps({"eventVersion": "1.08",
+                                                 "eventTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", clock),
+                                                 "eventSource": f"{service}.amazonaws.com",
+                                                 "eventName": event, "awsRegion": REGION,
+                                                 "sourceIPAddress": host}))
+                text = "\n".join(lines) + "\n"
+                fh.write(text)
+                written += len(text)
+                lines_written += len(lines)
+    return lines_written
+
+
+def _principals(rng, scale):
+    """``userIdentity`` blocks of every environment's instance role sessions, deploy user and operators."""
+    found = []
+    for name, _ in environments(scale):
+        role = f"{name}-ec2-role"
+        for _ in range(2):
+            session = f"i-{rng.getrandbits(68):017x}"
+            found.append({"type": "AssumedRole", "principalId": f"AROA{rng.getrandbits(64):016X}:{session}",
+                          "arn": f"arn:aws:sts::{ACCOUNT_ID}:assumed-role/{role}/{session}", "accountId": ACCOUNT_ID,
+                          "accessKeyId": f"ASIA{rng.getrandbits(64):016X}",
+                          "sessionContext": {"sessionIssuer": {"type": "Role", "userName": role,
+                                                               "arn": f"arn:aws:iam::{ACCOUNT_ID}:role/{role}"}}})
+        for user in (f"{name}-deploy", f"{name}-operator-0", f"{name}-operator-1"):
+            found.append({"type": "IAMUser", "principalId": f"AIDA{rng.getrandbits(64):016X}",
+                          "arn": f"arn:aws:iam::{ACCOUNT_ID}:user/{user}", "accountId": ACCOUNT_ID,
+                          "accessKeyId": f"AKIA{rng.getrandbits(64):016X}", "userName": user})
+    return found
+
+
+def _ingress(group_id, port, cidr):
+    return {"groupId": group_id, "ipPermissions": {"items": [
+        {"ipProtocol": "tcp", "fromPort": port, "toPort": port, "ipRanges": {"items": [{"cidrIp": cidr}]}}]}}
+
+
+def _trail_record(rng, stamp, region, identity, service, event, hosts):
+    bucket = f"{identity['arn'].split('/')[1].split('-')[0]}-logs-{ACCOUNT_ID}"
+    record = {"eventVersion": "1.08", "userIdentity": identity,
+              "eventTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stamp)),
+              "eventSource": f"{ENDPOINTS.get(service, service)}.amazonaws.com", "eventName": event,
+              "awsRegion": region, "sourceIPAddress": rng.choice(hosts),
+              "userAgent": rng.choice(("aws-cli/2.13.25", "Boto3/1.28.0", "terraform-provider-aws/5.31.0")),
+              "requestID": f"{rng.getrandbits(128):032x}", "eventID": f"{rng.getrandbits(128):032x}",
+              "readOnly": event.startswith(("Describe", "Get", "List")), "eventType": "AwsApiCall",
+              "managementEvent": True, "recipientAccountId": ACCOUNT_ID, "eventCategory": "Management"}
+    if event == "AuthorizeSecurityGroupIngress":
+        record["requestParameters"] = _ingress(f"sg-{rng.getrandbits(68):017x}", 443, "10.0.0.0/8")
+    elif service == "s3" and event.endswith("Object"):
+        key = f"app/{rng.getrandbits(32):08x}.json"
+        record.update(managementEvent=False, eventCategory="Data",
+                      requestParameters={"bucketName": bucket, "key": key},
+                      resources=[{"type": "AWS::S3::Object", "ARN": f"arn:aws:s3:::{bucket}/{key}"}])
+    if rng.random() < 0.03:
+        record.update(errorCode="AccessDenied", errorMessage=f"User is not authorized to perform {service}:{event}")
+    return record
+
+
+def write_trail(directory, scale):
+    """Write gzipped CloudTrail deliveries as in the trail bucket; return the number of records.
+
+    About ``scale.log_mb`` MB of records spread over ``TRAIL_DAYS`` days up
+    to the corpus epoch and ``TRAIL_REGIONS``, in files of at most
+    ``TRAIL_FILE_RECORDS`` records under
+    ``AWSLogs/<account>/CloudTrail/<region>/YYYY/MM/DD/``, plus a digest file
+    that readers must skip.  On the last day ``prod-operator-1`` opens SSH
+    to the world on a batch of security groups from an unfamiliar address.
+    """
+    rng = _rng(scale, "trail")
+    principals, hosts = _principals(rng, scale), _hosts(rng, scale, 3)
+    calls = [(service, event) for service, events in SERVICES.items() for event in events]
+    first = EPOCH - (TRAIL_DAYS - 1) * 86400
+    total, written = max(1, int(scale.log_mb * MB / TRAIL_RECORD_BYTES)), 0
+
+    def deliver(region, batch):
+        start = batch[0][0]
+        folder = os.path.join(directory, "AWSLogs", ACCOUNT_ID, "CloudTrail", region,
+                              time.strftime("%Y/%m/%d", time.gmtime(start)))
+        os.makedirs(folder, exist_ok=True)
+        name = (f"{ACCOUNT_ID}_CloudTrail_{region}_{time.strftime('%Y%m%dT%H%MZ', time.gmtime(start - start % 300))}"
+                f"_{rng.getrandbits(64):016X}.json.gz")
+        with open(os.path.join(folder, name), "wb") as fh:
+            fh.write(gzip.compress(json.dumps({"Records": [record for _, record in batch]}).encode(), mtime=0))
+        return len(batch)
+
+    for region, share in TRAIL_REGIONS:
+        batch = []
+        for stamp in sorted(rng.randrange(first, EPOCH + 86400) for _ in range(max(1, int(total * share)))):
+            if batch and (len(batch) == TRAIL_FILE_RECORDS or stamp // 86400 != batch[0][0] // 86400):
+                written += deliver(region, batch)
+                batch = []
+            batch.append((stamp, _trail_record(rng, stamp, region, rng.choice(principals), *rng.choice(calls), hosts)))
+        written += deliver(region, batch)
+
+    operator = next(identity for identity in principals if identity["arn"].endswith(":user/prod-operator-1"))
+    burst = []
+    for number in range(20):
+        stamp = EPOCH + 3 * 3600 + number * 7
+        record = _trail_record(rng, stamp, REGION, operator, "ec2", "AuthorizeSecurityGroupIngress", ["198.51.100.7"])
+        record.pop("errorCode", None)
+        record.pop("errorMessage", None)
+        record["requestParameters"] = _ingress(f"sg-{rng.getrandbits(68):017x}", 22, "0.0.0.0/0")
+        burst.append((stamp, record))
+    written += deliver(REGION, burst)
+    digest = os.path.join(directory, "AWSLogs", ACCOUNT_ID, "CloudTrail-Digest", REGION,
+                          time.strftime("%Y/%m/%d", time.gmtime(EPOCH)))
+    os.makedirs(digest, exist_ok=True)
+    with open(os.path.join(digest, f"{ACCOUNT_ID}_CloudTrail-Digest_{REGION}_prod-cloudtrail_{REGION}_"
+                                   f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(EPOCH))}.json.gz"), "wb") as fh:
+        fh.write(gzip.compress(json.dumps({"awsAccountId": ACCOUNT_ID, "logFiles": []}).encode(), mtime=0))
+    return written
+
+
+# -- Corpus ---------------------------------------------------------------------
+
+
+def _dump(directory, name, document):
+    with open(os.path.join(directory, name), "w") as fh:
+        json.dump(document, fh)
+    return name
+
+
+def write_corpus(directory, scale):
+    """Write every corpus for ``scale`` under ``directory``; return the manifest, also saved as ``manifest.json``.
+
+    Paths in the manifest are relative to ``directory``.
+    """
+    for name in ("plans", "audit", "logs"):
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+    named = list(plans(scale))
+    files = {"plans": {name: _dump(directory, f"plans/{name}.json", plan) for name, plan in named},
+             "plan": _dump(directory, "plan.json", nest(named)),
+             "seed": _dump(directory, "seed.json", seed_data(scale)),
+             "iam": _dump(directory, "iam.json", authorization_details(scale)),
+             "networks": "networks.txt", "flow_log": "flow.log", "audit": "audit", "logs": "logs", "trail": "trail"}
+    with open(os.path.join(directory, files["networks"]), "w") as fh:
+        fh.writelines(f"{settings['vpc_cidr']}  # {name}\n" for name, settings in environments(scale))
+    counts = {"environments": len(named), "resources": sum(len(plan["resource_changes"]) for _, plan in named),
+              "policies": scale.policies + len(named),
+              "flow_records": write_flow_log(os.path.join(directory, files["flow_log"]), scale),
+              "audit_events": write_audit_logs(os.path.join(directory, files["audit"]), scale),
+              "log_lines": write_secure_logs(os.path.join(directory, files["logs"]), scale),
+              "trail_records": write_trail(os.path.join(directory, files["trail"]), scale)}
+    manifest = {"scale": asdict(scale), "files": files, "counts": counts}
+    _dump(directory, "manifest.json", manifest)
+    return manifest
+
+
+# -- CLI ------------------------------------------------------------------------
+
+
+@click.group()
+def main():
+    """Synthetic plans, moto seed data and log corpora at scale."""
+
+
+@main.command("generate")
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--environments", default=3, show_default=True, help="Environments, cycling prod, staging, dev.")
+@click.option("--azs", default=3, show_default=True, help="Availability zones per VPC.")
+@click.option("--asgs", default=1, show_default=True, help="Auto Scaling groups per environment.")
+@click.option("--rules", default=0, show_default=True, help="Extra partner ingress rules on each private group.")
+@click.option("--policies", default=100, show_default=True, help="Customer managed IAM policies.")
+@click.option("--log-mb", default=1.0, show_default=True, help="Megabytes of each log corpus.")
+@click.option("--hosts", default=4, show_default=True, help="Hosts writing audit logs.")
+@click.option("--seed", default=7, show_default=True)
+@click.option("--factor", default=1, show_default=True, help="Multiply environments, policies, log volume and hosts.")
+def generate_command(directory, factor, **sizes):
+    """Write plans, seed data, an IAM export and log corpora to DIRECTORY."""
+    try:
+        scale = Scale(**sizes).times(factor)
+    except SynthError as exc:
+        raise click.ClickException(str(exc))
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    manifest = write_corpus(directory, scale)
+    for key, value in manifest["counts"].items():
+        click.echo(f"{key:<14} {value}")
+    click.echo(f"written to {directory} in {time.perf_counter() - started:.1f} s")
+
+
+@main.command("seed")
+@click.argument("seed_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--endpoint-url", envvar="AWS_ENDPOINT_URL", required=True, help="A local moto server.")
+def seed_command(seed_path, endpoint_url):
+    """Create the resources in SEED_PATH (a corpus's seed.json) on a moto server."""
+    with open(seed_path) as fh:
+        data = json.load(fh)
+    started = time.perf_counter()
+    counts = seed(Clients(endpoint_url=endpoint_url), data)
+    click.echo(", ".join(f"{count} {kind}" for kind, count in counts.items()))
+    click.echo(f"seeded in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()